@@ -0,0 +1,117 @@
+"""
+Food plan result cache with stale-while-revalidate semantics.
+
+Plans are keyed by a digest of everything that influences generation: the
+personalization-relevant profile fields, dietary preferences, number of days,
+plan start date, a watermark of the food history and the generator version.
+Fresh entries are returned as-is; stale entries are returned immediately while
+a single background task regenerates them. Storage, early refresh and
+cross-worker recompute locking come from ``common.cache.tiered``; plans are
+tagged with ``user:<id>`` so a profile change can drop them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from common.cache.tiered import TieredCache, invalidate_user, user_tag
+
+# Bump whenever plan generation changes in a way that should invalidate cached plans
+FOOD_PLAN_GENERATOR_VERSION = "enhanced_ai_nutrition_system_v1.0"
+
+# Entries younger than this are served without revalidation
+FOOD_PLAN_FRESH_SECONDS = 6 * 3600
+# Stale entries are still served (and refreshed in background) until Redis expires them
+FOOD_PLAN_TTL_SECONDS = 48 * 3600
+
+# Profile fields that change the generated plan
+_PROFILE_DIGEST_FIELDS = (
+    "age",
+    "gender",
+    "height_cm",
+    "weight_kg",
+    "activity_level",
+    "goal",
+    "daily_calories_target",
+    "language",
+    "allergies",
+)
+
+# Degraded plans are returned to the caller but never cached
+_UNCACHED_MODELS = {"fallback", "fallback_generator"}
+
+plan_cache = TieredCache("food_plan", FOOD_PLAN_TTL_SECONDS, fresh_seconds=FOOD_PLAN_FRESH_SECONDS)
+
+# Background revalidation tasks by cache key (also keeps the task references alive)
+_revalidating: Dict[str, asyncio.Task] = plan_cache.refresh_tasks
+
+
+def history_watermark(food_history: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Cheap fingerprint of the food history: entry count and latest timestamp."""
+    timestamps = [str(row.get("timestamp")) for row in food_history or [] if row.get("timestamp")]
+    return {"count": len(food_history or []), "latest": max(timestamps) if timestamps else None}
+
+
+def food_plan_digest(
+    profile: Optional[Dict[str, Any]],
+    food_history: List[Dict[str, Any]],
+    days: int,
+    start_date: date,
+) -> str:
+    """Deterministic digest of the plan generation inputs."""
+    profile = profile or {}
+    material = {
+        "profile": {field: profile.get(field) for field in _PROFILE_DIGEST_FIELDS},
+        "dietary_preferences": sorted(profile.get("dietary_preferences") or []),
+        "days": days,
+        "start_date": str(start_date),
+        "history": history_watermark(food_history),
+        "version": FOOD_PLAN_GENERATOR_VERSION,
+    }
+    raw = json.dumps(material, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def food_plan_cache_key(digest: str) -> str:
+    return plan_cache.key({"digest": digest})
+
+
+def _cacheable(plan: Dict[str, Any]) -> bool:
+    return isinstance(plan, dict) and plan.get("model_used") not in _UNCACHED_MODELS
+
+
+async def get_or_generate_food_plan(
+    profile: Optional[Dict[str, Any]],
+    food_history: List[Dict[str, Any]],
+    days: int,
+    start_date: date,
+    generate: Callable[[], Awaitable[Dict[str, Any]]],
+    force: bool = False,
+) -> Dict[str, Any]:
+    """
+    Return a generated plan for the given inputs, using the cache when possible.
+
+    ``generate`` is awaited on a miss (or when ``force`` is set) and its result
+    is cached. A stale hit is returned immediately and refreshed in background;
+    concurrent misses across workers run ``generate`` once.
+    """
+    digest = food_plan_digest(profile, food_history, days, start_date)
+    user_id = (profile or {}).get("user_id")
+    return await plan_cache.get_or_compute(
+        {"digest": digest},
+        generate,
+        tags=[user_tag(user_id)] if user_id else (),
+        ttl_seconds=FOOD_PLAN_TTL_SECONDS,
+        fresh_seconds=FOOD_PLAN_FRESH_SECONDS,
+        force=force,
+        cacheable=_cacheable,
+    )
+
+
+async def invalidate_user_food_plans(user_id: Any) -> int:
+    """Drop every cached entry of the user (plans included) after a profile change."""
+    return await invalidate_user(user_id)
@@ -0,0 +1,55 @@
+"""
+Rendered nutrition insights cache.
+
+The insights menu sections (BMI, ideal weight, metabolic age, water needs,
+macro and meal distribution, recommendations, goal advice) depend only on the
+profile and the language. They are rendered together, once per profile
+version and language, and stored as ``{section: text}``; menu taps are served
+from the cache.
+
+The key is a digest of the whole profile row (``updated_at`` included), the
+language and the renderer version, so an edited profile never hits an old
+entry. Entries are also tagged with ``user:<id>``, which
+``update_user_profile`` invalidates.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from common.cache.tiered import TieredCache, user_tag
+
+# Bump whenever section texts or calculations change
+INSIGHTS_RENDER_VERSION = "insights_v1"
+
+INSIGHTS_TTL_SECONDS = 7 * 24 * 3600
+
+# Keys are content-addressed (profile digest), so L1 copies can live long
+insights_cache = TieredCache("nutrition_insights", INSIGHTS_TTL_SECONDS, l1_ttl_seconds=3600.0)
+
+
+def profile_version(profile: Optional[Dict[str, Any]]) -> str:
+    """Deterministic digest of the profile row."""
+    raw = json.dumps(profile or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def get_or_render_insights(
+    profile: Optional[Dict[str, Any]],
+    language: str,
+    render: Callable[[], Awaitable[Dict[str, str]]],
+    user_id: Any = None,
+) -> Dict[str, str]:
+    """
+    Rendered sections for the profile and language, from the cache when possible.
+
+    ``render`` is awaited on a miss and must return every section.
+    """
+    user_id = user_id or (profile or {}).get("user_id")
+    return await insights_cache.get_or_compute(
+        {"profile": profile_version(profile), "language": language, "version": INSIGHTS_RENDER_VERSION},
+        render,
+        tags=[user_tag(user_id)] if user_id else (),
+    )
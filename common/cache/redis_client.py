@@ -2,12 +2,17 @@
 Minimal async Redis client facade used by food plan router for caching.
 
 For local/dev environments without Redis, functions degrade gracefully.
+Keys are hashed and values are JSON, zlib-compressed above
+``COMPRESS_MIN_BYTES``; see ``common.cache.tiered`` for the two-tier cache.
 """
 
 from __future__ import annotations
 
+import base64
+import hashlib
 import os
 import json
+import zlib
 from typing import Any, Dict
 
 from loguru import logger
@@ -26,6 +31,24 @@ class _DummyAsyncRedis:
         logger.debug(f"[DummyRedis] get {key} -> None")
         return None
 
+    async def set(self, key: str, value: str, nx: bool = False, ex: int = None) -> bool:
+        logger.debug(f"[DummyRedis] set {key} nx={nx} ex={ex}")
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        logger.debug(f"[DummyRedis] delete {keys}")
+        return 0
+
+    async def sadd(self, key: str, *members: str) -> int:
+        logger.debug(f"[DummyRedis] sadd {key} {len(members)} members")
+        return 0
+
+    async def smembers(self, key: str) -> set:
+        return set()
+
+    async def expire(self, key: str, ttl_seconds: int) -> bool:
+        return False
+
 
 _client = None
 
@@ -48,12 +71,37 @@ async def get_async_redis():
     return _client
 
 
+# Values at least this long (JSON characters) are stored compressed
+COMPRESS_MIN_BYTES = 1024
+
+
 def make_cache_key(namespace: str, params: Dict[str, Any]) -> str:
+    """``c0r:<namespace>:<digest>``; the digest covers the canonical JSON of params."""
     try:
-        suffix = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        material = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
     except Exception:
-        suffix = str(params)
-    return f"c0r:{namespace}:{suffix}"
+        material = str(params)
+    digest = hashlib.blake2b(material.encode("utf-8"), digest_size=16).hexdigest()
+    return f"c0r:{namespace}:{digest}"
+
+
+def encode_value(value: Any) -> str:
+    """JSON with a codec prefix: ``j:`` plain, ``z:`` base64 of zlib (the client decodes responses as text)."""
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        return "z:" + base64.b64encode(zlib.compress(raw.encode("utf-8"), 6)).decode("ascii")
+    return "j:" + raw
+
+
+def decode_value(raw: Any) -> Any:
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+    if raw.startswith("z:"):
+        return json.loads(zlib.decompress(base64.b64decode(raw[2:])).decode("utf-8"))
+    if raw.startswith("j:"):
+        return json.loads(raw[2:])
+    # Written before the codec prefix existed
+    return json.loads(raw)
 
 
 async def cache_get_json(key: str):
@@ -63,18 +111,16 @@ async def cache_get_json(key: str):
         raw = await client.get(key)  # type: ignore[attr-defined]
         if not raw:
             return None
-        return json.loads(raw)
+        return decode_value(raw)
     except Exception as e:
         logger.debug(f"cache_get_json error for {key}: {e}")
         return None
 
 
 async def cache_set_json(key: str, value: Any, ttl_seconds: int) -> None:
-    """Set JSON value with TTL."""
+    """Set JSON value with TTL (compressed when large)."""
     try:
         client = await get_async_redis()
-        await client.setex(key, ttl_seconds, json.dumps(value, ensure_ascii=False))  # type: ignore[attr-defined]
+        await client.setex(key, ttl_seconds, encode_value(value))  # type: ignore[attr-defined]
     except Exception as e:
         logger.debug(f"cache_set_json error for {key}: {e}")
-
-
@@ -0,0 +1,125 @@
+"""
+Single-flight execution: concurrent calls for the same key share one run.
+
+Within a process, callers for a key already in flight await the running
+task instead of starting their own. Across workers, the first caller takes a
+Redis lock (SET NX EX) and the others poll for the result the leader
+publishes (for photo analysis: the regular analysis cache entry) until it
+appears or the lock goes away.
+
+Without Redis (dummy client) only the in-process coalescing applies.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from loguru import logger
+
+from common.cache.redis_client import get_async_redis
+
+# Longer than the slowest leader run (ML timeout + uploads) so the lock does not expire mid-flight
+SINGLE_FLIGHT_LOCK_TTL_SECONDS = 120
+SINGLE_FLIGHT_POLL_SECONDS = 0.25
+
+
+class SingleFlight:
+    """Coalesces concurrent runs by key; one instance per kind of work."""
+
+    def __init__(
+        self,
+        namespace: str,
+        lock_ttl_seconds: int = SINGLE_FLIGHT_LOCK_TTL_SECONDS,
+        poll_seconds: float = SINGLE_FLIGHT_POLL_SECONDS,
+    ):
+        self.namespace = namespace
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.poll_seconds = poll_seconds
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _lock_key(self, key: str) -> str:
+        return f"c0r:flight:{self.namespace}:{key}"
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        load_shared: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> Tuple[Any, bool]:
+        """
+        Run ``fn`` once per key at a time. Returns ``(value, shared)``: ``shared``
+        is False for the caller whose ``fn`` ran and True for callers that got
+        another run's value. An exception of the run is raised in every caller.
+
+        ``load_shared`` fetches a result published by a leader in another worker;
+        without it only in-process calls are coalesced.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            logger.info(f"Single-flight {self.namespace}: joining in-flight run for {key}")
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value, shared = await self._lead(key, fn, load_shared)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieve the exception so a flight without followers does not log "never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value, shared
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _lead(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        load_shared: Optional[Callable[[], Awaitable[Any]]],
+    ) -> Tuple[Any, bool]:
+        if load_shared is None:
+            return await fn(), False
+
+        lock_key = self._lock_key(key)
+        token = uuid.uuid4().hex
+        while True:
+            if await self._acquire(lock_key, token):
+                try:
+                    return await fn(), False
+                finally:
+                    await self._release(lock_key, token)
+            # Another worker holds the lock: wait for its result, or for the lock to be
+            # released without one (failed run) or to expire (crashed worker) and retry
+            await asyncio.sleep(self.poll_seconds)
+            shared = await load_shared()
+            if shared is not None:
+                logger.info(f"Single-flight {self.namespace}: using result of another worker for {key}")
+                return shared, True
+
+    async def _acquire(self, lock_key: str, token: str) -> bool:
+        try:
+            client = await get_async_redis()
+            return bool(await client.set(lock_key, token, nx=True, ex=self.lock_ttl_seconds))
+        except Exception as e:
+            # Never block work on Redis trouble; duplicates are only wasted effort
+            logger.debug(f"Single-flight lock error for {lock_key}: {e}")
+            return True
+
+    async def _release(self, lock_key: str, token: str) -> None:
+        try:
+            client = await get_async_redis()
+            if await client.get(lock_key) == token:
+                await client.delete(lock_key)
+        except Exception as e:
+            logger.debug(f"Single-flight unlock error for {lock_key}: {e}")
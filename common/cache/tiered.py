@@ -0,0 +1,377 @@
+"""
+Two-tier cache: a bounded in-process LRU (L1) over Redis (L2).
+
+Entries are stored as ``{"v": value, "c": created_at, "d": compute_seconds,
+"t": tags}`` with the redis_client codec (hashed keys, compressed large values).
+
+Freshness is decided on read, so callers can pass ``fresh_seconds`` per call:
+
+- Before the fresh deadline a read refreshes early with a probability that
+  grows as the deadline nears and with the cost of the last compute
+  (probabilistic early expiration, "XFetch"), so hot keys are rarely all
+  recomputed at once.
+- Past the deadline the stale value is served and one background refresh
+  runs (one per key in the process, one per key across workers via a Redis
+  lock). Only the Redis TTL removes entries.
+- A miss is computed once across workers: ``SingleFlight`` coalesces callers in
+  the process and holds a Redis lock; other workers wait for the published
+  entry.
+
+Every entry is tagged with ``ns:<namespace>`` plus the caller's tags (for
+example ``user:<id>``); tags index keys in Redis sets for invalidation. L1
+entries live at most ``l1_ttl_seconds``, which bounds how long another process
+can serve a value invalidated elsewhere. L1 keeps values as JSON text and
+decodes them on every hit, so callers get their own copy to mutate, with the
+same types a Redis hit gives.
+
+``None`` cannot be cached: it is what a miss looks like.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import json
+import math
+import random
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from common.cache.redis_client import decode_value, encode_value, get_async_redis, make_cache_key
+from common.cache.single_flight import SingleFlight
+from shared.metrics import REGISTRY
+
+_EVENTS = REGISTRY.counter(
+    "c0r_cache_events_total",
+    "Tiered cache lookups and maintenance by namespace",
+    ("namespace", "event"),
+)
+
+# Live caches, so tag invalidation also drops matching L1 entries of other caches in this process
+_caches: "weakref.WeakSet[TieredCache]" = weakref.WeakSet()
+
+
+def tag_key(tag: str) -> str:
+    return f"c0r:tag:{tag}"
+
+
+def user_tag(user_id: Any) -> str:
+    return f"user:{user_id}"
+
+
+class TieredCache:
+    """L1 LRU + Redis cache for one namespace (food plans, profiles, analyses, ...)."""
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl_seconds: int,
+        fresh_seconds: Optional[float] = None,
+        l1_max_entries: int = 512,
+        l1_ttl_seconds: float = 30.0,
+        beta: float = 1.0,
+        lock_ttl_seconds: int = 60,
+        poll_seconds: float = 0.1,
+        clock: Callable[[], float] = time.time,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.fresh_seconds = ttl_seconds if fresh_seconds is None else fresh_seconds
+        self.l1_max_entries = l1_max_entries
+        self.l1_ttl_seconds = l1_ttl_seconds
+        self.beta = beta
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.clock = clock
+        self.rng = rng
+        # key -> (entry without "v", JSON of "v", expires at)
+        self._l1: "OrderedDict[str, Tuple[Dict[str, Any], str, float]]" = OrderedDict()
+        self._flight = SingleFlight(f"cache:{namespace}", lock_ttl_seconds=lock_ttl_seconds, poll_seconds=poll_seconds)
+        # Background refreshes by key (also keeps the task references alive)
+        self.refresh_tasks: Dict[str, asyncio.Task] = {}
+        self.counts: Dict[str, int] = {}
+        _caches.add(self)
+
+    @property
+    def namespace_tag(self) -> str:
+        return f"ns:{self.namespace}"
+
+    def key(self, params: Dict[str, Any]) -> str:
+        return make_cache_key(self.namespace, params)
+
+    def _count(self, event: str) -> None:
+        self.counts[event] = self.counts.get(event, 0) + 1
+        _EVENTS.inc(namespace=self.namespace, event=event)
+
+    # -- public API -----------------------------------------------------------------
+
+    async def get(self, params: Dict[str, Any]) -> Any:
+        """Cached value regardless of freshness, or None."""
+        entry = await self._read(self.key(params))
+        if entry is None:
+            self._count("miss")
+            return None
+        return entry["v"]
+
+    async def set(
+        self,
+        params: Dict[str, Any],
+        value: Any,
+        tags: Iterable[str] = (),
+        ttl_seconds: Optional[int] = None,
+    ) -> None:
+        await self._write(self.key(params), value, tags, ttl_seconds, 0.0)
+
+    async def get_or_compute(
+        self,
+        params: Dict[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+        tags: Iterable[str] = (),
+        ttl_seconds: Optional[int] = None,
+        fresh_seconds: Optional[float] = None,
+        force: bool = False,
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        Cached value for ``params``, computing it with ``compute`` on a miss.
+
+        ``force`` recomputes and overwrites. Values rejected by ``cacheable``
+        are returned but not stored.
+        """
+        key = self.key(params)
+        tags = tuple(tags)
+
+        async def run() -> Any:
+            started = time.perf_counter()
+            value = await compute()
+            self._count("recompute")
+            if value is not None and (cacheable is None or cacheable(value)):
+                await self._write(key, value, tags, ttl_seconds, time.perf_counter() - started)
+            return value
+
+        if force:
+            return await run()
+
+        entry = await self._read(key)
+        if entry is not None:
+            if self._needs_refresh(entry, self.fresh_seconds if fresh_seconds is None else fresh_seconds):
+                self._schedule_refresh(key, run, entry)
+            return entry["v"]
+
+        self._count("miss")
+        value, shared = await self._flight.do(key, run, load_shared=lambda: self._load_shared(key))
+        if shared:
+            self._count("shared")
+            # Callers that joined an in-process flight all get the leader's object
+            value = copy.deepcopy(value)
+        return value
+
+    async def invalidate(self, params: Dict[str, Any]) -> None:
+        key = self.key(params)
+        self._l1.pop(key, None)
+        self._count("invalidation")
+        try:
+            client = await get_async_redis()
+            await client.delete(key)
+        except Exception as e:
+            logger.debug(f"Cache invalidate error for {key}: {e}")
+
+    async def invalidate_namespace(self) -> int:
+        return await invalidate_tag(self.namespace_tag)
+
+    def clear_local(self) -> None:
+        """Drop L1 only (tests, memory pressure)."""
+        self._l1.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counts.get("l1_hit", 0) + self.counts.get("l2_hit", 0)
+        lookups = hits + self.counts.get("miss", 0)
+        return {
+            "namespace": self.namespace,
+            **self.counts,
+            "hit_ratio": round(hits / lookups, 3) if lookups else None,
+            "l1_entries": len(self._l1),
+        }
+
+    # -- internals ------------------------------------------------------------------
+
+    def _needs_refresh(self, entry: Dict[str, Any], fresh_seconds: float) -> bool:
+        now = self.clock()
+        deadline = float(entry.get("c") or 0) + fresh_seconds
+        if now >= deadline:
+            self._count("stale")
+            return True
+        # XFetch: refresh early with probability rising as the deadline nears (scaled by compute cost)
+        delta = float(entry.get("d") or 0)
+        if delta > 0 and now - delta * self.beta * math.log(max(self.rng(), 1e-12)) >= deadline:
+            self._count("early_refresh")
+            return True
+        return False
+
+    def _schedule_refresh(self, key: str, run: Callable[[], Awaitable[Any]], seen: Dict[str, Any]) -> None:
+        if key in self.refresh_tasks or self._flight.in_flight(key):
+            return
+
+        async def _refresh() -> None:
+            lock_key = f"c0r:refresh:{self.namespace}:{key}"
+            token = uuid.uuid4().hex
+            try:
+                if not await self._try_lock(lock_key, token):
+                    return  # another worker is refreshing it
+                try:
+                    current = await self._read_l2(key)
+                    if current is not None and float(current["c"]) > float(seen.get("c") or 0):
+                        # Another worker refreshed it since our read
+                        self._l1_put(key, current)
+                        return
+                    await run()
+                finally:
+                    await self._unlock(lock_key, token)
+            except Exception as e:
+                logger.warning(f"Background cache refresh failed for {key}: {e}")
+            finally:
+                self.refresh_tasks.pop(key, None)
+
+        self.refresh_tasks[key] = asyncio.create_task(_refresh())
+
+    async def _try_lock(self, lock_key: str, token: str) -> bool:
+        try:
+            client = await get_async_redis()
+            return bool(await client.set(lock_key, token, nx=True, ex=self.lock_ttl_seconds))
+        except Exception as e:
+            # A duplicate refresh is only wasted work
+            logger.debug(f"Cache refresh lock error for {lock_key}: {e}")
+            return True
+
+    async def _unlock(self, lock_key: str, token: str) -> None:
+        try:
+            client = await get_async_redis()
+            if await client.get(lock_key) == token:
+                await client.delete(lock_key)
+        except Exception as e:
+            logger.debug(f"Cache refresh unlock error for {lock_key}: {e}")
+
+    def _l1_get(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self._l1.get(key)
+        if item is None:
+            return None
+        meta, raw, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._l1[key]
+            return None
+        self._l1.move_to_end(key)
+        return {**meta, "v": json.loads(raw)}
+
+    def _l1_put(self, key: str, entry: Dict[str, Any]) -> None:
+        if self.l1_max_entries <= 0:
+            return
+        try:
+            raw = json.dumps(entry["v"], ensure_ascii=False, separators=(",", ":"))
+        except (TypeError, ValueError) as e:
+            # Not storable in Redis either
+            self._count("error")
+            logger.debug(f"Cache value for {key} is not JSON: {e}")
+            return
+        meta = {name: value for name, value in entry.items() if name != "v"}
+        self._l1[key] = (meta, raw, time.monotonic() + self.l1_ttl_seconds)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_max_entries:
+            self._l1.popitem(last=False)
+            self._count("l1_eviction")
+
+    def _drop_tagged(self, tag: str) -> None:
+        for key in [key for key, (meta, _, _) in self._l1.items() if tag in meta.get("t", ())]:
+            del self._l1[key]
+
+    async def _read_l2(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            client = await get_async_redis()
+            raw = await client.get(key)
+            if not raw:
+                return None
+            entry = decode_value(raw)
+        except Exception as e:
+            self._count("error")
+            logger.debug(f"Cache read error for {key}: {e}")
+            return None
+        if not isinstance(entry, dict) or "v" not in entry or "c" not in entry:
+            return None
+        return entry
+
+    async def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._l1_get(key)
+        if entry is not None:
+            self._count("l1_hit")
+            return entry
+        entry = await self._read_l2(key)
+        if entry is not None:
+            self._l1_put(key, entry)
+            self._count("l2_hit")
+        return entry
+
+    async def _load_shared(self, key: str) -> Any:
+        entry = await self._read_l2(key)
+        if entry is None:
+            return None
+        self._l1_put(key, entry)
+        return entry["v"]
+
+    async def _write(
+        self,
+        key: str,
+        value: Any,
+        tags: Iterable[str],
+        ttl_seconds: Optional[int],
+        compute_seconds: float,
+    ) -> None:
+        ttl = int(ttl_seconds or self.ttl_seconds)
+        all_tags: List[str] = [self.namespace_tag, *tags]
+        entry = {"v": value, "c": self.clock(), "d": round(compute_seconds, 4), "t": all_tags}
+        self._l1_put(key, entry)
+        try:
+            client = await get_async_redis()
+            await client.setex(key, ttl, encode_value(entry))
+        except Exception as e:
+            self._count("error")
+            logger.debug(f"Cache write error for {key}: {e}")
+            return
+        try:
+            for tag in all_tags:
+                await client.sadd(tag_key(tag), key)
+                await client.expire(tag_key(tag), max(ttl, self.ttl_seconds))
+        except Exception as e:
+            logger.debug(f"Cache tag index error for {key}: {e}")
+
+
+async def invalidate_tag(tag: str) -> int:
+    """
+    Delete every entry carrying ``tag`` (across namespaces) from Redis and
+    from the L1 of caches in this process. Returns the number of keys indexed.
+    """
+    for cache in list(_caches):
+        cache._drop_tagged(tag)
+        cache._count("invalidation")
+    try:
+        client = await get_async_redis()
+        keys = list(await client.smembers(tag_key(tag)) or ())
+        if keys:
+            await client.delete(*keys)
+        await client.delete(tag_key(tag))
+        return len(keys)
+    except Exception as e:
+        logger.debug(f"Cache tag invalidation error for {tag}: {e}")
+        return 0
+
+
+async def invalidate_user(user_id: Any) -> int:
+    """Drop all cached entries tagged for one user (plans, profiles, analyses)."""
+    return await invalidate_tag(user_tag(user_id))
+
+
+def cache_stats() -> List[Dict[str, Any]]:
+    return [cache.stats() for cache in list(_caches)]
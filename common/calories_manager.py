@@ -36,7 +36,8 @@ class CaloriesManager:
         self,
         user_id: str, 
         analysis_data: Dict, 
-        photo_url: str = None
+        photo_url: str = None,
+        log_analysis: bool = True
     ) -> bool:
         """
         Add calories from food analysis to user's daily consumption
@@ -45,6 +46,8 @@ class CaloriesManager:
             user_id: User UUID
             analysis_data: Analysis result from ML service
             photo_url: URL of the analyzed photo
+            log_analysis: Also write the analysis log entry (background task); the job
+                queue writes it as its own step instead
             
         Returns:
             bool: True if successful, False otherwise
@@ -112,6 +115,8 @@ class CaloriesManager:
             # Also log the individual food analysis
             # Note: _log_food_analysis is async but we're calling it from sync context
             # This is a temporary fix - in production we should make this properly async
+            if not log_analysis:
+                return True
             try:
                 import asyncio
                 asyncio.create_task(self._log_food_analysis(
@@ -141,7 +146,7 @@ class CaloriesManager:
         carbohydrates: float,
         photo_url: str = None,
         analysis_data: Dict = None
-    ):
+    ) -> bool:
         """Log individual food analysis for tracking"""
         try:
             log_data = {
@@ -160,9 +165,11 @@ class CaloriesManager:
             
             self.supabase.table("logs").insert(log_data).execute()
             logger.info(f"✅ Logged food analysis for user {user_id}")
+            return True
             
         except Exception as e:
             logger.error(f"❌ Error logging food analysis for user {user_id}: {e}")
+            return False
     
     def get_daily_summary(self, user_id: str, date: str = None) -> Dict:
         """
@@ -430,9 +437,23 @@ class CaloriesManager:
 calories_manager = CaloriesManager()
 
 # Convenience functions for easy access
-def add_calories_from_analysis(user_id: str, analysis_data: Dict, photo_url: str = None) -> bool:
+def add_calories_from_analysis(user_id: str, analysis_data: Dict, photo_url: str = None, log_analysis: bool = True) -> bool:
     """Add calories from food analysis"""
-    return calories_manager.add_calories_from_analysis(user_id, analysis_data, photo_url)
+    return calories_manager.add_calories_from_analysis(user_id, analysis_data, photo_url, log_analysis)
+
+
+async def log_food_analysis(user_id: str, analysis_data: Dict, photo_url: str = None) -> bool:
+    """Write the analysis log entry; False if the insert failed"""
+    nutrition = analysis_data.get("analysis", {}).get("total_nutrition", {})
+    return await calories_manager._log_food_analysis(
+        user_id=user_id,
+        calories=float(nutrition.get("calories", 0)),
+        proteins=float(nutrition.get("proteins", 0)),
+        fats=float(nutrition.get("fats", 0)),
+        carbohydrates=float(nutrition.get("carbohydrates", 0)),
+        photo_url=photo_url,
+        analysis_data=analysis_data
+    )
 
 
 def get_daily_calories(user_id: str, date: str = None) -> Dict:
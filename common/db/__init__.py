@@ -17,6 +17,7 @@ from .credits import (
 from .profiles import (
     get_user_profile,
     get_user_with_profile,
+    load_user_with_profile,
     create_user_profile,
     update_user_profile,
     validate_profile_completeness,
@@ -35,12 +36,19 @@ from .payments import (
 from .favorites import (
     save_favorite_food,
     list_favorites,
+    search_favorites,
     get_favorite_by_id,
+    get_favorite_by_composition_hash,
     delete_favorite,
 )
+from .nutrition_rollups import (
+    get_weekly_rollups,
+    summarize_weekly_rollup,
+)
 from .recipes import (
     save_recipe,
     list_recipes,
+    search_recipes,
     get_recipe_by_id,
     delete_recipe,
 )
@@ -60,6 +68,7 @@ __all__ = [
     # Profiles
     'get_user_profile',
     'get_user_with_profile',
+    'load_user_with_profile',
     'create_user_profile',
     'update_user_profile',
     'validate_profile_completeness',
@@ -78,12 +87,19 @@ __all__ = [
     # Favorites
     'save_favorite_food',
     'list_favorites',
+    'search_favorites',
     'get_favorite_by_id',
+    'get_favorite_by_composition_hash',
     'delete_favorite',
     
+    # Nutrition rollups
+    'get_weekly_rollups',
+    'summarize_weekly_rollup',
+    
     # Recipes
     'save_recipe',
     'list_recipes',
+    'search_recipes',
     'get_recipe_by_id',
     'delete_recipe'
 ]
\ No newline at end of file
@@ -8,7 +8,7 @@ from .client import supabase
 
 def _apply_search(query, search: Optional[str]):
     if search:
-        # Simple ILIKE search on name
+        # Fallback when the search_favorites RPC is missing (unindexed ILIKE on name)
         return query.ilike("name", f"%{search}%")
     return query
 
@@ -42,11 +42,16 @@ async def list_favorites(
     user_id: str,
     limit: int = 50,
     search: Optional[str] = None,
+    offset: int = 0,
 ) -> List[Dict[str, Any]]:
-    logger.info(f"Listing favorites for user={user_id}, limit={limit}, search={search}")
+    logger.info(f"Listing favorites for user={user_id}, limit={limit}, offset={offset}, search={search}")
+    if search and search.strip():
+        return await search_favorites(user_id, search, limit=limit, offset=offset)
     try:
-        query = supabase.table("favorites_food").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(limit)
-        query = _apply_search(query, search)
+        query = (
+            supabase.table("favorites_food").select("*").eq("user_id", user_id)
+            .order("created_at", desc=True).range(offset, offset + limit - 1)
+        )
         res = query.execute()
         return res.data or []
     except Exception as e:
@@ -54,6 +59,52 @@ async def list_favorites(
         return []
 
 
+async def search_favorites(
+    user_id: str,
+    search: str,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Ranked favorites search (full-text + trigram, see
+    migrations/database/2025-10-21_favorites_recipes_search.sql); best matches first
+    """
+    try:
+        res = supabase.rpc("search_favorites", {
+            "p_user_id": user_id,
+            "p_query": search.strip(),
+            "p_limit": limit,
+            "p_offset": offset,
+        }).execute()
+        return res.data or []
+    except Exception as e:
+        logger.warning(f"Favorites search RPC failed, using ILIKE: {e}")
+    try:
+        query = (
+            supabase.table("favorites_food").select("*").eq("user_id", user_id)
+            .order("created_at", desc=True).range(offset, offset + limit - 1)
+        )
+        res = _apply_search(query, search.strip()).execute()
+        return res.data or []
+    except Exception as e:
+        logger.error(f"Failed to search favorites: {e}")
+        return []
+
+
+async def get_favorite_by_composition_hash(user_id: str, composition_hash: str) -> Optional[Dict[str, Any]]:
+    """Most recent favorite with the given composition (same items, weights and calories)"""
+    try:
+        res = (
+            supabase.table("favorites_food").select("*")
+            .eq("user_id", user_id).eq("composition_hash", composition_hash)
+            .order("created_at", desc=True).limit(1).execute()
+        )
+        return res.data[0] if res.data else None
+    except Exception as e:
+        logger.error(f"Failed to get favorite by composition for user {user_id}: {e}")
+        return None
+
+
 async def get_favorite_by_id(user_id: str, favorite_id: str) -> Optional[Dict[str, Any]]:
     try:
         res = supabase.table("favorites_food").select("*").eq("user_id", user_id).eq("id", favorite_id).single().execute()
@@ -3,10 +3,33 @@ User action logging operations
 Handles logging of all user actions and photo analyses
 """
 import asyncio
-from typing import Optional, Dict, Any
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Tuple
 from loguru import logger
 from .client import supabase
 
+# logs is range-partitioned by month on "timestamp" (migrations/database/2025-10-20_partition_logs_by_month.sql):
+# readers pass both bounds so Postgres only touches the months in the window
+LOGS_RETENTION_DAYS = 90
+
+
+def log_window_bounds(days: int, until: Optional[datetime] = None) -> Tuple[str, str]:
+    """
+    Return (since, until) ISO timestamps (UTC) for the last ``days`` days,
+    for .gte("timestamp", since).lt("timestamp", until) filters on logs
+    """
+    until = until or datetime.utcnow()
+    return (until - timedelta(days=days)).isoformat(), until.isoformat()
+
+
+def log_day_bounds(date_from: str, date_to: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Return [start, end) timestamps covering whole days date_from..date_to (YYYY-MM-DD),
+    so the last second of the final day is included
+    """
+    end_day = datetime.strptime(date_to or date_from, "%Y-%m-%d") + timedelta(days=1)
+    return f"{date_from}T00:00:00", end_day.strftime("%Y-%m-%dT00:00:00")
+
 
 async def log_user_action(user_id: str, action_type: str, metadata: Dict[str, Any] = None, photo_url: str = None, kbzhu: Dict[str, Any] = None, model_used: str = None):
     """
@@ -187,9 +210,9 @@ async def get_user_analysis_count(user_id: str, date_from: str = None, date_to:
     query = supabase.table("logs").select("id", count="exact").eq("user_id", user_id).eq("action_type", "photo_analysis")
     
     if date_from:
-        query = query.gte("timestamp", f"{date_from}T00:00:00")
+        query = query.gte("timestamp", log_day_bounds(date_from)[0])
     if date_to:
-        query = query.lt("timestamp", f"{date_to}T23:59:59")
+        query = query.lt("timestamp", log_day_bounds(date_to)[1])
     
     try:
         result = query.execute()
@@ -227,23 +250,43 @@ async def get_popular_actions(limit: int = 10):
         return []
 
 
-async def cleanup_old_logs(days_to_keep: int = 90):
+async def cleanup_old_logs(days_to_keep: int = LOGS_RETENTION_DAYS):
     """
-    Clean up old log entries
+    Clean up old log entries by dropping whole monthly partitions
+
+    Only months that end before the cutoff are dropped, so up to a month of
+    older rows can remain until the next run. Falls back to a bounded DELETE
+    when the partition function is missing (unpartitioned database), through
+    RPC delete_old_logs where it exists so the nutrition rollups are kept.
     
     Args:
         days_to_keep: Number of days to keep logs
         
     Returns:
-        Number of deleted records
+        Number of deleted records (estimated for dropped partitions)
     """
-    from datetime import datetime, timedelta
-    
-    cutoff_date = datetime.now() - timedelta(days=days_to_keep)
+    cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
     cutoff_str = cutoff_date.strftime('%Y-%m-%dT%H:%M:%S')
     
     logger.info(f"Cleaning up logs older than {cutoff_str}")
     
+    try:
+        result = supabase.rpc("drop_old_logs_partitions", {"cutoff": f"{cutoff_str}Z"}).execute()
+        dropped = result.data or []
+        deleted_count = sum(int(row.get("estimated_rows") or 0) for row in dropped)
+        logger.info(f"Dropped log partitions {[row.get('partition_name') for row in dropped]} (~{deleted_count} rows)")
+        return deleted_count
+    except Exception as e:
+        logger.warning(f"Partition retention unavailable, deleting rows instead: {e}")
+
+    try:
+        result = supabase.rpc("delete_old_logs", {"cutoff": f"{cutoff_str}Z"}).execute()
+        deleted_count = int(result.data or 0)
+        logger.info(f"Deleted {deleted_count} old log entries")
+        return deleted_count
+    except Exception as e:
+        logger.warning(f"Retention DELETE function unavailable, deleting through the table: {e}")
+    
     try:
         result = supabase.table("logs").delete().lt("timestamp", cutoff_str).execute()
         deleted_count = len(result.data) if result.data else 0
@@ -0,0 +1,167 @@
+"""
+Weekly nutrition rollups
+Per-user weekly aggregates kept current by the database as analyses are logged
+(migrations/database/2025-10-23_weekly_nutrition_rollups.sql); the weekly report
+reads them instead of scanning raw logs
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from loguru import logger
+
+from .client import supabase
+
+ROLLUPS_TABLE = "user_weekly_nutrition_rollups"
+
+BACKFILL_BATCH_SIZE = 200
+
+
+def week_start(day: date) -> date:
+    """Monday of the (ISO) week containing ``day``"""
+    return day - timedelta(days=day.weekday())
+
+
+def _as_date(value: Any) -> Optional[date]:
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+async def get_weekly_rollups(user_id: str, today: Optional[date] = None) -> Optional[Dict[str, Optional[Dict[str, Any]]]]:
+    """
+    Rollup rows of the current and the previous week (one primary key range read)
+
+    Returns:
+        {"current": row or None, "previous": row or None}, or None when the
+        rollups cannot be read (e.g. the migration is not applied)
+    """
+    today = today or datetime.utcnow().date()
+    current = week_start(today)
+    previous = current - timedelta(days=7)
+    try:
+        rows = (
+            supabase.table(ROLLUPS_TABLE).select("*")
+            .eq("user_id", user_id)
+            .gte("week_start", previous.isoformat())
+            .lte("week_start", current.isoformat())
+            .execute()
+        ).data or []
+    except Exception as e:
+        logger.error(f"Failed to get weekly rollups for user {user_id}: {e}")
+        return None
+    by_week = {_as_date(row.get("week_start")): row for row in rows}
+    return {"current": by_week.get(current), "previous": by_week.get(previous)}
+
+
+def summarize_weekly_rollup(rollup: Optional[Dict[str, Any]], today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Report figures for one rollup row
+
+    Averages are per logged day. The consistency score (0-100) weighs days
+    logged out of the days elapsed in the week (60%) and days on target out of
+    days logged (40%); without a calorie target it is the logging share alone.
+    The current streak is 0 unless the last logged day is today or yesterday.
+    """
+    today = today or datetime.utcnow().date()
+    rollup = rollup or {}
+    start = _as_date(rollup.get("week_start")) or week_start(today)
+    days_logged = int(rollup.get("days_logged") or 0)
+    target = int(rollup.get("calorie_target") or 0) or None
+    on_target = int(rollup.get("days_on_target") or 0)
+
+    elapsed_days = max(1, min(7, (today - start).days + 1))
+    summary: Dict[str, Any] = {
+        "week_start": start,
+        "meals_count": int(rollup.get("meals_count") or 0),
+        "days_logged": days_logged,
+        "elapsed_days": elapsed_days,
+        "calorie_target": target,
+        "days_on_target": on_target,
+        "avg_calories": None,
+        "avg_proteins": None,
+        "avg_fats": None,
+        "avg_carbohydrates": None,
+        "goal_progress_percent": None,
+        "consistency_score": None,
+        "current_streak": 0,
+        "longest_streak": int(rollup.get("longest_streak") or 0),
+    }
+    if not days_logged:
+        return summary
+
+    for field in ("calories", "proteins", "fats", "carbohydrates"):
+        summary[f"avg_{field}"] = round(float(rollup.get(field) or 0) / days_logged)
+
+    logging_share = min(1.0, days_logged / elapsed_days)
+    if target:
+        summary["goal_progress_percent"] = round(100 * on_target / days_logged)
+        summary["consistency_score"] = round(100 * (0.6 * logging_share + 0.4 * on_target / days_logged))
+    else:
+        summary["consistency_score"] = round(100 * logging_share)
+
+    last_logged = _as_date(rollup.get("last_logged_day"))
+    if last_logged is not None and last_logged >= today - timedelta(days=1):
+        summary["current_streak"] = int(rollup.get("streak_days") or 0)
+    return summary
+
+
+async def backfill_nutrition_rollups(since: date, user_ids: Optional[Sequence[str]] = None) -> Dict[str, int]:
+    """
+    Rebuild daily and weekly rollups from logs since ``since`` (aligned to Monday)
+
+    Runs in one database transaction, so pass ``user_ids`` batches on large
+    databases. Weeks older than the logs retention window cannot be rebuilt
+    and are left as they are.
+    """
+    params: Dict[str, Any] = {"p_since": since.isoformat()}
+    if user_ids is not None:
+        params["p_user_ids"] = list(user_ids)
+    result = await asyncio.to_thread(lambda: supabase.rpc("backfill_user_nutrition_rollups", params).execute())
+    row = (result.data or [{}])[0]
+    return {
+        "users": int(row.get("users_count") or 0),
+        "days": int(row.get("days_count") or 0),
+        "weeks": int(row.get("weeks_count") or 0),
+    }
+
+
+async def _user_id_batches(batch_size: int) -> List[List[str]]:
+    batches: List[List[str]] = []
+    offset = 0
+    while True:
+        rows = await asyncio.to_thread(
+            lambda: supabase.table("users").select("id").order("id").range(offset, offset + batch_size - 1).execute()
+        )
+        ids = [row["id"] for row in rows.data or []]
+        if ids:
+            batches.append(ids)
+        if len(ids) < batch_size:
+            return batches
+        offset += batch_size
+
+
+async def _cli(args: argparse.Namespace) -> None:
+    since = date.fromisoformat(args.since)
+    totals = {"users": 0, "days": 0, "weeks": 0}
+    batches = [args.user] if args.user else await _user_id_batches(args.batch_size)
+    for number, batch in enumerate(batches, 1):
+        counts = await backfill_nutrition_rollups(since, batch)
+        totals = {key: totals[key] + counts[key] for key in totals}
+        logger.info(f"Backfilled rollups batch {number}/{len(batches)}: {counts}")
+    print(totals)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m common.db.nutrition_rollups")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="rebuild rollups from logs")
+    backfill.add_argument("--since", required=True, help="YYYY-MM-DD, aligned to the Monday of its week")
+    backfill.add_argument("--user", action="append", help="user UUID (repeatable); default: all users")
+    backfill.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    asyncio.run(_cli(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
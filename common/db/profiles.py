@@ -6,9 +6,10 @@ import asyncio
 from typing import Optional, Tuple, List, Dict, Any
 from datetime import datetime
 from loguru import logger
+from common.cache.tiered import invalidate_user
 from .client import supabase
 from .users import get_or_create_user
-from .logs import get_effective_log_calories
+from .logs import get_effective_log_calories, log_day_bounds
 
 
 async def get_user_profile(user_id: str):
@@ -58,6 +59,33 @@ async def get_user_with_profile(telegram_id: int):
     return result
 
 
+async def load_user_with_profile(telegram_id: int, language: Optional[str] = None):
+    """
+    Same result as get_user_with_profile in one round-trip: the profile is
+    embedded into the users select (user_profiles.user_id -> users.id).
+    Falls back to get_user_with_profile for new users or if embedding fails.
+    """
+    try:
+        rows = supabase.table("users").select("*, user_profiles(*)").eq("telegram_id", telegram_id).limit(1).execute().data
+    except Exception as e:
+        logger.warning(f"Embedded user/profile select failed for {telegram_id}: {e}")
+        rows = None
+    if not rows:
+        user = await get_or_create_user(telegram_id, language)
+        if not user:
+            return None
+        profile = await get_user_profile(user['id'])
+        return {'user': user, 'profile': profile, 'has_profile': profile is not None}
+
+    user = dict(rows[0])
+    profiles = user.pop("user_profiles", None)
+    if isinstance(profiles, dict):
+        profile = profiles
+    else:
+        profile = profiles[0] if profiles else None
+    return {'user': user, 'profile': profile, 'has_profile': profile is not None}
+
+
 def calculate_daily_calories(profile_data: dict) -> int:
     """
     Calculate daily calorie target using Mifflin-St Jeor Equation.
@@ -206,6 +234,8 @@ async def update_user_profile(user_id: str, profile_data: dict):
     
     updated = supabase.table("user_profiles").update(profile_data).eq("user_id", user_id).execute().data[0]
     logger.info(f"Profile updated for user {user_id}: {updated}")
+    # Cached plans and other per-user entries were computed from the old profile
+    await invalidate_user(user_id)
     return updated
 
 
@@ -266,8 +296,9 @@ async def get_daily_calories_consumed(user_id: str, date: str = None):
     
     logger.info(f"Getting daily calories for user {user_id} on {date}")
     
-    # Get all photo analyses for the date
-    logs = supabase.table("logs").select("*").eq("user_id", user_id).eq("action_type", "photo_analysis").gte("timestamp", f"{date}T00:00:00").lt("timestamp", f"{date}T23:59:59").execute().data
+    # Get all photo analyses for the date (both bounds keep the scan on one monthly partition)
+    day_start, day_end = log_day_bounds(date)
+    logs = supabase.table("logs").select("*").eq("user_id", user_id).eq("action_type", "photo_analysis").gte("timestamp", day_start).lt("timestamp", day_end).execute().data
     
     total_calories = 0
     total_protein = 0
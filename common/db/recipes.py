@@ -8,6 +8,7 @@ from .client import supabase
 
 def _apply_search(query, search: Optional[str]):
     if search:
+        # Fallback when the search_recipes RPC is missing (unindexed ILIKE on title)
         return query.ilike("title", f"%{search}%")
     return query
 
@@ -41,11 +42,16 @@ async def list_recipes(
     user_id: str,
     limit: int = 50,
     search: Optional[str] = None,
+    offset: int = 0,
 ) -> List[Dict[str, Any]]:
-    logger.info(f"Listing recipes for user={user_id}, limit={limit}, search={search}")
+    logger.info(f"Listing recipes for user={user_id}, limit={limit}, offset={offset}, search={search}")
+    if search and search.strip():
+        return await search_recipes(user_id, search, limit=limit, offset=offset)
     try:
-        query = supabase.table("saved_recipes").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(limit)
-        query = _apply_search(query, search)
+        query = (
+            supabase.table("saved_recipes").select("*").eq("user_id", user_id)
+            .order("created_at", desc=True).range(offset, offset + limit - 1)
+        )
         res = query.execute()
         return res.data or []
     except Exception as e:
@@ -53,6 +59,38 @@ async def list_recipes(
         return []
 
 
+async def search_recipes(
+    user_id: str,
+    search: str,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Ranked saved-recipes search (full-text + trigram, see
+    migrations/database/2025-10-21_favorites_recipes_search.sql); best matches first
+    """
+    try:
+        res = supabase.rpc("search_recipes", {
+            "p_user_id": user_id,
+            "p_query": search.strip(),
+            "p_limit": limit,
+            "p_offset": offset,
+        }).execute()
+        return res.data or []
+    except Exception as e:
+        logger.warning(f"Recipes search RPC failed, using ILIKE: {e}")
+    try:
+        query = (
+            supabase.table("saved_recipes").select("*").eq("user_id", user_id)
+            .order("created_at", desc=True).range(offset, offset + limit - 1)
+        )
+        res = _apply_search(query, search.strip()).execute()
+        return res.data or []
+    except Exception as e:
+        logger.error(f"Failed to search recipes: {e}")
+        return []
+
+
 async def get_recipe_by_id(user_id: str, recipe_id: str) -> Optional[Dict[str, Any]]:
     try:
         res = supabase.table("saved_recipes").select("*").eq("user_id", user_id).eq("id", recipe_id).single().execute()
@@ -17,6 +17,7 @@ from typing import Any, Dict, Optional
 from loguru import logger
 
 from .client import supabase
+from .logs import log_window_bounds
 
 
 class SupabaseService:
@@ -140,13 +141,14 @@ class SupabaseService:
 
         # Recent history (7 days) from logs, day-by-day
         try:
-            since = (datetime.utcnow() - timedelta(days=7)).isoformat()
+            since, until = log_window_bounds(7)
             logs = (
                 supabase.table("logs")
                 .select("timestamp, kbzhu, metadata")
                 .eq("user_id", user_id)
                 .eq("action_type", "photo_analysis")
                 .gte("timestamp", since)
+                .lt("timestamp", until)
                 .order("timestamp", desc=False)
                 .execute()
                 .data
@@ -182,13 +184,14 @@ class SupabaseService:
         # Build a human-readable 14d summary using timestamps only (portable, no model deps)
         history_summary_text_14d = None
         try:
-            since_14d = (datetime.utcnow() - timedelta(days=14)).isoformat()
+            since_14d, until_14d = log_window_bounds(14)
             rows_14d = (
                 supabase.table("logs")
                 .select("timestamp")
                 .eq("user_id", user_id)
                 .eq("action_type", "photo_analysis")
                 .gte("timestamp", since_14d)
+                .lt("timestamp", until_14d)
                 .order("timestamp", desc=False)
                 .execute()
                 .data
@@ -271,13 +274,14 @@ class SupabaseService:
             }
 
         try:
-            since = (datetime.utcnow() - timedelta(days=14)).isoformat()
+            since, until = log_window_bounds(14)
             rows = (
                 supabase.table("logs")
                 .select("timestamp")
                 .eq("user_id", user_id)
                 .eq("action_type", "photo_analysis")
                 .gte("timestamp", since)
+                .lt("timestamp", until)
                 .execute()
                 .data
             )
@@ -0,0 +1,370 @@
+"""
+Food taxonomy shared across services.
+
+Classifies free-text food names (RU/EN) into categories, portion defaults and
+typical per-100 g nutrition in a single linear pass. All keywords are compiled
+once at import into an Aho-Corasick automaton, so callers no longer rebuild
+keyword lists and rescan the name once per list.
+
+Matching semantics follow the keyword lists this module replaced: a keyword
+matches when it occurs as a substring of the normalized name, except for terms
+marked whole-word. Russian keywords are stemmed at build time (one trailing
+vowel/soft sign is dropped when a stem of at least four letters remains), so
+"курица" also matches "курицей" and "гречка" matches "гречкой".
+"""
+
+from __future__ import annotations
+
+import re
+from collections import deque
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+# category -> keywords; "=word" marks a whole-word term
+FOOD_CATEGORIES: Dict[str, Tuple[str, ...]] = {
+    # Meal-plan history analysis
+    "breakfast": ("овсянка", "каша", "мюсли", "яйц", "омлет", "йогурт", "творог", "тост", "хлопья"),
+    "protein": (
+        "курица", "говядина", "рыба", "лосось", "тунец", "яйц", "творог", "сыр", "индейка", "свинина", "треска",
+        "salmon", "chicken", "beef", "cottage", "eggs", "tuna",
+    ),
+    "carb": ("рис", "гречка", "макарон", "хлеб", "картофель", "овсянка", "киноа", "паста"),
+    "healthy": ("овощи", "салат", "брокколи", "шпинат", "помидор", "огурец", "ягоды", "фрукт", "авокадо", "листья"),
+    "unhealthy": ("пицца", "бургер", "=фри", "чипсы", "кола", "торт", "пирожное", "конфеты"),
+    # Health score bonuses / penalties
+    "healthy_ingredient": (
+        "лосось", "семга", "авокадо", "брокколи", "шпинат", "киноа", "овсянка", "ягоды", "орехи", "оливковое масло",
+        "salmon", "avocado", "broccoli", "spinach", "quinoa", "oats", "berries", "nuts", "olive oil",
+    ),
+    "unhealthy_ingredient": (
+        "=фри", "чипсы", "кола", "пицца", "бургер", "майонез", "кетчуп",
+        "fries", "chips", "cola", "pizza", "burger", "mayo", "ketchup",
+    ),
+    # Meal composition checks
+    "vegetable": (
+        "салат", "помидор", "огурец", "перец", "брокколи", "шпинат", "морковь",
+        "lettuce", "tomato", "cucumber", "pepper", "broccoli", "spinach", "carrot",
+    ),
+    "healthy_fat": ("авокадо", "орехи", "оливковое", "лосось", "avocado", "nuts", "olive", "salmon"),
+    # Dish naming
+    "dish_soup": ("бульон", "суп", "=щи", "борщ", "солянка", "soup", "broth", "chowder"),
+    "dish_pasta": ("паста", "макарон", "спагетти", "пенне", "фарфалле", "pasta", "spaghetti", "penne", "linguine"),
+    "dish_rice": ("рис", "плов", "ризотто", "rice", "risotto", "pilaf"),
+    "dish_porridge": ("гречка", "каша", "овсянка"),
+    "dish_meat": ("стейк", "говядина", "свинина", "баранина", "котлет", "steak", "beef", "pork", "lamb", "chicken"),
+    "dish_fish": ("лосось", "семга", "тунец", "треска", "окунь", "рыба", "salmon", "tuna", "fish", "cod", "halibut"),
+    "dish_greens": ("салат", "листья", "руккола", "шпинат", "айсберг", "lettuce", "salad", "greens", "arugula", "spinach"),
+    "dish_salad_vegetable": (
+        "помидор", "огурец", "перец", "морковь", "свекла", "tomato", "cucumber", "pepper", "carrot",
+    ),
+    "dish_bread": ("хлеб", "тост", "багет", "булка", "сэндвич", "bread", "toast", "sandwich", "bagel"),
+    # Portion size groups
+    "meat": ("мясо", "курица", "говядина", "свинина", "баранина"),
+    "fish": ("рыба", "лосось", "треска", "судак"),
+    "vegetables": ("овощи", "салат", "капуста", "морковь"),
+    "grain": ("каша", "рис", "гречка", "овсянка"),
+    "soup": ("суп", "борщ", "солянка", "=щи"),
+    # Dairy (label heuristics)
+    "dairy_cream": ("сливочн",),
+    "cheese_any": ("сыр",),
+    "cheese": ("=сыр",),
+    "cottage_cheese": ("творог",),
+    "milk": ("молок",),
+    "yogurt": ("йогурт",),
+    "kefir": ("кефир",),
+    # Allergen / diet tags (recommender catalog bitsets). These drive allergy exclusions, so they err
+    # towards tagging: dishes that usually contain the ingredient are listed, and short English words
+    # are whole-word ("=egg" does not match "eggplant", "=ham" not "hamburger").
+    "tag_meat": (
+        "мяс", "говядина", "телятина", "баранина", "фарш", "котлет", "бургер", "пельмен", "манты", "хинкали",
+        "беляш", "чебурек", "шаурм", "шашлык", "стейк", "колбас", "сосиск", "сардельк", "тефтел", "фрикадел",
+        "голубц", "плов", "бефстроганов", "гуляш", "люля",
+        "beef", "lamb", "veal", "meat", "steak", "sausage", "=burger", "=burgers", "=hamburger", "=hamburgers",
+        "cheeseburger", "meatball", "pepperoni", "salami",
+    ),
+    "tag_poultry": ("курица", "курин", "индейка", "утка", "утин", "цыпл", "chicken", "turkey", "duck"),
+    "tag_pork": (
+        "свинина", "свин", "бекон", "ветчина", "=сало", "буженин", "карбонад", "грудинк", "чоризо",
+        "pork", "bacon", "=ham", "prosciutto", "pancetta", "chorizo", "pepperoni", "salami",
+    ),
+    "tag_fish": (
+        "рыба", "рыбн", "лосось", "семга", "тунец", "тунца", "треска", "трески", "окунь", "сельдь", "селедк",
+        "скумбрия", "форел", "тилапи", "барабульк", "горбуш", "минтай", "=хек", "судак", "=щука", "=щуки",
+        "=щукой", "=карп", "=карпа", "=карпом", "палтус", "сибас", "дорадо", "сардин", "анчоус", "шпрот", "кильк", "камбал", "=кета",
+        "=кеты", "=кетой", "=икра", "=икры", "=икрой", "суши",
+        "fish", "salmon", "=tuna", "=cod", "trout", "tilapia", "mullet", "herring", "mackerel", "sardine",
+        "anchov", "pollock", "halibut", "=carp", "=pike", "=perch", "seabass", "=bass", "sushi",
+    ),
+    "tag_shellfish": (
+        "креветк", "мидии", "мидия", "кальмар", "морепродукт", "краб", "устриц", "гребешк", "осьминог", "лангуст",
+        "омар",
+        "shrimp", "prawn", "mussel", "squid", "crab", "seafood", "oyster", "scallop", "lobster", "octopus",
+        "calamari",
+    ),
+    "tag_dairy": (
+        "молок", "молоч", "йогурт", "творог", "творож", "сыр", "кефир", "сметан", "сливк", "сливочн", "ряженк",
+        "сырник", "моцарелл", "пармезан", "рикотт", "маскарпоне", "брынз", "=фета", "=феты", "=фетой",
+        "milk", "yogurt", "cheese", "cream", "butter", "mozzarella", "parmesan", "ricotta",
+    ),
+    "tag_eggs": (
+        "яйц", "яиц", "яич", "омлет", "глазунь", "майонез", "блин", "оладь", "сырник", "меренг", "=безе",
+        "запеканк", "=egg", "=eggs", "omelet", "mayo", "meringue", "frittata", "quiche", "aioli", "pancake",
+    ),
+    "tag_gluten": (
+        "хлеб", "тост", "паста", "макарон", "спагетти", "оладь", "гранола", "булк", "пицц", "лаваш", "кускус",
+        "пшениц", "блин", "пельмен", "вареник", "манты", "хинкали", "лапш", "=мука", "=муки", "=мукой", "мучн",
+        "булгур", "манн", "=манка", "=манки", "=манкой", "печенье", "печенья", "печеньем", "пирог", "пирож",
+        "сухар", "панировк", "ячмен", "перловк", "ржан", "сэндвич", "бутерброд", "багет", "бублик", "бургер",
+        "вафл", "круассан", "кекс", "торт", "маффин", "пончик", "лепешк", "хачапури", "беляш", "чебурек",
+        "шаурм", "гренк", "крекер", "тесто", "клецк", "медовик", "сейтан", "фунчоз", "лазань", "пенне", "фузилли",
+        "bread", "toast", "pasta", "pancake", "granola", "wheat", "noodle", "couscous", "bulgur", "semolina",
+        "flour", "cookie", "biscuit", "cracker", "dumpling", "=bun", "=buns", "burger", "sandwich", "pizza",
+        "waffle", "croissant", "muffin", "=cake", "=pie", "tortilla", "bagel", "spaghetti", "seitan", "barley",
+        "=rye", "lasagn", "ramen", "udon",
+    ),
+    "tag_nuts": (
+        "орех", "миндал", "кешью", "фундук", "фисташ", "=пекан", "=пекана", "=пеканом", "нутелл", "пралине",
+        "марципан",
+        "nuts", "almond", "cashew", "walnut", "hazelnut", "pistachio", "pecan", "nutella", "praline", "marzipan",
+    ),
+    "tag_peanuts": ("арахис", "peanut"),
+    "tag_soy": ("тофу", "соев", "=соя", "эдамам", "мисо", "=темпе", "tofu", "soy", "edamame", "=miso", "tempeh"),
+    "tag_sesame": ("кунжут", "хумус", "тахини", "халв", "sesame", "hummus", "tahini", "halva"),
+    "tag_honey": ("=мед", "=медом", "медов", "honey"),
+    "tag_sulfites": ("=вино", "=вином", "=вине", "сухофрукт", "курага", "изюм", "чернослив", "wine", "raisin"),
+}
+
+# Typical medium-size portions (grams) for specific foods; earlier entries win
+PORTION_DEFAULTS: Dict[str, Dict[str, int]] = {
+    # Мясо и птица
+    "курица": {"small": 80, "medium": 120, "large": 180},
+    "говядина": {"small": 90, "medium": 140, "large": 200},
+    "свинина": {"small": 85, "medium": 130, "large": 190},
+    "рыба": {"small": 70, "medium": 110, "large": 160},
+    "котлета": {"small": 60, "medium": 90, "large": 130},
+    # Гарниры
+    "рис": {"small": 60, "medium": 100, "large": 150},
+    "картофель": {"small": 80, "medium": 120, "large": 180},
+    "макароны": {"small": 70, "medium": 110, "large": 160},
+    "гречка": {"small": 65, "medium": 100, "large": 140},
+    "пюре": {"small": 80, "medium": 120, "large": 180},
+    # Овощи
+    "салат": {"small": 50, "medium": 80, "large": 120},
+    "помидор": {"small": 60, "medium": 100, "large": 150},
+    "огурец": {"small": 40, "medium": 70, "large": 100},
+    "капуста": {"small": 50, "medium": 80, "large": 120},
+    "морковь": {"small": 30, "medium": 50, "large": 80},
+    # Молочные продукты
+    "творог": {"small": 60, "medium": 100, "large": 150},
+    "сыр": {"small": 20, "medium": 40, "large": 60},
+    "йогурт": {"small": 80, "medium": 125, "large": 200},
+    # Хлебобулочные
+    "хлеб": {"small": 15, "medium": 25, "large": 40},
+    "булочка": {"small": 30, "medium": 50, "large": 80},
+    # Супы
+    "суп": {"small": 150, "medium": 250, "large": 350},
+    "борщ": {"small": 150, "medium": 250, "large": 350},
+    # Каши
+    "каша": {"small": 80, "medium": 120, "large": 180},
+    "овсянка": {"small": 70, "medium": 110, "large": 160},
+    # Фрукты
+    "яблоко": {"small": 80, "medium": 120, "large": 180},
+    "банан": {"small": 60, "medium": 100, "large": 140},
+    "апельсин": {"small": 80, "medium": 130, "large": 200},
+}
+
+# Portion fallbacks by category when no specific food matched; earlier entries win
+CATEGORY_PORTIONS: Dict[str, Dict[str, int]] = {
+    "meat": {"small": 85, "medium": 130, "large": 190},
+    "fish": {"small": 70, "medium": 110, "large": 160},
+    "vegetables": {"small": 45, "medium": 75, "large": 110},
+    "grain": {"small": 70, "medium": 110, "large": 160},
+    "soup": {"small": 150, "medium": 250, "large": 350},
+}
+
+# Typical per-100 g nutrition (kcal, proteins, fats, carbs) keyed by required categories; first match wins
+NUTRITION_PER_100G: Tuple[Tuple[str, FrozenSet[str], Tuple[float, float, float, float]], ...] = (
+    ("cream_cheese", frozenset({"dairy_cream", "cheese_any"}), (330.0, 25.0, 26.0, 3.0)),
+    ("hard_cheese", frozenset({"cheese"}), (350.0, 25.0, 27.0, 0.0)),
+    ("cottage_cheese", frozenset({"cottage_cheese"}), (170.0, 16.0, 9.0, 3.0)),
+    ("milk", frozenset({"milk"}), (64.0, 3.3, 3.2, 4.7)),
+    ("yogurt", frozenset({"yogurt"}), (60.0, 4.0, 3.0, 5.0)),
+    ("kefir", frozenset({"kefir"}), (52.0, 3.0, 3.0, 4.0)),
+)
+
+_RU_STEM_ENDINGS = "аяыиоеуюьй"
+_MIN_STEM_LENGTH = 4
+_NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def normalize_food_name(name: str) -> str:
+    """Lowercase, fold ё to е and collapse punctuation/whitespace to single spaces."""
+    return _NON_WORD_RE.sub(" ", (name or "").lower().replace("ё", "е")).strip()
+
+
+def stem_keyword(keyword: str) -> str:
+    """Drop one trailing Russian vowel/soft sign from the last word if the stem stays long enough."""
+    keyword = normalize_food_name(keyword)
+    if keyword and keyword[-1] in _RU_STEM_ENDINGS:
+        last_word = keyword.rsplit(" ", 1)[-1]
+        if len(last_word) - 1 >= _MIN_STEM_LENGTH:
+            return keyword[:-1]
+    return keyword
+
+
+class _Term(NamedTuple):
+    keyword: str
+    whole_word: bool
+    categories: FrozenSet[str]
+
+
+class FoodClassification(NamedTuple):
+    """Result of classifying one food name (or several joined names)."""
+
+    categories: FrozenSet[str]
+    # Matched keywords (as listed in FOOD_CATEGORIES) in order of first appearance
+    terms: Tuple[str, ...]
+    # Category -> matched keywords for that category
+    terms_by_category: Mapping[str, Tuple[str, ...]]
+    portion: Optional[Mapping[str, int]]
+    nutrition_label: Optional[str]
+    nutrition_per_100g: Optional[Tuple[float, float, float, float]]
+
+    def has(self, *categories: str) -> bool:
+        return any(category in self.categories for category in categories)
+
+    def count(self, category: str) -> int:
+        """Number of distinct keywords of ``category`` present."""
+        return len(self.terms_by_category.get(category, ()))
+
+
+class _AhoCorasick:
+    """Minimal Aho-Corasick automaton over str patterns."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self.patterns: List[str] = []
+
+        for pattern in patterns:
+            node = 0
+            for char in pattern:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] = self._out[node] + (len(self.patterns),)
+            self.patterns.append(pattern)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def finditer(self, text: str):
+        """Yield (start, end, pattern_index) for every pattern occurrence."""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern_index in out[node]:
+                yield index + 1 - len(patterns[pattern_index]), index + 1, pattern_index
+
+
+def _build_index():
+    terms: Dict[Tuple[str, bool], Dict[str, object]] = {}
+    for category, keywords in FOOD_CATEGORIES.items():
+        for raw in keywords:
+            whole_word = raw.startswith("=")
+            keyword = raw.lstrip("=")
+            entry = terms.setdefault((keyword, whole_word), {"categories": set()})
+            entry["categories"].add(category)
+
+    # Specific portion foods must be matchable even when not in any category
+    for keyword in PORTION_DEFAULTS:
+        terms.setdefault((keyword, False), {"categories": set()})
+
+    by_pattern: Dict[str, List[_Term]] = {}
+    for (keyword, whole_word), entry in terms.items():
+        pattern = normalize_food_name(keyword) if whole_word else stem_keyword(keyword)
+        by_pattern.setdefault(pattern, []).append(
+            _Term(keyword, whole_word, frozenset(entry["categories"]))
+        )
+
+    automaton = _AhoCorasick(by_pattern)
+    pattern_terms = [tuple(by_pattern[pattern]) for pattern in automaton.patterns]
+    return automaton, pattern_terms
+
+
+_AUTOMATON, _PATTERN_TERMS = _build_index()
+_PORTION_PRIORITY = {keyword: rank for rank, keyword in enumerate(PORTION_DEFAULTS)}
+_FROZEN_PORTIONS = {key: MappingProxyType(dict(value)) for key, value in PORTION_DEFAULTS.items()}
+_FROZEN_CATEGORY_PORTIONS = {key: MappingProxyType(dict(value)) for key, value in CATEGORY_PORTIONS.items()}
+
+
+def _is_word_boundary(text: str, start: int, end: int) -> bool:
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not before.isalnum() and not after.isalnum()
+
+
+@lru_cache(maxsize=8192)
+def classify_food(name: str) -> FoodClassification:
+    """Classify a food name in one pass over its normalized text."""
+    text = normalize_food_name(name)
+    categories: set = set()
+    terms: Dict[str, None] = {}
+    terms_by_category: Dict[str, Dict[str, None]] = {}
+
+    for start, end, pattern_index in _AUTOMATON.finditer(text):
+        for term in _PATTERN_TERMS[pattern_index]:
+            if term.whole_word and not _is_word_boundary(text, start, end):
+                continue
+            terms[term.keyword] = None
+            categories.update(term.categories)
+            for category in term.categories:
+                terms_by_category.setdefault(category, {})[term.keyword] = None
+
+    portion = None
+    specific = [term for term in terms if term in _PORTION_PRIORITY]
+    if specific:
+        portion = _FROZEN_PORTIONS[min(specific, key=_PORTION_PRIORITY.__getitem__)]
+    else:
+        for category, weights in _FROZEN_CATEGORY_PORTIONS.items():
+            if category in categories:
+                portion = weights
+                break
+
+    nutrition_label, nutrition = None, None
+    for label, required, values in NUTRITION_PER_100G:
+        if required <= categories:
+            nutrition_label, nutrition = label, values
+            break
+
+    return FoodClassification(
+        categories=frozenset(categories),
+        terms=tuple(terms),
+        terms_by_category=MappingProxyType({key: tuple(value) for key, value in terms_by_category.items()}),
+        portion=portion,
+        nutrition_label=nutrition_label,
+        nutrition_per_100g=nutrition,
+    )
+
+
+def classify_foods(names: Iterable[str]) -> FoodClassification:
+    """Classify several names at once (e.g. all items on a plate) as one text."""
+    return classify_food(" | ".join(name or "" for name in names))
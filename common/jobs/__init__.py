@@ -0,0 +1,23 @@
+"""
+Durable background jobs (Redis queue + worker)
+"""
+
+from .queue import (
+    Job,
+    JobContext,
+    JobQueue,
+    JobWorker,
+    get_job_queue,
+    job_handler,
+    submit,
+)
+
+__all__ = [
+    'Job',
+    'JobContext',
+    'JobQueue',
+    'JobWorker',
+    'get_job_queue',
+    'job_handler',
+    'submit',
+]
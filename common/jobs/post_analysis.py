@@ -0,0 +1,67 @@
+"""
+Side effects of a photo analysis, run as one queued job.
+
+The bot enqueues ``analysis.side_effects`` and replies right away; a worker
+charges the credit, adds the meal to the daily totals and writes the analysis
+log. Each of these is a separate step, so a retry or a redelivery after a crash
+does not charge or count the same analysis twice. The job id comes from the
+analysis (user and image), so the same analysis queued twice runs once.
+"""
+
+import asyncio
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from common.calories_manager import add_calories_from_analysis, log_food_analysis
+from common.db.credits import decrement_credits
+from common.jobs.queue import JobContext, job_handler, submit
+
+POST_ANALYSIS_JOB = "analysis.side_effects"
+
+
+async def enqueue_post_analysis(
+    user_id: str,
+    telegram_id: int,
+    analysis_data: Dict[str, Any],
+    photo_url: Optional[str] = None,
+    *,
+    analysis_id: str,
+) -> bool:
+    """
+    Queue the side effects of one analysis; True if queued, False if they already ran inline.
+    `analysis_id` must be stable for the analysis (e.g. its result cache key).
+    """
+    return await submit(POST_ANALYSIS_JOB, {
+        "user_id": user_id,
+        "telegram_id": telegram_id,
+        "analysis_data": analysis_data,
+        "photo_url": photo_url,
+    }, job_id=f"analysis:{analysis_id}")
+
+
+@job_handler(POST_ANALYSIS_JOB)
+async def apply_post_analysis(ctx: JobContext):
+    payload = ctx.job.payload
+    user_id = payload["user_id"]
+
+    async def charge():
+        # None means the user is gone or out of credits: nothing to retry
+        if await decrement_credits(payload["telegram_id"]) is None:
+            logger.warning(f"Credit not charged for analysis job {ctx.job.id}")
+
+    async def add_calories():
+        # Sync Supabase writes: keep them off the worker's event loop
+        added = await asyncio.to_thread(
+            add_calories_from_analysis, user_id, payload["analysis_data"], payload.get("photo_url"), log_analysis=False
+        )
+        if not added:
+            raise RuntimeError(f"Failed to add calories for user {user_id}")
+
+    async def write_log():
+        if not await log_food_analysis(user_id, payload["analysis_data"], payload.get("photo_url")):
+            raise RuntimeError(f"Failed to log food analysis for user {user_id}")
+
+    await ctx.step("credits", charge)
+    await ctx.step("calories", add_calories)
+    await ctx.step("log", write_log)
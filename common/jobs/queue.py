@@ -0,0 +1,318 @@
+"""
+Durable Redis job queue with retries, dead-lettering and crash redelivery.
+
+Layout per queue (``c0r:jobs:<queue>:*``):
+- ``data``       hash job id -> job JSON (type, payload, attempts, last error)
+- ``ready``      list of job ids waiting for a worker
+- ``processing`` list of claimed job ids; ``leases`` zset holds their deadlines
+- ``delayed``    zset of job ids waiting for a retry (score = run at)
+- ``dead``       list of job ids that ran out of attempts
+
+A worker claims ids with LMOVE ready -> processing and leases them for
+``visibility_seconds``. Acked jobs leave a ``done`` marker so a redelivered or
+re-enqueued job is not run twice; a lease that expires (worker crashed or was
+killed mid-job) puts the job back on ``ready``. Delivery is at-least-once:
+handlers split their side effects into steps (``JobContext.step``) that are
+each recorded once they succeed, so a redelivery only repeats unfinished steps.
+
+Without ``JOB_QUEUE_ENABLED`` (or without Redis) ``submit`` runs the handler in
+the calling process, as before the queue existed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from common.cache.redis_client import _DummyAsyncRedis, get_async_redis
+
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "false").lower() in ("1", "true", "yes")
+DEFAULT_QUEUE = "default"
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 5.0
+RETRY_MAX_SECONDS = 600.0
+VISIBILITY_SECONDS = 60.0
+# How long done/step markers guard against a second run
+DONE_TTL_SECONDS = 7 * 24 * 3600
+
+
+@dataclass
+class Job:
+    type: str
+    payload: Dict[str, Any]
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    attempts: int = 0
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    enqueued_at: float = field(default_factory=time.time)
+    last_error: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False, default=str)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "Job":
+        return cls(**json.loads(raw))
+
+
+class JobContext:
+    """What a handler gets: the job and idempotent steps"""
+
+    def __init__(self, job: Job, queue: Optional["JobQueue"] = None):
+        self.job = job
+        self.queue = queue
+
+    async def step(self, name: str, fn: Callable[[], Awaitable[Any]]) -> bool:
+        """Run ``fn`` unless this job already completed the step; False if skipped"""
+        if self.queue is None:
+            await fn()
+            return True
+        key = self.queue._key(f"step:{self.job.id}:{name}")
+        if await self.queue.redis.get(key):
+            logger.info(f"Job {self.job.id}: step {name} already done, skipping")
+            return False
+        await fn()
+        await self.queue.redis.set(key, "1", ex=DONE_TTL_SECONDS)
+        return True
+
+
+JobHandler = Callable[[JobContext], Awaitable[None]]
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(job_type: str):
+    """Register the handler for a job type"""
+    def register(fn: JobHandler) -> JobHandler:
+        _handlers[job_type] = fn
+        return fn
+    return register
+
+
+def get_handler(job_type: str) -> Optional[JobHandler]:
+    return _handlers.get(job_type)
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff after the given number of failed attempts"""
+    return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+
+
+class JobQueue:
+    """One named queue on a Redis client (redis.asyncio API)"""
+
+    def __init__(
+        self,
+        redis,
+        name: str = DEFAULT_QUEUE,
+        visibility_seconds: float = VISIBILITY_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.redis = redis
+        self.name = name
+        self.visibility_seconds = visibility_seconds
+        self.clock = clock
+
+    def _key(self, suffix: str) -> str:
+        return f"c0r:jobs:{self.name}:{suffix}"
+
+    async def enqueue(
+        self,
+        job_type: str,
+        payload: Dict[str, Any],
+        job_id: Optional[str] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> Job:
+        """Queue a job; enqueueing an id that is queued or done again is a no-op"""
+        job = Job(type=job_type, payload=payload, max_attempts=max_attempts)
+        if job_id:
+            job.id = job_id
+        if await self.redis.get(self._key(f"done:{job.id}")):
+            logger.info(f"Job {job.id} already done, not enqueueing")
+            return job
+        if not await self.redis.hsetnx(self._key("data"), job.id, job.to_json()):
+            logger.info(f"Job {job.id} already queued")
+            return job
+        await self.redis.lpush(self._key("ready"), job.id)
+        return job
+
+    async def claim(self, batch_size: int = 1) -> List[Job]:
+        """Move up to ``batch_size`` ready jobs to processing and lease them"""
+        jobs: List[Job] = []
+        for _ in range(batch_size):
+            job_id = await self.redis.lmove(self._key("ready"), self._key("processing"), "RIGHT", "LEFT")
+            if job_id is None:
+                break
+            await self.redis.zadd(self._key("leases"), {job_id: self.clock() + self.visibility_seconds})
+            raw = await self.redis.hget(self._key("data"), job_id)
+            if raw is None:
+                # Acked by a worker whose lease had expired meanwhile
+                await self._release(job_id)
+                continue
+            job = Job.from_json(raw)
+            job.attempts += 1
+            if job.attempts > job.max_attempts:
+                # Crashed the worker on every delivery
+                await self._dead_letter(job, job.last_error or "redelivered too often")
+                continue
+            await self.redis.hset(self._key("data"), job.id, job.to_json())
+            jobs.append(job)
+        return jobs
+
+    async def is_done(self, job_id: str) -> bool:
+        return bool(await self.redis.get(self._key(f"done:{job_id}")))
+
+    async def ack(self, job: Job):
+        await self.redis.set(self._key(f"done:{job.id}"), "1", ex=DONE_TTL_SECONDS)
+        await self._release(job.id)
+        await self.redis.hdel(self._key("data"), job.id)
+
+    async def fail(self, job: Job, error: str):
+        """Schedule a retry with backoff, or dead-letter the job after its last attempt"""
+        job.last_error = error
+        if job.attempts >= job.max_attempts:
+            await self._dead_letter(job, error)
+            return
+        delay = retry_delay(job.attempts)
+        await self.redis.hset(self._key("data"), job.id, job.to_json())
+        await self.redis.zadd(self._key("delayed"), {job.id: self.clock() + delay})
+        await self._release(job.id)
+        logger.warning(f"Job {job.id} ({job.type}) failed attempt {job.attempts}/{job.max_attempts}, retry in {delay:.0f}s: {error}")
+
+    async def promote_due(self) -> int:
+        """Move retries whose delay has passed back to ready"""
+        moved = 0
+        for job_id in await self.redis.zrangebyscore(self._key("delayed"), "-inf", self.clock()):
+            if await self.redis.zrem(self._key("delayed"), job_id):
+                await self.redis.lpush(self._key("ready"), job_id)
+                moved += 1
+        return moved
+
+    async def requeue_expired(self) -> int:
+        """Redeliver jobs whose lease expired (their worker died mid-job)"""
+        moved = 0
+        for job_id in await self.redis.zrangebyscore(self._key("leases"), "-inf", self.clock()):
+            if await self.redis.zrem(self._key("leases"), job_id):
+                await self.redis.lrem(self._key("processing"), 1, job_id)
+                await self.redis.lpush(self._key("ready"), job_id)
+                logger.warning(f"Job {job_id} lease expired, redelivering")
+                moved += 1
+        return moved
+
+    async def dead_jobs(self) -> List[Job]:
+        jobs = []
+        for job_id in await self.redis.lrange(self._key("dead"), 0, -1):
+            raw = await self.redis.hget(self._key("data"), job_id)
+            if raw is not None:
+                jobs.append(Job.from_json(raw))
+        return jobs
+
+    async def stats(self) -> Dict[str, int]:
+        return {
+            "ready": await self.redis.llen(self._key("ready")),
+            "processing": await self.redis.llen(self._key("processing")),
+            "delayed": await self.redis.zcard(self._key("delayed")),
+            "dead": await self.redis.llen(self._key("dead")),
+        }
+
+    async def _release(self, job_id: str):
+        await self.redis.lrem(self._key("processing"), 1, job_id)
+        await self.redis.zrem(self._key("leases"), job_id)
+
+    async def _dead_letter(self, job: Job, error: str):
+        job.last_error = error
+        await self.redis.hset(self._key("data"), job.id, job.to_json())
+        await self.redis.lpush(self._key("dead"), job.id)
+        await self._release(job.id)
+        logger.error(f"Job {job.id} ({job.type}) dead-lettered after {job.attempts} attempts: {error}")
+
+
+async def get_job_queue(name: str = DEFAULT_QUEUE) -> Optional[JobQueue]:
+    """The durable queue, or None when it is disabled or Redis is not configured"""
+    if not JOB_QUEUE_ENABLED:
+        return None
+    client = await get_async_redis()
+    if isinstance(client, _DummyAsyncRedis):
+        return None
+    return JobQueue(client, name)
+
+
+async def submit(job_type: str, payload: Dict[str, Any], job_id: Optional[str] = None) -> bool:
+    """
+    Hand a job to the workers. Returns True when it was queued, False when it
+    ran inline because the queue is not available (handler errors are logged).
+    """
+    queue = await get_job_queue()
+    if queue is not None:
+        await queue.enqueue(job_type, payload, job_id=job_id)
+        return True
+    handler = get_handler(job_type)
+    if handler is None:
+        raise ValueError(f"No handler registered for job type {job_type}")
+    try:
+        await handler(JobContext(Job(type=job_type, payload=payload)))
+    except Exception as e:
+        logger.error(f"Inline job {job_type} failed: {e}")
+    return False
+
+
+class JobWorker:
+    """Claims jobs in batches, runs their handlers concurrently, acks or retries them"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Optional[Dict[str, JobHandler]] = None,
+        batch_size: int = 20,
+        poll_seconds: float = 0.5,
+    ):
+        self.queue = queue
+        self.handlers = handlers if handlers is not None else _handlers
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+
+    async def run_once(self) -> int:
+        """One pass: promote due retries, redeliver expired leases, process a batch"""
+        await self.queue.promote_due()
+        await self.queue.requeue_expired()
+        jobs = await self.queue.claim(self.batch_size)
+        await asyncio.gather(*(self._process(job) for job in jobs))
+        return len(jobs)
+
+    async def run_forever(self, stop: Optional[asyncio.Event] = None):
+        stop = stop or asyncio.Event()
+        logger.info(f"Job worker started on queue {self.queue.name}")
+        while not stop.is_set():
+            try:
+                processed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Job worker pass failed: {e}")
+                processed = 0
+            if not processed:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        logger.info(f"Job worker on queue {self.queue.name} stopped")
+
+    async def _process(self, job: Job):
+        if await self.queue.is_done(job.id):
+            await self.queue.ack(job)
+            return
+        handler = self.handlers.get(job.type)
+        if handler is None:
+            job.attempts = job.max_attempts
+            await self.queue.fail(job, f"no handler for {job.type}")
+            return
+        try:
+            await handler(JobContext(job, self.queue))
+        except Exception as e:
+            await self.queue.fail(job, str(e) or type(e).__name__)
+            return
+        await self.queue.ack(job)
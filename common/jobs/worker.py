@@ -0,0 +1,33 @@
+"""
+Job worker entry point: ``python -m common.jobs.worker``
+
+Runs the registered job handlers against the Redis queue until SIGINT/SIGTERM.
+Settings: ``REDIS_URL``, ``JOB_QUEUE_ENABLED=true``, ``JOB_WORKER_BATCH_SIZE``.
+"""
+
+import asyncio
+import os
+import signal
+
+from loguru import logger
+
+# Importing the handler modules registers their job types
+import common.jobs.post_analysis  # noqa: F401
+from common.jobs.queue import JobWorker, get_job_queue
+
+
+async def main():
+    queue = await get_job_queue()
+    if queue is None:
+        logger.error("Job queue unavailable: set JOB_QUEUE_ENABLED=true and REDIS_URL")
+        return
+    worker = JobWorker(queue, batch_size=int(os.getenv("JOB_WORKER_BATCH_SIZE", "20")))
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await worker.run_forever(stop)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
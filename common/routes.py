@@ -5,7 +5,9 @@ Centralized routes configuration for all services
 class Routes:
     # === ML Service routes ===
     ML_ANALYZE = "/api/v1/analyze"
+    ML_ANALYZE_STREAM = "/api/v1/analyze/stream"
     ML_GENERATE_RECIPE = "/api/v1/generate-recipe"
+    ML_GENERATE_RECIPE_STREAM = "/api/v1/generate-recipe/stream"
     ML_HEALTH = "/"
     ML_LABEL_ANALYZE = "/api/v1/label/analyze"
     ML_LABEL_PERPLEXITY = "/api/v1/label/perplexity"
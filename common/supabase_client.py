@@ -31,6 +31,7 @@ __all__ = [
     # Profiles
     'get_user_profile',
     'get_user_with_profile',
+    'load_user_with_profile',
     'create_user_profile',
     'update_user_profile',
     'validate_profile_completeness',
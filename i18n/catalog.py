@@ -0,0 +1,105 @@
+"""
+Compiled message catalog for the i18n manager
+
+Translations are compiled once when the manager is created:
+- keys are interned and every language table holds every known key (missing
+  ones point at the English message), so a render is one dict lookup
+- format templates are parsed up front: plain strings are returned as is,
+  templates with simple ``{name}`` fields are joined from their pieces, and
+  anything fancier (format specs, attribute/index access) keeps ``str.format``
+- keys missing in a language are collected at build time and reported once
+"""
+import sys
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+_formatter = Formatter()
+
+
+class CompiledMessage:
+    """One translation with its pre-parsed format template"""
+
+    __slots__ = ("key", "language", "value", "_static", "_pieces")
+
+    def __init__(self, key: str, language: str, value: Any):
+        self.key = key
+        self.language = language
+        self.value = value
+        # Rendered text when no fields need substituting
+        self._static: Optional[Any] = None
+        # (literal, field name or None) pairs for simple templates
+        self._pieces: Optional[Tuple[Tuple[str, Optional[str]], ...]] = None
+        self._compile()
+
+    def _compile(self):
+        if not isinstance(self.value, str):
+            self._static = self.value
+            return
+        try:
+            parsed = list(_formatter.parse(self.value))
+        except ValueError:
+            # Unbalanced braces: str.format would raise on every call, keep the raw text
+            self._static = self.value
+            return
+        fields = [field for _, field, _, _ in parsed if field is not None]
+        if not fields:
+            self._static = "".join(literal for literal, _, _, _ in parsed)
+            return
+        if all(field.isidentifier() and not spec and not conversion
+               for _, field, spec, conversion in parsed if field is not None):
+            self._pieces = tuple((literal, sys.intern(field) if field is not None else None)
+                                 for literal, field, _, _ in parsed)
+
+    def render(self, kwargs: Dict[str, Any]) -> Any:
+        """Same result as ``value.format(**kwargs)``; raises KeyError for a missing parameter"""
+        if self._static is not None:
+            return self._static
+        if self._pieces is None:
+            return self.value.format(**kwargs)
+        parts: List[str] = []
+        for literal, field in self._pieces:
+            if literal:
+                parts.append(literal)
+            if field is not None:
+                parts.append(format(kwargs[field]))
+        return "".join(parts)
+
+
+class MessageCatalog:
+    """All languages compiled into ``{language: {key: CompiledMessage}}``"""
+
+    def __init__(self, translations: Dict[str, Dict[str, Any]], fallback_language: str):
+        self.fallback_language = fallback_language
+        self.languages: Dict[str, Dict[str, CompiledMessage]] = {}
+        # Keys each language lacks (they render in the fallback language, or not at all)
+        self.missing: Dict[str, List[str]] = {}
+        self._build(translations)
+
+    def _build(self, translations: Dict[str, Dict[str, Any]]):
+        compiled = {
+            language: {sys.intern(key): CompiledMessage(sys.intern(key), language, value)
+                       for key, value in table.items()}
+            for language, table in translations.items()
+        }
+        all_keys = set().union(*(table.keys() for table in compiled.values())) if compiled else set()
+        fallback = compiled.get(self.fallback_language, {})
+        for language, table in compiled.items():
+            missing = sorted(all_keys - table.keys())
+            if missing:
+                self.missing[language] = missing
+                logger.warning(
+                    f"i18n catalog: {len(missing)} keys missing in '{language}': "
+                    f"{', '.join(missing[:20])}{' ...' if len(missing) > 20 else ''}"
+                )
+            for key in missing:
+                if key in fallback:
+                    table[key] = fallback[key]
+            self.languages[language] = table
+
+    def lookup(self, key: str, language: str) -> Optional[CompiledMessage]:
+        table = self.languages.get(language)
+        if table is None:
+            return None
+        return table.get(key)
@@ -10,9 +10,12 @@ TRANSLATIONS = {
     "weekly_report_note": "📝 **Note:** Start analyzing your meals with me to see detailed weekly insights - it's going to be amazing!",
     "weekly_report_coming_soon": "🔜 **Exciting Features Coming Soon:**",
     "weekly_report_trends": "• Detailed calorie trends just for you",
-    "weekly_report_macro": "• Macro balance analysis to optimize your nutrition",
+    "weekly_report_days_logged": "📆 **Days Logged:** {days}/{elapsed}",
+    "weekly_report_calories_per_day": "{calories} kcal/day",
+    "weekly_report_macros": "🥩 **Average Macros:** P {proteins}g · F {fats}g · C {carbs}g",
+    "weekly_report_days_on_target": "{on_target}/{days} days on target ({percent}%)",
+    "weekly_report_streak": "🔥 **Logging Streak:** {days} days in a row",
     "weekly_report_quality": "• Nutrition quality scoring to help you improve",
-    "weekly_report_tracking": "• Goal progress tracking to keep you motivated",
     
     # Weekly report translations
     "weekly_report_avg_calories": "📈 Your Average Calories: {calories}",
@@ -36,6 +36,7 @@ TRANSLATIONS = {
     "favorites_title": "⭐ Your Favorites",
     "favorite_saved": "Saved to favorites ⭐",
     "favorites_empty": "No favorites yet. Save from analysis with ⭐",
+    "favorites_not_found": "No favorites match your search. Try another word or open ⭐ Favorites",
     "favorite_added_to_daily": "Added to your daily total ✅",
     "favorite_deleted": "Removed from favorites ✅",
     "favorite_delete": "🗑️ Delete",
@@ -3,10 +3,19 @@ Internationalization (i18n) module for c0r.ai Telegram Bot
 Handles language detection, translations, and language switching
 """
 from typing import Dict, Optional, List
+from collections import OrderedDict
 from enum import Enum
+from functools import lru_cache
+import importlib
+import random
 import re
 from loguru import logger
 
+from .catalog import MessageCatalog
+
+# Telegram user id -> language, for code paths that have no user row at hand
+USER_LANGUAGE_CACHE_SIZE = 10_000
+
 
 class Language(Enum):
     """Supported languages"""
@@ -46,6 +55,9 @@ class I18nManager:
     
     def __init__(self):
         self.translations = self._load_translations()
+        self.catalog = MessageCatalog(self.translations, Language.ENGLISH.value)
+        self._user_languages: "OrderedDict[int, str]" = OrderedDict()
+        self._reported_missing = set()
     
     def _load_translations(self) -> Dict[str, Dict[str, str]]:
         """Load all translations from modular files"""
@@ -88,18 +100,21 @@ class I18nManager:
         """
         if not language_code:
             return Language.ENGLISH.value
-        
-        # Normalize language code
-        lang = language_code.lower().strip()
-        
-        # Check if it's a CIS language
-        if lang in self.CIS_LANGUAGES:
-            logger.info(f"Detected Russian language for language_code: {language_code}")
-            return Language.RUSSIAN.value
-        
-        # Default to English
-        logger.info(f"Defaulting to English language for language_code: {language_code}")
-        return Language.ENGLISH.value
+        return _detect_language(language_code)
+
+    def remember_language(self, telegram_user_id: int, language: str):
+        """Cache the language stored for a user (after loading or changing it)"""
+        self._user_languages[telegram_user_id] = language
+        self._user_languages.move_to_end(telegram_user_id)
+        if len(self._user_languages) > USER_LANGUAGE_CACHE_SIZE:
+            self._user_languages.popitem(last=False)
+
+    def resolve_language(self, telegram_user_id: Optional[int], language_code: Optional[str] = None) -> str:
+        """Language of a user: the cached stored language, else detected from language_code"""
+        language = self._user_languages.get(telegram_user_id) if telegram_user_id is not None else None
+        if language is not None:
+            return language
+        return self.detect_language(language_code)
     
     def get_text(self, key: str, language: str = Language.ENGLISH.value, **kwargs) -> str:
         """
@@ -113,26 +128,32 @@ class I18nManager:
         Returns:
             Translated and formatted text
         """
-        if language not in self.translations:
-            logger.warning(f"Language {language} not found, falling back to English")
-            language = Language.ENGLISH.value
-        
-        if key not in self.translations[language]:
-            logger.warning(f"Translation key '{key}' not found for language {language}")
-            # Fallback to English
-            if key in self.translations[Language.ENGLISH.value]:
-                text = self.translations[Language.ENGLISH.value][key]
-            else:
+        message = self.catalog.lookup(key, language)
+        if message is None:
+            if language not in self.catalog.languages:
+                self._report_missing(None, language)
+                language = Language.ENGLISH.value
+                message = self.catalog.lookup(key, language)
+            if message is None:
+                self._report_missing(key, language)
                 return f"[Missing translation: {key}]"
-        else:
-            text = self.translations[language][key]
         
         # Format the text with provided parameters
         try:
-            return text.format(**kwargs)
+            return message.render(kwargs)
         except KeyError as e:
             logger.error(f"Missing format parameter {e} for key '{key}' in language {language}")
-            return text
+            return message.value
+
+    def _report_missing(self, key: Optional[str], language: str):
+        # Once per key/language: missing keys are already listed when the catalog is built
+        if (key, language) in self._reported_missing:
+            return
+        self._reported_missing.add((key, language))
+        if key is None:
+            logger.warning(f"Language {language} not found, falling back to English")
+        else:
+            logger.warning(f"Translation key '{key}' not found for language {language}")
     
     def get_language_name(self, language_code: str) -> str:
         """Get human-readable language name"""
@@ -144,8 +165,6 @@ class I18nManager:
     
     def get_random_header(self, header_key: str, language: str = Language.ENGLISH.value) -> str:
         """Get a random header from an array of creative headers"""
-        import random
-        
         headers_array = self.translations.get(language, {}).get(header_key, [])
         
         if isinstance(headers_array, list) and headers_array:
@@ -165,21 +184,17 @@ class I18nManager:
         Returns:
             Random food fact string
         """
-        try:
-            from i18n.food_facts import FOOD_FACTS, FACT_EXTENSIONS
-            
-            facts = FOOD_FACTS.get(language, FOOD_FACTS.get("en", []))
+        catalog = _food_facts()
+        if catalog is not None:
+            facts = catalog.FOOD_FACTS.get(language, catalog.FOOD_FACTS.get("en", []))
             if facts:
-                import random
                 base = random.choice(facts)
                 # Optionally extend the fact with a longer explanatory tail
-                extensions = FACT_EXTENSIONS.get(language, FACT_EXTENSIONS.get("en", []))
+                extensions = catalog.FACT_EXTENSIONS.get(language, catalog.FACT_EXTENSIONS.get("en", []))
                 if extensions:
                     tail = random.choice(extensions)
                     return f"{base}. {tail}"
                 return base
-        except ImportError:
-            pass
         return "🍎 Food is amazing!"
 
     def get_random_waiting_phrase(self, language: str = Language.ENGLISH.value) -> str:
@@ -192,38 +207,37 @@ class I18nManager:
         Returns:
             Random waiting phrase string
         """
-        try:
-            from i18n.food_facts import WAITING_PHRASES
-            
-            phrases = WAITING_PHRASES.get(language, WAITING_PHRASES.get("en", []))
+        catalog = _food_facts()
+        if catalog is not None:
+            phrases = catalog.WAITING_PHRASES.get(language, catalog.WAITING_PHRASES.get("en", []))
             if phrases:
-                import random
                 return random.choice(phrases)
-        except ImportError:
-            pass
         return "Analyzing your food... ⏳"
 
-    def get_random_waiting_phrase(self, language: str = Language.ENGLISH.value) -> str:
-        """
-        Get a random waiting phrase for analysis
-        
-        Args:
-            language: Language code
-            
-        Returns:
-            Random waiting phrase string
-        """
-        try:
-            from i18n.food_facts import WAITING_PHRASES
-            
-            phrases = WAITING_PHRASES.get(language, WAITING_PHRASES.get("en", []))
-            if phrases:
-                import random
-                return random.choice(phrases)
-        except ImportError:
-            pass
-        return "Analyzing your food... ⏳"
+
+@lru_cache(maxsize=256)
+def _detect_language(language_code: str) -> str:
+    # Normalize language code
+    lang = language_code.lower().strip()
+    
+    # Check if it's a CIS language
+    if lang in I18nManager.CIS_LANGUAGES:
+        logger.debug(f"Detected Russian language for language_code: {language_code}")
+        return Language.RUSSIAN.value
+    
+    # Default to English
+    logger.debug(f"Defaulting to English language for language_code: {language_code}")
+    return Language.ENGLISH.value
+
+
+@lru_cache(maxsize=1)
+def _food_facts():
+    """Food facts and waiting phrases: a large catalog only needed around photo analysis, loaded on first use"""
+    try:
+        return importlib.import_module("i18n.food_facts")
+    except ImportError:
+        return None
 
 
 # Global instance
-i18n = I18nManager() 
\ No newline at end of file
+i18n = I18nManager()
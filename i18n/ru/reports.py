@@ -10,9 +10,12 @@ TRANSLATIONS = {
     "weekly_report_note": "📝 **Примечание:** Начни анализировать свои приемы пищи со мной, чтобы увидеть детальную недельную статистику - это будет потрясающе!",
     "weekly_report_coming_soon": "🔜 **Захватывающие функции скоро:**",
     "weekly_report_trends": "• Детальные тренды калорий именно для тебя",
-    "weekly_report_macro": "• Анализ баланса макронутриентов для оптимизации твоего питания",
+    "weekly_report_days_logged": "📆 **Дней с записями:** {days}/{elapsed}",
+    "weekly_report_calories_per_day": "{calories} ккал/день",
+    "weekly_report_macros": "🥩 **Средние БЖУ:** Б {proteins}г · Ж {fats}г · У {carbs}г",
+    "weekly_report_days_on_target": "{on_target}/{days} дней в пределах цели ({percent}%)",
+    "weekly_report_streak": "🔥 **Серия:** {days} дней подряд",
     "weekly_report_quality": "• Оценка качества питания, чтобы помочь тебе улучшиться",
-    "weekly_report_tracking": "• Отслеживание прогресса целей, чтобы держать тебя мотивированным",
     "weekly_report_not_enough_data": "Пока недостаточно данных - давай строить твою историю вместе!",
     "weekly_report_setup_profile": "Настрой свой профиль, и я буду отслеживать все для тебя!",
     
@@ -33,6 +33,7 @@ TRANSLATIONS = {
     "favorites_title": "⭐ Твои избранные",
     "favorite_saved": "Сохранено в избранное ⭐",
     "favorites_empty": "Пока нет избранных. Сохраняй из анализа кнопкой ⭐",
+    "favorites_not_found": "Ничего не нашлось в избранном. Попробуй другое слово или открой ⭐ Избранное",
     "favorite_added_to_daily": "Добавлено в дневной итог ✅",
     "favorite_deleted": "Удалено из избранного ✅",
     "favorite_delete": "🗑️ Удалить",
@@ -0,0 +1,214 @@
+-- Migration: Partition public.logs by month on timestamp
+-- Created: 2025-10-20
+-- Purpose: Keep recent-window reads (daily calories, 7d/14d history) on a few small
+--          partitions and turn retention into DROP TABLE instead of a huge DELETE.
+--
+-- Layout:
+--   public.logs                  partitioned table (RANGE on "timestamp"), PK (id, timestamp)
+--   public.logs_pYYYY_MM         one partition per calendar month (UTC)
+--   public.logs_default          catches rows outside the created months
+--
+-- Functions:
+--   public.create_logs_partitions(months_ahead)   creates the current and upcoming months;
+--                                                 moves matching rows out of logs_default first
+--   public.drop_old_logs_partitions(cutoff)       detaches and drops months that end before cutoff,
+--                                                 deletes older rows from logs_default
+--
+-- Notes:
+--   - A foreign key can only reference a partitioned table through a unique key containing the
+--     partition column, so user_food_analysis_enhanced.original_log_id keeps its index but
+--     loses the FK constraint (the column was ON DELETE SET NULL, i.e. best-effort already).
+--   - Rows are copied in one INSERT ... SELECT; on very large tables run it in a maintenance
+--     window (the old table is kept as public.logs_unpartitioned until the rollback window ends).
+--   - With pg_cron available, partition creation is scheduled daily. Retention is left to
+--     common/db/logs.cleanup_old_logs (RPC drop_old_logs_partitions) so the window stays app policy.
+
+DO $$
+DECLARE
+    first_month DATE;
+    view_exists BOOLEAN;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.migrations_log WHERE migration_name = '2025-10-20_partition_logs_by_month.sql') THEN
+
+        IF EXISTS (
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relname = 'logs'
+        ) THEN
+            RAISE NOTICE 'public.logs is already partitioned, only recording the migration';
+        ELSE
+            -- Dependants that pin the old relation
+            ALTER TABLE IF EXISTS public.user_food_analysis_enhanced
+                DROP CONSTRAINT IF EXISTS user_food_analysis_enhanced_original_log_id_fkey;
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.views
+                WHERE table_schema = 'public' AND table_name = 'user_activity_summary'
+            ) INTO view_exists;
+            DROP VIEW IF EXISTS public.user_activity_summary;
+
+            ALTER TABLE public.logs RENAME TO logs_unpartitioned;
+
+            -- Same columns, defaults and CHECKs as the original table
+            CREATE TABLE public.logs (
+                LIKE public.logs_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+            ) PARTITION BY RANGE ("timestamp");
+
+            ALTER TABLE public.logs ALTER COLUMN "timestamp" SET DEFAULT NOW();
+            ALTER TABLE public.logs ALTER COLUMN "timestamp" SET NOT NULL;
+            ALTER TABLE public.logs ADD CONSTRAINT logs_pkey PRIMARY KEY (id, "timestamp");
+
+            -- Indexes are created per partition automatically
+            CREATE INDEX IF NOT EXISTS idx_logs_user_action_timestamp ON public.logs (user_id, action_type, "timestamp");
+            CREATE INDEX IF NOT EXISTS idx_logs_user_timestamp ON public.logs (user_id, "timestamp");
+            CREATE INDEX IF NOT EXISTS idx_logs_action_type_timestamp ON public.logs (action_type, "timestamp");
+            CREATE INDEX IF NOT EXISTS idx_logs_timestamp_desc ON public.logs ("timestamp" DESC);
+            CREATE INDEX IF NOT EXISTS idx_logs_id ON public.logs (id);
+
+            CREATE TABLE public.logs_default PARTITION OF public.logs DEFAULT;
+
+            -- SERIAL ids: move the sequence so dropping logs_unpartitioned later does not take it along
+            IF pg_get_serial_sequence('public.logs_unpartitioned', 'id') IS NOT NULL THEN
+                EXECUTE format('ALTER SEQUENCE %s OWNED BY public.logs.id', pg_get_serial_sequence('public.logs_unpartitioned', 'id'));
+            END IF;
+
+            GRANT ALL ON public.logs TO postgres;
+            GRANT ALL ON public.logs TO service_role;
+        END IF;
+
+        -- Partition maintenance --------------------------------------------------------
+
+        CREATE OR REPLACE FUNCTION public.create_logs_partitions(months_ahead INTEGER DEFAULT 3, from_month DATE DEFAULT NULL)
+        RETURNS INTEGER
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            month_start DATE := date_trunc('month', COALESCE(from_month, (NOW() AT TIME ZONE 'UTC')::date))::date;
+            last_month DATE := (date_trunc('month', (NOW() AT TIME ZONE 'UTC')::date) + make_interval(months => months_ahead))::date;
+            part_name TEXT;
+            lower_ts TIMESTAMPTZ;
+            upper_ts TIMESTAMPTZ;
+            created INTEGER := 0;
+        BEGIN
+            WHILE month_start <= last_month LOOP
+                part_name := format('logs_p%s', to_char(month_start, 'YYYY_MM'));
+                IF to_regclass(format('public.%I', part_name)) IS NULL THEN
+                    lower_ts := month_start::timestamp AT TIME ZONE 'UTC';
+                    upper_ts := (month_start + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+                    -- Attaching fails while logs_default holds rows of the range, so move them over
+                    EXECUTE format('CREATE TABLE public.%I (LIKE public.logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part_name);
+                    EXECUTE format(
+                        'WITH moved AS (DELETE FROM public.logs_default WHERE "timestamp" >= $1 AND "timestamp" < $2 RETURNING *) '
+                        'INSERT INTO public.%I SELECT * FROM moved', part_name
+                    ) USING lower_ts, upper_ts;
+                    EXECUTE format(
+                        'ALTER TABLE public.logs ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+                        part_name, lower_ts, upper_ts
+                    );
+                    created := created + 1;
+                END IF;
+                month_start := (month_start + INTERVAL '1 month')::date;
+            END LOOP;
+            RETURN created;
+        END;
+        $fn$;
+
+        CREATE OR REPLACE FUNCTION public.drop_old_logs_partitions(cutoff TIMESTAMPTZ)
+        RETURNS TABLE (partition_name TEXT, estimated_rows BIGINT)
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            part RECORD;
+            default_deleted BIGINT;
+        BEGIN
+            FOR part IN
+                SELECT c.relname, GREATEST(c.reltuples, 0)::BIGINT AS rows_estimate
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                JOIN pg_namespace n ON n.oid = p.relnamespace
+                WHERE n.nspname = 'public' AND p.relname = 'logs'
+                  AND c.relname ~ '^logs_p[0-9]{4}_[0-9]{2}$'
+                ORDER BY c.relname
+            LOOP
+                -- Only whole months that end at or before the cutoff
+                IF (to_date(substring(part.relname FROM 7), 'YYYY_MM') + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC' <= cutoff THEN
+                    EXECUTE format('ALTER TABLE public.logs DETACH PARTITION public.%I', part.relname);
+                    EXECUTE format('DROP TABLE public.%I', part.relname);
+                    partition_name := part.relname;
+                    estimated_rows := part.rows_estimate;
+                    RETURN NEXT;
+                END IF;
+            END LOOP;
+
+            -- Stragglers outside the monthly partitions are few; a plain DELETE is fine there
+            DELETE FROM public.logs_default WHERE "timestamp" < cutoff;
+            GET DIAGNOSTICS default_deleted = ROW_COUNT;
+            IF default_deleted > 0 THEN
+                partition_name := 'logs_default';
+                estimated_rows := default_deleted;
+                RETURN NEXT;
+            END IF;
+        END;
+        $fn$;
+
+        GRANT EXECUTE ON FUNCTION public.create_logs_partitions(INTEGER, DATE) TO service_role;
+        GRANT EXECUTE ON FUNCTION public.drop_old_logs_partitions(TIMESTAMPTZ) TO service_role;
+
+        -- Data copy --------------------------------------------------------------------
+
+        IF to_regclass('public.logs_unpartitioned') IS NOT NULL AND NOT EXISTS (SELECT 1 FROM public.logs LIMIT 1) THEN
+            SELECT date_trunc('month', MIN("timestamp") AT TIME ZONE 'UTC')::date
+            INTO first_month
+            FROM public.logs_unpartitioned;
+
+            PERFORM public.create_logs_partitions(3, first_month);
+
+            -- "timestamp" is NOT NULL in the original schema too, so every row lands in a month
+            INSERT INTO public.logs
+            SELECT * FROM public.logs_unpartitioned;
+
+            RAISE NOTICE 'Copied logs into monthly partitions starting %', COALESCE(first_month::text, 'current month');
+        ELSE
+            PERFORM public.create_logs_partitions(3);
+        END IF;
+
+        IF view_exists THEN
+            CREATE OR REPLACE VIEW public.user_activity_summary AS
+            SELECT
+                u.telegram_id,
+                u.credits_remaining,
+                u.total_paid,
+                u.language,
+                u.country,
+                u.created_at,
+                COUNT(l.id) as total_actions,
+                COUNT(CASE WHEN l.action_type = 'photo_analysis' THEN 1 END) as photo_analyses,
+                COUNT(CASE WHEN l.action_type = 'start' THEN 1 END) as start_commands,
+                COUNT(CASE WHEN l.action_type = 'help' THEN 1 END) as help_commands,
+                COUNT(CASE WHEN l.action_type = 'status' THEN 1 END) as status_commands,
+                COUNT(CASE WHEN l.action_type = 'buy' THEN 1 END) as buy_commands,
+                COUNT(CASE WHEN l.action_type = 'language_change' THEN 1 END) as language_changes,
+                MAX(l.timestamp) as last_activity
+            FROM public.users u
+            LEFT JOIN public.logs l ON u.id = l.user_id
+            GROUP BY u.id, u.telegram_id, u.credits_remaining, u.total_paid, u.language, u.country, u.created_at;
+        END IF;
+
+        -- Keep upcoming months in place without relying on the app
+        IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+            PERFORM cron.schedule('create_logs_partitions', '15 3 * * *', 'SELECT public.create_logs_partitions(3)');
+            RAISE NOTICE 'Scheduled daily create_logs_partitions via pg_cron';
+        ELSE
+            RAISE NOTICE 'pg_cron not available: call public.create_logs_partitions(3) at least monthly';
+        END IF;
+
+        -- Log this migration
+        INSERT INTO public.migrations_log (migration_name)
+        VALUES ('2025-10-20_partition_logs_by_month.sql');
+
+        RAISE NOTICE 'Migration 2025-10-20_partition_logs_by_month.sql applied successfully';
+    ELSE
+        RAISE NOTICE 'Migration 2025-10-20_partition_logs_by_month.sql already applied, skipping';
+    END IF;
+END $$;
@@ -0,0 +1,112 @@
+-- Migration: Indexed, ranked search for favorites and saved recipes
+-- Created: 2025-10-21
+-- Purpose: Replace unindexable ILIKE '%term%' scans with full-text + trigram search
+--          and index favorites by composition hash for instant re-logging.
+--
+-- Search:
+--   search_tsv   generated tsvector ('simple' config: names mix Russian and English)
+--   GIN indexes  on search_tsv and on the raw name/title with gin_trgm_ops (typos, substrings)
+--   RPCs         search_favorites / search_recipes (p_user_id, p_query, p_limit, p_offset)
+--                ranked by ts_rank + trigram similarity, newest first on ties
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.migrations_log WHERE migration_name = '2025-10-21_favorites_recipes_search.sql') THEN
+
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+        -- Favorites
+        ALTER TABLE public.favorites_food
+            ADD COLUMN IF NOT EXISTS search_tsv tsvector
+            GENERATED ALWAYS AS (to_tsvector('simple', coalesce(name, ''))) STORED;
+
+        CREATE INDEX IF NOT EXISTS favorites_food_search_tsv_idx ON public.favorites_food USING GIN (search_tsv);
+        CREATE INDEX IF NOT EXISTS favorites_food_name_trgm_idx ON public.favorites_food USING GIN (name gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS favorites_food_user_composition_idx ON public.favorites_food (user_id, composition_hash, created_at DESC);
+
+        -- Saved recipes (title plus the optional description inside recipe_json)
+        ALTER TABLE public.saved_recipes
+            ADD COLUMN IF NOT EXISTS search_tsv tsvector
+            GENERATED ALWAYS AS (
+                to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(recipe_json->>'description', ''))
+            ) STORED;
+
+        CREATE INDEX IF NOT EXISTS saved_recipes_search_tsv_idx ON public.saved_recipes USING GIN (search_tsv);
+        CREATE INDEX IF NOT EXISTS saved_recipes_title_trgm_idx ON public.saved_recipes USING GIN (title gin_trgm_ops);
+
+        CREATE OR REPLACE FUNCTION public.search_favorites(
+            p_user_id UUID,
+            p_query TEXT,
+            p_limit INTEGER DEFAULT 20,
+            p_offset INTEGER DEFAULT 0
+        )
+        RETURNS TABLE (
+            id UUID,
+            user_id UUID,
+            name TEXT,
+            items_json JSONB,
+            composition_hash TEXT,
+            default_portion NUMERIC,
+            created_at TIMESTAMPTZ,
+            rank REAL
+        )
+        LANGUAGE sql
+        STABLE
+        AS $fn$
+            WITH q AS (
+                SELECT websearch_to_tsquery('simple', p_query) AS tsq,
+                       '%' || replace(replace(replace(p_query, '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pattern
+            )
+            SELECT f.id, f.user_id, f.name, f.items_json, f.composition_hash, f.default_portion, f.created_at,
+                   (ts_rank(f.search_tsv, q.tsq) + similarity(f.name, p_query))::REAL AS rank
+            FROM public.favorites_food f, q
+            WHERE f.user_id = p_user_id
+              AND (f.search_tsv @@ q.tsq OR f.name % p_query OR f.name ILIKE q.pattern)
+            ORDER BY rank DESC, f.created_at DESC
+            LIMIT p_limit OFFSET p_offset;
+        $fn$;
+
+        CREATE OR REPLACE FUNCTION public.search_recipes(
+            p_user_id UUID,
+            p_query TEXT,
+            p_limit INTEGER DEFAULT 20,
+            p_offset INTEGER DEFAULT 0
+        )
+        RETURNS TABLE (
+            id UUID,
+            user_id UUID,
+            title TEXT,
+            language TEXT,
+            recipe_json JSONB,
+            source TEXT,
+            created_at TIMESTAMPTZ,
+            rank REAL
+        )
+        LANGUAGE sql
+        STABLE
+        AS $fn$
+            WITH q AS (
+                SELECT websearch_to_tsquery('simple', p_query) AS tsq,
+                       '%' || replace(replace(replace(p_query, '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pattern
+            )
+            SELECT r.id, r.user_id, r.title, r.language, r.recipe_json, r.source, r.created_at,
+                   (ts_rank(r.search_tsv, q.tsq) + similarity(r.title, p_query))::REAL AS rank
+            FROM public.saved_recipes r, q
+            WHERE r.user_id = p_user_id
+              AND (r.search_tsv @@ q.tsq OR r.title % p_query OR r.title ILIKE q.pattern)
+            ORDER BY rank DESC, r.created_at DESC
+            LIMIT p_limit OFFSET p_offset;
+        $fn$;
+
+        GRANT EXECUTE ON FUNCTION public.search_favorites(UUID, TEXT, INTEGER, INTEGER) TO service_role;
+        GRANT EXECUTE ON FUNCTION public.search_recipes(UUID, TEXT, INTEGER, INTEGER) TO service_role;
+
+        -- Log this migration
+        INSERT INTO public.migrations_log (migration_name)
+        VALUES ('2025-10-21_favorites_recipes_search.sql');
+
+        RAISE NOTICE 'Migration 2025-10-21_favorites_recipes_search.sql applied successfully';
+    ELSE
+        RAISE NOTICE 'Migration 2025-10-21_favorites_recipes_search.sql already applied, skipping';
+    END IF;
+END $$;
@@ -0,0 +1,134 @@
+-- Migration: Durable, idempotent payment webhook ingestion
+-- Created: 2025-10-22
+-- Purpose: Webhook endpoints store the verified raw event and ack; a worker applies
+--          credits exactly once. Provider retries of the same event are absorbed by
+--          the unique (provider, event_id) constraint.
+--
+-- Objects:
+--   payment_webhook_events              raw events with processing status
+--   claim_payment_webhook_events()      lease a batch of due pending (or lease-expired) events
+--   apply_payment_webhook_event()       credits + payment row + status in one transaction;
+--                                       a second apply of the same event or transaction is a no-op
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.migrations_log WHERE migration_name = '2025-10-22_payment_webhook_events.sql') THEN
+
+        CREATE TABLE IF NOT EXISTS public.payment_webhook_events (
+            id BIGSERIAL PRIMARY KEY,
+            provider TEXT NOT NULL,
+            event_id TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            payload JSONB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending', 'processing', 'applied', 'ignored', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            locked_until TIMESTAMPTZ,
+            received_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            processed_at TIMESTAMPTZ,
+            CONSTRAINT payment_webhook_events_provider_event_key UNIQUE (provider, event_id)
+        );
+
+        CREATE INDEX IF NOT EXISTS payment_webhook_events_queue_idx
+            ON public.payment_webhook_events (received_at)
+            WHERE status IN ('pending', 'processing');
+
+        CREATE OR REPLACE FUNCTION public.claim_payment_webhook_events(
+            p_limit INTEGER DEFAULT 50,
+            p_lease_seconds INTEGER DEFAULT 60
+        )
+        RETURNS SETOF public.payment_webhook_events
+        LANGUAGE sql
+        AS $fn$
+            UPDATE public.payment_webhook_events e
+            SET status = 'processing',
+                attempts = e.attempts + 1,
+                locked_until = NOW() + make_interval(secs => p_lease_seconds)
+            WHERE e.id IN (
+                SELECT id FROM public.payment_webhook_events
+                -- locked_until is the retry backoff for pending rows and the lease for processing ones
+                WHERE (status = 'pending' AND (locked_until IS NULL OR locked_until < NOW()))
+                   OR (status = 'processing' AND locked_until < NOW())
+                ORDER BY received_at
+                LIMIT p_limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING e.*;
+        $fn$;
+
+        CREATE OR REPLACE FUNCTION public.apply_payment_webhook_event(
+            p_event_row_id BIGINT,
+            p_telegram_id BIGINT,
+            p_credits INTEGER,
+            p_amount NUMERIC,
+            p_gateway TEXT,
+            p_transaction_id TEXT,
+            p_metadata JSONB DEFAULT '{}'::jsonb
+        )
+        RETURNS JSONB
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            v_status TEXT;
+            v_user_id UUID;
+        BEGIN
+            SELECT status INTO v_status
+            FROM public.payment_webhook_events
+            WHERE id = p_event_row_id
+            FOR UPDATE;
+
+            IF v_status IS NULL THEN
+                RETURN jsonb_build_object('result', 'event_not_found');
+            END IF;
+            IF v_status = 'applied' THEN
+                RETURN jsonb_build_object('result', 'duplicate');
+            END IF;
+
+            -- Another event for the same payment (e.g. completed + async_payment_succeeded)
+            IF EXISTS (
+                SELECT 1 FROM public.payments
+                WHERE gateway = p_gateway AND metadata->>'transaction_id' = p_transaction_id
+            ) THEN
+                UPDATE public.payment_webhook_events
+                SET status = 'applied', processed_at = NOW(), locked_until = NULL, last_error = NULL
+                WHERE id = p_event_row_id;
+                RETURN jsonb_build_object('result', 'duplicate');
+            END IF;
+
+            SELECT id INTO v_user_id FROM public.users WHERE telegram_id = p_telegram_id;
+            IF v_user_id IS NULL THEN
+                RETURN jsonb_build_object('result', 'user_not_found');
+            END IF;
+
+            UPDATE public.users
+            SET credits_remaining = credits_remaining + p_credits
+            WHERE id = v_user_id;
+
+            INSERT INTO public.payments (user_id, amount, gateway, status, metadata)
+            VALUES (v_user_id, p_amount, p_gateway, 'succeeded',
+                    p_metadata || jsonb_build_object('transaction_id', p_transaction_id, 'webhook_event_row_id', p_event_row_id));
+
+            UPDATE public.payment_webhook_events
+            SET status = 'applied', processed_at = NOW(), locked_until = NULL, last_error = NULL
+            WHERE id = p_event_row_id;
+
+            RETURN jsonb_build_object('result', 'applied', 'user_id', v_user_id);
+        END;
+        $fn$;
+
+        CREATE INDEX IF NOT EXISTS payments_gateway_transaction_idx
+            ON public.payments (gateway, (metadata->>'transaction_id'));
+
+        GRANT EXECUTE ON FUNCTION public.claim_payment_webhook_events(INTEGER, INTEGER) TO service_role;
+        GRANT EXECUTE ON FUNCTION public.apply_payment_webhook_event(BIGINT, BIGINT, INTEGER, NUMERIC, TEXT, TEXT, JSONB) TO service_role;
+
+        -- Log this migration
+        INSERT INTO public.migrations_log (migration_name)
+        VALUES ('2025-10-22_payment_webhook_events.sql');
+
+        RAISE NOTICE 'Migration 2025-10-22_payment_webhook_events.sql applied successfully';
+    ELSE
+        RAISE NOTICE 'Migration 2025-10-22_payment_webhook_events.sql already applied, skipping';
+    END IF;
+END $$;
@@ -0,0 +1,327 @@
+-- Migration: Per-user daily and weekly nutrition rollups
+-- Created: 2025-10-23
+-- Purpose: The weekly report reads one indexed row instead of scanning a week of raw logs.
+--          Rollups are kept current by a trigger on public.logs as analyses are logged,
+--          corrected (metadata.corrected_total_calories) or deleted, and survive the
+--          partition-drop retention of logs.
+--
+-- Objects:
+--   user_daily_nutrition                  one row per (user, UTC day) with logged photo analyses
+--   user_weekly_nutrition_rollups         one row per (user, ISO week starting Monday): totals, meals,
+--                                         days logged, days on target, logging streaks
+--   refresh_user_nutrition_day()          recompute one day from logs (a few rows on one partition)
+--   refresh_user_weekly_rollup()          recompute one week from its daily rows
+--   refresh_user_nutrition_rollups()      day + its week + following weeks whose streak carries over
+--   backfill_user_nutrition_rollups()     rebuild rollups from logs for all (or some) users since a date
+--   logs_nutrition_rollup trigger         calls refresh_user_nutrition_rollups for photo_analysis rows
+--
+-- Notes:
+--   - Calories follow common/db/logs.get_effective_log_calories: corrected total, then kbzhu.calories,
+--     then metadata.analysis.total_nutrition.calories. Non-numeric values count as 0.
+--   - A day is "on target" within +-10% of user_profiles.daily_calories_target (snapshot at refresh).
+--   - Refreshes of one user are serialized with an advisory lock so concurrent analyses cannot
+--     overwrite each other's day totals.
+--   - Rollup errors never fail the log insert: the trigger logs a WARNING and the backfill repairs.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.migrations_log WHERE migration_name = '2025-10-23_weekly_nutrition_rollups.sql') THEN
+
+        CREATE TABLE IF NOT EXISTS public.user_daily_nutrition (
+            user_id UUID NOT NULL,
+            day DATE NOT NULL,
+            meals_count INTEGER NOT NULL DEFAULT 0,
+            calories NUMERIC(10, 1) NOT NULL DEFAULT 0,
+            proteins NUMERIC(9, 1) NOT NULL DEFAULT 0,
+            fats NUMERIC(9, 1) NOT NULL DEFAULT 0,
+            carbohydrates NUMERIC(9, 1) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (user_id, day)
+        );
+
+        CREATE TABLE IF NOT EXISTS public.user_weekly_nutrition_rollups (
+            user_id UUID NOT NULL,
+            week_start DATE NOT NULL,
+            meals_count INTEGER NOT NULL DEFAULT 0,
+            days_logged SMALLINT NOT NULL DEFAULT 0,
+            calories NUMERIC(11, 1) NOT NULL DEFAULT 0,
+            proteins NUMERIC(10, 1) NOT NULL DEFAULT 0,
+            fats NUMERIC(10, 1) NOT NULL DEFAULT 0,
+            carbohydrates NUMERIC(10, 1) NOT NULL DEFAULT 0,
+            calorie_target INTEGER,
+            days_on_target SMALLINT NOT NULL DEFAULT 0,
+            -- Longest run of consecutive logged days touching this week (including days carried in)
+            longest_streak SMALLINT NOT NULL DEFAULT 0,
+            -- Run of consecutive logged days ending on last_logged_day
+            streak_days SMALLINT NOT NULL DEFAULT 0,
+            last_logged_day DATE,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (user_id, week_start),
+            CONSTRAINT user_weekly_nutrition_rollups_monday CHECK (EXTRACT(ISODOW FROM week_start) = 1)
+        );
+
+        CREATE OR REPLACE FUNCTION public.nutrition_numeric(p_value TEXT)
+        RETURNS NUMERIC
+        LANGUAGE sql
+        IMMUTABLE
+        AS $fn$
+            SELECT CASE WHEN p_value ~ '^\s*-?[0-9]+(\.[0-9]+)?\s*$' THEN p_value::NUMERIC END;
+        $fn$;
+
+        CREATE OR REPLACE FUNCTION public.refresh_user_nutrition_day(p_user_id UUID, p_day DATE)
+        RETURNS VOID
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            v_meals INTEGER;
+            v_calories NUMERIC;
+            v_proteins NUMERIC;
+            v_fats NUMERIC;
+            v_carbohydrates NUMERIC;
+        BEGIN
+            SELECT COUNT(*),
+                   COALESCE(SUM(COALESCE(
+                       public.nutrition_numeric(l.metadata->>'corrected_total_calories'),
+                       public.nutrition_numeric(l.kbzhu->>'calories'),
+                       public.nutrition_numeric(l.metadata #>> '{analysis,total_nutrition,calories}'),
+                       0)), 0),
+                   COALESCE(SUM(COALESCE(public.nutrition_numeric(l.kbzhu->>'proteins'), 0)), 0),
+                   COALESCE(SUM(COALESCE(public.nutrition_numeric(l.kbzhu->>'fats'), 0)), 0),
+                   COALESCE(SUM(COALESCE(public.nutrition_numeric(l.kbzhu->>'carbohydrates'), 0)), 0)
+            INTO v_meals, v_calories, v_proteins, v_fats, v_carbohydrates
+            FROM public.logs l
+            WHERE l.user_id = p_user_id
+              AND l.action_type = 'photo_analysis'
+              -- Both bounds keep the scan on one monthly partition
+              AND l."timestamp" >= (p_day::TIMESTAMP AT TIME ZONE 'UTC')
+              AND l."timestamp" < ((p_day + 1)::TIMESTAMP AT TIME ZONE 'UTC');
+
+            IF v_meals = 0 THEN
+                DELETE FROM public.user_daily_nutrition WHERE user_id = p_user_id AND day = p_day;
+                RETURN;
+            END IF;
+
+            INSERT INTO public.user_daily_nutrition
+                (user_id, day, meals_count, calories, proteins, fats, carbohydrates, updated_at)
+            VALUES (p_user_id, p_day, v_meals, v_calories, v_proteins, v_fats, v_carbohydrates, NOW())
+            ON CONFLICT (user_id, day) DO UPDATE
+            SET meals_count = EXCLUDED.meals_count,
+                calories = EXCLUDED.calories,
+                proteins = EXCLUDED.proteins,
+                fats = EXCLUDED.fats,
+                carbohydrates = EXCLUDED.carbohydrates,
+                updated_at = NOW();
+        END;
+        $fn$;
+
+        CREATE OR REPLACE FUNCTION public.refresh_user_weekly_rollup(p_user_id UUID, p_week_start DATE)
+        RETURNS VOID
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            v_day RECORD;
+            v_target INTEGER;
+            v_prev_streak INTEGER;
+            v_prev_last DATE;
+            v_last DATE;
+            v_run INTEGER := 0;
+            v_longest INTEGER := 0;
+            v_days INTEGER := 0;
+            v_on_target INTEGER := 0;
+            v_meals INTEGER := 0;
+            v_calories NUMERIC := 0;
+            v_proteins NUMERIC := 0;
+            v_fats NUMERIC := 0;
+            v_carbohydrates NUMERIC := 0;
+        BEGIN
+            SELECT daily_calories_target INTO v_target
+            FROM public.user_profiles
+            WHERE user_id = p_user_id
+            LIMIT 1;
+
+            -- A streak running through the previous Sunday continues into this week
+            SELECT streak_days, last_logged_day INTO v_prev_streak, v_prev_last
+            FROM public.user_weekly_nutrition_rollups
+            WHERE user_id = p_user_id AND week_start = p_week_start - 7;
+            IF v_prev_last = p_week_start - 1 THEN
+                v_last := v_prev_last;
+                v_run := COALESCE(v_prev_streak, 0);
+            END IF;
+
+            FOR v_day IN
+                SELECT * FROM public.user_daily_nutrition
+                WHERE user_id = p_user_id AND day >= p_week_start AND day < p_week_start + 7
+                ORDER BY day
+            LOOP
+                IF v_last IS NOT NULL AND v_day.day = v_last + 1 THEN
+                    v_run := v_run + 1;
+                ELSE
+                    v_run := 1;
+                END IF;
+                v_last := v_day.day;
+                v_longest := GREATEST(v_longest, v_run);
+
+                v_days := v_days + 1;
+                v_meals := v_meals + v_day.meals_count;
+                v_calories := v_calories + v_day.calories;
+                v_proteins := v_proteins + v_day.proteins;
+                v_fats := v_fats + v_day.fats;
+                v_carbohydrates := v_carbohydrates + v_day.carbohydrates;
+                IF v_target > 0 AND v_day.calories BETWEEN v_target * 0.9 AND v_target * 1.1 THEN
+                    v_on_target := v_on_target + 1;
+                END IF;
+            END LOOP;
+
+            IF v_days = 0 THEN
+                DELETE FROM public.user_weekly_nutrition_rollups
+                WHERE user_id = p_user_id AND week_start = p_week_start;
+                RETURN;
+            END IF;
+
+            INSERT INTO public.user_weekly_nutrition_rollups
+                (user_id, week_start, meals_count, days_logged, calories, proteins, fats, carbohydrates,
+                 calorie_target, days_on_target, longest_streak, streak_days, last_logged_day, updated_at)
+            VALUES (p_user_id, p_week_start, v_meals, v_days, v_calories, v_proteins, v_fats, v_carbohydrates,
+                    v_target, v_on_target, v_longest, v_run, v_last, NOW())
+            ON CONFLICT (user_id, week_start) DO UPDATE
+            SET meals_count = EXCLUDED.meals_count,
+                days_logged = EXCLUDED.days_logged,
+                calories = EXCLUDED.calories,
+                proteins = EXCLUDED.proteins,
+                fats = EXCLUDED.fats,
+                carbohydrates = EXCLUDED.carbohydrates,
+                calorie_target = EXCLUDED.calorie_target,
+                days_on_target = EXCLUDED.days_on_target,
+                longest_streak = EXCLUDED.longest_streak,
+                streak_days = EXCLUDED.streak_days,
+                last_logged_day = EXCLUDED.last_logged_day,
+                updated_at = NOW();
+        END;
+        $fn$;
+
+        CREATE OR REPLACE FUNCTION public.refresh_user_nutrition_rollups(p_user_id UUID, p_day DATE)
+        RETURNS VOID
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            v_week DATE := date_trunc('week', p_day)::DATE;
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('nutrition_rollup:' || p_user_id::TEXT));
+            PERFORM public.refresh_user_nutrition_day(p_user_id, p_day);
+            PERFORM public.refresh_user_weekly_rollup(p_user_id, v_week);
+            -- Later weeks only depend on this one through a streak carried into their Monday
+            LOOP
+                v_week := v_week + 7;
+                EXIT WHEN NOT EXISTS (
+                    SELECT 1 FROM public.user_daily_nutrition WHERE user_id = p_user_id AND day = v_week
+                );
+                PERFORM public.refresh_user_weekly_rollup(p_user_id, v_week);
+            END LOOP;
+        END;
+        $fn$;
+
+        CREATE OR REPLACE FUNCTION public.logs_nutrition_rollup_trigger()
+        RETURNS TRIGGER
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            v_old_day DATE;
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.action_type = 'photo_analysis' AND OLD.user_id IS NOT NULL THEN
+                v_old_day := (OLD."timestamp" AT TIME ZONE 'UTC')::DATE;
+                PERFORM public.refresh_user_nutrition_rollups(OLD.user_id, v_old_day);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.action_type = 'photo_analysis' AND NEW.user_id IS NOT NULL
+               AND (v_old_day IS NULL OR OLD.user_id IS DISTINCT FROM NEW.user_id
+                    OR v_old_day <> (NEW."timestamp" AT TIME ZONE 'UTC')::DATE) THEN
+                PERFORM public.refresh_user_nutrition_rollups(NEW.user_id, (NEW."timestamp" AT TIME ZONE 'UTC')::DATE);
+            END IF;
+            RETURN NULL;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE WARNING 'nutrition rollup refresh failed (%): %', TG_OP, SQLERRM;
+            RETURN NULL;
+        END;
+        $fn$;
+
+        DROP TRIGGER IF EXISTS logs_nutrition_rollup ON public.logs;
+        CREATE TRIGGER logs_nutrition_rollup
+            AFTER INSERT OR DELETE OR UPDATE OF user_id, action_type, "timestamp", kbzhu, metadata
+            ON public.logs
+            FOR EACH ROW
+            EXECUTE FUNCTION public.logs_nutrition_rollup_trigger();
+
+        CREATE OR REPLACE FUNCTION public.backfill_user_nutrition_rollups(
+            p_since DATE,
+            p_user_ids UUID[] DEFAULT NULL
+        )
+        RETURNS TABLE (users_count INTEGER, days_count INTEGER, weeks_count INTEGER)
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            -- Whole weeks, so the first week is not rebuilt from a partial set of days
+            v_since DATE := date_trunc('week', p_since)::DATE;
+            v_week RECORD;
+            v_days INTEGER;
+            v_weeks INTEGER := 0;
+            v_users INTEGER;
+        BEGIN
+            DELETE FROM public.user_daily_nutrition
+            WHERE day >= v_since AND (p_user_ids IS NULL OR user_id = ANY (p_user_ids));
+            DELETE FROM public.user_weekly_nutrition_rollups
+            WHERE week_start >= v_since AND (p_user_ids IS NULL OR user_id = ANY (p_user_ids));
+
+            INSERT INTO public.user_daily_nutrition
+                (user_id, day, meals_count, calories, proteins, fats, carbohydrates, updated_at)
+            SELECT l.user_id,
+                   (l."timestamp" AT TIME ZONE 'UTC')::DATE,
+                   COUNT(*),
+                   SUM(COALESCE(
+                       public.nutrition_numeric(l.metadata->>'corrected_total_calories'),
+                       public.nutrition_numeric(l.kbzhu->>'calories'),
+                       public.nutrition_numeric(l.metadata #>> '{analysis,total_nutrition,calories}'),
+                       0)),
+                   SUM(COALESCE(public.nutrition_numeric(l.kbzhu->>'proteins'), 0)),
+                   SUM(COALESCE(public.nutrition_numeric(l.kbzhu->>'fats'), 0)),
+                   SUM(COALESCE(public.nutrition_numeric(l.kbzhu->>'carbohydrates'), 0)),
+                   NOW()
+            FROM public.logs l
+            WHERE l.action_type = 'photo_analysis'
+              AND l.user_id IS NOT NULL
+              AND l."timestamp" >= (v_since::TIMESTAMP AT TIME ZONE 'UTC')
+              AND (p_user_ids IS NULL OR l.user_id = ANY (p_user_ids))
+            GROUP BY 1, 2;
+            GET DIAGNOSTICS v_days = ROW_COUNT;
+
+            -- Oldest first: each week reads the streak of the one before it
+            FOR v_week IN
+                SELECT DISTINCT user_id, date_trunc('week', day)::DATE AS week_start
+                FROM public.user_daily_nutrition
+                WHERE day >= v_since AND (p_user_ids IS NULL OR user_id = ANY (p_user_ids))
+                ORDER BY user_id, week_start
+            LOOP
+                PERFORM public.refresh_user_weekly_rollup(v_week.user_id, v_week.week_start);
+                v_weeks := v_weeks + 1;
+            END LOOP;
+
+            SELECT COUNT(DISTINCT user_id) INTO v_users
+            FROM public.user_weekly_nutrition_rollups
+            WHERE week_start >= v_since AND (p_user_ids IS NULL OR user_id = ANY (p_user_ids));
+
+            RETURN QUERY SELECT v_users, v_days, v_weeks;
+        END;
+        $fn$;
+
+        GRANT SELECT ON public.user_daily_nutrition TO service_role;
+        GRANT SELECT ON public.user_weekly_nutrition_rollups TO service_role;
+        GRANT EXECUTE ON FUNCTION public.refresh_user_nutrition_rollups(UUID, DATE) TO service_role;
+        GRANT EXECUTE ON FUNCTION public.backfill_user_nutrition_rollups(DATE, UUID[]) TO service_role;
+
+        -- Log this migration
+        INSERT INTO public.migrations_log (migration_name)
+        VALUES ('2025-10-23_weekly_nutrition_rollups.sql');
+
+        RAISE NOTICE 'Migration 2025-10-23_weekly_nutrition_rollups.sql applied successfully';
+    ELSE
+        RAISE NOTICE 'Migration 2025-10-23_weekly_nutrition_rollups.sql already applied, skipping';
+    END IF;
+END $$;
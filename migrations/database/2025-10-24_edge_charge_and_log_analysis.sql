@@ -0,0 +1,62 @@
+-- Migration: Atomic credit charge + analysis log for the edge analyze path
+-- Created: 2025-10-24
+-- Purpose: services/api/edge charged credits with a PATCH (whose body PostgREST cannot
+--          apply as a decrement) and logged with a second request. One RPC now does both
+--          in one transaction, so a charge is never recorded without its log row or the
+--          other way around, and the edge makes a single round-trip.
+--
+-- Objects:
+--   edge_charge_and_log_analysis()   decrement one credit (only if > 0) and insert the
+--                                    photo_analysis log; returns charged / insufficient_credits /
+--                                    user_not_found with the remaining credits
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.migrations_log WHERE migration_name = '2025-10-24_edge_charge_and_log_analysis.sql') THEN
+
+        CREATE OR REPLACE FUNCTION public.edge_charge_and_log_analysis(
+            p_telegram_id BIGINT,
+            p_photo_url TEXT,
+            p_kbzhu JSONB,
+            p_model_used TEXT,
+            p_metadata JSONB DEFAULT '{}'::jsonb
+        )
+        RETURNS JSONB
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            v_user_id UUID;
+            v_credits INTEGER;
+        BEGIN
+            -- The row lock of the UPDATE serializes concurrent charges of one user
+            UPDATE public.users
+            SET credits_remaining = credits_remaining - 1
+            WHERE telegram_id = p_telegram_id AND credits_remaining > 0
+            RETURNING id, credits_remaining INTO v_user_id, v_credits;
+
+            IF v_user_id IS NULL THEN
+                IF EXISTS (SELECT 1 FROM public.users WHERE telegram_id = p_telegram_id) THEN
+                    RETURN jsonb_build_object('result', 'insufficient_credits', 'credits_remaining', 0);
+                END IF;
+                RETURN jsonb_build_object('result', 'user_not_found');
+            END IF;
+
+            INSERT INTO public.logs (user_id, action_type, photo_url, kbzhu, model_used, metadata)
+            VALUES (v_user_id, 'photo_analysis', p_photo_url, p_kbzhu, p_model_used,
+                    p_metadata || jsonb_build_object('source', 'edge'));
+
+            RETURN jsonb_build_object('result', 'charged', 'user_id', v_user_id, 'credits_remaining', v_credits);
+        END;
+        $fn$;
+
+        GRANT EXECUTE ON FUNCTION public.edge_charge_and_log_analysis(BIGINT, TEXT, JSONB, TEXT, JSONB) TO service_role;
+
+        -- Log this migration
+        INSERT INTO public.migrations_log (migration_name)
+        VALUES ('2025-10-24_edge_charge_and_log_analysis.sql');
+
+        RAISE NOTICE 'Migration 2025-10-24_edge_charge_and_log_analysis.sql applied successfully';
+    ELSE
+        RAISE NOTICE 'Migration 2025-10-24_edge_charge_and_log_analysis.sql already applied, skipping';
+    END IF;
+END $$;
@@ -0,0 +1,212 @@
+-- Migration: Batched subscription renewals
+-- Created: 2025-10-25
+-- Purpose: Recurring plans are renewed by services/pay/subscription_renewal.py: due
+--          subscriptions are paged through an index on next_renewal_at, charged with the
+--          saved payment method, and the outcomes of a page are written in one call that
+--          also moves the run checkpoint, so a crashed run resumes after the last page.
+--
+-- Objects:
+--   subscriptions                    recurring plans with the saved gateway payment method
+--   subscription_renewal_runs        one row per run: cutoff, keyset checkpoint, counts
+--   subscription_renewals            every charge attempt; one success per period
+--   due_subscriptions()              keyset page of active subscriptions due by the cutoff
+--   record_subscription_renewals()   outcomes + credits + payments + checkpoint in one transaction
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.migrations_log WHERE migration_name = '2025-10-25_subscription_renewals.sql') THEN
+
+        CREATE TABLE IF NOT EXISTS public.subscriptions (
+            id BIGSERIAL PRIMARY KEY,
+            user_id UUID NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
+            plan_id TEXT NOT NULL,
+            gateway TEXT NOT NULL CHECK (gateway IN ('stripe', 'yookassa')),
+            gateway_customer_id TEXT,
+            payment_method_id TEXT NOT NULL,
+            amount NUMERIC(12, 2) NOT NULL CHECK (amount > 0),
+            currency TEXT NOT NULL,
+            credits INTEGER NOT NULL CHECK (credits > 0),
+            renewal_interval INTERVAL NOT NULL DEFAULT INTERVAL '1 month',
+            status TEXT NOT NULL DEFAULT 'active' CHECK (status IN ('active', 'past_due', 'canceled')),
+            current_period_end TIMESTAMPTZ NOT NULL,
+            -- current_period_end, or later while a declined charge is retried
+            next_renewal_at TIMESTAMPTZ NOT NULL,
+            failed_attempts INTEGER NOT NULL DEFAULT 0,
+            last_renewed_at TIMESTAMPTZ,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+
+        -- Keyset order of due_subscriptions(); only active rows are ever due
+        CREATE INDEX IF NOT EXISTS subscriptions_due_idx
+            ON public.subscriptions (next_renewal_at, id)
+            WHERE status = 'active';
+        CREATE INDEX IF NOT EXISTS subscriptions_user_idx ON public.subscriptions (user_id);
+
+        CREATE TABLE IF NOT EXISTS public.subscription_renewal_runs (
+            run_id TEXT PRIMARY KEY,
+            cutoff TIMESTAMPTZ NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'completed')),
+            checkpoint_renewal_at TIMESTAMPTZ,
+            checkpoint_id BIGINT,
+            counts JSONB NOT NULL DEFAULT '{}'::jsonb,
+            started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            finished_at TIMESTAMPTZ
+        );
+
+        CREATE TABLE IF NOT EXISTS public.subscription_renewals (
+            id BIGSERIAL PRIMARY KEY,
+            subscription_id BIGINT NOT NULL REFERENCES public.subscriptions(id) ON DELETE CASCADE,
+            run_id TEXT,
+            period_start TIMESTAMPTZ NOT NULL,
+            attempt INTEGER NOT NULL,
+            -- error: the gateway did not answer (or the payment is still pending); nothing changes
+            status TEXT NOT NULL CHECK (status IN ('succeeded', 'declined', 'error')),
+            transaction_id TEXT,
+            amount NUMERIC(12, 2),
+            currency TEXT,
+            error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+
+        CREATE UNIQUE INDEX IF NOT EXISTS subscription_renewals_period_succeeded_key
+            ON public.subscription_renewals (subscription_id, period_start)
+            WHERE status = 'succeeded';
+
+        CREATE OR REPLACE FUNCTION public.due_subscriptions(
+            p_cutoff TIMESTAMPTZ,
+            p_after_renewal_at TIMESTAMPTZ DEFAULT NULL,
+            p_after_id BIGINT DEFAULT 0,
+            p_limit INTEGER DEFAULT 500
+        )
+        RETURNS SETOF public.subscriptions
+        LANGUAGE sql
+        STABLE
+        AS $fn$
+            SELECT *
+            FROM public.subscriptions
+            WHERE status = 'active'
+              AND next_renewal_at <= p_cutoff
+              AND (p_after_renewal_at IS NULL OR (next_renewal_at, id) > (p_after_renewal_at, p_after_id))
+            ORDER BY next_renewal_at, id
+            LIMIT p_limit;
+        $fn$;
+
+        CREATE OR REPLACE FUNCTION public.record_subscription_renewals(
+            p_run_id TEXT,
+            p_outcomes JSONB,
+            p_checkpoint_renewal_at TIMESTAMPTZ,
+            p_checkpoint_id BIGINT,
+            p_counts JSONB,
+            p_max_attempts INTEGER DEFAULT 4
+        )
+        RETURNS JSONB
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            v_renewed INTEGER;
+            v_declined INTEGER;
+        BEGIN
+            CREATE TEMP TABLE IF NOT EXISTS pg_temp.renewal_outcomes (
+                subscription_id BIGINT,
+                period_start TIMESTAMPTZ,
+                attempt INTEGER,
+                status TEXT,
+                transaction_id TEXT,
+                amount NUMERIC,
+                currency TEXT,
+                error TEXT
+            ) ON COMMIT DROP;
+            TRUNCATE pg_temp.renewal_outcomes;
+
+            -- A replayed page (charged again after a crash, same idempotency keys) inserts no second success
+            WITH inserted AS (
+                INSERT INTO public.subscription_renewals
+                    (subscription_id, run_id, period_start, attempt, status, transaction_id, amount, currency, error)
+                SELECT o.subscription_id, p_run_id, o.period_start, o.attempt, o.status,
+                       o.transaction_id, o.amount, o.currency, o.error
+                FROM jsonb_to_recordset(p_outcomes) AS o(
+                    subscription_id BIGINT, period_start TIMESTAMPTZ, attempt INTEGER, status TEXT,
+                    transaction_id TEXT, amount NUMERIC, currency TEXT, error TEXT
+                )
+                ON CONFLICT (subscription_id, period_start) WHERE status = 'succeeded' DO NOTHING
+                RETURNING subscription_id, period_start, attempt, status, transaction_id, amount, currency, error
+            )
+            INSERT INTO pg_temp.renewal_outcomes SELECT * FROM inserted;
+
+            -- Successes: next period, credits and a payment row; guarded by the period the charge was for
+            WITH renewed AS (
+                UPDATE public.subscriptions s
+                SET current_period_end = s.current_period_end + s.renewal_interval,
+                    next_renewal_at = s.current_period_end + s.renewal_interval,
+                    failed_attempts = 0,
+                    last_renewed_at = NOW(),
+                    updated_at = NOW()
+                FROM pg_temp.renewal_outcomes o
+                WHERE o.status = 'succeeded'
+                  AND s.id = o.subscription_id
+                  AND s.current_period_end = o.period_start
+                RETURNING s.id, s.user_id, s.plan_id, s.gateway, s.credits, o.transaction_id, o.amount, o.currency
+            ),
+            credited AS (
+                UPDATE public.users u
+                SET credits_remaining = u.credits_remaining + r.credits
+                FROM (SELECT user_id, SUM(credits) AS credits FROM renewed GROUP BY user_id) r
+                WHERE u.id = r.user_id
+                RETURNING u.id
+            ),
+            paid AS (
+                INSERT INTO public.payments (user_id, amount, gateway, status, metadata)
+                SELECT r.user_id, r.amount, r.gateway, 'succeeded', jsonb_build_object(
+                    'transaction_id', r.transaction_id,
+                    'subscription_id', r.id,
+                    'plan_id', r.plan_id,
+                    'currency', r.currency,
+                    'credits', r.credits,
+                    'renewal_run_id', p_run_id
+                )
+                FROM renewed r
+                RETURNING 1
+            )
+            SELECT COUNT(*) INTO v_renewed FROM renewed;
+
+            -- Declines: retry after 1, 2, 4... days; past_due after p_max_attempts declines
+            WITH declined AS (
+                UPDATE public.subscriptions s
+                SET failed_attempts = s.failed_attempts + 1,
+                    next_renewal_at = NOW() + make_interval(days => (2 ^ s.failed_attempts)::INTEGER),
+                    status = CASE WHEN s.failed_attempts + 1 >= p_max_attempts THEN 'past_due' ELSE s.status END,
+                    updated_at = NOW()
+                FROM pg_temp.renewal_outcomes o
+                WHERE o.status = 'declined'
+                  AND s.id = o.subscription_id
+                  AND s.current_period_end = o.period_start
+                  AND s.failed_attempts = o.attempt
+                RETURNING s.id
+            )
+            SELECT COUNT(*) INTO v_declined FROM declined;
+
+            UPDATE public.subscription_renewal_runs
+            SET checkpoint_renewal_at = p_checkpoint_renewal_at,
+                checkpoint_id = p_checkpoint_id,
+                counts = p_counts,
+                updated_at = NOW()
+            WHERE run_id = p_run_id;
+
+            RETURN jsonb_build_object('renewed', v_renewed, 'declined', v_declined);
+        END;
+        $fn$;
+
+        GRANT EXECUTE ON FUNCTION public.due_subscriptions(TIMESTAMPTZ, TIMESTAMPTZ, BIGINT, INTEGER) TO service_role;
+        GRANT EXECUTE ON FUNCTION public.record_subscription_renewals(TEXT, JSONB, TIMESTAMPTZ, BIGINT, JSONB, INTEGER) TO service_role;
+
+        -- Log this migration
+        INSERT INTO public.migrations_log (migration_name)
+        VALUES ('2025-10-25_subscription_renewals.sql');
+
+        RAISE NOTICE 'Migration 2025-10-25_subscription_renewals.sql applied successfully';
+    ELSE
+        RAISE NOTICE 'Migration 2025-10-25_subscription_renewals.sql already applied, skipping';
+    END IF;
+END $$;
@@ -0,0 +1,161 @@
+-- Migration: Keep nutrition rollups when old logs are removed by retention
+-- Created: 2025-10-26
+-- Purpose: The rollup trigger from 2025-10-23 recomputes a day on every DELETE from public.logs,
+--          so retention (the logs_default straggler DELETE, the cleanup_old_logs DELETE fallback)
+--          erased the rollups it is meant to outlive. Moving rows out of logs_default into a new
+--          month partition deleted them from the rollups the same way.
+--
+-- Objects:
+--   logs_nutrition_rollup_trigger()       skips deletes while c0r.logs_retention is 'on'
+--   delete_old_logs(cutoff)               row-by-row retention for unpartitioned logs, rollups kept
+--   drop_old_logs_partitions(cutoff)      sets c0r.logs_retention around the logs_default DELETE
+--   create_logs_partitions(...)           sets c0r.logs_retention around moving rows out of logs_default
+--
+-- Notes:
+--   - c0r.logs_retention is a transaction-local setting; the functions switch it off again after
+--     their DELETE so user deletions later in the same transaction still update the rollups.
+--   - The partition functions are only replaced when 2025-10-20_partition_logs_by_month.sql is applied,
+--     the trigger function only when 2025-10-23_weekly_nutrition_rollups.sql is.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.migrations_log WHERE migration_name = '2025-10-26_logs_retention_keeps_rollups.sql') THEN
+
+        IF to_regprocedure('public.logs_nutrition_rollup_trigger()') IS NOT NULL THEN
+            CREATE OR REPLACE FUNCTION public.logs_nutrition_rollup_trigger()
+            RETURNS TRIGGER
+            LANGUAGE plpgsql
+            AS $fn$
+            DECLARE
+                v_old_day DATE;
+            BEGIN
+                -- Retention removes history, not meals: the rollups keep it
+                IF TG_OP = 'DELETE' AND current_setting('c0r.logs_retention', true) = 'on' THEN
+                    RETURN NULL;
+                END IF;
+                IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.action_type = 'photo_analysis' AND OLD.user_id IS NOT NULL THEN
+                    v_old_day := (OLD."timestamp" AT TIME ZONE 'UTC')::DATE;
+                    PERFORM public.refresh_user_nutrition_rollups(OLD.user_id, v_old_day);
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.action_type = 'photo_analysis' AND NEW.user_id IS NOT NULL
+                   AND (v_old_day IS NULL OR OLD.user_id IS DISTINCT FROM NEW.user_id
+                        OR v_old_day <> (NEW."timestamp" AT TIME ZONE 'UTC')::DATE) THEN
+                    PERFORM public.refresh_user_nutrition_rollups(NEW.user_id, (NEW."timestamp" AT TIME ZONE 'UTC')::DATE);
+                END IF;
+                RETURN NULL;
+            EXCEPTION WHEN OTHERS THEN
+                RAISE WARNING 'nutrition rollup refresh failed (%): %', TG_OP, SQLERRM;
+                RETURN NULL;
+            END;
+            $fn$;
+        END IF;
+
+        CREATE OR REPLACE FUNCTION public.delete_old_logs(cutoff TIMESTAMPTZ)
+        RETURNS BIGINT
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            deleted BIGINT;
+        BEGIN
+            PERFORM set_config('c0r.logs_retention', 'on', true);
+            DELETE FROM public.logs WHERE "timestamp" < cutoff;
+            GET DIAGNOSTICS deleted = ROW_COUNT;
+            PERFORM set_config('c0r.logs_retention', 'off', true);
+            RETURN deleted;
+        END;
+        $fn$;
+
+        GRANT EXECUTE ON FUNCTION public.delete_old_logs(TIMESTAMPTZ) TO service_role;
+
+        IF to_regprocedure('public.drop_old_logs_partitions(timestamptz)') IS NOT NULL THEN
+            CREATE OR REPLACE FUNCTION public.drop_old_logs_partitions(cutoff TIMESTAMPTZ)
+            RETURNS TABLE (partition_name TEXT, estimated_rows BIGINT)
+            LANGUAGE plpgsql
+            AS $fn$
+            DECLARE
+                part RECORD;
+                default_deleted BIGINT;
+            BEGIN
+                FOR part IN
+                    SELECT c.relname, GREATEST(c.reltuples, 0)::BIGINT AS rows_estimate
+                    FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    JOIN pg_class p ON p.oid = i.inhparent
+                    JOIN pg_namespace n ON n.oid = p.relnamespace
+                    WHERE n.nspname = 'public' AND p.relname = 'logs'
+                      AND c.relname ~ '^logs_p[0-9]{4}_[0-9]{2}$'
+                    ORDER BY c.relname
+                LOOP
+                    -- Only whole months that end at or before the cutoff
+                    IF (to_date(substring(part.relname FROM 7), 'YYYY_MM') + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC' <= cutoff THEN
+                        EXECUTE format('ALTER TABLE public.logs DETACH PARTITION public.%I', part.relname);
+                        EXECUTE format('DROP TABLE public.%I', part.relname);
+                        partition_name := part.relname;
+                        estimated_rows := part.rows_estimate;
+                        RETURN NEXT;
+                    END IF;
+                END LOOP;
+
+                -- Stragglers outside the monthly partitions are few; a plain DELETE is fine there
+                PERFORM set_config('c0r.logs_retention', 'on', true);
+                DELETE FROM public.logs_default WHERE "timestamp" < cutoff;
+                GET DIAGNOSTICS default_deleted = ROW_COUNT;
+                PERFORM set_config('c0r.logs_retention', 'off', true);
+                IF default_deleted > 0 THEN
+                    partition_name := 'logs_default';
+                    estimated_rows := default_deleted;
+                    RETURN NEXT;
+                END IF;
+            END;
+            $fn$;
+        END IF;
+
+        IF to_regprocedure('public.create_logs_partitions(integer, date)') IS NOT NULL THEN
+            CREATE OR REPLACE FUNCTION public.create_logs_partitions(months_ahead INTEGER DEFAULT 3, from_month DATE DEFAULT NULL)
+            RETURNS INTEGER
+            LANGUAGE plpgsql
+            AS $fn$
+            DECLARE
+                month_start DATE := date_trunc('month', COALESCE(from_month, (NOW() AT TIME ZONE 'UTC')::date))::date;
+                last_month DATE := (date_trunc('month', (NOW() AT TIME ZONE 'UTC')::date) + make_interval(months => months_ahead))::date;
+                part_name TEXT;
+                lower_ts TIMESTAMPTZ;
+                upper_ts TIMESTAMPTZ;
+                created INTEGER := 0;
+            BEGIN
+                WHILE month_start <= last_month LOOP
+                    part_name := format('logs_p%s', to_char(month_start, 'YYYY_MM'));
+                    IF to_regclass(format('public.%I', part_name)) IS NULL THEN
+                        lower_ts := month_start::timestamp AT TIME ZONE 'UTC';
+                        upper_ts := (month_start + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+                        -- Attaching fails while logs_default holds rows of the range, so move them over;
+                        -- the rows come back with the partition, so this is not a deletion for the rollups
+                        EXECUTE format('CREATE TABLE public.%I (LIKE public.logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part_name);
+                        PERFORM set_config('c0r.logs_retention', 'on', true);
+                        EXECUTE format(
+                            'WITH moved AS (DELETE FROM public.logs_default WHERE "timestamp" >= $1 AND "timestamp" < $2 RETURNING *) '
+                            'INSERT INTO public.%I SELECT * FROM moved', part_name
+                        ) USING lower_ts, upper_ts;
+                        PERFORM set_config('c0r.logs_retention', 'off', true);
+                        EXECUTE format(
+                            'ALTER TABLE public.logs ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+                            part_name, lower_ts, upper_ts
+                        );
+                        created := created + 1;
+                    END IF;
+                    month_start := (month_start + INTERVAL '1 month')::date;
+                END LOOP;
+                RETURN created;
+            END;
+            $fn$;
+        END IF;
+
+        -- Log this migration
+        INSERT INTO public.migrations_log (migration_name)
+        VALUES ('2025-10-26_logs_retention_keeps_rollups.sql');
+
+        RAISE NOTICE 'Migration 2025-10-26_logs_retention_keeps_rollups.sql applied successfully';
+    ELSE
+        RAISE NOTICE 'Migration 2025-10-26_logs_retention_keeps_rollups.sql already applied, skipping';
+    END IF;
+END $$;
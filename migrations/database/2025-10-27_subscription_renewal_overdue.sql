@@ -0,0 +1,169 @@
+-- Migration: Overdue subscriptions are renewed once per run
+-- Created: 2025-10-27
+-- Purpose: record_subscription_renewals() moved a renewed subscription one interval ahead. For a
+--          subscription more than one period overdue the new next_renewal_at was still before the
+--          run cutoff, behind the run's keyset position or ahead of it depending on page timing,
+--          so the same run could charge it again. Every written outcome now moves the row out of
+--          the run's window.
+--
+-- Objects:
+--   subscription_period_end_after()   first period end after a moment
+--   record_subscription_renewals()    success: next period end after GREATEST(NOW(), run cutoff);
+--                                     decline: retry delay counted from the same moment
+--
+-- Notes:
+--   - Missed periods are not charged: one successful renewal pays for one period and the
+--     subscription continues from the first period end after the run.
+--   - Gateway errors still leave the row unchanged; the run's keyset position is already past it.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.migrations_log WHERE migration_name = '2025-10-27_subscription_renewal_overdue.sql') THEN
+
+        CREATE OR REPLACE FUNCTION public.subscription_period_end_after(
+            p_period_end TIMESTAMPTZ,
+            p_interval INTERVAL,
+            p_after TIMESTAMPTZ
+        )
+        RETURNS TIMESTAMPTZ
+        LANGUAGE plpgsql
+        STABLE
+        AS $fn$
+        DECLARE
+            v_periods INTEGER := 1;
+        BEGIN
+            IF p_interval <= INTERVAL '0' THEN
+                RAISE EXCEPTION 'renewal_interval must be positive, got %', p_interval;
+            END IF;
+            -- Multiples of the interval from the original end, so month ends do not drift
+            WHILE p_period_end + p_interval * v_periods <= p_after LOOP
+                v_periods := v_periods + 1;
+            END LOOP;
+            RETURN p_period_end + p_interval * v_periods;
+        END;
+        $fn$;
+
+        CREATE OR REPLACE FUNCTION public.record_subscription_renewals(
+            p_run_id TEXT,
+            p_outcomes JSONB,
+            p_checkpoint_renewal_at TIMESTAMPTZ,
+            p_checkpoint_id BIGINT,
+            p_counts JSONB,
+            p_max_attempts INTEGER DEFAULT 4
+        )
+        RETURNS JSONB
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            v_renewed INTEGER;
+            v_declined INTEGER;
+            v_after TIMESTAMPTZ;
+        BEGIN
+            -- Rows written by this run must not be due again before its cutoff
+            SELECT GREATEST(NOW(), r.cutoff) INTO v_after
+            FROM public.subscription_renewal_runs r
+            WHERE r.run_id = p_run_id;
+            v_after := COALESCE(v_after, NOW());
+
+            CREATE TEMP TABLE IF NOT EXISTS pg_temp.renewal_outcomes (
+                subscription_id BIGINT,
+                period_start TIMESTAMPTZ,
+                attempt INTEGER,
+                status TEXT,
+                transaction_id TEXT,
+                amount NUMERIC,
+                currency TEXT,
+                error TEXT
+            ) ON COMMIT DROP;
+            TRUNCATE pg_temp.renewal_outcomes;
+
+            -- A replayed page (charged again after a crash, same idempotency keys) inserts no second success
+            WITH inserted AS (
+                INSERT INTO public.subscription_renewals
+                    (subscription_id, run_id, period_start, attempt, status, transaction_id, amount, currency, error)
+                SELECT o.subscription_id, p_run_id, o.period_start, o.attempt, o.status,
+                       o.transaction_id, o.amount, o.currency, o.error
+                FROM jsonb_to_recordset(p_outcomes) AS o(
+                    subscription_id BIGINT, period_start TIMESTAMPTZ, attempt INTEGER, status TEXT,
+                    transaction_id TEXT, amount NUMERIC, currency TEXT, error TEXT
+                )
+                ON CONFLICT (subscription_id, period_start) WHERE status = 'succeeded' DO NOTHING
+                RETURNING subscription_id, period_start, attempt, status, transaction_id, amount, currency, error
+            )
+            INSERT INTO pg_temp.renewal_outcomes SELECT * FROM inserted;
+
+            -- Successes: next period, credits and a payment row; guarded by the period the charge was for.
+            -- Periods missed while overdue are skipped, not charged.
+            WITH renewed AS (
+                UPDATE public.subscriptions s
+                SET current_period_end = public.subscription_period_end_after(s.current_period_end, s.renewal_interval, v_after),
+                    next_renewal_at = public.subscription_period_end_after(s.current_period_end, s.renewal_interval, v_after),
+                    failed_attempts = 0,
+                    last_renewed_at = NOW(),
+                    updated_at = NOW()
+                FROM pg_temp.renewal_outcomes o
+                WHERE o.status = 'succeeded'
+                  AND s.id = o.subscription_id
+                  AND s.current_period_end = o.period_start
+                RETURNING s.id, s.user_id, s.plan_id, s.gateway, s.credits, o.transaction_id, o.amount, o.currency
+            ),
+            credited AS (
+                UPDATE public.users u
+                SET credits_remaining = u.credits_remaining + r.credits
+                FROM (SELECT user_id, SUM(credits) AS credits FROM renewed GROUP BY user_id) r
+                WHERE u.id = r.user_id
+                RETURNING u.id
+            ),
+            paid AS (
+                INSERT INTO public.payments (user_id, amount, gateway, status, metadata)
+                SELECT r.user_id, r.amount, r.gateway, 'succeeded', jsonb_build_object(
+                    'transaction_id', r.transaction_id,
+                    'subscription_id', r.id,
+                    'plan_id', r.plan_id,
+                    'currency', r.currency,
+                    'credits', r.credits,
+                    'renewal_run_id', p_run_id
+                )
+                FROM renewed r
+                RETURNING 1
+            )
+            SELECT COUNT(*) INTO v_renewed FROM renewed;
+
+            -- Declines: retry 1, 2, 4... days after this run; past_due after p_max_attempts declines
+            WITH declined AS (
+                UPDATE public.subscriptions s
+                SET failed_attempts = s.failed_attempts + 1,
+                    next_renewal_at = v_after + make_interval(days => (2 ^ s.failed_attempts)::INTEGER),
+                    status = CASE WHEN s.failed_attempts + 1 >= p_max_attempts THEN 'past_due' ELSE s.status END,
+                    updated_at = NOW()
+                FROM pg_temp.renewal_outcomes o
+                WHERE o.status = 'declined'
+                  AND s.id = o.subscription_id
+                  AND s.current_period_end = o.period_start
+                  AND s.failed_attempts = o.attempt
+                RETURNING s.id
+            )
+            SELECT COUNT(*) INTO v_declined FROM declined;
+
+            UPDATE public.subscription_renewal_runs
+            SET checkpoint_renewal_at = p_checkpoint_renewal_at,
+                checkpoint_id = p_checkpoint_id,
+                counts = p_counts,
+                updated_at = NOW()
+            WHERE run_id = p_run_id;
+
+            RETURN jsonb_build_object('renewed', v_renewed, 'declined', v_declined);
+        END;
+        $fn$;
+
+        GRANT EXECUTE ON FUNCTION public.record_subscription_renewals(TEXT, JSONB, TIMESTAMPTZ, BIGINT, JSONB, INTEGER) TO service_role;
+
+        -- Log this migration
+        INSERT INTO public.migrations_log (migration_name)
+        VALUES ('2025-10-27_subscription_renewal_overdue.sql');
+
+        RAISE NOTICE 'Migration 2025-10-27_subscription_renewal_overdue.sql applied successfully';
+    ELSE
+        RAISE NOTICE 'Migration 2025-10-27_subscription_renewal_overdue.sql already applied, skipping';
+    END IF;
+END $$;
@@ -0,0 +1,170 @@
+-- Migration: Look up unresolved renewal charges before charging again
+-- Created: 2025-10-28
+-- Purpose: A renewal charge whose outcome the run did not learn (a gateway timeout after the charge,
+--          a payment still pending, a page charged but not written before a crash) was only settled
+--          by charging again with the same idempotency key. The gateways forget keys after 24 hours,
+--          so a later retry charged twice. Such subscriptions are now marked and the renewal engine
+--          looks the payment up before a new charge; payment webhooks record late successes.
+--
+-- Objects:
+--   subscriptions.charge_pending            the last charge of this period and attempt has no final outcome
+--   subscriptions.pending_transaction_id    gateway payment id of that charge, when it is known
+--   record_subscription_renewals()          errors mark the subscription; successes and declines clear it
+--
+-- Notes:
+--   - services/pay/webhook_queue.py and the non-queued webhook handlers call
+--     record_subscription_renewals() with run id 'webhook'; the one success per period index keeps a
+--     success reported by both the run and the webhook single.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.migrations_log WHERE migration_name = '2025-10-28_subscription_renewal_pending_charges.sql') THEN
+
+        ALTER TABLE public.subscriptions
+            ADD COLUMN IF NOT EXISTS charge_pending BOOLEAN NOT NULL DEFAULT false,
+            ADD COLUMN IF NOT EXISTS pending_transaction_id TEXT;
+
+        CREATE OR REPLACE FUNCTION public.record_subscription_renewals(
+            p_run_id TEXT,
+            p_outcomes JSONB,
+            p_checkpoint_renewal_at TIMESTAMPTZ,
+            p_checkpoint_id BIGINT,
+            p_counts JSONB,
+            p_max_attempts INTEGER DEFAULT 4
+        )
+        RETURNS JSONB
+        LANGUAGE plpgsql
+        AS $fn$
+        DECLARE
+            v_renewed INTEGER;
+            v_declined INTEGER;
+            v_pending INTEGER;
+            v_after TIMESTAMPTZ;
+        BEGIN
+            -- Rows written by this run must not be due again before its cutoff (webhooks have no run: NOW())
+            SELECT GREATEST(NOW(), r.cutoff) INTO v_after
+            FROM public.subscription_renewal_runs r
+            WHERE r.run_id = p_run_id;
+            v_after := COALESCE(v_after, NOW());
+
+            CREATE TEMP TABLE IF NOT EXISTS pg_temp.renewal_outcomes (
+                subscription_id BIGINT,
+                period_start TIMESTAMPTZ,
+                attempt INTEGER,
+                status TEXT,
+                transaction_id TEXT,
+                amount NUMERIC,
+                currency TEXT,
+                error TEXT
+            ) ON COMMIT DROP;
+            TRUNCATE pg_temp.renewal_outcomes;
+
+            -- A replayed page (charged again after a crash, same idempotency keys) inserts no second success
+            WITH inserted AS (
+                INSERT INTO public.subscription_renewals
+                    (subscription_id, run_id, period_start, attempt, status, transaction_id, amount, currency, error)
+                SELECT o.subscription_id, p_run_id, o.period_start, o.attempt, o.status,
+                       o.transaction_id, o.amount, o.currency, o.error
+                FROM jsonb_to_recordset(p_outcomes) AS o(
+                    subscription_id BIGINT, period_start TIMESTAMPTZ, attempt INTEGER, status TEXT,
+                    transaction_id TEXT, amount NUMERIC, currency TEXT, error TEXT
+                )
+                ON CONFLICT (subscription_id, period_start) WHERE status = 'succeeded' DO NOTHING
+                RETURNING subscription_id, period_start, attempt, status, transaction_id, amount, currency, error
+            )
+            INSERT INTO pg_temp.renewal_outcomes SELECT * FROM inserted;
+
+            -- Successes: next period, credits and a payment row; guarded by the period the charge was for.
+            -- Periods missed while overdue are skipped, not charged.
+            WITH renewed AS (
+                UPDATE public.subscriptions s
+                SET current_period_end = public.subscription_period_end_after(s.current_period_end, s.renewal_interval, v_after),
+                    next_renewal_at = public.subscription_period_end_after(s.current_period_end, s.renewal_interval, v_after),
+                    failed_attempts = 0,
+                    charge_pending = false,
+                    pending_transaction_id = NULL,
+                    last_renewed_at = NOW(),
+                    updated_at = NOW()
+                FROM pg_temp.renewal_outcomes o
+                WHERE o.status = 'succeeded'
+                  AND s.id = o.subscription_id
+                  AND s.current_period_end = o.period_start
+                RETURNING s.id, s.user_id, s.plan_id, s.gateway, s.credits, o.transaction_id, o.amount, o.currency
+            ),
+            credited AS (
+                UPDATE public.users u
+                SET credits_remaining = u.credits_remaining + r.credits
+                FROM (SELECT user_id, SUM(credits) AS credits FROM renewed GROUP BY user_id) r
+                WHERE u.id = r.user_id
+                RETURNING u.id
+            ),
+            paid AS (
+                INSERT INTO public.payments (user_id, amount, gateway, status, metadata)
+                SELECT r.user_id, r.amount, r.gateway, 'succeeded', jsonb_build_object(
+                    'transaction_id', r.transaction_id,
+                    'subscription_id', r.id,
+                    'plan_id', r.plan_id,
+                    'currency', r.currency,
+                    'credits', r.credits,
+                    'renewal_run_id', p_run_id
+                )
+                FROM renewed r
+                RETURNING 1
+            )
+            SELECT COUNT(*) INTO v_renewed FROM renewed;
+
+            -- Declines: retry 1, 2, 4... days after this run; past_due after p_max_attempts declines
+            WITH declined AS (
+                UPDATE public.subscriptions s
+                SET failed_attempts = s.failed_attempts + 1,
+                    next_renewal_at = v_after + make_interval(days => (2 ^ s.failed_attempts)::INTEGER),
+                    status = CASE WHEN s.failed_attempts + 1 >= p_max_attempts THEN 'past_due' ELSE s.status END,
+                    charge_pending = false,
+                    pending_transaction_id = NULL,
+                    updated_at = NOW()
+                FROM pg_temp.renewal_outcomes o
+                WHERE o.status = 'declined'
+                  AND s.id = o.subscription_id
+                  AND s.current_period_end = o.period_start
+                  AND s.failed_attempts = o.attempt
+                RETURNING s.id
+            )
+            SELECT COUNT(*) INTO v_declined FROM declined;
+
+            -- Errors: the charge may have gone through; the next run looks it up before charging again
+            WITH pending AS (
+                UPDATE public.subscriptions s
+                SET charge_pending = true,
+                    pending_transaction_id = COALESCE(o.transaction_id, s.pending_transaction_id),
+                    updated_at = NOW()
+                FROM pg_temp.renewal_outcomes o
+                WHERE o.status = 'error'
+                  AND s.id = o.subscription_id
+                  AND s.current_period_end = o.period_start
+                  AND s.failed_attempts = o.attempt
+                RETURNING s.id
+            )
+            SELECT COUNT(*) INTO v_pending FROM pending;
+
+            UPDATE public.subscription_renewal_runs
+            SET checkpoint_renewal_at = p_checkpoint_renewal_at,
+                checkpoint_id = p_checkpoint_id,
+                counts = p_counts,
+                updated_at = NOW()
+            WHERE run_id = p_run_id;
+
+            RETURN jsonb_build_object('renewed', v_renewed, 'declined', v_declined, 'pending', v_pending);
+        END;
+        $fn$;
+
+        GRANT EXECUTE ON FUNCTION public.record_subscription_renewals(TEXT, JSONB, TIMESTAMPTZ, BIGINT, JSONB, INTEGER) TO service_role;
+
+        -- Log this migration
+        INSERT INTO public.migrations_log (migration_name)
+        VALUES ('2025-10-28_subscription_renewal_pending_charges.sql');
+
+        RAISE NOTICE 'Migration 2025-10-28_subscription_renewal_pending_charges.sql applied successfully';
+    ELSE
+        RAISE NOTICE 'Migration 2025-10-28_subscription_renewal_pending_charges.sql already applied, skipping';
+    END IF;
+END $$;
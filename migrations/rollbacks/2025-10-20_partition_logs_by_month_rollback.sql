@@ -0,0 +1,79 @@
+-- Rollback: Return public.logs to a single unpartitioned table
+-- Created: 2025-10-20
+-- Purpose: Rollback for 2025-10-20_partition_logs_by_month.sql
+--
+-- Rows written since the migration are copied back into public.logs_unpartitioned
+-- (ON CONFLICT on its id primary key), then the partitioned table is dropped and the
+-- old table takes its name again. Months already dropped by retention stay gone.
+
+DO $$
+DECLARE
+    view_exists BOOLEAN;
+BEGIN
+    IF to_regclass('public.logs_unpartitioned') IS NOT NULL THEN
+
+        IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron')
+           AND EXISTS (SELECT 1 FROM cron.job WHERE jobname = 'create_logs_partitions') THEN
+            PERFORM cron.unschedule('create_logs_partitions');
+        END IF;
+
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.views
+            WHERE table_schema = 'public' AND table_name = 'user_activity_summary'
+        ) INTO view_exists;
+        DROP VIEW IF EXISTS public.user_activity_summary;
+
+        INSERT INTO public.logs_unpartitioned
+        SELECT * FROM public.logs
+        ON CONFLICT (id) DO NOTHING;
+
+        IF pg_get_serial_sequence('public.logs', 'id') IS NOT NULL THEN
+            EXECUTE format('ALTER SEQUENCE %s OWNED BY public.logs_unpartitioned.id', pg_get_serial_sequence('public.logs', 'id'));
+        END IF;
+
+        DROP TABLE public.logs CASCADE;
+        ALTER TABLE public.logs_unpartitioned RENAME TO logs;
+
+        DROP FUNCTION IF EXISTS public.create_logs_partitions(INTEGER, DATE);
+        DROP FUNCTION IF EXISTS public.drop_old_logs_partitions(TIMESTAMPTZ);
+
+        IF to_regclass('public.user_food_analysis_enhanced') IS NOT NULL THEN
+            ALTER TABLE public.user_food_analysis_enhanced
+                ADD CONSTRAINT user_food_analysis_enhanced_original_log_id_fkey
+                FOREIGN KEY (original_log_id) REFERENCES public.logs(id) ON DELETE SET NULL NOT VALID;
+        END IF;
+
+        IF view_exists THEN
+            CREATE OR REPLACE VIEW public.user_activity_summary AS
+            SELECT
+                u.telegram_id,
+                u.credits_remaining,
+                u.total_paid,
+                u.language,
+                u.country,
+                u.created_at,
+                COUNT(l.id) as total_actions,
+                COUNT(CASE WHEN l.action_type = 'photo_analysis' THEN 1 END) as photo_analyses,
+                COUNT(CASE WHEN l.action_type = 'start' THEN 1 END) as start_commands,
+                COUNT(CASE WHEN l.action_type = 'help' THEN 1 END) as help_commands,
+                COUNT(CASE WHEN l.action_type = 'status' THEN 1 END) as status_commands,
+                COUNT(CASE WHEN l.action_type = 'buy' THEN 1 END) as buy_commands,
+                COUNT(CASE WHEN l.action_type = 'language_change' THEN 1 END) as language_changes,
+                MAX(l.timestamp) as last_activity
+            FROM public.users u
+            LEFT JOIN public.logs l ON u.id = l.user_id
+            GROUP BY u.id, u.telegram_id, u.credits_remaining, u.total_paid, u.language, u.country, u.created_at;
+        END IF;
+
+        -- Remove migration log entry
+        DELETE FROM public.migrations_log WHERE migration_name = '2025-10-20_partition_logs_by_month.sql';
+
+        -- Log the rollback
+        INSERT INTO public.migrations_log (migration_name, applied_at)
+        VALUES ('2025-10-20_partition_logs_by_month_rollback.sql', CURRENT_TIMESTAMP);
+
+        RAISE NOTICE 'Rollback completed: public.logs is unpartitioned again';
+    ELSE
+        RAISE NOTICE 'public.logs_unpartitioned does not exist, nothing to rollback';
+    END IF;
+END $$;
@@ -0,0 +1,28 @@
+-- Rollback: Remove indexed favorites / recipes search
+-- Created: 2025-10-21
+-- Purpose: Rollback for 2025-10-21_favorites_recipes_search.sql
+-- The pg_trgm extension is left installed (other objects may use it).
+
+DO $$
+BEGIN
+    DROP FUNCTION IF EXISTS public.search_favorites(UUID, TEXT, INTEGER, INTEGER);
+    DROP FUNCTION IF EXISTS public.search_recipes(UUID, TEXT, INTEGER, INTEGER);
+
+    DROP INDEX IF EXISTS public.favorites_food_search_tsv_idx;
+    DROP INDEX IF EXISTS public.favorites_food_name_trgm_idx;
+    DROP INDEX IF EXISTS public.favorites_food_user_composition_idx;
+    DROP INDEX IF EXISTS public.saved_recipes_search_tsv_idx;
+    DROP INDEX IF EXISTS public.saved_recipes_title_trgm_idx;
+
+    ALTER TABLE IF EXISTS public.favorites_food DROP COLUMN IF EXISTS search_tsv;
+    ALTER TABLE IF EXISTS public.saved_recipes DROP COLUMN IF EXISTS search_tsv;
+
+    -- Remove migration log entry
+    DELETE FROM public.migrations_log WHERE migration_name = '2025-10-21_favorites_recipes_search.sql';
+
+    -- Log the rollback
+    INSERT INTO public.migrations_log (migration_name, applied_at)
+    VALUES ('2025-10-21_favorites_recipes_search_rollback.sql', CURRENT_TIMESTAMP);
+
+    RAISE NOTICE 'Rollback completed: favorites / recipes search removed';
+END $$;
@@ -0,0 +1,21 @@
+-- Rollback: Remove durable payment webhook ingestion
+-- Created: 2025-10-22
+-- Purpose: Rollback for 2025-10-22_payment_webhook_events.sql
+-- Stored events are dropped; payments already applied stay in public.payments.
+
+DO $$
+BEGIN
+    DROP FUNCTION IF EXISTS public.apply_payment_webhook_event(BIGINT, BIGINT, INTEGER, NUMERIC, TEXT, TEXT, JSONB);
+    DROP FUNCTION IF EXISTS public.claim_payment_webhook_events(INTEGER, INTEGER);
+    DROP INDEX IF EXISTS public.payments_gateway_transaction_idx;
+    DROP TABLE IF EXISTS public.payment_webhook_events;
+
+    -- Remove migration log entry
+    DELETE FROM public.migrations_log WHERE migration_name = '2025-10-22_payment_webhook_events.sql';
+
+    -- Log the rollback
+    INSERT INTO public.migrations_log (migration_name, applied_at)
+    VALUES ('2025-10-22_payment_webhook_events_rollback.sql', CURRENT_TIMESTAMP);
+
+    RAISE NOTICE 'Rollback completed: payment webhook events removed';
+END $$;
@@ -0,0 +1,26 @@
+-- Rollback: Remove per-user daily and weekly nutrition rollups
+-- Created: 2025-10-23
+-- Purpose: Rollback for 2025-10-23_weekly_nutrition_rollups.sql
+-- Logs are untouched; the weekly report falls back to counting logged analyses.
+
+DO $$
+BEGIN
+    DROP TRIGGER IF EXISTS logs_nutrition_rollup ON public.logs;
+    DROP FUNCTION IF EXISTS public.logs_nutrition_rollup_trigger();
+    DROP FUNCTION IF EXISTS public.backfill_user_nutrition_rollups(DATE, UUID[]);
+    DROP FUNCTION IF EXISTS public.refresh_user_nutrition_rollups(UUID, DATE);
+    DROP FUNCTION IF EXISTS public.refresh_user_weekly_rollup(UUID, DATE);
+    DROP FUNCTION IF EXISTS public.refresh_user_nutrition_day(UUID, DATE);
+    DROP FUNCTION IF EXISTS public.nutrition_numeric(TEXT);
+    DROP TABLE IF EXISTS public.user_weekly_nutrition_rollups;
+    DROP TABLE IF EXISTS public.user_daily_nutrition;
+
+    -- Remove migration log entry
+    DELETE FROM public.migrations_log WHERE migration_name = '2025-10-23_weekly_nutrition_rollups.sql';
+
+    -- Log the rollback
+    INSERT INTO public.migrations_log (migration_name, applied_at)
+    VALUES ('2025-10-23_weekly_nutrition_rollups_rollback.sql', CURRENT_TIMESTAMP);
+
+    RAISE NOTICE 'Rollback completed: nutrition rollups removed';
+END $$;
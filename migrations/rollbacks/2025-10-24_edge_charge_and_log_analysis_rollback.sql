@@ -0,0 +1,18 @@
+-- Rollback: Remove the edge charge + log RPC
+-- Created: 2025-10-24
+-- Purpose: Rollback for 2025-10-24_edge_charge_and_log_analysis.sql
+-- The edge analyze path fails until the function exists again.
+
+DO $$
+BEGIN
+    DROP FUNCTION IF EXISTS public.edge_charge_and_log_analysis(BIGINT, TEXT, JSONB, TEXT, JSONB);
+
+    -- Remove migration log entry
+    DELETE FROM public.migrations_log WHERE migration_name = '2025-10-24_edge_charge_and_log_analysis.sql';
+
+    -- Log the rollback
+    INSERT INTO public.migrations_log (migration_name, applied_at)
+    VALUES ('2025-10-24_edge_charge_and_log_analysis_rollback.sql', CURRENT_TIMESTAMP);
+
+    RAISE NOTICE 'Rollback completed: edge charge + log RPC removed';
+END $$;
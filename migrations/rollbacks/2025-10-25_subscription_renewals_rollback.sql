@@ -0,0 +1,22 @@
+-- Rollback: Remove batched subscription renewals
+-- Created: 2025-10-25
+-- Purpose: Rollback for 2025-10-25_subscription_renewals.sql
+-- Subscriptions and renewal history are dropped; renewal payments stay in public.payments.
+
+DO $$
+BEGIN
+    DROP FUNCTION IF EXISTS public.record_subscription_renewals(TEXT, JSONB, TIMESTAMPTZ, BIGINT, JSONB, INTEGER);
+    DROP FUNCTION IF EXISTS public.due_subscriptions(TIMESTAMPTZ, TIMESTAMPTZ, BIGINT, INTEGER);
+    DROP TABLE IF EXISTS public.subscription_renewals;
+    DROP TABLE IF EXISTS public.subscription_renewal_runs;
+    DROP TABLE IF EXISTS public.subscriptions;
+
+    -- Remove migration log entry
+    DELETE FROM public.migrations_log WHERE migration_name = '2025-10-25_subscription_renewals.sql';
+
+    -- Log the rollback
+    INSERT INTO public.migrations_log (migration_name, applied_at)
+    VALUES ('2025-10-25_subscription_renewals_rollback.sql', CURRENT_TIMESTAMP);
+
+    RAISE NOTICE 'Rollback completed: subscription renewals removed';
+END $$;
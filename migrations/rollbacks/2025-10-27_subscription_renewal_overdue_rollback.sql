@@ -0,0 +1,124 @@
+-- Rollback: Restore one-interval renewals
+-- Created: 2025-10-27
+-- Purpose: Rollback for 2025-10-27_subscription_renewal_overdue.sql
+-- A renewed subscription moves one interval ahead again, so one run can charge a subscription that
+-- is several periods overdue more than once.
+
+DO $$
+BEGIN
+    CREATE OR REPLACE FUNCTION public.record_subscription_renewals(
+        p_run_id TEXT,
+        p_outcomes JSONB,
+        p_checkpoint_renewal_at TIMESTAMPTZ,
+        p_checkpoint_id BIGINT,
+        p_counts JSONB,
+        p_max_attempts INTEGER DEFAULT 4
+    )
+    RETURNS JSONB
+    LANGUAGE plpgsql
+    AS $fn$
+    DECLARE
+        v_renewed INTEGER;
+        v_declined INTEGER;
+    BEGIN
+        CREATE TEMP TABLE IF NOT EXISTS pg_temp.renewal_outcomes (
+            subscription_id BIGINT,
+            period_start TIMESTAMPTZ,
+            attempt INTEGER,
+            status TEXT,
+            transaction_id TEXT,
+            amount NUMERIC,
+            currency TEXT,
+            error TEXT
+        ) ON COMMIT DROP;
+        TRUNCATE pg_temp.renewal_outcomes;
+
+        -- A replayed page (charged again after a crash, same idempotency keys) inserts no second success
+        WITH inserted AS (
+            INSERT INTO public.subscription_renewals
+                (subscription_id, run_id, period_start, attempt, status, transaction_id, amount, currency, error)
+            SELECT o.subscription_id, p_run_id, o.period_start, o.attempt, o.status,
+                   o.transaction_id, o.amount, o.currency, o.error
+            FROM jsonb_to_recordset(p_outcomes) AS o(
+                subscription_id BIGINT, period_start TIMESTAMPTZ, attempt INTEGER, status TEXT,
+                transaction_id TEXT, amount NUMERIC, currency TEXT, error TEXT
+            )
+            ON CONFLICT (subscription_id, period_start) WHERE status = 'succeeded' DO NOTHING
+            RETURNING subscription_id, period_start, attempt, status, transaction_id, amount, currency, error
+        )
+        INSERT INTO pg_temp.renewal_outcomes SELECT * FROM inserted;
+
+        -- Successes: next period, credits and a payment row; guarded by the period the charge was for
+        WITH renewed AS (
+            UPDATE public.subscriptions s
+            SET current_period_end = s.current_period_end + s.renewal_interval,
+                next_renewal_at = s.current_period_end + s.renewal_interval,
+                failed_attempts = 0,
+                last_renewed_at = NOW(),
+                updated_at = NOW()
+            FROM pg_temp.renewal_outcomes o
+            WHERE o.status = 'succeeded'
+              AND s.id = o.subscription_id
+              AND s.current_period_end = o.period_start
+            RETURNING s.id, s.user_id, s.plan_id, s.gateway, s.credits, o.transaction_id, o.amount, o.currency
+        ),
+        credited AS (
+            UPDATE public.users u
+            SET credits_remaining = u.credits_remaining + r.credits
+            FROM (SELECT user_id, SUM(credits) AS credits FROM renewed GROUP BY user_id) r
+            WHERE u.id = r.user_id
+            RETURNING u.id
+        ),
+        paid AS (
+            INSERT INTO public.payments (user_id, amount, gateway, status, metadata)
+            SELECT r.user_id, r.amount, r.gateway, 'succeeded', jsonb_build_object(
+                'transaction_id', r.transaction_id,
+                'subscription_id', r.id,
+                'plan_id', r.plan_id,
+                'currency', r.currency,
+                'credits', r.credits,
+                'renewal_run_id', p_run_id
+            )
+            FROM renewed r
+            RETURNING 1
+        )
+        SELECT COUNT(*) INTO v_renewed FROM renewed;
+
+        -- Declines: retry after 1, 2, 4... days; past_due after p_max_attempts declines
+        WITH declined AS (
+            UPDATE public.subscriptions s
+            SET failed_attempts = s.failed_attempts + 1,
+                next_renewal_at = NOW() + make_interval(days => (2 ^ s.failed_attempts)::INTEGER),
+                status = CASE WHEN s.failed_attempts + 1 >= p_max_attempts THEN 'past_due' ELSE s.status END,
+                updated_at = NOW()
+            FROM pg_temp.renewal_outcomes o
+            WHERE o.status = 'declined'
+              AND s.id = o.subscription_id
+              AND s.current_period_end = o.period_start
+              AND s.failed_attempts = o.attempt
+            RETURNING s.id
+        )
+        SELECT COUNT(*) INTO v_declined FROM declined;
+
+        UPDATE public.subscription_renewal_runs
+        SET checkpoint_renewal_at = p_checkpoint_renewal_at,
+            checkpoint_id = p_checkpoint_id,
+            counts = p_counts,
+            updated_at = NOW()
+        WHERE run_id = p_run_id;
+
+        RETURN jsonb_build_object('renewed', v_renewed, 'declined', v_declined);
+    END;
+    $fn$;
+
+    DROP FUNCTION IF EXISTS public.subscription_period_end_after(TIMESTAMPTZ, INTERVAL, TIMESTAMPTZ);
+
+    -- Remove migration log entry
+    DELETE FROM public.migrations_log WHERE migration_name = '2025-10-27_subscription_renewal_overdue.sql';
+
+    -- Log the rollback
+    INSERT INTO public.migrations_log (migration_name, applied_at)
+    VALUES ('2025-10-27_subscription_renewal_overdue_rollback.sql', CURRENT_TIMESTAMP);
+
+    RAISE NOTICE 'Rollback completed: renewals move one interval ahead again';
+END $$;
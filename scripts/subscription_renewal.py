@@ -1,25 +1,20 @@
+#!/usr/bin/env python3
+"""
+Renew due subscriptions (cron entry point)
+
+The engine lives in services/pay/subscription_renewal.py:
+
+    python scripts/subscription_renewal.py run
+    python scripts/subscription_renewal.py run --run-id renewal-20251025T030000   # resume a crashed run
+    python scripts/subscription_renewal.py status --run-id renewal-20251025T030000
+"""
+
 import os
-from datetime import datetime, timedelta
-# from common.supabase_client import get_all_subscribers, add_payment
-# from pay.c0r.ai.app.stripe_client import create_stripe_invoice
-# from pay.c0r.ai.app.yookassa_client import create_yookassa_invoice
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-# Заглушка: пример логики автосписания
-async def renew_subscriptions():
-    # subscribers = await get_all_subscribers()
-    subscribers = [
-        {"telegram_id": 123, "plan_id": "pro", "last_payment": datetime.now() - timedelta(days=31)},
-        {"telegram_id": 456, "plan_id": "pro_stripe", "last_payment": datetime.now() - timedelta(days=29)}
-    ]
-    for sub in subscribers:
-        days_since = (datetime.now() - sub["last_payment"]).days
-        if days_since >= 30:
-            print(f"[AUTO-RENEW] User {sub['telegram_id']} plan {sub['plan_id']} — инициировать новый платёж!")
-            # await create_yookassa_invoice(sub["telegram_id"], sub["plan_id"])
-            # await create_stripe_invoice(sub["telegram_id"], sub["plan_id"])
-        else:
-            print(f"[OK] User {sub['telegram_id']} plan {sub['plan_id']} — подписка активна ({days_since} дней)")
+from services.pay.subscription_renewal import main
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(renew_subscriptions()) 
\ No newline at end of file
+    main()
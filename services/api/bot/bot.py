@@ -7,7 +7,7 @@ from aiogram.filters import Command
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
 from services.api.bot.handlers.commands import start_command, help_command, status_command, buy_credits_command, buy_basic_callback, buy_pro_callback, handle_action_callback
-from services.api.bot.handlers.favorites import favorites_callback_router
+from services.api.bot.handlers.favorites import favorites_callback_router, favorites_command
 from services.api.bot.handlers.enhanced_payments import enhanced_payment_handler
 from services.api.bot.handlers.photo import photo_handler
 from services.api.bot.handlers.payments import handle_pre_checkout_query, handle_successful_payment, handle_buy_callback
@@ -31,6 +31,7 @@ from services.api.bot.handlers.scan import (
     ScanStates,
 )
 from services.api.bot.handlers.language import language_command, handle_language_callback
+from services.api.bot.utils.user_context import UserContextMiddleware
 from i18n.i18n import i18n
 from loguru import logger
 
@@ -137,14 +138,14 @@ async def rate_limit_middleware(handler, event, data: dict):
     message = event
     user_id = message.from_user.id
     
-    # Get user's language (default to English for rate limit messages)
+    # Get user's language (default to English for rate limit messages); the
+    # user loaded here is the one the handler gets from the update's context
     user_language = "en"
     try:
-        from common.supabase_client import get_user_by_telegram_id
-        user = await get_user_by_telegram_id(user_id)
-        if user and user.get('language'):
-            user_language = user['language']
-    except:
+        user_context = data.get("user_context")
+        if user_context is not None:
+            user_language = await user_context.language()
+    except Exception:
         pass  # Use default English if we can't get user language
     
     # Check for photo requests
@@ -174,6 +175,8 @@ async def rate_limit_middleware(handler, event, data: dict):
     return await handler(event, data)
 
 # Register middleware
+# One user/profile load per update, shared by the middlewares and handlers below
+dp.update.outer_middleware(UserContextMiddleware())
 dp.message.middleware(rate_limit_middleware)
 
 # Command handlers
@@ -188,6 +191,7 @@ dp.message.register(nutrition_insights_command, Command(commands=["insights"]))
 dp.message.register(weekly_report_command, Command(commands=["report"]))
 dp.message.register(water_tracker_command, Command(commands=["water"]))
 dp.message.register(language_command, Command(commands=["language"]))
+dp.message.register(favorites_command, Command(commands=["fav", "favorites"]))
 
 # FSM handlers (MUST be registered BEFORE general photo handler)
 dp.message.register(process_recipe_photo, RecipeStates.waiting_for_photo)
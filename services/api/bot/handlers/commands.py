@@ -6,7 +6,8 @@ from datetime import datetime
 from aiogram import types
 from aiogram.fsm.context import FSMContext
 from loguru import logger
-from common.supabase_client import get_or_create_user, log_user_action, get_user_with_profile, get_daily_calories_consumed, get_user_total_paid
+from common.supabase_client import log_user_action, get_daily_calories_consumed, get_user_total_paid
+from services.api.bot.utils.user_context import get_or_create_user, get_user_with_profile
 from .keyboards import create_main_menu_keyboard, create_main_menu_text
 from .nutrition import NutritionStates
 from i18n.i18n import i18n
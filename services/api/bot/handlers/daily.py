@@ -6,11 +6,10 @@ from aiogram import types
 from loguru import logger
 from datetime import datetime, timedelta
 from common.supabase_client import (
-    get_user_with_profile, 
     get_daily_calories_consumed,
     log_user_action,
-    get_or_create_user
 )
+from services.api.bot.utils.user_context import get_or_create_user, get_user_with_profile
 from .keyboards import create_main_menu_keyboard
 from i18n.i18n import i18n
 
@@ -1,21 +1,29 @@
 """
 Favorites handlers for Telegram bot
 Simple flow:
-- Save last analysis to favorites
-- List favorites with basic pagination
-- Add favorite back to daily totals
+- Save last analysis to favorites (one favorite per composition)
+- List favorites with pagination, /fav <query> for ranked search
+- Add favorite back to daily totals from its stored nutrition (no ML call)
 - Delete favorite
 """
 from aiogram import types
+from aiogram.filters import CommandObject
 from aiogram.fsm.context import FSMContext
 from loguru import logger
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import hashlib
 import json
 
 from i18n.i18n import i18n
-from common.supabase_client import get_or_create_user
-from common.db.favorites import save_favorite_food, list_favorites, get_favorite_by_id, delete_favorite
+from services.api.bot.utils.user_context import get_or_create_user
+from common.db.favorites import (
+    save_favorite_food,
+    list_favorites,
+    search_favorites,
+    get_favorite_by_id,
+    get_favorite_by_composition_hash,
+    delete_favorite,
+)
 from common.db.logs import get_latest_photo_analysis_log_id, get_log_by_id
 from common.calories_manager import add_calories_from_analysis
 
@@ -72,7 +80,9 @@ async def save_latest_analysis_to_favorites(callback: types.CallbackQuery, state
         name = _infer_name_from_analysis(analysis, language)
         composition_hash = _compute_composition_hash(analysis)
 
-        saved = await save_favorite_food(user_id=user_id, name=name, items_json={'analysis': analysis}, composition_hash=composition_hash)
+        # Same meal saved again: keep the existing favorite instead of a duplicate
+        if not await get_favorite_by_composition_hash(user_id, composition_hash):
+            await save_favorite_food(user_id=user_id, name=name, items_json={'analysis': analysis}, composition_hash=composition_hash)
 
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
             [types.InlineKeyboardButton(text=i18n.get_text('btn_main_menu', language), callback_data='action_main_menu')],
@@ -81,39 +91,33 @@ async def save_latest_analysis_to_favorites(callback: types.CallbackQuery, state
         await callback.message.answer(i18n.get_text('favorite_saved', language, default='Saved to favorites ⭐'), reply_markup=keyboard)
     except Exception as e:
         logger.error(f"Error saving favorite: {e}")
-        await callback.message.answer(i18n.get_text('error_general', 'en'))
+        await callback.message.answer(i18n.get_text('error_general', i18n.resolve_language(callback.from_user.id, callback.from_user.language_code)))
 
 
-async def show_favorites(callback_or_message, page: int = 0):
-    """Show favorites list; supports both CallbackQuery and Message origins."""
-    is_callback = isinstance(callback_or_message, types.CallbackQuery)
-    message = callback_or_message.message if is_callback else callback_or_message
-    # IMPORTANT: With callbacks, the real user is callback.from_user, not message.from_user
-    telegram_user_id = callback_or_message.from_user.id if is_callback else message.from_user.id
-    user = await get_or_create_user(telegram_user_id)
-    language = user.get('language', 'en')
-    items = await list_favorites(user['id'], limit=50)
-    if not items:
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[[types.InlineKeyboardButton(text=i18n.get_text('btn_main_menu', language), callback_data='action_main_menu')]])
-        await message.answer(i18n.get_text('favorites_empty', language, default='No favorites yet. Save from analysis with ⭐'), reply_markup=keyboard)
-        return
+def relog_favorite(user_id: str, favorite: Dict[str, Any]) -> bool:
+    """Add a favorite to today's totals from its stored nutrition; no photo or ML call involved."""
+    analysis = (favorite.get('items_json') or {}).get('analysis') or {}
+    if not analysis:
+        return False
+    return add_calories_from_analysis(user_id, {
+        'analysis': analysis,
+        'source': 'favorite',
+        'favorite_id': favorite.get('id'),
+        'composition_hash': favorite.get('composition_hash'),
+    })
 
-    per_page = 5
-    start = page * per_page
-    page_items = items[start:start + per_page]
 
-    # Header with pagination controls
-    header = i18n.get_text('favorites_title', language, default='⭐ Your Favorites')
-    nav_row: List[types.InlineKeyboardButton] = []
-    if start > 0:
-        nav_row.append(types.InlineKeyboardButton(text='⬅️', callback_data=f'fav_page:{page-1}'))
-    if start + per_page < len(items):
-        nav_row.append(types.InlineKeyboardButton(text='➡️', callback_data=f'fav_page:{page+1}'))
-    header_kb = types.InlineKeyboardMarkup(inline_keyboard=[nav_row] if nav_row else [[types.InlineKeyboardButton(text=i18n.get_text('btn_main_menu', language), callback_data='action_main_menu')]])
-    await message.answer(header, reply_markup=header_kb)
+async def relog_favorite_by_hash(user_id: str, composition_hash: str) -> Optional[Dict[str, Any]]:
+    """Re-log the favorite with this composition; returns it, or None if unknown or not logged."""
+    favorite = await get_favorite_by_composition_hash(user_id, composition_hash)
+    if not favorite or not relog_favorite(user_id, favorite):
+        return None
+    return favorite
 
+
+async def _send_favorite_items(message: types.Message, items: List[Dict[str, Any]], language: str):
     # Send each favorite as a separate short message with its own actions
-    for it in page_items:
+    for it in items:
         name = it.get('name', 'Favorite')
         date_str = str(it.get('created_at', ''))[:10]
         # Nutrition extraction
@@ -151,6 +155,57 @@ async def show_favorites(callback_or_message, page: int = 0):
         await message.answer(title, reply_markup=kb, parse_mode='HTML')
 
 
+async def show_favorites(callback_or_message, page: int = 0):
+    """Show favorites list; supports both CallbackQuery and Message origins."""
+    is_callback = isinstance(callback_or_message, types.CallbackQuery)
+    message = callback_or_message.message if is_callback else callback_or_message
+    # IMPORTANT: With callbacks, the real user is callback.from_user, not message.from_user
+    telegram_user_id = callback_or_message.from_user.id if is_callback else message.from_user.id
+    user = await get_or_create_user(telegram_user_id)
+    language = user.get('language', 'en')
+
+    per_page = 5
+    start = page * per_page
+    # One extra row tells whether there is a next page
+    items = await list_favorites(user['id'], limit=per_page + 1, offset=start)
+    if not items and page == 0:
+        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[[types.InlineKeyboardButton(text=i18n.get_text('btn_main_menu', language), callback_data='action_main_menu')]])
+        await message.answer(i18n.get_text('favorites_empty', language, default='No favorites yet. Save from analysis with ⭐'), reply_markup=keyboard)
+        return
+    page_items = items[:per_page]
+
+    # Header with pagination controls
+    header = i18n.get_text('favorites_title', language, default='⭐ Your Favorites')
+    nav_row: List[types.InlineKeyboardButton] = []
+    if start > 0:
+        nav_row.append(types.InlineKeyboardButton(text='⬅️', callback_data=f'fav_page:{page-1}'))
+    if len(items) > per_page:
+        nav_row.append(types.InlineKeyboardButton(text='➡️', callback_data=f'fav_page:{page+1}'))
+    header_kb = types.InlineKeyboardMarkup(inline_keyboard=[nav_row] if nav_row else [[types.InlineKeyboardButton(text=i18n.get_text('btn_main_menu', language), callback_data='action_main_menu')]])
+    await message.answer(header, reply_markup=header_kb)
+
+    await _send_favorite_items(message, page_items, language)
+
+
+async def favorites_command(message: types.Message, command: CommandObject = None):
+    """/fav — list favorites; /fav <query> — best matching favorites, ready to add to daily."""
+    query = (command.args or '').strip() if command else ''
+    if not query:
+        await show_favorites(message)
+        return
+
+    user = await get_or_create_user(message.from_user.id)
+    language = user.get('language', 'en')
+    items = await search_favorites(user['id'], query, limit=5)
+    if not items:
+        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
+            [types.InlineKeyboardButton(text=i18n.get_text('btn_favorites', language, default='⭐ Favorites'), callback_data='action_favorites')]
+        ])
+        await message.answer(i18n.get_text('favorites_not_found', language), reply_markup=keyboard)
+        return
+    await _send_favorite_items(message, items, language)
+
+
 async def favorites_callback_router(callback: types.CallbackQuery, state: FSMContext):
     try:
         # Acknowledge to stop Telegram spinner
@@ -171,15 +226,7 @@ async def favorites_callback_router(callback: types.CallbackQuery, state: FSMCon
             user = await get_or_create_user(callback.from_user.id)
             language = user.get('language', 'en')
             item = await get_favorite_by_id(user['id'], fid)
-            if not item:
-                await callback.message.answer(i18n.get_text('error_general', language))
-                return
-            analysis = (item.get('items_json') or {}).get('analysis') or {}
-            if not analysis:
-                await callback.message.answer(i18n.get_text('error_general', language))
-                return
-            ok = add_calories_from_analysis(user['id'], {'analysis': analysis})
-            if not ok:
+            if not item or not relog_favorite(user['id'], item):
                 await callback.message.answer(i18n.get_text('error_general', language))
                 return
             kb = types.InlineKeyboardMarkup(inline_keyboard=[
@@ -204,6 +251,6 @@ async def favorites_callback_router(callback: types.CallbackQuery, state: FSMCon
             return
     except Exception as e:
         logger.error(f"Favorites callback error: {e}")
-        await callback.message.answer(i18n.get_text('error_general', 'en'))
+        await callback.message.answer(i18n.get_text('error_general', i18n.resolve_language(callback.from_user.id, callback.from_user.language_code)))
 
 
@@ -5,6 +5,7 @@ Handles language switching and language detection
 from aiogram import types
 from loguru import logger
 from common.supabase_client import update_user_language
+from services.api.bot.utils.user_context import invalidate_user_context
 from i18n.i18n import i18n, Language
 
 
@@ -52,7 +53,7 @@ async def language_command(message: types.Message):
         
     except Exception as e:
         logger.error(f"Error in language command: {e}")
-        await message.answer(i18n.get_text("error_general", "en"))
+        await message.answer(i18n.get_text("error_general", i18n.resolve_language(message.from_user.id, message.from_user.language_code)))
 
 
 async def handle_language_callback(callback: types.CallbackQuery):
@@ -85,10 +86,12 @@ async def handle_language_callback(callback: types.CallbackQuery):
         
         # Update user language in database
         updated_user = await update_user_language(telegram_user_id, selected_language)
+        invalidate_user_context(telegram_user_id)
         
         if not updated_user:
             await callback.answer("Failed to update language")
             return
+        i18n.remember_language(telegram_user_id, selected_language)
         
         # Log language change
         await log_user_action(
@@ -141,6 +144,7 @@ async def detect_and_set_user_language(message: types.Message) -> str:
         
         # Update user's language in database
         await update_user_language(telegram_user_id, user_language)
+        invalidate_user_context(telegram_user_id)
         
         logger.info(f"Set language {user_language} for user {telegram_user_id}")
         
@@ -152,4 +156,5 @@ async def detect_and_set_user_language(message: types.Message) -> str:
 
 
 # Import these functions to avoid circular imports
-from common.supabase_client import get_or_create_user, log_user_action 
\ No newline at end of file
+from common.supabase_client import log_user_action
+from services.api.bot.utils.user_context import get_or_create_user
\ No newline at end of file
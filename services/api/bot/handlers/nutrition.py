@@ -6,7 +6,10 @@ Provides BMI, ideal weight, water needs, macro distribution, and recommendations
 from aiogram import types
 from aiogram.fsm.state import State, StatesGroup
 from loguru import logger
-from common.supabase_client import get_user_with_profile, log_user_action, get_or_create_user
+from common.supabase_client import log_user_action
+from common.db.nutrition_rollups import get_weekly_rollups, summarize_weekly_rollup
+from common.cache.insights_cache import get_or_render_insights
+from services.api.bot.utils.user_context import get_or_create_user, get_user_with_profile
 from common.nutrition_calculations import (
     calculate_bmi, calculate_ideal_weight, calculate_water_needs,
     calculate_macro_distribution, calculate_metabolic_age,
@@ -70,10 +73,10 @@ async def get_weekly_meals_count(user_id: str) -> int:
     logger.info(f"Getting weekly meals count for user {user_id} from {start_date} to {end_date}")
     
     try:
-        # Get all photo analyses for the past 7 days
-        logs = supabase.table("logs").select("*").eq("user_id", user_id).eq("action_type", "photo_analysis").gte("timestamp", start_date.isoformat()).lte("timestamp", end_date.isoformat()).execute().data
+        # Count photo analyses for the past 7 days
+        result = supabase.table("logs").select("id", count="exact").eq("user_id", user_id).eq("action_type", "photo_analysis").gte("timestamp", start_date.isoformat()).lte("timestamp", end_date.isoformat()).execute()
         
-        meals_count = len(logs)
+        meals_count = result.count or 0
         logger.info(f"Found {meals_count} analyzed meals for user {user_id} in the past week")
         
         return meals_count
@@ -82,6 +85,74 @@ async def get_weekly_meals_count(user_id: str) -> int:
         return 0
 
 
+async def build_weekly_report(user_id: str, language: str) -> str:
+    """
+    Weekly report text from the user's weekly rollup row (current week, or the
+    previous one while the current week has no meals yet)
+    """
+    rollups = await get_weekly_rollups(user_id)
+    if rollups is None:
+        # Rollups unavailable: only the meal count can be shown
+        summary = summarize_weekly_rollup(None)
+        summary["meals_count"] = await get_weekly_meals_count(user_id)
+        return render_weekly_report(summary, language)
+    rollup = rollups["current"] if rollups["current"] or not rollups["previous"] else rollups["previous"]
+    return render_weekly_report(summarize_weekly_rollup(rollup), language)
+
+
+def render_weekly_report(summary: dict, language: str) -> str:
+    """Format a summary from common.db.nutrition_rollups.summarize_weekly_rollup"""
+    not_enough_data = i18n.get_text('weekly_report_not_enough_data', language)
+    has_data = summary["days_logged"] > 0
+
+    lines = [
+        i18n.get_text('weekly_report_title', language),
+        "",
+        i18n.get_text('weekly_report_week_of', language, date=summary["week_start"].strftime('%b %d, %Y')),
+        "",
+        i18n.get_text('weekly_report_meals_analyzed', language, count=summary["meals_count"]),
+    ]
+    if has_data:
+        lines.append(i18n.get_text(
+            'weekly_report_days_logged', language, days=summary["days_logged"], elapsed=summary["elapsed_days"]
+        ))
+        calories = i18n.get_text('weekly_report_calories_per_day', language, calories=summary["avg_calories"])
+    else:
+        calories = not_enough_data
+    lines.append(i18n.get_text('weekly_report_avg_calories', language, calories=calories))
+    if has_data:
+        lines.append(i18n.get_text(
+            'weekly_report_macros', language,
+            proteins=summary["avg_proteins"], fats=summary["avg_fats"], carbs=summary["avg_carbohydrates"],
+        ))
+
+    if summary["goal_progress_percent"] is not None:
+        progress = i18n.get_text(
+            'weekly_report_days_on_target', language,
+            on_target=summary["days_on_target"], days=summary["days_logged"], percent=summary["goal_progress_percent"],
+        )
+    elif has_data:
+        progress = i18n.get_text('weekly_report_setup_profile', language)
+    else:
+        progress = not_enough_data
+    lines.append(i18n.get_text('weekly_report_goal_progress', language, progress=progress))
+
+    score = f"{summary['consistency_score']}/100" if summary["consistency_score"] is not None else "N/A"
+    lines.append(i18n.get_text('weekly_report_consistency_score', language, score=score))
+    if summary["current_streak"] > 1:
+        lines.append(i18n.get_text('weekly_report_streak', language, days=summary["current_streak"]))
+
+    if not has_data:
+        lines += ["", i18n.get_text('weekly_report_note', language)]
+    lines += [
+        "",
+        i18n.get_text('weekly_report_coming_soon', language),
+        i18n.get_text('weekly_report_trends', language),
+        i18n.get_text('weekly_report_quality', language),
+    ]
+    return "\n".join(lines)
+
+
 async def nutrition_insights_command(message: types.Message):
     """
     Show nutrition insights menu with buttons for different sections
@@ -292,10 +363,24 @@ async def generate_nutrition_insights(profile: dict, user: dict) -> str:
     Returns:
         Formatted insights text
     """
-    insights = []
-    
-    # Get user's language
     user_language = user.get('language', 'en')
+    sections = await get_insight_sections(profile, user)
+    
+    # The footer changes daily and with every analysis, so it is never cached
+    insights = [
+        sections['summary'],
+        f"{i18n.get_text('nutrition_analysis_date', user_language, date=datetime.now().strftime('%Y-%m-%d'))}",
+        f"{i18n.get_text('nutrition_credits_remaining', user_language, credits=user.get('credits_remaining', 0))}",
+    ]
+    
+    # Join all insights and sanitize
+    raw_text = "\n".join(insights)
+    return sanitize_markdown_text(raw_text)
+
+
+def _render_insights_summary(profile: dict, user_language: str, calc: "InsightCalculations") -> str:
+    """All sections in one text, without the footer (unsanitized)"""
+    insights = []
     
     # Header
     insights.append(f"{i18n.get_text('nutrition_analysis_title', user_language)}\n")
@@ -311,14 +396,14 @@ async def generate_nutrition_insights(profile: dict, user: dict) -> str:
     
     # 1. BMI Analysis
     if weight > 0 and height > 0:
-        bmi_data = calculate_bmi(weight, height, user_language)
+        bmi_data = calc(calculate_bmi, weight, height, user_language)
         insights.append(f"{i18n.get_text('nutrition_bmi_title', user_language)}")
         insights.append(f"{bmi_data['emoji']} **{bmi_data['bmi']}** - {bmi_data['description']}")
         insights.append(f"💡 {bmi_data['motivation']}")
         insights.append("")
         
         # Ideal weight
-        ideal_weight = calculate_ideal_weight(height, gender)
+        ideal_weight = calc(calculate_ideal_weight, height, gender)
         insights.append(f"{i18n.get_text('nutrition_ideal_weight_title', user_language)}")
         insights.append(f"**{ideal_weight['range']}** ({i18n.get_text('bmi_based', user_language)})")
         insights.append(f"**{ideal_weight['broca']} {i18n.get_text('kg', user_language)}** ({i18n.get_text('broca_formula', user_language)})")
@@ -326,7 +411,7 @@ async def generate_nutrition_insights(profile: dict, user: dict) -> str:
     
     # 2. Metabolic Age
     if age > 0 and weight > 0 and height > 0:
-        metabolic_data = calculate_metabolic_age(age, gender, weight, height, activity, user_language)
+        metabolic_data = calc(calculate_metabolic_age, age, gender, weight, height, activity, user_language)
         insights.append(f"{i18n.get_text('nutrition_metabolic_age_title', user_language)}")
         insights.append(f"{metabolic_data['emoji']} **{metabolic_data['metabolic_age']} {i18n.get_text('years', user_language)}** (vs {age} {i18n.get_text('actual', user_language)})")
         insights.append(f"{metabolic_data['description']}")
@@ -335,7 +420,7 @@ async def generate_nutrition_insights(profile: dict, user: dict) -> str:
     
     # 3. Daily Water Needs
     if weight > 0:
-        water_data = calculate_water_needs(weight, activity)
+        water_data = calc(calculate_water_needs, weight, activity)
         insights.append(f"{i18n.get_text('nutrition_water_needs_title', user_language)}")
         insights.append(f"**{water_data['liters']}{i18n.get_text('L', user_language)}** ({water_data['glasses']} {i18n.get_text('glasses', user_language)})")
         insights.append(f"{i18n.get_text('base', user_language).capitalize()}: {water_data['base_ml']}{i18n.get_text('ml', user_language)} + {i18n.get_text('activity', user_language).capitalize()}: {water_data['activity_bonus']}{i18n.get_text('ml', user_language)}")
@@ -343,7 +428,7 @@ async def generate_nutrition_insights(profile: dict, user: dict) -> str:
     
     # 4. Macro Distribution
     if daily_calories > 0:
-        macro_data = calculate_macro_distribution(daily_calories, goal)
+        macro_data = calc(calculate_macro_distribution, daily_calories, goal)
         insights.append(f"{i18n.get_text('nutrition_macro_title', user_language)}")
         insights.append(f"**Protein:** {macro_data['protein']['grams']}{i18n.get_text('g', user_language)} ({macro_data['protein']['percent']}%)")
         insights.append(f"**Carbs:** {macro_data['carbs']['grams']}{i18n.get_text('g', user_language)} ({macro_data['carbs']['percent']}%)")
@@ -351,7 +436,7 @@ async def generate_nutrition_insights(profile: dict, user: dict) -> str:
         insights.append("")
         
         # Meal portions
-        meal_data = calculate_meal_portions(daily_calories, 3, user_language)
+        meal_data = calc(calculate_meal_portions, daily_calories, 3, user_language)
         insights.append(f"{i18n.get_text('nutrition_meal_distribution_title', user_language)}")
         for meal in meal_data['meals']:
             insights.append(f"**{meal['name']}:** {meal['calories']} {i18n.get_text('cal', user_language)} ({meal['percentage']}%)")
@@ -376,13 +461,7 @@ async def generate_nutrition_insights(profile: dict, user: dict) -> str:
                 insights.append(line)
         insights.append("")
     
-    # Footer
-    insights.append(f"{i18n.get_text('nutrition_analysis_date', user_language, date=datetime.now().strftime('%Y-%m-%d'))}")
-    insights.append(f"{i18n.get_text('nutrition_credits_remaining', user_language, credits=user.get('credits_remaining', 0))}")
-    
-    # Join all insights and sanitize
-    raw_text = "\n".join(insights)
-    return sanitize_markdown_text(raw_text)
+    return "\n".join(insights)
 
 
 def get_goal_specific_advice(goal: str, profile: dict, language: str) -> str:
@@ -419,24 +498,7 @@ async def weekly_report_callback(callback: types.CallbackQuery):
             }
         )
         
-        # Get actual meals count for the past week
-        meals_count = await get_weekly_meals_count(user['id'])
-        
-        # Generate weekly report with actual data
-        report_text = (
-            f"{i18n.get_text('weekly_report_title', user_language)}\n\n"
-            f"{i18n.get_text('weekly_report_week_of', user_language, date=datetime.now().strftime('%b %d, %Y'))}\n\n"
-            f"{i18n.get_text('weekly_report_meals_analyzed', user_language, count=meals_count)}\n"
-            f"{i18n.get_text('weekly_report_avg_calories', user_language, calories=i18n.get_text('weekly_report_not_enough_data', user_language))}\n"
-            f"{i18n.get_text('weekly_report_goal_progress', user_language, progress=i18n.get_text('weekly_report_setup_profile', user_language))}\n"
-            f"{i18n.get_text('weekly_report_consistency_score', user_language, score='N/A')}\n\n"
-            f"{i18n.get_text('weekly_report_note', user_language)}\n\n"
-            f"{i18n.get_text('weekly_report_coming_soon', user_language)}\n"
-            f"{i18n.get_text('weekly_report_trends', user_language)}\n"
-            f"{i18n.get_text('weekly_report_macro', user_language)}\n"
-            f"{i18n.get_text('weekly_report_quality', user_language)}\n"
-            f"{i18n.get_text('weekly_report_tracking', user_language)}"
-        )
+        report_text = await build_weekly_report(user['id'], user_language)
         
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
             [
@@ -486,24 +548,7 @@ async def weekly_report_command(message: types.Message):
         # Get user's language
         user_language = user.get('language', 'en')
         
-        # Get actual meals count for the past week
-        meals_count = await get_weekly_meals_count(user['id'])
-        
-        # Generate weekly report with actual data
-        report_text = (
-            f"{i18n.get_text('weekly_report_title', user_language)}\n\n"
-            f"{i18n.get_text('weekly_report_week_of', user_language, date=datetime.now().strftime('%b %d, %Y'))}\n\n"
-            f"{i18n.get_text('weekly_report_meals_analyzed', user_language, count=meals_count)}\n"
-            f"{i18n.get_text('weekly_report_avg_calories', user_language, calories=i18n.get_text('weekly_report_not_enough_data', user_language))}\n"
-            f"{i18n.get_text('weekly_report_goal_progress', user_language, progress=i18n.get_text('weekly_report_setup_profile', user_language))}\n"
-            f"{i18n.get_text('weekly_report_consistency_score', user_language, score='N/A')}\n\n"
-            f"{i18n.get_text('weekly_report_note', user_language)}\n\n"
-            f"{i18n.get_text('weekly_report_coming_soon', user_language)}\n"
-            f"{i18n.get_text('weekly_report_trends', user_language)}\n"
-            f"{i18n.get_text('weekly_report_macro', user_language)}\n"
-            f"{i18n.get_text('weekly_report_quality', user_language)}\n"
-            f"{i18n.get_text('weekly_report_tracking', user_language)}"
-        )
+        report_text = await build_weekly_report(user['id'], user_language)
         
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
             [
@@ -854,27 +899,13 @@ async def handle_nutrition_section_callback(callback: types.CallbackQuery):
         section = callback.data.replace("nutrition_section_", "")
         user_language = user.get('language', 'en')
         
-        # Generate section content
-        if section == "bmi":
-            content = await generate_bmi_section(profile, user)
-        elif section == "ideal_weight":
-            content = await generate_ideal_weight_section(profile, user)
-        elif section == "metabolic_age":
-            content = await generate_metabolic_age_section(profile, user)
-        elif section == "water_needs":
-            content = await generate_water_needs_section(profile, user)
-        elif section == "macro_distribution":
-            content = await generate_macro_distribution_section(profile, user)
-        elif section == "meal_distribution":
-            content = await generate_meal_distribution_section(profile, user)
-        elif section == "recommendations":
-            content = await generate_recommendations_section(profile, user)
-        elif section == "goal_advice":
-            content = await generate_goal_advice_section(profile, user)
-        else:
+        if section not in INSIGHT_SECTIONS:
             await callback.message.answer(i18n.get_text("error_general", user_language))
             return
         
+        # Rendered once per profile version and language
+        content = (await get_insight_sections(profile, user))[section]
+        
         # Create keyboard with back button
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
             [
@@ -913,15 +944,14 @@ async def handle_nutrition_menu_callback(callback: types.CallbackQuery):
         await callback.message.answer(error_text)
 
 
-# Section generation functions
-async def generate_bmi_section(profile: dict, user: dict) -> str:
+# Section renderers: pure functions of the profile and language
+def _render_bmi_section(profile: dict, user_language: str, calc: "InsightCalculations") -> str:
     """Generate BMI section content"""
-    user_language = user.get('language', 'en')
     
     weight = profile.get('weight_kg', 70)
     height = profile.get('height_cm', 170)
     
-    bmi_data = calculate_bmi(weight, height, user_language)
+    bmi_data = calc(calculate_bmi, weight, height, user_language)
     
     content = (
         f"**{i18n.get_text('nutrition_bmi_title', user_language)}**\n\n"
@@ -938,15 +968,14 @@ async def generate_bmi_section(profile: dict, user: dict) -> str:
     return sanitize_markdown_text(content)
 
 
-async def generate_ideal_weight_section(profile: dict, user: dict) -> str:
+def _render_ideal_weight_section(profile: dict, user_language: str, calc: "InsightCalculations") -> str:
     """Generate ideal weight section content"""
-    user_language = user.get('language', 'en')
     
     weight = profile.get('weight_kg', 70)
     height = profile.get('height_cm', 170)
     gender = profile.get('gender', 'male')
     
-    ideal_weight_data = calculate_ideal_weight(height, gender)
+    ideal_weight_data = calc(calculate_ideal_weight, height, gender)
     
     content = (
         f"**Идеальный диапазон веса**\n\n"
@@ -961,9 +990,8 @@ async def generate_ideal_weight_section(profile: dict, user: dict) -> str:
     return sanitize_markdown_text(content)
 
 
-async def generate_metabolic_age_section(profile: dict, user: dict) -> str:
+def _render_metabolic_age_section(profile: dict, user_language: str, calc: "InsightCalculations") -> str:
     """Generate metabolic age section content"""
-    user_language = user.get('language', 'en')
     
     weight = profile.get('weight_kg', 70)
     height = profile.get('height_cm', 170)
@@ -971,7 +999,7 @@ async def generate_metabolic_age_section(profile: dict, user: dict) -> str:
     gender = profile.get('gender', 'male')
     activity = profile.get('activity_level', 'moderately_active')
     
-    metabolic_age_data = calculate_metabolic_age(age, gender, weight, height, activity, user_language)
+    metabolic_age_data = calc(calculate_metabolic_age, age, gender, weight, height, activity, user_language)
     
     content = (
         f"**Метаболический возраст**\n\n"
@@ -984,14 +1012,13 @@ async def generate_metabolic_age_section(profile: dict, user: dict) -> str:
     return sanitize_markdown_text(content)
 
 
-async def generate_water_needs_section(profile: dict, user: dict) -> str:
+def _render_water_needs_section(profile: dict, user_language: str, calc: "InsightCalculations") -> str:
     """Generate water needs section content"""
-    user_language = user.get('language', 'en')
     
     weight = profile.get('weight_kg', 70)
     activity = profile.get('activity_level', 'sedentary')
     
-    water_data = calculate_water_needs(weight, activity)
+    water_data = calc(calculate_water_needs, weight, activity)
     
     content = (
         f"**Дневные потребности в воде**\n\n"
@@ -1010,14 +1037,13 @@ async def generate_water_needs_section(profile: dict, user: dict) -> str:
     return sanitize_markdown_text(content)
 
 
-async def generate_macro_distribution_section(profile: dict, user: dict) -> str:
+def _render_macro_distribution_section(profile: dict, user_language: str, calc: "InsightCalculations") -> str:
     """Generate macro distribution section content"""
-    user_language = user.get('language', 'en')
     
     calories = profile.get('daily_calories_target', 2000)
     goal = profile.get('goal', 'maintain_weight')
     
-    macro_data = calculate_macro_distribution(calories, goal)
+    macro_data = calc(calculate_macro_distribution, calories, goal)
     
     content = (
         f"**Оптимальное распределение макронутриентов**\n\n"
@@ -1034,13 +1060,12 @@ async def generate_macro_distribution_section(profile: dict, user: dict) -> str:
     return sanitize_markdown_text(content)
 
 
-async def generate_meal_distribution_section(profile: dict, user: dict) -> str:
+def _render_meal_distribution_section(profile: dict, user_language: str, calc: "InsightCalculations") -> str:
     """Generate meal distribution section content"""
-    user_language = user.get('language', 'en')
     
     calories = profile.get('daily_calories_target', 2000)
     
-    meal_data = calculate_meal_portions(calories, 3, user_language)
+    meal_data = calc(calculate_meal_portions, calories, 3, user_language)
     
     content = (
         f"**Распределение приемов пищи**\n\n"
@@ -1058,9 +1083,8 @@ async def generate_meal_distribution_section(profile: dict, user: dict) -> str:
     return sanitize_markdown_text(content)
 
 
-async def generate_recommendations_section(profile: dict, user: dict) -> str:
+def _render_recommendations_section(profile: dict, user_language: str, calc: "InsightCalculations") -> str:
     """Generate recommendations section content"""
-    user_language = user.get('language', 'en')
     
     # Pass empty list for recent_logs since we don't have them in this context
     recommendations = get_nutrition_recommendations(profile, [], user_language)
@@ -1075,9 +1099,8 @@ async def generate_recommendations_section(profile: dict, user: dict) -> str:
     return sanitize_markdown_text(content)
 
 
-async def generate_goal_advice_section(profile: dict, user: dict) -> str:
+def _render_goal_advice_section(profile: dict, user_language: str, calc: "InsightCalculations") -> str:
     """Generate goal advice section content"""
-    user_language = user.get('language', 'en')
     
     goal = profile.get('goal', 'maintain_weight')
     goal_advice = get_goal_specific_advice(goal, profile, user_language)
@@ -1087,4 +1110,81 @@ async def generate_goal_advice_section(profile: dict, user: dict) -> str:
         f"{goal_advice}"
     )
     
-    return sanitize_markdown_text(content) 
\ No newline at end of file
+    return sanitize_markdown_text(content) 
+
+
+_SECTION_RENDERERS = {
+    "bmi": _render_bmi_section,
+    "ideal_weight": _render_ideal_weight_section,
+    "metabolic_age": _render_metabolic_age_section,
+    "water_needs": _render_water_needs_section,
+    "macro_distribution": _render_macro_distribution_section,
+    "meal_distribution": _render_meal_distribution_section,
+    "recommendations": _render_recommendations_section,
+    "goal_advice": _render_goal_advice_section,
+}
+
+# Sections reachable from the insights menu (nutrition_section_<name>)
+INSIGHT_SECTIONS = tuple(_SECTION_RENDERERS)
+
+
+class InsightCalculations:
+    """Calculator results of one render pass: each distinct input is computed once"""
+
+    def __init__(self):
+        self._results = {}
+
+    def __call__(self, calculate, *args):
+        key = (calculate.__name__, args)
+        if key not in self._results:
+            self._results[key] = calculate(*args)
+        return self._results[key]
+
+
+async def render_insight_sections(profile: dict, language: str) -> dict:
+    """Every menu section plus the full summary, rendered in one pass"""
+    calc = InsightCalculations()
+    sections = {name: render(profile, language, calc) for name, render in _SECTION_RENDERERS.items()}
+    sections["summary"] = _render_insights_summary(profile, language, calc)
+    return sections
+
+
+async def get_insight_sections(profile: dict, user: dict) -> dict:
+    """Rendered sections for the user's profile version and language (cached)"""
+    language = user.get('language', 'en')
+    return await get_or_render_insights(
+        profile, language, lambda: render_insight_sections(profile, language), user_id=user.get('id')
+    )
+
+
+# Single sections, served from the rendered set
+async def generate_bmi_section(profile: dict, user: dict) -> str:
+    return (await get_insight_sections(profile, user))["bmi"]
+
+
+async def generate_ideal_weight_section(profile: dict, user: dict) -> str:
+    return (await get_insight_sections(profile, user))["ideal_weight"]
+
+
+async def generate_metabolic_age_section(profile: dict, user: dict) -> str:
+    return (await get_insight_sections(profile, user))["metabolic_age"]
+
+
+async def generate_water_needs_section(profile: dict, user: dict) -> str:
+    return (await get_insight_sections(profile, user))["water_needs"]
+
+
+async def generate_macro_distribution_section(profile: dict, user: dict) -> str:
+    return (await get_insight_sections(profile, user))["macro_distribution"]
+
+
+async def generate_meal_distribution_section(profile: dict, user: dict) -> str:
+    return (await get_insight_sections(profile, user))["meal_distribution"]
+
+
+async def generate_recommendations_section(profile: dict, user: dict) -> str:
+    return (await get_insight_sections(profile, user))["recommendations"]
+
+
+async def generate_goal_advice_section(profile: dict, user: dict) -> str:
+    return (await get_insight_sections(profile, user))["goal_advice"]
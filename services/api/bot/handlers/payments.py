@@ -6,7 +6,8 @@ import os
 import sys
 from aiogram import types
 from loguru import logger
-from common.supabase_client import get_or_create_user, add_credits, add_payment, log_user_action
+from common.supabase_client import add_credits, add_payment, log_user_action
+from services.api.bot.utils.user_context import get_or_create_user, invalidate_user_context
 from .keyboards import create_main_menu_keyboard, create_payment_success_keyboard
 from services.api.bot.config import PAYMENT_PLANS
 import traceback
@@ -286,6 +287,7 @@ async def handle_successful_payment(message: types.Message):
         
         # Add credits to user account
         updated_user = await add_credits(user_id, plan["credits"])
+        invalidate_user_context(user_id)
         logger.info(f"User after payment: {updated_user}")
         
         # Add payment record to database
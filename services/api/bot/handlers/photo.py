@@ -3,16 +3,23 @@ Photo processing handler for c0r.ai bot
 Handles food photo analysis and nutrition information
 """
 import os
+import time
 import httpx
 from aiogram import types
 from aiogram.fsm.context import FSMContext
 from loguru import logger
 from common.routes import Routes
-from common.supabase_client import get_or_create_user, decrement_credits, get_user_with_profile, log_user_action
+from common.supabase_client import decrement_credits, log_user_action
+from services.api.bot.utils.user_context import get_or_create_user, get_user_with_profile, invalidate_user_context
 from common.calories_manager import add_calories_from_analysis, get_daily_calories
-from services.api.bot.utils.r2 import upload_telegram_photo
-from common.cache.redis_client import get_async_redis, make_cache_key, cache_get_json, cache_set_json
-from common.utils.hash_utils import sha256_bytes_to_hex
+from services.api.bot.utils.photo_stream import PhotoStreamError, PhotoTooLargeError, StreamedPhoto, stream_telegram_photo, upload_streamed_photo
+from services.api.bot.utils.ml_stream import ML_STREAMING_ENABLED, MLStreamError, ProgressiveMessage, iter_sse_events
+from common.cache.redis_client import make_cache_key, cache_get_json, cache_set_json
+from common.cache.single_flight import SingleFlight
+from common.jobs.post_analysis import enqueue_post_analysis
+from common.jobs.queue import JOB_QUEUE_ENABLED
+from common.food_taxonomy import classify_food, classify_foods
+from shared.metrics import stage, trace
 from .keyboards import create_main_menu_keyboard
 from aiogram.filters import StateFilter
 import re
@@ -28,44 +35,52 @@ ML_SERVICE_URL = os.getenv("ML_SERVICE_URL")
 
 def _generate_smart_dish_name(food_names: List[str], user_language: str) -> str:
     """Generate intelligent dish name based on ingredients"""
-    # Convert to lowercase for easier matching
-    foods = [name.lower() for name in food_names]
+    # Classify every ingredient once; the whole plate is classified as one text
+    classes = [classify_food(name) for name in food_names]
+    plate = classify_foods(food_names)
+
+    def first_with(category: str) -> str:
+        return next((name for name, c in zip(food_names, classes) if c.has(category)), "")
+
+    def others_than(category: str, limit: int) -> List[str]:
+        return [name for name, c in zip(food_names, classes) if not c.has(category)][:limit]
+
+    is_salad = plate.has("dish_greens") or sum(1 for c in classes if c.has("dish_salad_vegetable")) >= 2
 
     if user_language == "ru":
         # Soup indicators
-        if any(word in " ".join(foods) for word in ["бульон", "суп", "щи", "борщ", "солянка"]):
+        if plate.has("dish_soup"):
             return f"суп с {', '.join(food_names[:2])}"
 
         # Pasta/grain dishes
-        elif any(word in " ".join(foods) for word in ["паста", "макарон", "спагетти", "пенне", "фарфалле"]):
-            return f"паста с {', '.join([f for f in food_names if not any(p in f.lower() for p in ['паста', 'макарон', 'спагетти'])][:2])}"
+        elif plate.has("dish_pasta"):
+            return f"паста с {', '.join(others_than('dish_pasta', 2))}"
 
-        elif any(word in " ".join(foods) for word in ["рис", "плов", "ризотто"]):
-            return f"рис с {', '.join([f for f in food_names if 'рис' not in f.lower()][:2])}"
+        elif plate.has("dish_rice"):
+            return f"рис с {', '.join(others_than('dish_rice', 2))}"
 
-        elif any(word in " ".join(foods) for word in ["гречка", "каша", "овсянка"]):
-            return f"каша с {', '.join([f for f in food_names if not any(k in f.lower() for k in ['гречка', 'каша', 'овсянка'])][:2])}"
+        elif plate.has("dish_porridge"):
+            return f"каша с {', '.join(others_than('dish_porridge', 2))}"
 
         # Meat dishes
-        elif any(word in " ".join(foods) for word in ["стейк", "говядина", "свинина", "баранина", "котлет"]):
-            meat = next((f for f in food_names if any(m in f.lower() for m in ['стейк', 'говядина', 'свинина', 'баранина', 'котлет'])), "")
+        elif plate.has("dish_meat"):
+            meat = first_with("dish_meat")
             others = [f for f in food_names if f != meat][:2]
             return f"{meat} с {', '.join(others)}" if others else meat
 
         # Fish dishes
-        elif any(word in " ".join(foods) for word in ["лосось", "семга", "тунец", "треска", "окунь", "рыба"]):
-            fish = next((f for f in food_names if any(fi in f.lower() for fi in ['лосось', 'семга', 'тунец', 'треска', 'окунь', 'рыба'])), "")
+        elif plate.has("dish_fish"):
+            fish = first_with("dish_fish")
             others = [f for f in food_names if f != fish][:2]
             return f"{fish} с {', '.join(others)}" if others else fish
 
         # Salad indicators (green leaves, vegetables)
-        elif any(word in " ".join(foods) for word in ["салат", "листья", "руккола", "шпинат", "айсберг"]) or \
-             len([f for f in foods if any(veg in f for veg in ["помидор", "огурец", "перец", "морковь", "свекла"])]) >= 2:
+        elif is_salad:
             return f"салат с {', '.join(food_names[:3])}"
 
         # Sandwich/toast
-        elif any(word in " ".join(foods) for word in ["хлеб", "тост", "багет", "булка", "сэндвич"]):
-            bread = next((f for f in food_names if any(b in f.lower() for b in ['хлеб', 'тост', 'багет', 'булка'])), "")
+        elif plate.has("dish_bread"):
+            bread = first_with("dish_bread")
             others = [f for f in food_names if f != bread][:2]
             return f"тост с {', '.join(others)}" if others else "тост"
 
@@ -74,28 +89,24 @@ def _generate_smart_dish_name(food_names: List[str], user_language: str) -> str:
             return f"блюдо с {', '.join(food_names[:3])}"
 
     else:  # English
-        # Similar logic for English
-        foods_joined = " ".join(foods)
-
-        if any(word in foods_joined for word in ["soup", "broth", "chowder"]):
+        if plate.has("dish_soup"):
             return f"soup with {', '.join(food_names[:2])}"
-        elif any(word in foods_joined for word in ["pasta", "spaghetti", "penne", "linguine"]):
-            return f"pasta with {', '.join([f for f in food_names if not any(p in f.lower() for p in ['pasta', 'spaghetti', 'penne'])][:2])}"
-        elif any(word in foods_joined for word in ["rice", "risotto", "pilaf"]):
-            return f"rice with {', '.join([f for f in food_names if 'rice' not in f.lower()][:2])}"
-        elif any(word in foods_joined for word in ["steak", "beef", "pork", "lamb", "chicken"]):
-            meat = next((f for f in food_names if any(m in f.lower() for m in ['steak', 'beef', 'pork', 'lamb', 'chicken'])), "")
+        elif plate.has("dish_pasta"):
+            return f"pasta with {', '.join(others_than('dish_pasta', 2))}"
+        elif plate.has("dish_rice"):
+            return f"rice with {', '.join(others_than('dish_rice', 2))}"
+        elif plate.has("dish_meat"):
+            meat = first_with("dish_meat")
             others = [f for f in food_names if f != meat][:2]
             return f"{meat} with {', '.join(others)}" if others else meat
-        elif any(word in foods_joined for word in ["salmon", "tuna", "fish", "cod", "halibut"]):
-            fish = next((f for f in food_names if any(fi in f.lower() for fi in ['salmon', 'tuna', 'fish', 'cod', 'halibut'])), "")
+        elif plate.has("dish_fish"):
+            fish = first_with("dish_fish")
             others = [f for f in food_names if f != fish][:2]
             return f"{fish} with {', '.join(others)}" if others else fish
-        elif any(word in foods_joined for word in ["lettuce", "salad", "greens", "arugula", "spinach"]) or \
-             len([f for f in foods if any(veg in f for veg in ["tomato", "cucumber", "pepper", "carrot"])]) >= 2:
+        elif is_salad:
             return f"salad with {', '.join(food_names[:3])}"
-        elif any(word in foods_joined for word in ["bread", "toast", "sandwich", "bagel"]):
-            return f"toast with {', '.join([f for f in food_names if not any(b in f.lower() for b in ['bread', 'toast'])][:2])}"
+        elif plate.has("dish_bread"):
+            return f"toast with {', '.join(others_than('dish_bread', 2))}"
         else:
             return f"dish with {', '.join(food_names[:3])}"
 
@@ -150,17 +161,11 @@ def _calculate_dynamic_health_score(base_score: int, totals: dict, food_items: l
     elif ingredient_count <= 2:
         adjustments -= 0.5  # Limited diversity
 
-    # Healthy ingredient bonuses
-    healthy_ingredients = ['лосось', 'семга', 'авокадо', 'брокколи', 'шпинат', 'киноа', 'овсянка', 'ягоды', 'орехи', 'оливковое масло',
-                          'salmon', 'avocado', 'broccoli', 'spinach', 'quinoa', 'oats', 'berries', 'nuts', 'olive oil']
-
-    unhealthy_ingredients = ['фри', 'чипсы', 'кола', 'пицца', 'бургер', 'майонез', 'кетчуп',
-                            'fries', 'chips', 'cola', 'pizza', 'burger', 'mayo', 'ketchup']
+    # Healthy ingredient bonuses / unhealthy penalties (distinct taxonomy keywords present)
+    plate = classify_foods(item.get('name', '') for item in food_items)
 
-    food_names_lower = ' '.join([item.get('name', '').lower() for item in food_items])
-
-    healthy_count = sum(1 for ingredient in healthy_ingredients if ingredient in food_names_lower)
-    unhealthy_count = sum(1 for ingredient in unhealthy_ingredients if ingredient in food_names_lower)
+    healthy_count = plate.count('healthy_ingredient')
+    unhealthy_count = plate.count('unhealthy_ingredient')
 
     adjustments += healthy_count * 0.5
     adjustments -= unhealthy_count * 1
@@ -220,18 +225,10 @@ def _generate_personalized_points(total_nutrition: dict, profile: Optional[dict]
     dietary_prefs = (profile or {}).get('dietary_preferences', []) if profile else []
 
     # Analyze current ingredients to avoid redundant suggestions
-    current_ingredients = []
-    if food_items:
-        current_ingredients = [item.get('name', '').lower() for item in food_items]
-    has_vegetables = any(veg in ' '.join(current_ingredients) for veg in
-                        ['салат', 'помидор', 'огурец', 'перец', 'брокколи', 'шпинат', 'морковь',
-                         'lettuce', 'tomato', 'cucumber', 'pepper', 'broccoli', 'spinach', 'carrot'])
-    has_protein = any(prot in ' '.join(current_ingredients) for prot in
-                     ['лосось', 'курица', 'говядина', 'творог', 'яйца', 'тунец',
-                      'salmon', 'chicken', 'beef', 'cottage', 'eggs', 'tuna'])
-    has_healthy_fats = any(fat in ' '.join(current_ingredients) for fat in
-                          ['авокадо', 'орехи', 'оливковое', 'лосось',
-                           'avocado', 'nuts', 'olive', 'salmon'])
+    plate = classify_foods(item.get('name', '') for item in (food_items or []))
+    has_vegetables = plate.has('vegetable')
+    has_protein = plate.has('protein')
+    has_healthy_fats = plate.has('healthy_fat')
 
     positives: List[str] = []
     improvements: List[str] = []
@@ -506,11 +503,263 @@ def format_analysis_result(result: dict, user_language: str = 'en', profile: Opt
     
     return "\n".join(message_parts)
 
+def format_partial_analysis(fields: dict, user_language: str, header: str) -> str:
+    """Plain-text progress view of a streaming analysis (dish name, items, totals)"""
+    lines = [header]
+    if fields.get("dish_name"):
+        lines += ["", f"🍽️ {fields['dish_name']}"]
+    items = fields.get("food_items") or []
+    if items:
+        lines.append("")
+        unit_g, unit_kcal = ("г", "ккал") if user_language == "ru" else ("g", "kcal")
+        for item in items[:8]:
+            parts = [f"{item.get('emoji', '•')} {item.get('name', '?')}"]
+            if item.get("weight_grams"):
+                parts.append(f"{item['weight_grams']} {unit_g}")
+            if item.get("calories") is not None:
+                parts.append(f"{item['calories']} {unit_kcal}")
+            lines.append(" — ".join(parts))
+    totals = fields.get("total_nutrition")
+    if totals:
+        if user_language == "ru":
+            lines += ["", f"🔥 {totals.get('calories', '?')} ккал · Б {totals.get('proteins', '?')} · Ж {totals.get('fats', '?')} · У {totals.get('carbohydrates', '?')}"]
+        else:
+            lines += ["", f"🔥 {totals.get('calories', '?')} kcal · P {totals.get('proteins', '?')} · F {totals.get('fats', '?')} · C {totals.get('carbohydrates', '?')}"]
+    return "\n".join(lines)
+
+
+async def stream_nutrition_analysis(
+    client: httpx.AsyncClient,
+    files: dict,
+    data: dict,
+    headers: dict,
+    processing_msg: types.Message,
+    user_language: str,
+) -> Optional[dict]:
+    """
+    Call the streaming analysis endpoint, editing the processing message as fields arrive.
+    
+    Returns the final ML result, or None when streaming is unavailable (no
+    connection or a non-200 answer; the caller then uses the blocking endpoint).
+    Raises MLStreamError when the stream fails after it was accepted: the model
+    call is already paid for and is not repeated.
+    """
+    progress = ProgressiveMessage(processing_msg)
+    header = i18n.get_text('waiting_phrase_title', user_language)
+    fields: dict = {}
+    started = time.monotonic()
+    accepted = False
+    try:
+        async with client.stream(
+            "POST",
+            f"{ML_SERVICE_URL}{Routes.ML_ANALYZE_STREAM}",
+            files=files,
+            data=data,
+            headers=headers,
+            timeout=60.0,
+        ) as response:
+            if response.status_code != 200:
+                logger.warning(f"Streaming analysis unavailable: {response.status_code}")
+                return None
+            accepted = True
+            async for event, payload in iter_sse_events(response.aiter_lines()):
+                if event == "partial":
+                    if not fields:
+                        logger.info(f"⏱️ First partial analysis after {round((time.monotonic() - started) * 1000)}ms")
+                    fields.update(payload)
+                    await progress.update(format_partial_analysis(fields, user_language, header))
+                elif event == "result":
+                    logger.info(f"⏱️ Streaming analysis done in {round((time.monotonic() - started) * 1000)}ms ({progress.edits} progress edits)")
+                    return payload
+                elif event == "error":
+                    raise MLStreamError(f"Streaming analysis error: {payload}")
+    except httpx.HTTPError as e:
+        if accepted:
+            raise MLStreamError(f"Streaming analysis failed: {e}") from e
+        logger.warning(f"Streaming analysis failed to start: {e}")
+        return None
+    raise MLStreamError("Streaming analysis ended without a result")
+
+
+# Coalesces concurrent analyses of the same photo by the same user (keyed by the analysis cache key)
+analysis_flight = SingleFlight("photo_analysis")
+
+
+def _analysis_result_keyboard(user_language: str) -> types.InlineKeyboardMarkup:
+    """Fix Calories / Add to favorites / main menu buttons under an analysis result."""
+    return types.InlineKeyboardMarkup(inline_keyboard=[
+        [
+            types.InlineKeyboardButton(
+                text=i18n.get_text('fix_calories_btn', user_language),
+                callback_data='action_fix_calories'
+            )
+        ],
+        [
+            types.InlineKeyboardButton(
+                text=i18n.get_text('btn_save_to_favorites', user_language, default='⭐ Save to favorites'),
+                callback_data='action_save_favorite'
+            )
+        ],
+        [
+            types.InlineKeyboardButton(
+                text=i18n.get_text('btn_main_menu', user_language),
+                callback_data='action_main_menu'
+            )
+        ]
+    ])
+
+
+async def _answer_with_shared_result(
+    processing_msg: types.Message,
+    state: FSMContext,
+    result: dict,
+    user_language: str,
+    credits: int,
+):
+    """
+    Reply with an analysis produced by another request (cache hit or joined
+    in-flight run): no credits are deducted and no calories are added again.
+    """
+    analysis_text = format_analysis_result(result, user_language)
+    # Optional hint for cached results without mentioning LLM
+    try:
+        analysis_text += "\n\n" + i18n.get_text('cached_result', user_language, default='(cached result)')
+    except Exception:
+        pass
+    await state.clear()
+    final_text = f"{analysis_text}\n\n{i18n.get_text('credits_remaining', user_language)} {credits} {i18n.get_text('credits', user_language)} {i18n.get_text('left', user_language)}! 💪"
+    sanitized_final_text = sanitize_markdown_text(final_text)
+    await processing_msg.edit_text(
+        sanitized_final_text,
+        parse_mode="Markdown",
+        reply_markup=_analysis_result_keyboard(user_language)
+    )
+
+
+async def _analyze_and_charge(
+    processing_msg: types.Message,
+    user: dict,
+    telegram_user_id: int,
+    photo: StreamedPhoto,
+    cache_key: str,
+    user_language: str,
+) -> Optional[dict]:
+    """
+    The paid part of a photo analysis, run once per in-flight photo: R2 upload,
+    ML call, cache write, credit decrement and calorie write. With the job queue
+    enabled the last two are queued for the worker instead of awaited here.
+    Both the upload and the ML request read the photo from its spool.
+
+    Returns the ML result, or None when the ML service failed.
+    """
+    with stage("api", "r2_upload"):
+        photo_url = await upload_streamed_photo(photo, str(user["id"]), "nutrition_analysis")
+    
+    async with httpx.AsyncClient() as client:
+        logger.info(f"🔍 Calling ML service for user {telegram_user_id}, photo size: {photo.size} bytes")
+        
+        # Prepare form data for ML service
+        files = {"photo": ("photo.jpg", photo.body(), "image/jpeg")}
+        data = {
+            "telegram_user_id": str(telegram_user_id),
+            "provider": "openai",
+            "user_language": user_language
+        }
+        
+        # Get authentication headers
+        from shared.auth import get_auth_headers
+        auth_headers = get_auth_headers()
+        # Remove Content-Type to let httpx set it automatically for multipart/form-data
+        if 'Content-Type' in auth_headers:
+            del auth_headers['Content-Type']
+        
+        result = None
+        if ML_STREAMING_ENABLED:
+            try:
+                with stage("api", "llm_stream"):
+                    result = await stream_nutrition_analysis(
+                        client, files, data, auth_headers, processing_msg, user_language
+                    )
+            except MLStreamError as e:
+                logger.error(str(e))
+                return None
+        if result is None:
+            logger.info(f"🚀 Sending request to ML service: {ML_SERVICE_URL}/api/v1/analyze")
+        
+            with stage("api", "llm_call"):
+                response = await client.post(
+                    f"{ML_SERVICE_URL}/api/v1/analyze",
+                    files=files,
+                    data=data,
+                    headers=auth_headers,
+                    timeout=60.0
+                )
+        
+            logger.info(f"📨 ML service response: {response.status_code}")
+        
+            if response.status_code != 200:
+                logger.error(f"ML service error: {response.status_code} - {response.text}")
+                return None
+        
+            result = response.json()
+        # Attach meta for cache provenance and hash
+        try:
+            if isinstance(result, dict):
+                result.setdefault('meta', {})
+                result['meta'].update({'cache_hit': False, 'source': 'llm', 'image_hash': photo.sha256})
+        except Exception:
+            pass
+        logger.info(f"✅ ML service result received: {len(str(result))} chars")
+        logger.info(f"🔍 ML service result keys: {list(result.keys()) if isinstance(result, dict) else 'Not a dict'}")
+        logger.info(f"🔍 ML service result content: {result}")
+    
+    # Save to Redis cache (14 days); this is also the result other workers wait for
+    try:
+        await cache_set_json(cache_key, result, ttl_seconds=14 * 24 * 3600)
+    except Exception:
+        pass
+
+    if JOB_QUEUE_ENABLED:
+        with stage("api", "side_effects_enqueue"):
+            queued = await enqueue_post_analysis(
+                str(user["id"]), telegram_user_id, result, photo_url, analysis_id=cache_key
+            )
+        invalidate_user_context(telegram_user_id)
+        if queued:
+            # The daily totals do not include this meal until the worker has run
+            result.setdefault('meta', {})['side_effects_pending'] = True
+        return result
+
+    # Decrement credits
+    with stage("api", "credit_decrement"):
+        await decrement_credits(telegram_user_id)
+    invalidate_user_context(telegram_user_id)
+    
+    # Add calories to daily consumption using new calories manager
+    with stage("api", "calorie_write"):
+        daily_summary = add_calories_from_analysis(
+            user_id=str(user["id"]),
+            analysis_data=result,
+            photo_url=photo_url
+        )
+    
+    if not daily_summary:
+        logger.error(f"Failed to add calories for user {user['id']}")
+    return result
+
+
 # Process nutrition analysis for a photo
 async def process_nutrition_analysis(message: types.Message, state: FSMContext):
     """
     Process photo for nutrition analysis
     """
+    # One trace id per analysis; sent to the ML service with the auth headers
+    with trace():
+        await _process_nutrition_analysis(message, state)
+
+
+async def _process_nutrition_analysis(message: types.Message, state: FSMContext):
+    streamed_photo = None
     try:
         telegram_user_id = message.from_user.id
         logger.info(f"Processing nutrition analysis for user {telegram_user_id}")
@@ -547,154 +796,69 @@ async def process_nutrition_analysis(message: types.Message, state: FSMContext):
         
         processing_msg = await message.answer(processing_text)
         
-        # Download and upload photo to R2
+        # Stream the photo once into a spool, hashing it on the way; the hash keys both
+        # the result cache and the in-flight registry
         photo = message.photo[-1]  # Get highest resolution photo
-        photo_url = await upload_telegram_photo(
-            message.bot, 
-            photo, 
-            str(user["id"]), 
-            "nutrition_analysis"
-        )
-        
-        # Call ML service for analysis (with Redis cache pre-check by image hash)
-        async with httpx.AsyncClient() as client:
-            # Download photo data for ML service
+        with stage("api", "download"):
             photo_file = await message.bot.get_file(photo.file_id)
-            photo_bytes_io = await message.bot.download_file(photo_file.file_path)
-            
-            # Convert BytesIO to bytes
-            if hasattr(photo_bytes_io, 'read'):
-                photo_bytes = photo_bytes_io.read()
-            elif hasattr(photo_bytes_io, 'getvalue'):
-                photo_bytes = photo_bytes_io.getvalue()
-            else:
-                photo_bytes = photo_bytes_io
-            
-            logger.info(f"🔍 Calling ML service for user {telegram_user_id}, photo size: {len(photo_bytes)} bytes")
-
-            # Compute image hash and check Redis cache first
-            image_hash = sha256_bytes_to_hex(photo_bytes)
-            redis = await get_async_redis()
-            cache_key = make_cache_key("analysis", {"user": str(user["id"]), "image_hash": image_hash})
             try:
-                cached = await cache_get_json(cache_key)
-            except Exception:
-                cached = None
-            if cached and isinstance(cached, dict) and cached.get("analysis"):
-                logger.info("✅ Cache hit for analysis; skipping LLM and credits deduction")
-                analysis_text = format_analysis_result(cached, user_language)
-                # Optional hint for cached results without mentioning LLM
-                try:
-                    analysis_text += "\n\n" + i18n.get_text('cached_result', user_language, default='(cached result)')
-                except Exception:
-                    pass
-                # Do not decrement credits; do not add calories again
-                # Clear state and respond
-                await state.clear()
-                keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-                    [
-                        types.InlineKeyboardButton(
-                            text=i18n.get_text('fix_calories_btn', user_language),
-                            callback_data='action_fix_calories'
-                        )
-                    ],
-                    [
-                        types.InlineKeyboardButton(
-                            text=i18n.get_text('btn_save_to_favorites', user_language, default='⭐ Save to favorites'),
-                            callback_data='action_save_favorite'
-                        )
-                    ],
-                    [
-                        types.InlineKeyboardButton(
-                            text=i18n.get_text('btn_main_menu', user_language),
-                            callback_data='action_main_menu'
-                        )
-                    ]
-                ])
-                final_text = f"{analysis_text}\n\n{i18n.get_text('credits_remaining', user_language)} {credits} {i18n.get_text('credits', user_language)} {i18n.get_text('left', user_language)}! 💪"
-                sanitized_final_text = sanitize_markdown_text(final_text)
-                await processing_msg.edit_text(
-                    sanitized_final_text,
-                    parse_mode="Markdown",
-                    reply_markup=keyboard
+                streamed_photo = await stream_telegram_photo(
+                    message.bot, photo_file.file_path, expected_size=photo_file.file_size
                 )
-                return
-            
-            # Prepare form data for ML service
-            files = {"photo": ("photo.jpg", photo_bytes, "image/jpeg")}
-            data = {
-                "telegram_user_id": str(telegram_user_id),
-                "provider": "openai",
-                "user_language": user_language
-            }
-            
-            # Get authentication headers
-            from shared.auth import get_auth_headers
-            auth_headers = get_auth_headers()
-            # Remove Content-Type to let httpx set it automatically for multipart/form-data
-            if 'Content-Type' in auth_headers:
-                del auth_headers['Content-Type']
-            
-            logger.info(f"🚀 Sending request to ML service: {ML_SERVICE_URL}/api/v1/analyze")
-            
-            response = await client.post(
-                f"{ML_SERVICE_URL}/api/v1/analyze",
-                files=files,
-                data=data,
-                headers=auth_headers,
-                timeout=60.0
-            )
-            
-            logger.info(f"📨 ML service response: {response.status_code}")
-            
-            if response.status_code != 200:
-                logger.error(f"ML service error: {response.status_code} - {response.text}")
+            except PhotoStreamError as e:
+                logger.warning(f"Rejected photo from user {telegram_user_id}: {e}")
+                too_large = isinstance(e, PhotoTooLargeError)
                 await processing_msg.edit_text(
-                    i18n.get_text('analysis_failed', user_language),
+                    i18n.get_text('photo_too_large' if too_large else 'error_analysis', user_language),
                     parse_mode="Markdown"
                 )
                 return
-            
-            result = response.json()
-            # Attach meta for cache provenance and hash
-            try:
-                if isinstance(result, dict):
-                    result.setdefault('meta', {})
-                    result['meta'].update({'cache_hit': False, 'source': 'llm', 'image_hash': image_hash})
-            except Exception:
-                pass
-            logger.info(f"✅ ML service result received: {len(str(result))} chars")
-            logger.info(f"🔍 ML service result keys: {list(result.keys()) if isinstance(result, dict) else 'Not a dict'}")
-            logger.info(f"🔍 ML service result content: {result}")
         
-        # Format and send result
-        analysis_text = format_analysis_result(result, user_language)
-        
-        # Save to Redis cache (14 days)
+        # Check Redis cache first
+        cache_key = make_cache_key("analysis", {"user": str(user["id"]), "image_hash": streamed_photo.sha256})
         try:
-            await cache_set_json(cache_key, result, ttl_seconds=14 * 24 * 3600)
+            with stage("api", "cache_lookup"):
+                cached = await cache_get_json(cache_key)
         except Exception:
-            pass
-
-        # Decrement credits
-        await decrement_credits(telegram_user_id)
+            cached = None
+        if cached and isinstance(cached, dict) and cached.get("analysis"):
+            logger.info("✅ Cache hit for analysis; skipping LLM and credits deduction")
+            await _answer_with_shared_result(processing_msg, state, cached, user_language, credits)
+            return
         
-        # Add calories to daily consumption using new calories manager
-        daily_summary = add_calories_from_analysis(
-            user_id=str(user["id"]),
-            analysis_data=result,
-            photo_url=photo_url
-        )
+        async def analyze():
+            return await _analyze_and_charge(
+                processing_msg, user, telegram_user_id, streamed_photo, cache_key, user_language
+            )
+        
+        async def load_published():
+            published = await cache_get_json(cache_key)
+            return published if isinstance(published, dict) and published.get("analysis") else None
+        
+        # A double-tapped send or a retried update joins the analysis already running for this image
+        # instead of paying for a second upload, LLM call and credit
+        result, shared = await analysis_flight.do(cache_key, analyze, load_published)
+        if result is None:
+            await processing_msg.edit_text(
+                i18n.get_text('analysis_failed', user_language),
+                parse_mode="Markdown"
+            )
+            return
+        if shared:
+            logger.info("✅ Joined in-flight analysis; skipping LLM and credits deduction")
+            await _answer_with_shared_result(processing_msg, state, result, user_language, credits)
+            return
         
-        if not daily_summary:
-            logger.error(f"Failed to add calories for user {user['id']}")
-            daily_summary = get_daily_calories(str(user["id"]))
+        # Format and send result
+        analysis_text = format_analysis_result(result, user_language)
 
         # Add daily progress if user has profile (AFTER adding calories)
         if has_profile:
             # Get updated daily data after adding calories
             daily_data = get_daily_calories(str(user["id"]))
             daily_consumed = daily_data.get("total_calories", 0) if isinstance(daily_data, dict) else daily_data
+            if result.get("meta", {}).get("side_effects_pending"):
+                daily_consumed += float(result.get("analysis", {}).get("total_nutrition", {}).get("calories", 0) or 0)
             daily_target = profile.get("daily_calories_target", 2000)
             remaining = max(0, daily_target - daily_consumed)
             
@@ -710,26 +874,7 @@ async def process_nutrition_analysis(message: types.Message, state: FSMContext):
         await state.clear()
         
         # Send result with main menu and Fix Calories/Add to favorites buttons
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-            [
-                types.InlineKeyboardButton(
-                    text=i18n.get_text('fix_calories_btn', user_language),
-                    callback_data='action_fix_calories'
-                )
-            ],
-            [
-                types.InlineKeyboardButton(
-                    text=i18n.get_text('btn_save_to_favorites', user_language, default='⭐ Save to favorites'),
-                    callback_data='action_save_favorite'
-                )
-            ],
-            [
-                types.InlineKeyboardButton(
-                    text=i18n.get_text('btn_main_menu', user_language),
-                    callback_data='action_main_menu'
-                )
-            ]
-        ])
+        keyboard = _analysis_result_keyboard(user_language)
         
         final_text = f"{analysis_text}\n\n{i18n.get_text('credits_remaining', user_language)} {credits - 1} {i18n.get_text('credits', user_language)} {i18n.get_text('left', user_language)}! 💪"
         
@@ -750,6 +895,9 @@ async def process_nutrition_analysis(message: types.Message, state: FSMContext):
         )
         # Clear state on error
         await state.clear()
+    finally:
+        if streamed_photo is not None:
+            streamed_photo.close()
 
 # Main photo handler - only handles photos when no FSM state is set
 async def photo_handler(message: types.Message, state: FSMContext):
@@ -7,12 +7,11 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from loguru import logger
 from common.supabase_client import (
-    get_user_with_profile, 
     create_or_update_profile, 
     log_user_action,
     calculate_daily_calories,
-    get_or_create_user
 )
+from services.api.bot.utils.user_context import get_or_create_user, get_user_with_profile, invalidate_user_context
 from i18n.i18n import i18n
 from services.api.bot.utils.motivational_messages import (
     get_profile_step_message,
@@ -347,6 +346,7 @@ async def recalculate_calories(message: types.Message, telegram_user_id: int):
             await create_or_update_profile(user_data['user']['id'], {
                 'daily_calories_target': new_calories
             })
+            invalidate_user_context(telegram_user_id)
             
             await message.answer(
                 f"🔄 **Calories Recalculated!**\n\n"
@@ -397,7 +397,6 @@ async def profile_skip(message: types.Message, telegram_user_id: int):
         await message.answer(skip_text, parse_mode="Markdown", reply_markup=skip_keyboard)
         
         # Get user data for main menu
-        from common.supabase_client import get_or_create_user
         user = await get_or_create_user(telegram_user_id)
         
         # Show main menu with buttons
@@ -1129,6 +1128,7 @@ async def complete_profile_setup(callback: types.CallbackQuery, state: FSMContex
         
         # Create or update profile
         profile, was_created = await create_or_update_profile(user['id'], data)
+        invalidate_user_context(telegram_user_id)
         
         # Log profile creation/update
         await log_user_action(
@@ -5,8 +5,10 @@ Handles recipe generation from food photos using OpenAI GPT-4o
 import logging
 import re
 import os
+import asyncio
 import aiohttp
 import json
+import time
 from datetime import datetime
 from typing import Optional
 
@@ -14,10 +16,12 @@ from aiogram import types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from common.supabase_client import get_or_create_user, get_user_with_profile, log_user_action, decrement_credits
+from common.supabase_client import log_user_action, decrement_credits
+from services.api.bot.utils.user_context import get_or_create_user, get_user_with_profile, invalidate_user_context
 from common.routes import Routes
 from i18n.i18n import i18n
 from services.api.bot.utils.r2 import upload_photo_to_r2, upload_telegram_photo
+from services.api.bot.utils.ml_stream import ML_STREAMING_ENABLED, MLStreamError, ProgressiveMessage, iter_sse_events
 from services.api.bot.handlers.nutrition import sanitize_markdown_text
 
 logger = logging.getLogger(__name__)
@@ -567,7 +571,9 @@ async def process_recipe_photo(message: types.Message, state: FSMContext):
                 'profile': profile,
                 'has_profile': has_profile
             }
-            recipe_data = await generate_recipe_from_photo(photo_url, user_data_for_ml, telegram_user_id)
+            recipe_data = await generate_recipe_from_photo(
+                photo_url, user_data_for_ml, telegram_user_id, progress_msg=processing_msg
+            )
             
             if not recipe_data:
                 # Create keyboard with main menu button
@@ -601,6 +607,7 @@ async def process_recipe_photo(message: types.Message, state: FSMContext):
             
             # Decrement credits
             await decrement_credits(telegram_user_id, 1)
+            invalidate_user_context(telegram_user_id)
             
             # Log successful recipe generation
             await log_user_action(
@@ -653,8 +660,76 @@ async def process_recipe_photo(message: types.Message, state: FSMContext):
             except Exception:
                 pass  # Ignore state clearing errors
 
-async def generate_recipe_from_photo(photo_url: str, user_data: dict, telegram_user_id: int) -> dict:
-    """Generate recipe from photo using ML service"""
+def format_partial_recipe(fields: dict, user_language: str) -> str:
+    """Plain-text progress view of a streaming recipe"""
+    lines = ["👨‍🍳 Готовлю рецепт..." if user_language == 'ru' else "👨‍🍳 Writing your recipe..."]
+    if fields.get('name'):
+        lines += ["", f"📝 {fields['name']}"]
+    if fields.get('description'):
+        lines.append(f"📖 {fields['description']}")
+    ingredients = fields.get('ingredients') or []
+    if ingredients:
+        lines += ["", "🛒 Ингредиенты:" if user_language == 'ru' else "🛒 Ingredients:"]
+        lines += [f"• {ingredient}" for ingredient in ingredients]
+    instructions = fields.get('instructions') or []
+    if instructions:
+        lines += ["", "👨‍🍳 Приготовление:" if user_language == 'ru' else "👨‍🍳 Steps:"]
+        lines += [f"{i}. {step}" for i, step in enumerate(instructions, 1)]
+    return "\n".join(lines)
+
+
+async def _stream_recipe(
+    session: aiohttp.ClientSession,
+    url: str,
+    form_data: aiohttp.FormData,
+    headers: dict,
+    progress_msg: types.Message,
+    user_language: str,
+) -> Optional[dict]:
+    """
+    Stream a recipe, editing `progress_msg` as fields arrive. None means the stream
+    never started (fall back to the blocking endpoint); MLStreamError means it
+    failed after the ML service accepted it, and the recipe is not generated again.
+    """
+    progress = ProgressiveMessage(progress_msg)
+    fields: dict = {}
+    started = time.monotonic()
+    accepted = False
+    try:
+        async with session.post(url, data=form_data, headers=headers, timeout=aiohttp.ClientTimeout(total=60)) as response:
+            if response.status != 200:
+                logger.warning(f"Streaming recipe unavailable: {response.status}")
+                return None
+            accepted = True
+            async for event, payload in iter_sse_events(response.content):
+                if event == "partial":
+                    if not fields:
+                        logger.info(f"First partial recipe after {round((time.monotonic() - started) * 1000)}ms")
+                    fields.update(payload)
+                    await progress.update(format_partial_recipe(fields, user_language))
+                elif event == "result":
+                    return payload
+                elif event == "error":
+                    raise MLStreamError(f"Streaming recipe error: {payload}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if accepted:
+            raise MLStreamError(f"Streaming recipe failed: {e!r}") from e
+        logger.warning(f"Streaming recipe failed to start: {e!r}")
+        return None
+    raise MLStreamError("Streaming recipe ended without a result")
+
+
+async def generate_recipe_from_photo(
+    photo_url: str,
+    user_data: dict,
+    telegram_user_id: int,
+    progress_msg: Optional[types.Message] = None,
+) -> dict:
+    """Generate recipe from photo using ML service
+
+    With `progress_msg`, the streaming endpoint is used and the message is
+    edited with the recipe name, ingredients and steps as they are generated.
+    """
     try:
         user = user_data['user']
         profile = user_data['profile']
@@ -685,11 +760,13 @@ async def generate_recipe_from_photo(photo_url: str, user_data: dict, telegram_u
         # Call ML service for recipe generation
         ml_service_url = os.getenv("ML_SERVICE_URL", "http://ml:8001")
         
-        # Prepare form data for ML service
-        form_data = aiohttp.FormData()
-        form_data.add_field('image_url', photo_url)
-        form_data.add_field('telegram_user_id', str(telegram_user_id))
-        form_data.add_field('user_context', json.dumps(user_context))
+        def recipe_form() -> aiohttp.FormData:
+            # FormData can only be sent once; build a fresh one per request
+            form_data = aiohttp.FormData()
+            form_data.add_field('image_url', photo_url)
+            form_data.add_field('telegram_user_id', str(telegram_user_id))
+            form_data.add_field('user_context', json.dumps(user_context))
+            return form_data
         
         # Debug logging
         logger.info(f"DEBUG: Sending to ML service:")
@@ -706,9 +783,20 @@ async def generate_recipe_from_photo(photo_url: str, user_data: dict, telegram_u
             del auth_headers['Content-Type']
         
         async with aiohttp.ClientSession() as session:
+            if ML_STREAMING_ENABLED and progress_msg is not None:
+                try:
+                    result = await _stream_recipe(
+                        session, f"{ml_service_url}{Routes.ML_GENERATE_RECIPE_STREAM}",
+                        recipe_form(), auth_headers, progress_msg, user_language
+                    )
+                except MLStreamError as e:
+                    logger.error(str(e))
+                    return None
+                if result is not None:
+                    return result
             async with session.post(
                 f"{ml_service_url}{Routes.ML_GENERATE_RECIPE}",
-                data=form_data,
+                data=recipe_form(),
                 headers=auth_headers,
                 timeout=aiohttp.ClientTimeout(total=60)
             ) as response:
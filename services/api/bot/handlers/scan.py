@@ -7,8 +7,9 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from loguru import logger
 from i18n.i18n import i18n
-from common.supabase_client import get_or_create_user
+from services.api.bot.utils.user_context import get_or_create_user
 from common.db.profiles import get_user_profile
+from services.api.bot.utils.photo_stream import stream_telegram_photo
 
 ML_SERVICE_URL = os.getenv("ML_SERVICE_URL")
 # Perplexity label analysis can be slow under load; keep generous timeout after we already sent a progress message
@@ -147,11 +148,11 @@ async def process_barcode_photo(message: types.Message, state: FSMContext):
         # Use a medium-sized photo to reduce upload time per Habr best-practices
         photo = message.photo[-2] if len(message.photo) > 1 else message.photo[-1]
         photo_file = await message.bot.get_file(photo.file_id)
-        photo_bytes_io = await message.bot.download_file(photo_file.file_path)
-        photo_bytes = photo_bytes_io.read() if hasattr(photo_bytes_io, 'read') else photo_bytes_io.getvalue()
-        logger.info(f"[SCAN] Downloaded photo bytes={len(photo_bytes)}")
+        # Streamed into a spool; httpx reads the upload body from it in chunks
+        streamed_photo = await stream_telegram_photo(message.bot, photo_file.file_path, expected_size=photo_file.file_size)
+        logger.info(f"[SCAN] Downloaded photo bytes={streamed_photo.size}")
 
-        files = {"photo": ("barcode.jpg", photo_bytes, "image/jpeg")}
+        files = {"photo": ("barcode.jpg", streamed_photo.body(), "image/jpeg")}
         data = {"user_language": user_language}
         from shared.auth import get_auth_headers
         headers = get_auth_headers()
@@ -176,6 +177,8 @@ async def process_barcode_photo(message: types.Message, state: FSMContext):
                 await progress_msg.edit_text(i18n.get_text('analysis_failed', user_language), reply_markup=keyboard)
                 await state.clear()
                 return
+            finally:
+                streamed_photo.close()
             logger.info(f"[SCAN] ML responded status={resp.status_code}")
         if resp.status_code != 200:
             # Show error with navigation back to main menu
@@ -5,7 +5,6 @@ from pydantic import BaseModel, Field
 from typing import Optional, List, Any, Dict
 from fastapi.staticfiles import StaticFiles
 import asyncio
-import uuid
 from services.api.bot.bot import start_bot
 import os
 import httpx
@@ -28,8 +27,11 @@ from common.supabase_client import (
     get_recipe_by_id,
     delete_recipe,
 )
+from services.api.bot.handlers.favorites import relog_favorite_by_hash
 from services.api.bot.utils.r2 import test_r2_connection, get_photo_stats, get_user_photos
 from shared.auth import require_internal_auth, get_auth_headers
+from shared.metrics import instrument_app
+from shared.health import HealthMonitor, standard_checks
 from loguru import logger
 
 ENV = os.getenv("ENV", "development").lower()
@@ -62,14 +64,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Basic request ID middleware for observability
-@app.middleware("http")
-async def add_request_id(request: Request, call_next):
-    request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-    request.state.request_id = request_id
-    response = await call_next(request)
-    response.headers["X-Request-ID"] = request_id
-    return response
+# Request ID (trace id) propagation, latency histograms and GET /metrics
+instrument_app(app, service="api")
 
 # Mount static files directory for assets (logo, etc.)
 if os.path.exists("assets"):
@@ -82,28 +78,33 @@ else:
 ML_SERVICE_URL = os.getenv("ML_SERVICE_URL")
 PAY_SERVICE_URL = os.getenv("PAY_SERVICE_URL")
 
-@app.get("/")
-async def health():
-    """Comprehensive health check for API Bot service"""
-    from shared.health import create_comprehensive_health_response
-    
+def _health_checks():
     # Check external service dependencies
     external_services = {}
     if ML_SERVICE_URL:
         external_services["ml_service"] = f"{ML_SERVICE_URL}/"
     if PAY_SERVICE_URL:
         external_services["pay_service"] = f"{PAY_SERVICE_URL}/"
-    
-    return await create_comprehensive_health_response(
-        service_name="api",
-        check_database=True,
-        check_external_services=external_services,
-        additional_info={
-            "ml_service_configured": bool(ML_SERVICE_URL),
-            "pay_service_configured": bool(PAY_SERVICE_URL),
-            "r2_enabled": os.getenv("R2_ENABLED", "false").lower() == "true"
-        }
-    )
+    return standard_checks(check_database=True, check_external_services=external_services)
+
+health_monitor = HealthMonitor(
+    "api",
+    checks=_health_checks,
+    additional_info=lambda: {
+        "ml_service_configured": bool(ML_SERVICE_URL),
+        "pay_service_configured": bool(PAY_SERVICE_URL),
+        "r2_enabled": os.getenv("R2_ENABLED", "false").lower() == "true"
+    },
+    # Sibling services answering slower than this are reported as degraded
+    degraded_after={"ml_service": 1.0, "pay_service": 1.0},
+)
+# Background refresh, GET /health/live and GET /health/ready
+health_monitor.install(app)
+
+@app.get("/")
+async def health():
+    """Health of the API Bot service from the latest dependency snapshot"""
+    return await health_monitor.response()
 
 @app.get("/health")
 async def health_alias():
@@ -317,13 +318,27 @@ async def favorites_save(request: Request, body: FavoritesSaveRequest):
 
 @app.get("/favorites/list", response_model=FavoritesListResponse)
 @require_internal_auth
-async def favorites_list(user_id: str, limit: int = 50, search: str | None = None):
+async def favorites_list(user_id: str, limit: int = 50, search: str | None = None, offset: int = 0):
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id required")
-    items = await list_favorites(user_id, limit=limit, search=search)
+    items = await list_favorites(user_id, limit=limit, search=search, offset=offset)
     return FavoritesListResponse(success=True, items=items)  # type: ignore[arg-type]
 
 
+class FavoritesRelogRequest(BaseModel):
+    user_id: str
+    composition_hash: str
+
+@app.post("/favorites/relog", response_model=FavoriteResponse)
+@require_internal_auth
+async def favorites_relog(request: Request, body: FavoritesRelogRequest):
+    # Stored nutrition goes straight to the daily totals: no photo, no ML call
+    favorite = await relog_favorite_by_hash(body.user_id, body.composition_hash)
+    if not favorite:
+        raise HTTPException(status_code=404, detail="Favorite not found")
+    return FavoriteResponse(success=True, favorite=favorite)  # type: ignore[arg-type]
+
+
 @app.get("/favorites/{favorite_id}", response_model=FavoriteResponse)
 @require_internal_auth
 async def favorites_get(favorite_id: str, user_id: str):
@@ -380,10 +395,10 @@ async def recipes_save(request: Request, body: RecipesSaveRequest):
 
 @app.get("/recipes/list", response_model=RecipesListResponse)
 @require_internal_auth
-async def recipes_list(user_id: str, limit: int = 50, search: str | None = None):
+async def recipes_list(user_id: str, limit: int = 50, search: str | None = None, offset: int = 0):
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id required")
-    items = await list_recipes(user_id, limit=limit, search=search)
+    items = await list_recipes(user_id, limit=limit, search=search, offset=offset)
     return RecipesListResponse(success=True, items=items)  # type: ignore[arg-type]
 
 
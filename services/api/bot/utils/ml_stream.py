@@ -0,0 +1,95 @@
+"""
+Client side of the ML streaming endpoints.
+
+- `iter_sse_events` parses Server-Sent Events from an HTTP response body
+  (httpx `aiter_lines()` or aiohttp `response.content`).
+- `ProgressiveMessage` edits the bot's "processing" message as partial
+  results arrive, rate-limited to stay within Telegram's edit limits.
+- `MLStreamError` marks a stream that the ML service accepted and that then
+  failed: the model call already ran, so it is not repeated on the blocking
+  endpoint.
+"""
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Union
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from loguru import logger
+
+# Set false to use the blocking ML endpoints (e.g. against an older ML service)
+ML_STREAMING_ENABLED = os.getenv("ML_STREAMING_ENABLED", "true").lower() == "true"
+# Telegram allows roughly one edit per second per chat; leave headroom
+EDIT_MIN_INTERVAL_SEC = float(os.getenv("ML_STREAM_EDIT_INTERVAL_SEC", "1.5"))
+
+
+class MLStreamError(Exception):
+    """A stream failed after the ML service answered 200 (error event, broken connection, timeout)"""
+
+
+async def iter_sse_events(lines: AsyncIterator[Union[str, bytes]]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (event, data) pairs; `data` lines are joined and decoded as JSON."""
+    event, data_lines = "message", []
+    async for raw in lines:
+        line = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+        line = line.rstrip("\r\n")
+        if not line:
+            if data_lines:
+                try:
+                    yield event, json.loads("\n".join(data_lines))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping malformed SSE event '{event}'")
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+    if data_lines:
+        try:
+            yield event, json.loads("\n".join(data_lines))
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping malformed SSE event '{event}'")
+
+
+class ProgressiveMessage:
+    """
+    Rate-limited editor for a single bot message.
+
+    `update()` drops intermediate texts that arrive faster than the edit
+    interval (the next update carries the newer text anyway); identical texts
+    are never re-sent. Edit failures are logged and never raised, so progress
+    display can not break the handler.
+    """
+
+    def __init__(self, message: types.Message, min_interval: float = EDIT_MIN_INTERVAL_SEC):
+        self.message = message
+        self.min_interval = min_interval
+        self._last_text: Optional[str] = None
+        self._next_edit_at = 0.0
+        self.edits = 0
+
+    async def update(self, text: str, **kwargs) -> bool:
+        if not text or text == self._last_text or time.monotonic() < self._next_edit_at:
+            return False
+        return await self._edit(text, **kwargs)
+
+    async def _edit(self, text: str, **kwargs) -> bool:
+        try:
+            await self.message.edit_text(text, **kwargs)
+        except TelegramRetryAfter as e:
+            logger.info(f"Progress edit throttled by Telegram for {e.retry_after}s")
+            self._next_edit_at = time.monotonic() + e.retry_after
+            return False
+        except TelegramBadRequest as e:
+            # "message is not modified" and similar are harmless for progress updates
+            logger.debug(f"Progress edit skipped: {e}")
+            return False
+        except Exception as e:
+            logger.warning(f"Progress edit failed: {e}")
+            return False
+        self._last_text = text
+        self._next_edit_at = time.monotonic() + self.min_interval
+        self.edits += 1
+        return True
+
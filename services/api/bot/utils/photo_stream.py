@@ -0,0 +1,404 @@
+"""
+Streaming photo pipeline: Telegram -> hash + R2 + ML service without whole-photo copies
+
+A photo is read from Telegram in chunks. Every chunk is hashed (sha256 keys the
+analysis cache, md5 goes into the R2 metadata) and appended to a `PhotoSpool`,
+the only copy of the photo a request keeps. With `upload=True` the same chunks
+are teed to R2 while the download runs: every full part goes out as a multipart
+upload part, one part in flight per photo; a photo smaller than one part is a
+single PUT streamed from the spool once the download is done. Part bytes are
+read from the spool on the upload thread, so parts waiting for a thread hold
+no memory.
+
+The ML service gets `StreamedPhoto.body()` as the multipart file: httpx reads it
+in chunks instead of holding another copy of the image.
+
+Memory: spools draw their in-memory share from one process-wide budget; a spool
+without a share (or that outgrows it) spills to a temp file, so buffered photo
+memory stays bounded however many photos are in flight: spool budget plus one
+part per R2 worker thread.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import weakref
+from typing import AsyncIterator, Dict, List, Optional
+
+import aiofiles
+from loguru import logger
+
+from services.api.bot.utils import r2
+
+# Read size for the Telegram download (aiogram's default)
+PHOTO_STREAM_CHUNK_SIZE = int(os.getenv("PHOTO_STREAM_CHUNK_SIZE", str(64 * 1024)))
+# In-memory share of one spool; Telegram photos are usually a few hundred KB
+PHOTO_SPOOL_MEMORY_BYTES = int(os.getenv("PHOTO_SPOOL_MEMORY_BYTES", str(1024 * 1024)))
+# Photo bytes all spools of the process may keep in memory together
+PHOTO_SPOOL_BUDGET_BYTES = int(os.getenv("PHOTO_SPOOL_BUDGET_BYTES", str(32 * 1024 * 1024)))
+# Multipart part size; S3 (and R2) need at least 5 MiB for every part but the last
+R2_PART_SIZE = int(os.getenv("R2_PART_SIZE", str(8 * 1024 * 1024)))
+PHOTO_MAX_BYTES = 10 * 1024 * 1024
+TELEGRAM_DOWNLOAD_TIMEOUT_SECONDS = 30
+
+
+class PhotoStreamError(Exception):
+    """The downloaded file is not an acceptable photo"""
+
+
+class PhotoTooLargeError(PhotoStreamError):
+    """The file is over the size limit (only known while streaming for files without a size)"""
+
+
+class SpoolBudget:
+    """Process-wide cap on photo bytes held in memory by spools (event loop only, no lock)"""
+
+    def __init__(self, limit: int = PHOTO_SPOOL_BUDGET_BYTES):
+        self.limit = limit
+        self.in_use = 0
+
+    def reserve(self, size: int) -> int:
+        """Grant up to ``size`` bytes; 0 when the budget is used up"""
+        granted = max(0, min(size, self.limit - self.in_use))
+        self.in_use += granted
+        return granted
+
+    def release(self, size: int):
+        self.in_use -= size
+
+
+spool_budget = SpoolBudget()
+
+
+class PhotoSpool:
+    """
+    Append-only photo buffer: in memory up to the share granted by the budget,
+    a temp file beyond it. Reads are positional and locked against writes, so
+    upload threads read earlier ranges while the download keeps appending.
+    """
+
+    def __init__(
+        self,
+        expected_size: Optional[int] = None,
+        memory_limit: int = PHOTO_SPOOL_MEMORY_BYTES,
+        budget: Optional[SpoolBudget] = None,
+    ):
+        budget = budget or spool_budget
+        wanted = min(memory_limit, expected_size) if expected_size else memory_limit
+        self.memory_share = budget.reserve(wanted)
+        if self.memory_share:
+            self._file = tempfile.SpooledTemporaryFile(max_size=self.memory_share)
+        else:
+            self._file = tempfile.TemporaryFile()
+        self.size = 0
+        self._lock = threading.Lock()
+        # Gives the share back even if a caller forgets close()
+        self._release = weakref.finalize(self, budget.release, self.memory_share)
+
+    @property
+    def on_disk(self) -> bool:
+        return not isinstance(self._file, tempfile.SpooledTemporaryFile) or self._file._rolled
+
+    def write(self, chunk: bytes):
+        with self._lock:
+            self._file.seek(self.size)
+            self._file.write(chunk)
+            self.size += len(chunk)
+
+    def read_range(self, offset: int, size: int) -> bytes:
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(size)
+
+    def getvalue(self) -> bytes:
+        """The whole photo as bytes (for callers that still need a copy)"""
+        return self.read_range(0, self.size)
+
+    def reader(self) -> "SpoolReader":
+        return SpoolReader(self)
+
+    def close(self):
+        self._file.close()
+        self._release()
+
+
+class SpoolReader(io.RawIOBase):
+    """
+    Read-only file view of a spool for httpx and boto3 bodies, with its own
+    position. There is no ``fileno()``: asking a SpooledTemporaryFile for it
+    would move it to disk.
+    """
+
+    def __init__(self, spool: PhotoSpool):
+        self._spool = spool
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._spool.size}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self._spool.size - self._position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = self._spool.read_range(self._position, size) if size > 0 else b""
+        self._position += len(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def __len__(self) -> int:
+        return self._spool.size
+
+
+class StreamedPhoto:
+    """A downloaded photo: its spool, hashes and (with upload) R2 key and signed URL"""
+
+    def __init__(self, spool: PhotoSpool, sha256: str, md5: str, content_type: str):
+        self.spool = spool
+        self.sha256 = sha256
+        self.md5 = md5
+        self.content_type = content_type
+        self.r2_key: Optional[str] = None
+        self.url: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return self.spool.size
+
+    def body(self) -> SpoolReader:
+        """File object for an httpx ``files=`` entry; httpx rewinds it before every send"""
+        return self.spool.reader()
+
+    def close(self):
+        self.spool.close()
+
+
+class R2StreamUpload:
+    """
+    Upload of a spool that is still being written: `feed()` sends every full
+    part beyond the last one sent (waiting for the part in flight first, which
+    paces the download to R2), `complete()` sends the rest. A spool that never
+    reaches one part is sent as a single PUT.
+
+    Multipart uploads are created before the whole photo has been hashed, so
+    only single PUTs carry ``file_hash`` in their metadata.
+    """
+
+    def __init__(
+        self,
+        spool: PhotoSpool,
+        user_id: str,
+        action_type: str = "photo_analysis",
+        content_type: str = "image/jpeg",
+        part_size: int = R2_PART_SIZE,
+        client=None,
+        bucket: Optional[str] = None,
+    ):
+        self.spool = spool
+        self.user_id = user_id
+        self.content_type = content_type
+        self.part_size = part_size
+        self.client = client or r2.get_r2_client()
+        self.bucket = bucket or r2.R2_BUCKET_NAME
+        extension = "jpg" if "jpeg" in content_type else "png"
+        self.key = r2.generate_photo_filename(user_id, extension, action_type)
+        self.upload_id: Optional[str] = None
+        self.parts: List[Dict] = []
+        self._sent = 0
+        self._in_flight: Optional[asyncio.Task] = None
+
+    def _metadata(self, file_hash: Optional[str] = None) -> Dict[str, str]:
+        metadata = {'user_id': self.user_id, 'upload_source': 'telegram_bot'}
+        if file_hash:
+            metadata['file_hash'] = file_hash
+        return metadata
+
+    async def feed(self):
+        while self.spool.size - self._sent >= self.part_size:
+            await self._send_part(self.part_size)
+
+    async def _send_part(self, size: int):
+        if self._in_flight is not None:
+            await self._in_flight
+        if self.upload_id is None:
+            created = await asyncio.to_thread(
+                self.client.create_multipart_upload,
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type, Metadata=self._metadata(),
+            )
+            self.upload_id = created['UploadId']
+        number, offset = len(self.parts) + 1, self._sent
+        self._sent += size
+        # Reserve the slot so part numbers stay in order
+        self.parts.append({})
+        self._in_flight = asyncio.create_task(asyncio.to_thread(self._upload_part, number, offset, size))
+
+    def _upload_part(self, number: int, offset: int, size: int):
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number,
+            Body=self.spool.read_range(offset, size),
+        )
+        self.parts[number - 1] = {'ETag': response['ETag'], 'PartNumber': number}
+
+    async def complete(self, file_hash: Optional[str] = None) -> str:
+        """Send what is left, finish the upload and return a signed URL (24 hours)"""
+        if self.upload_id is None:
+            await asyncio.to_thread(
+                self.client.put_object,
+                Bucket=self.bucket, Key=self.key, Body=self.spool.reader(), ContentLength=self.spool.size,
+                ContentType=self.content_type, Metadata=self._metadata(file_hash),
+            )
+        else:
+            if self.spool.size > self._sent:
+                await self._send_part(self.spool.size - self._sent)
+            await self._in_flight
+            await asyncio.to_thread(
+                self.client.complete_multipart_upload,
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={'Parts': self.parts},
+            )
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self.key},
+            ExpiresIn=86400,
+        )
+
+    async def abort(self):
+        if self._in_flight is not None:
+            try:
+                await self._in_flight
+            except Exception:
+                pass
+        if self.upload_id is not None:
+            try:
+                await asyncio.to_thread(
+                    self.client.abort_multipart_upload, Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                )
+            except Exception as e:
+                logger.warning(f"Could not abort R2 multipart upload {self.key}: {e}")
+
+
+async def iter_telegram_file(
+    bot,
+    file_path: str,
+    chunk_size: int = PHOTO_STREAM_CHUNK_SIZE,
+    timeout: int = TELEGRAM_DOWNLOAD_TIMEOUT_SECONDS,
+) -> AsyncIterator[bytes]:
+    """Chunks of a Telegram file, the way `bot.download_file` reads them but without collecting them"""
+    if bot.session.api.is_local:
+        async with aiofiles.open(bot.session.api.wrap_local_file.to_local(file_path), "rb") as f:
+            while chunk := await f.read(chunk_size):
+                yield chunk
+        return
+    url = bot.session.api.file_url(bot.token, file_path)
+    async for chunk in bot.session.stream_content(
+        url=url, timeout=timeout, chunk_size=chunk_size, raise_for_status=True,
+    ):
+        yield chunk
+
+
+async def stream_telegram_photo(
+    bot,
+    file_path: str,
+    expected_size: Optional[int] = None,
+    user_id: Optional[str] = None,
+    action_type: str = "photo_analysis",
+    content_type: str = "image/jpeg",
+    upload: bool = False,
+    max_bytes: int = PHOTO_MAX_BYTES,
+    part_size: int = R2_PART_SIZE,
+) -> StreamedPhoto:
+    """
+    Download a Telegram photo into a spool, hashing it on the way and, with
+    ``upload``, teeing it to R2. R2 failures are logged and leave ``url`` None
+    (the download carries on); a file that is too large (PhotoTooLargeError)
+    or not an image raises PhotoStreamError. The caller closes the returned photo.
+    """
+    spool = PhotoSpool(expected_size)
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    uploader: Optional[R2StreamUpload] = None
+    if upload and r2.R2_ENABLED:
+        try:
+            uploader = R2StreamUpload(spool, user_id, action_type, content_type, part_size=part_size)
+        except Exception as e:
+            logger.error(f"R2 upload setup failed for user {user_id}: {e}")
+    elif upload:
+        logger.warning("R2 not enabled, skipping photo upload")
+
+    try:
+        async for chunk in iter_telegram_file(bot, file_path):
+            if spool.size + len(chunk) > max_bytes:
+                raise PhotoTooLargeError(f"File too large: over {max_bytes / (1024 * 1024):.0f}MB")
+            sha256.update(chunk)
+            md5.update(chunk)
+            spool.write(chunk)
+            if uploader is not None:
+                try:
+                    await uploader.feed()
+                except Exception as e:
+                    logger.error(f"R2 multipart upload failed for user {user_id}: {e}")
+                    await uploader.abort()
+                    uploader = None
+        if r2.detect_image_format(spool.read_range(0, 12)) is None:
+            raise PhotoStreamError("File is not a valid image format")
+    except BaseException:
+        if uploader is not None:
+            await uploader.abort()
+        spool.close()
+        raise
+
+    photo = StreamedPhoto(spool, sha256.hexdigest(), md5.hexdigest(), content_type)
+    if uploader is not None:
+        try:
+            photo.url = await uploader.complete(photo.md5)
+            photo.r2_key = uploader.key
+            logger.info(f"Photo streamed to R2: {uploader.key} (size: {photo.size} bytes, parts: {len(uploader.parts) or 1})")
+        except Exception as e:
+            logger.error(f"R2 upload failed for user {user_id}: {e}")
+            await uploader.abort()
+    return photo
+
+
+async def upload_streamed_photo(
+    photo: StreamedPhoto,
+    user_id: str,
+    action_type: str = "photo_analysis",
+    part_size: int = R2_PART_SIZE,
+) -> Optional[str]:
+    """
+    Upload an already downloaded photo from its spool (e.g. only after a cache
+    miss). Returns the signed URL, or None when R2 is off or the upload failed.
+    """
+    if photo.url:
+        return photo.url
+    if not r2.R2_ENABLED:
+        logger.warning("R2 not enabled, skipping photo upload")
+        return None
+    uploader = None
+    try:
+        uploader = R2StreamUpload(photo.spool, user_id, action_type, photo.content_type, part_size=part_size)
+        await uploader.feed()
+        photo.url = await uploader.complete(photo.md5)
+        photo.r2_key = uploader.key
+        logger.info(f"Photo uploaded from spool: {uploader.key} (size: {photo.size} bytes)")
+        return photo.url
+    except Exception as e:
+        logger.error(f"R2 upload failed for user {user_id}: {e}")
+        if uploader is not None:
+            await uploader.abort()
+        return None
@@ -13,6 +13,7 @@ import hashlib
 import mimetypes
 from typing import BinaryIO, Optional
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
 from loguru import logger
 
@@ -21,6 +22,8 @@ R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID")
 R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID") 
 R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
 R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
+# Optional S3-compatible endpoint override (e.g. a local stand-in for load tests)
+R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
 
 # Validate R2 configuration
 if not all([R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME]):
@@ -30,19 +33,36 @@ else:
     R2_ENABLED = True
     logger.info(f"R2 configured: bucket={R2_BUCKET_NAME}")
 
+# Concurrent R2 requests per process (uploads run on worker threads)
+R2_MAX_POOL_CONNECTIONS = int(os.getenv("R2_MAX_POOL_CONNECTIONS", "32"))
+
+_r2_client = None
+
 # Create R2 client (compatible with S3 API)
 def get_r2_client():
-    """Create and return R2 client using S3-compatible API"""
+    """
+    Return the process-wide R2 client using S3-compatible API (boto3 clients
+    are thread-safe; one client means one connection pool for all uploads)
+    """
+    global _r2_client
     if not R2_ENABLED:
         raise Exception("R2 not configured")
     
-    return boto3.client(
-        's3',
-        endpoint_url=f'https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com',
-        aws_access_key_id=R2_ACCESS_KEY_ID,
-        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        region_name='auto'
-    )
+    if _r2_client is None:
+        _r2_client = boto3.client(
+            's3',
+            endpoint_url=R2_ENDPOINT_URL or f'https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com',
+            aws_access_key_id=R2_ACCESS_KEY_ID,
+            aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+            region_name='auto',
+            config=Config(
+                max_pool_connections=R2_MAX_POOL_CONNECTIONS,
+                # R2 does not support every checksum botocore now sends by default
+                request_checksum_calculation='when_required',
+                response_checksum_validation='when_required',
+            ),
+        )
+    return _r2_client
 
 def generate_photo_filename(user_id: str, file_extension: str = "jpg", action_type: str = "photo_analysis") -> str:
     """
@@ -71,6 +91,27 @@ def generate_photo_filename(user_id: str, file_extension: str = "jpg", action_ty
     logger.info(f"Generated photo filename: {filename}")
     return filename
 
+# Common image file signatures
+IMAGE_SIGNATURES = {
+    b'\xff\xd8\xff': 'jpg',
+    b'\x89\x50\x4e\x47\x0d\x0a\x1a\x0a': 'png',
+    b'\x47\x49\x46\x38': 'gif',
+    b'\x42\x4d': 'bmp',
+    b'\x52\x49\x46\x46': 'webp'  # RIFF for WebP
+}
+
+def detect_image_format(file_header: bytes) -> Optional[str]:
+    """
+    Detect image format from the first bytes of a file (12 are enough)
+    
+    Returns:
+        Format name (jpg, png, gif, bmp, webp) or None if not an image
+    """
+    for signature, format_name in IMAGE_SIGNATURES.items():
+        if file_header.startswith(signature):
+            return format_name
+    return None
+
 def validate_photo_file(file_data: bytes, max_size_mb: int = 10) -> tuple[bool, str]:
     """
     Validate photo file data
@@ -91,26 +132,8 @@ def validate_photo_file(file_data: bytes, max_size_mb: int = 10) -> tuple[bool,
     if not file_data:
         return False, "Empty file"
     
-    # Check for common image file signatures
-    image_signatures = {
-        b'\xff\xd8\xff': 'jpg',
-        b'\x89\x50\x4e\x47\x0d\x0a\x1a\x0a': 'png',
-        b'\x47\x49\x46\x38': 'gif',
-        b'\x42\x4d': 'bmp',
-        b'\x52\x49\x46\x46': 'webp'  # RIFF for WebP
-    }
-    
-    file_header = file_data[:12]  # Read first 12 bytes
-    is_image = False
-    detected_format = None
-    
-    for signature, format_name in image_signatures.items():
-        if file_header.startswith(signature):
-            is_image = True
-            detected_format = format_name
-            break
-    
-    if not is_image:
+    detected_format = detect_image_format(file_data[:12])
+    if detected_format is None:
         return False, "File is not a valid image format"
     
     logger.info(f"File validation passed: {detected_format}, {file_size_mb:.1f}MB")
@@ -210,13 +233,14 @@ async def upload_telegram_photo(bot, photo, user_id: str, action_type: str = "ph
         file = await bot.get_file(photo.file_id)
         logger.info(f"Got Telegram file for user {user_id}: {file.file_path}, size: {file.file_size}")
         
-        # Download photo data
-        photo_io = await bot.download_file(file.file_path)
-        photo_data = photo_io.getvalue()  # Convert BytesIO to bytes
-        logger.info(f"Downloaded photo data for user {user_id}, size: {len(photo_data)} bytes")
-        
-        # Upload to R2
-        url = await upload_photo_to_r2(photo_data, user_id, "image/jpeg", action_type)
+        # Stream the photo from Telegram straight into R2 (no whole-photo copies)
+        from services.api.bot.utils.photo_stream import stream_telegram_photo
+        streamed = await stream_telegram_photo(
+            bot, file.file_path, expected_size=file.file_size, user_id=user_id, action_type=action_type, upload=True
+        )
+        streamed.close()
+        url = streamed.url
+        logger.info(f"Streamed photo for user {user_id}, size: {streamed.size} bytes")
         
         if url:
             logger.info(f"✅ R2 upload SUCCESS for user {user_id}: {url}")
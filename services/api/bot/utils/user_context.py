@@ -0,0 +1,137 @@
+"""
+Per-update user context for bot handlers.
+
+`UserContextMiddleware` (outer middleware on updates) opens a `UserContext` for
+the Telegram user of each update. The user row, profile and language are
+loaded on first use, in one round-trip, and shared by everything that runs for
+that update: the handler, handlers it dispatches to, and their error paths.
+
+Handlers keep calling `get_or_create_user` / `get_user_with_profile` - the
+versions in this module answer from the current update's context and only go
+to the database outside an update or for another user. After writing the
+user or profile, call `invalidate_user_context()` (next read reloads) or
+`await refresh_user_context()` (reload now).
+"""
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from loguru import logger
+
+from common import supabase_client as db
+from i18n.i18n import i18n
+
+_current: ContextVar[Optional["UserContext"]] = ContextVar("bot_user_context", default=None)
+
+
+class UserContext:
+    """User, profile and language of one Telegram user, loaded at most once per update"""
+
+    def __init__(self, telegram_id: int, language_code: Optional[str] = None):
+        self.telegram_id = telegram_id
+        self.language_code = language_code
+        self._data: Optional[Dict[str, Any]] = None
+        self._lock = asyncio.Lock()
+        self.loads = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._data is not None
+
+    async def load(self, language: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """``{'user', 'profile', 'has_profile'}`` like get_user_with_profile"""
+        if self._data is not None:
+            return self._data
+        async with self._lock:
+            if self._data is None:
+                self.loads += 1
+                self._data = await db.load_user_with_profile(self.telegram_id, language)
+                user = (self._data or {}).get('user') or {}
+                if user.get('language'):
+                    i18n.remember_language(self.telegram_id, user['language'])
+        return self._data
+
+    async def user(self, language: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        data = await self.load(language)
+        return data['user'] if data else None
+
+    async def profile(self) -> Optional[Dict[str, Any]]:
+        data = await self.load()
+        return data['profile'] if data else None
+
+    async def language(self) -> str:
+        user = await self.user()
+        if user and user.get('language'):
+            return user['language']
+        return i18n.resolve_language(self.telegram_id, self.language_code)
+
+    def invalidate(self):
+        """Forget the loaded data; the next read goes to the database"""
+        self._data = None
+
+    async def refresh(self) -> Optional[Dict[str, Any]]:
+        self.invalidate()
+        return await self.load()
+
+
+def current_user_context(telegram_id: Optional[int] = None) -> Optional[UserContext]:
+    """The context of the running update (only if it belongs to ``telegram_id`` when given)"""
+    context = _current.get()
+    if context is None or (telegram_id is not None and context.telegram_id != telegram_id):
+        return None
+    return context
+
+
+async def get_or_create_user(telegram_id: int, language: Optional[str] = None):
+    """common.db get_or_create_user, answered from the update's context when possible"""
+    context = current_user_context(telegram_id)
+    if context is None:
+        return await db.get_or_create_user(telegram_id, language)
+    return await context.user(language)
+
+
+async def get_user_with_profile(telegram_id: int):
+    """common.db get_user_with_profile, answered from the update's context when possible"""
+    context = current_user_context(telegram_id)
+    if context is None:
+        return await db.get_user_with_profile(telegram_id)
+    return await context.load()
+
+
+def invalidate_user_context(telegram_id: Optional[int] = None):
+    """Call after writing the user or profile so later reads in this update see the change"""
+    context = current_user_context(telegram_id)
+    if context is not None:
+        context.invalidate()
+
+
+async def refresh_user_context(telegram_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    context = current_user_context(telegram_id)
+    if context is None:
+        return None
+    return await context.refresh()
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Opens a UserContext for the user of every update and puts it in handler data as ``user_context``"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is None or from_user.is_bot:
+            return await handler(event, data)
+        context = UserContext(from_user.id, from_user.language_code)
+        data["user_context"] = context
+        token = _current.set(context)
+        try:
+            return await handler(event, data)
+        finally:
+            _current.reset(token)
+            if context.loads > 1:
+                logger.debug(f"User {from_user.id} loaded {context.loads} times in one update")
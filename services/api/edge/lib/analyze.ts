@@ -0,0 +1,97 @@
+import type { EdgeEnv, ExecutionContextLike } from './env';
+import { getCachedResult, putCachedResult, resultCacheKey } from './cache';
+import { imageForModel, sha256Hex } from './image';
+import { analyzePhotoWithOpenAI, openAIModel } from './openai';
+import { handleR2Upload, photoKey, publicPhotoUrl } from './r2';
+import { decrementCreditsAndLog, fetchCredits } from './supabase';
+
+export type AnalyzeOutcome = {
+  status: 200 | 402 | 404;
+  body: Record<string, unknown>;
+  // Stage durations (ms) for the Server-Timing header
+  timings: Record<string, number>;
+};
+
+const CHARGE_ERRORS: Record<string, [402 | 404, string]> = {
+  insufficient_credits: [402, 'Insufficient credits'],
+  user_not_found: [404, 'User not found'],
+};
+
+/**
+ * Analyze one photo at the edge.
+ *
+ * A user resending a photo (same bytes, same model) is answered from their
+ * result cache without a new charge, like cache hits in the bot. Otherwise
+ * users without credits are turned away before the model call; the photo is
+ * written to R2 while the model analyzes the inline, downscaled copy, then one
+ * RPC charges the credit and logs the analysis. Results are cached only after
+ * a successful charge.
+ */
+export async function analyzeOnEdge(
+  env: EdgeEnv,
+  ctx: ExecutionContextLike,
+  photo: Blob,
+  telegramId: string,
+): Promise<AnalyzeOutcome> {
+  const timings: Record<string, number> = {};
+  const timed = async <T>(name: string, work: Promise<T>): Promise<T> => {
+    const started = Date.now();
+    try {
+      return await work;
+    } finally {
+      timings[name] = Date.now() - started;
+    }
+  };
+
+  const bytes = await photo.arrayBuffer();
+  const contentType = photo.type || 'image/jpeg';
+  const hash = await sha256Hex(bytes);
+  const model = openAIModel(env);
+  const cacheKey = resultCacheKey(model, telegramId, hash);
+
+  // Looked up alongside the cache; only needed on a miss
+  const credits = timed('credits', fetchCredits(env, telegramId));
+  credits.catch(() => undefined);
+  const cached = await timed('cache', getCachedResult(env, cacheKey));
+  if (cached) {
+    return { status: 200, body: { kbzhu: cached, cached: true }, timings };
+  }
+  const remaining = await credits;
+  if (remaining === null || remaining <= 0) {
+    const error = CHARGE_ERRORS[remaining === null ? 'user_not_found' : 'insufficient_credits'];
+    return { status: error[0], body: { error: error[1] }, timings };
+  }
+
+  const key = photoKey(hash);
+  const upload = timed('r2', handleR2Upload(env, bytes, key, contentType));
+  // Settled below; keeps a failed write from surfacing as an unhandled rejection meanwhile
+  upload.catch(() => undefined);
+
+  const image = await timed('downscale', imageForModel(env, bytes, contentType));
+  const kbzhu = await timed('model', analyzePhotoWithOpenAI(env, image.bytes, image.contentType));
+
+  const [charge, stored] = await Promise.allSettled([
+    timed('charge', decrementCreditsAndLog(env, telegramId, publicPhotoUrl(env, key), kbzhu, model)),
+    upload,
+  ]);
+  if (stored.status === 'rejected') {
+    // The analysis is already paid for; a missing photo only affects the stored URL
+    console.error('R2 photo upload failed:', stored.reason);
+  }
+  if (charge.status === 'rejected') throw charge.reason;
+
+  const error = CHARGE_ERRORS[charge.value.result];
+  if (error) {
+    return { status: error[0], body: { error: error[1] }, timings };
+  }
+  ctx.waitUntil(putCachedResult(env, cacheKey, kbzhu));
+  return {
+    status: 200,
+    body: { kbzhu, cached: false, credits_remaining: charge.value.credits_remaining },
+    timings,
+  };
+}
+
+export function serverTiming(timings: Record<string, number>): string {
+  return Object.entries(timings).map(([name, ms]) => `${name};dur=${ms}`).join(', ');
+}
@@ -0,0 +1,50 @@
+import type { EdgeEnv } from './env';
+import type { KBZHU } from './openai';
+
+// Same 14 days as the bot's Redis analysis cache
+export const RESULT_TTL_SECONDS = 14 * 24 * 3600;
+// Bump when the prompt or the result shape changes
+const RESULT_CACHE_VERSION = 'v2';
+
+// Per user, like the bot's cache: a hit is the same user resending a photo they
+// already paid for, never a free analysis of someone else's photo
+export function resultCacheKey(model: string, telegramId: string, hash: string): string {
+  return `analysis:${RESULT_CACHE_VERSION}:${model}:${telegramId}:${hash}`;
+}
+
+type CachedResult = { kbzhu: KBZHU; cached_at: number };
+
+// Cache failures are misses: the request falls through to the model
+export async function getCachedResult(env: EdgeEnv, key: string): Promise<KBZHU | null> {
+  try {
+    let raw: string | null = null;
+    if (env.RESULT_CACHE) {
+      raw = await env.RESULT_CACHE.get(key);
+    } else {
+      const object = await env.R2_BUCKET.get(`results/${key}.json`);
+      raw = object ? await object.text() : null;
+    }
+    if (!raw) return null;
+    const entry = JSON.parse(raw) as CachedResult;
+    // R2 has no per-object TTL; expire on read
+    if (Date.now() - entry.cached_at > RESULT_TTL_SECONDS * 1000) return null;
+    return entry.kbzhu;
+  } catch (err) {
+    console.warn('Result cache read failed:', err);
+    return null;
+  }
+}
+
+export async function putCachedResult(env: EdgeEnv, key: string, kbzhu: KBZHU): Promise<void> {
+  const entry: CachedResult = { kbzhu, cached_at: Date.now() };
+  const value = JSON.stringify(entry);
+  try {
+    if (env.RESULT_CACHE) {
+      await env.RESULT_CACHE.put(key, value, { expirationTtl: RESULT_TTL_SECONDS });
+    } else {
+      await env.R2_BUCKET.put(`results/${key}.json`, value, { httpMetadata: { contentType: 'application/json' } });
+    }
+  } catch (err) {
+    console.warn('Result cache write failed:', err);
+  }
+}
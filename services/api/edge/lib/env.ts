@@ -0,0 +1,38 @@
+// Worker bindings (wrangler.toml). Only the members the edge path uses are declared,
+// so local runs can pass plain objects in their place.
+
+export interface R2BucketLike {
+  put(key: string, value: ArrayBuffer | string, options?: { httpMetadata?: { contentType?: string } }): Promise<unknown>;
+  get(key: string): Promise<{ text(): Promise<string> } | null>;
+}
+
+export interface KVNamespaceLike {
+  get(key: string): Promise<string | null>;
+  put(key: string, value: string, options?: { expirationTtl?: number }): Promise<void>;
+}
+
+// Cloudflare Images binding: env.IMAGES.input(stream).transform(...).output(...)
+export interface ImagesBindingLike {
+  input(stream: ReadableStream): {
+    transform(options: Record<string, unknown>): {
+      output(options: { format: string; quality?: number }): Promise<{ response(): Response }>;
+    };
+  };
+}
+
+export interface EdgeEnv {
+  R2_BUCKET: R2BucketLike;
+  // Result cache; without it cached results live next to the photos in R2
+  RESULT_CACHE?: KVNamespaceLike;
+  // Downscaling; without it the photo is sent to the model as uploaded
+  IMAGES?: ImagesBindingLike;
+  OPENAI_API_KEY: string;
+  OPENAI_MODEL?: string;
+  SUPABASE_URL: string;
+  SUPABASE_SERVICE_KEY: string;
+  BASE_URL?: string;
+}
+
+export interface ExecutionContextLike {
+  waitUntil(promise: Promise<unknown>): void;
+}
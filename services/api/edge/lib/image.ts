@@ -0,0 +1,37 @@
+import type { EdgeEnv } from './env';
+
+// Longest side sent to the model; low-detail vision input is 512px anyway
+export const MODEL_IMAGE_MAX_SIDE = 1024;
+
+export async function sha256Hex(bytes: ArrayBuffer): Promise<string> {
+  const digest = await crypto.subtle.digest('SHA-256', bytes);
+  return [...new Uint8Array(digest)].map((b) => b.toString(16).padStart(2, '0')).join('');
+}
+
+export function toBase64(bytes: ArrayBuffer): string {
+  const view = new Uint8Array(bytes);
+  let binary = '';
+  // Chunked: String.fromCharCode(...view) overflows the stack on large photos
+  for (let i = 0; i < view.length; i += 0x8000) {
+    binary += String.fromCharCode(...view.subarray(i, i + 0x8000));
+  }
+  return btoa(binary);
+}
+
+// Downscaled JPEG for the model when the Images binding is available, else the original bytes
+export async function imageForModel(
+  env: EdgeEnv,
+  bytes: ArrayBuffer,
+  contentType: string,
+): Promise<{ bytes: ArrayBuffer; contentType: string }> {
+  if (!env.IMAGES) return { bytes, contentType };
+  try {
+    const result = await env.IMAGES.input(new Blob([bytes]).stream())
+      .transform({ width: MODEL_IMAGE_MAX_SIDE, height: MODEL_IMAGE_MAX_SIDE, fit: 'scale-down' })
+      .output({ format: 'image/jpeg', quality: 80 });
+    return { bytes: await result.response().arrayBuffer(), contentType: 'image/jpeg' };
+  } catch (err) {
+    console.warn('Image downscale failed, sending original:', err);
+    return { bytes, contentType };
+  }
+}
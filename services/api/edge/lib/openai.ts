@@ -1,16 +1,43 @@
-// Use globalThis for Worker environment variable compatibility
-export async function analyzePhotoWithOpenAI(signedUrl: string): Promise<{calories: number, protein: number, fats: number, carbs: number}> {
-  // @ts-ignore: OPENAI_API_KEY binding is available in Worker environment
-  const apiKey = (globalThis as any).OPENAI_API_KEY;
-  if (!apiKey) throw new Error('OPENAI_API_KEY not set');
+import type { EdgeEnv } from './env';
+import { toBase64 } from './image';
 
-  const res = await fetch('https://api.openai.com/v1/vision/analyze', {
+export type KBZHU = { calories: number, protein: number, fats: number, carbs: number };
+
+export const DEFAULT_OPENAI_MODEL = 'gpt-4o-mini';
+
+const SYSTEM_PROMPT =
+  'You estimate the nutrition of the food in a photo. Reply with JSON only: ' +
+  '{"calories": number, "protein": number, "fats": number, "carbs": number} ' +
+  'for the whole visible portion (kcal and grams).';
+
+export function openAIModel(env: EdgeEnv): string {
+  return env.OPENAI_MODEL || DEFAULT_OPENAI_MODEL;
+}
+
+// The image goes inline as a data URL, so the model does not download it from R2
+export async function analyzePhotoWithOpenAI(env: EdgeEnv, image: ArrayBuffer, contentType: string): Promise<KBZHU> {
+  if (!env.OPENAI_API_KEY) throw new Error('OPENAI_API_KEY not set');
+
+  const res = await fetch('https://api.openai.com/v1/chat/completions', {
     method: 'POST',
     headers: {
-      'Authorization': `Bearer ${apiKey}`,
+      'Authorization': `Bearer ${env.OPENAI_API_KEY}`,
       'Content-Type': 'application/json'
     },
-    body: JSON.stringify({ image_url: signedUrl })
+    body: JSON.stringify({
+      model: openAIModel(env),
+      response_format: { type: 'json_object' },
+      max_tokens: 100,
+      messages: [
+        { role: 'system', content: SYSTEM_PROMPT },
+        {
+          role: 'user',
+          content: [
+            { type: 'image_url', image_url: { url: `data:${contentType};base64,${toBase64(image)}`, detail: 'low' } },
+          ],
+        },
+      ],
+    }),
   });
 
   if (!res.ok) {
@@ -18,8 +45,13 @@ export async function analyzePhotoWithOpenAI(signedUrl: string): Promise<{calori
     throw new Error(`OpenAI API error: ${res.status} ${text}`);
   }
 
-  const data = await res.json();
-  // Assume OpenAI returns { kbzhu: { calories, protein, fats, carbs } }
-  if (!data.kbzhu) throw new Error('No KBZHU in OpenAI response');
-  return data.kbzhu;
-} 
\ No newline at end of file
+  const data: any = await res.json();
+  const kbzhu = JSON.parse(data?.choices?.[0]?.message?.content ?? 'null');
+  if (!kbzhu || typeof kbzhu.calories !== 'number') throw new Error('No KBZHU in OpenAI response');
+  return {
+    calories: kbzhu.calories,
+    protein: Number(kbzhu.protein) || 0,
+    fats: Number(kbzhu.fats) || 0,
+    carbs: Number(kbzhu.carbs) || 0,
+  };
+}
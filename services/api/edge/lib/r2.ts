@@ -1,18 +1,16 @@
-// Save photo to R2 bucket with UUID
-export async function handleR2Upload(photo: File, photoId: string): Promise<string> {
-  // @ts-ignore: R2 binding is available in Worker environment
-  const r2 = (globalThis as any).R2_BUCKET;
-  if (!r2) throw new Error('R2_BUCKET binding not found');
-  await r2.put(photoId, await photo.arrayBuffer());
-  return `r2://${photoId}`;
+import type { EdgeEnv } from './env';
+
+// Photos are content-addressed, so a repeated upload overwrites the same object
+export function photoKey(hash: string): string {
+  return `photos/${hash}`;
+}
+
+export async function handleR2Upload(env: EdgeEnv, bytes: ArrayBuffer, key: string, contentType: string): Promise<void> {
+  if (!env.R2_BUCKET) throw new Error('R2_BUCKET binding not found');
+  await env.R2_BUCKET.put(key, bytes, { httpMetadata: { contentType } });
 }
 
-// Generate signed URL for R2 object
-export async function getSignedUrl(photoId: string): Promise<string> {
-  // @ts-ignore: R2 binding is available in Worker environment
-  const r2 = (globalThis as any).R2_BUCKET;
-  if (!r2) throw new Error('R2_BUCKET binding not found');
-  // Use BASE_URL from env
-  const domain = (globalThis as any).BASE_URL || 'c0r.ai';
-  return `https://r2-public.${domain}/${photoId}`;
-} 
\ No newline at end of file
+export function publicPhotoUrl(env: EdgeEnv, key: string): string {
+  const domain = env.BASE_URL || 'c0r.ai';
+  return `https://r2-public.${domain}/${key}`;
+}
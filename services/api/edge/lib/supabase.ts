@@ -1,45 +1,61 @@
-type KBZHU = { calories: number, protein: number, fats: number, carbs: number };
+import type { EdgeEnv } from './env';
+import type { KBZHU } from './openai';
 
-export async function decrementCreditsAndLog(userId: string, photoId: string, kbzhu: KBZHU): Promise<void> {
-  // @ts-ignore: Supabase env bindings for Worker
-  const supabaseUrl = (globalThis as any).SUPABASE_URL;
-  const supabaseKey = (globalThis as any).SUPABASE_SERVICE_KEY;
-  if (!supabaseUrl || !supabaseKey) throw new Error('Supabase env vars not set');
+export type ChargeResult = {
+  result: 'charged' | 'insufficient_credits' | 'user_not_found';
+  user_id?: string;
+  credits_remaining?: number;
+};
 
-  // Decrement credits
-  const updateRes = await fetch(`${supabaseUrl}/rest/v1/users?telegram_id=eq.${userId}`, {
-    method: 'PATCH',
+// Credits before the model call, so unknown users and users without credits never
+// cost a paid request; null when the user does not exist. The charge RPC re-checks.
+export async function fetchCredits(env: EdgeEnv, telegramId: string): Promise<number | null> {
+  if (!env.SUPABASE_URL || !env.SUPABASE_SERVICE_KEY) throw new Error('Supabase env vars not set');
+
+  const params = new URLSearchParams({ telegram_id: `eq.${Number(telegramId)}`, select: 'credits_remaining' });
+  const res = await fetch(`${env.SUPABASE_URL}/rest/v1/users?${params}`, {
     headers: {
-      'apikey': supabaseKey,
-      'Authorization': `Bearer ${supabaseKey}`,
-      'Content-Type': 'application/json',
-      'Prefer': 'return=representation',
+      'apikey': env.SUPABASE_SERVICE_KEY,
+      'Authorization': `Bearer ${env.SUPABASE_SERVICE_KEY}`,
     },
-    body: JSON.stringify({ credits_remaining: { decrement: 1 } }),
   });
-  if (!updateRes.ok) {
-    const text = await updateRes.text();
-    throw new Error(`Supabase update error: ${updateRes.status} ${text}`);
+  if (!res.ok) {
+    const text = await res.text();
+    throw new Error(`Supabase users error: ${res.status} ${text}`);
   }
+  const rows = (await res.json()) as Array<{ credits_remaining: number }>;
+  return rows.length ? rows[0].credits_remaining : null;
+}
+
+// One RPC (migrations/database/2025-10-24_edge_charge_and_log_analysis.sql): the credit
+// decrement and the photo_analysis log row commit together or not at all
+export async function decrementCreditsAndLog(
+  env: EdgeEnv,
+  telegramId: string,
+  photoUrl: string,
+  kbzhu: KBZHU,
+  modelUsed: string,
+): Promise<ChargeResult> {
+  if (!env.SUPABASE_URL || !env.SUPABASE_SERVICE_KEY) throw new Error('Supabase env vars not set');
 
-  // Add log entry
-  const logRes = await fetch(`${supabaseUrl}/rest/v1/logs`, {
+  const res = await fetch(`${env.SUPABASE_URL}/rest/v1/rpc/edge_charge_and_log_analysis`, {
     method: 'POST',
     headers: {
-      'apikey': supabaseKey,
-      'Authorization': `Bearer ${supabaseKey}`,
+      'apikey': env.SUPABASE_SERVICE_KEY,
+      'Authorization': `Bearer ${env.SUPABASE_SERVICE_KEY}`,
       'Content-Type': 'application/json',
     },
     body: JSON.stringify({
-      user_id: userId,
-      photo_url: photoId,
-      kbzhu,
-      timestamp: new Date().toISOString(),
-      model_used: 'openai-vision',
+      p_telegram_id: Number(telegramId),
+      p_photo_url: photoUrl,
+      // Same keys as the bot's analyses, so daily totals and rollups read them
+      p_kbzhu: { calories: kbzhu.calories, proteins: kbzhu.protein, fats: kbzhu.fats, carbohydrates: kbzhu.carbs },
+      p_model_used: modelUsed,
     }),
   });
-  if (!logRes.ok) {
-    const text = await logRes.text();
-    throw new Error(`Supabase log error: ${logRes.status} ${text}`);
+  if (!res.ok) {
+    const text = await res.text();
+    throw new Error(`Supabase RPC error: ${res.status} ${text}`);
   }
-} 
\ No newline at end of file
+  return (await res.json()) as ChargeResult;
+}
@@ -1,10 +1,8 @@
 import { Hono } from 'hono';
-import { v4 as uuidv4 } from 'uuid';
-import { handleR2Upload, getSignedUrl } from './lib/r2';
-import { analyzePhotoWithOpenAI } from './lib/openai';
-import { decrementCreditsAndLog } from './lib/supabase';
+import type { EdgeEnv } from './lib/env';
+import { analyzeOnEdge, serverTiming } from './lib/analyze';
 
-const app = new Hono();
+const app = new Hono<{ Bindings: EdgeEnv }>();
 
 app.post('/v1/analyze', async (c) => {
   try {
@@ -20,21 +18,13 @@ app.post('/v1/analyze', async (c) => {
     }
     // Ensure userId is a string
     const userIdStr = typeof userId === 'string' ? userId : String(userId);
-    // Save photo to R2
-    const photoId = uuidv4();
-    const r2Url = await handleR2Upload(photo, photoId);
-    // Generate signed URL for OpenAI
-    const signedUrl = await getSignedUrl(photoId);
-    // Call OpenAI Vision
-    const kbzhu = await analyzePhotoWithOpenAI(signedUrl);
-    // Update Supabase: decrement credits, add log
-    await decrementCreditsAndLog(userIdStr, photoId, kbzhu);
-    // Return result
-    return c.json({ kbzhu });
+    const outcome = await analyzeOnEdge(c.env, c.executionCtx, photo, userIdStr);
+    c.header('Server-Timing', serverTiming(outcome.timings));
+    return c.json(outcome.body, outcome.status);
   } catch (err: any) {
     console.error('Error in /v1/analyze:', err);
     return c.json({ error: 'Analysis failed' }, 500);
   }
 });
 
-export default app; 
\ No newline at end of file
+export default app;
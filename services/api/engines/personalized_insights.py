@@ -11,7 +11,7 @@ from typing import Dict, List, Optional, Any, Tuple
 from loguru import logger
 
 from ..models.nutrition_profile import (
-    NutritionDNA, EatingPersonality, WeeklyInsight, PersonalizedMealRecommendation
+    NutritionDNA, EatingPersonality, WeeklyInsight, PersonalizedFoodRecommendation
 )
 from ..analyzers.temporal_patterns import TemporalPatternsAnalyzer
 from ..analyzers.psychological_profile import PsychologicalProfileAnalyzer
@@ -28,9 +28,15 @@ class PersonalizedInsightsEngine:
         cls,
         nutrition_dna: NutritionDNA,
         current_date: date = None,
-        recent_logs: List[Dict[str, Any]] = None
+        recent_logs: List[Dict[str, Any]] = None,
+        recent_behavior_insights: Optional[List[str]] = None
     ) -> List[str]:
-        """Generate personalized daily insights"""
+        """Generate personalized daily insights.
+
+        ``recent_behavior_insights`` lets callers that render several days
+        against the same ``recent_logs`` pass the output of
+        ``generate_recent_behavior_insights`` once instead of re-scanning the logs.
+        """
 
         if current_date is None:
             current_date = date.today()
@@ -49,7 +55,9 @@ class PersonalizedInsightsEngine:
         insights.extend(cls._get_trigger_insights(nutrition_dna, day_of_week))
 
         # Recent behavior insights
-        if recent_logs:
+        if recent_behavior_insights is not None:
+            insights.extend(recent_behavior_insights)
+        elif recent_logs:
             insights.extend(cls._get_recent_behavior_insights(recent_logs, nutrition_dna))
 
         # Energy pattern insights
@@ -57,6 +65,16 @@ class PersonalizedInsightsEngine:
 
         return insights[:5]  # Return top 5 most relevant insights
 
+    @classmethod
+    def generate_recent_behavior_insights(
+        cls,
+        nutrition_dna: NutritionDNA,
+        recent_logs: List[Dict[str, Any]] = None
+    ) -> List[str]:
+        """Day-independent part of the daily insights, computed once per log window"""
+
+        return cls._get_recent_behavior_insights(recent_logs or [], nutrition_dna)
+
     @classmethod
     def _get_archetype_daily_insights(cls, archetype: EatingPersonality, day_of_week: int) -> List[str]:
         """Get archetype-specific insights for the day"""
@@ -276,9 +294,13 @@ class PersonalizedInsightsEngine:
         # Generate day-specific insights for the week
         day_insights = {}
         day_names = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        recent_behavior_insights = cls.generate_recent_behavior_insights(nutrition_dna, week_logs)
 
         for i, day_name in enumerate(day_names):
-            daily_insights = cls.generate_daily_insights(nutrition_dna, week_start + timedelta(days=i), week_logs)
+            daily_insights = cls.generate_daily_insights(
+                nutrition_dna, week_start + timedelta(days=i), week_logs,
+                recent_behavior_insights=recent_behavior_insights
+            )
             if daily_insights:
                 day_insights[day_name] = daily_insights[0]  # Top insight for each day
 
@@ -4,6 +4,7 @@ Integrates Nutrition DNA, predictive analytics, contextual analysis, and adaptiv
 """
 from __future__ import annotations
 
+import asyncio
 import json
 import statistics
 from collections import Counter
@@ -17,7 +18,7 @@ from ..analyzers.nutrition_dna_generator import NutritionDNAGenerator
 from ..engines.personalized_insights import PersonalizedInsightsEngine
 from ..engines.contextual_analyzer import ContextualAnalyzer
 from ..predictors.behavior_predictor import BehaviorPredictor
-from ..recommenders.adaptive_meal_recommender import AdaptiveMealRecommender
+from ..recommenders.adaptive_food_recommender import AdaptiveFoodRecommender
 
 
 class EnhancedFoodPlanGenerator:
@@ -30,12 +31,26 @@ class EnhancedFoodPlanGenerator:
     - Real-time insights
     """
 
-    def __init__(self):
+    # Upper bound on days generated at the same time
+    DEFAULT_MAX_CONCURRENT_DAYS = 7
+
+    # Shopping list categories and the ingredient keywords that map into them
+    SHOPPING_CATEGORIES = {
+        'Белки': ('курица', 'рыба', 'мясо', 'яйца', 'творог', 'йогурт', 'тофу', 'бобы'),
+        'Овощи': ('салат', 'огурцы', 'помидоры', 'морковь', 'брокколи', 'шпинат'),
+        'Фрукты': ('яблоки', 'бананы', 'ягоды', 'апельсины'),
+        'Злаки': ('овсянка', 'рис', 'гречка', 'киноа', 'хлеб'),
+        'Молочные': ('молоко', 'сыр', 'йогурт', 'кефир'),
+        'Приправы': ('соль', 'перец', 'специи', 'масло')
+    }
+
+    def __init__(self, max_concurrent_days: int = DEFAULT_MAX_CONCURRENT_DAYS):
         self.dna_generator = NutritionDNAGenerator
         self.insights_engine = PersonalizedInsightsEngine
         self.context_analyzer = ContextualAnalyzer
         self.behavior_predictor = BehaviorPredictor
-        self.meal_recommender = AdaptiveMealRecommender
+        self.meal_recommender = AdaptiveFoodRecommender
+        self.max_concurrent_days = max(1, max_concurrent_days)
 
     async def generate_enhanced_plan(
         self,
@@ -81,26 +96,39 @@ class EnhancedFoodPlanGenerator:
                 nutrition_dna, start_date, context.get('weekly_context', {}) if context else {}
             )
 
-            # 5. Generate daily meal plans with AI recommendations
-            plan_json = {}
-            daily_insights = {}
+            # 5. Generate daily meal plans concurrently, sharing day-independent inputs
+            recent_logs = food_history[-7:] if food_history else []
+            recent_behavior_insights = self.insights_engine.generate_recent_behavior_insights(
+                nutrition_dna, recent_logs
+            )
+            semaphore = asyncio.Semaphore(self.max_concurrent_days)
 
-            for day_num in range(1, days + 1):
+            async def build_day(day_num: int):
                 target_date = start_date + timedelta(days=day_num - 1)
-                day_key = f"day_{day_num}"
-
-                # Generate AI-powered daily plan
-                daily_plan = await self._generate_ai_daily_plan(
-                    nutrition_dna, target_date, context_analysis,
-                    weekly_predictions, context, profile
+                async with semaphore:
+                    daily_plan = await self._generate_ai_daily_plan(
+                        nutrition_dna, target_date, context_analysis,
+                        weekly_predictions, context, profile
+                    )
+                insights = self.insights_engine.generate_daily_insights(
+                    nutrition_dna, target_date, recent_logs,
+                    recent_behavior_insights=recent_behavior_insights
                 )
+                return f"day_{day_num}", daily_plan, insights
 
-                plan_json[day_key] = daily_plan
+            completed_days = {}
+            daily_insights = {}
+            categorized_shopping = self._empty_shopping_categories()
 
-                # Generate daily insights
-                daily_insights[day_key] = self.insights_engine.generate_daily_insights(
-                    nutrition_dna, target_date, food_history[-7:] if food_history else []
-                )
+            for next_day in asyncio.as_completed([build_day(n) for n in range(1, days + 1)]):
+                day_key, daily_plan, insights = await next_day
+                completed_days[day_key] = daily_plan
+                daily_insights[day_key] = insights
+                # Stream ingredients into the shopping list as soon as the day is ready
+                self._add_day_to_shopping_list(categorized_shopping, daily_plan)
+
+            plan_json = {f"day_{n}": completed_days[f"day_{n}"] for n in range(1, days + 1)}
+            daily_insights = {key: daily_insights[key] for key in plan_json}
 
             # 6. Generate weekly insights and recommendations
             weekly_insights = self.insights_engine.generate_weekly_insights(
@@ -112,8 +140,8 @@ class EnhancedFoodPlanGenerator:
                 nutrition_dna, context_analysis, weekly_insights, profile, days
             )
 
-            # 8. Generate AI shopping list with smart suggestions
-            shopping_list_json = self._generate_smart_shopping_list(plan_json, nutrition_dna)
+            # 8. Finish the AI shopping list with smart suggestions
+            shopping_list_json = self._finalize_shopping_list(categorized_shopping, nutrition_dna)
 
             # 9. Add personalization metadata
             personalization_data = {
@@ -192,8 +220,10 @@ class EnhancedFoodPlanGenerator:
             'weather': context.get('weather') if context else None
         }
 
-        # Generate AI meal recommendations with enhanced preferences
-        daily_meals = self.meal_recommender.generate_daily_meal_plan(
+        # Generate AI meal recommendations with enhanced preferences; the recommender is
+        # synchronous, so run it off the event loop to let other days proceed
+        daily_meals = await asyncio.to_thread(
+            self.meal_recommender.generate_daily_food_plan,
             nutrition_dna, target_date, meal_context, None, enhanced_profile
         )
 
@@ -359,38 +389,45 @@ class EnhancedFoodPlanGenerator:
     ) -> Dict[str, Any]:
         """Generate smart shopping list with AI suggestions"""
 
-        # Aggregate all ingredients
-        all_ingredients = []
+        categorized_shopping = self._empty_shopping_categories()
         for day_data in plan_json.values():
-            for meal_type in ['breakfast', 'lunch', 'dinner']:
-                meal = day_data.get(meal_type, {})
-                ingredients = meal.get('ingredients', [])
-                all_ingredients.extend(ingredients)
-
-        # Group by category
-        categories = {
-            'Белки': ['курица', 'рыба', 'мясо', 'яйца', 'творог', 'йогурт', 'тофу', 'бобы'],
-            'Овощи': ['салат', 'огурцы', 'помидоры', 'морковь', 'брокколи', 'шпинат'],
-            'Фрукты': ['яблоки', 'бананы', 'ягоды', 'апельсины'],
-            'Злаки': ['овсянка', 'рис', 'гречка', 'киноа', 'хлеб'],
-            'Молочные': ['молоко', 'сыр', 'йогурт', 'кефир'],
-            'Приправы': ['соль', 'перец', 'специи', 'масло']
-        }
+            self._add_day_to_shopping_list(categorized_shopping, day_data)
 
-        categorized_shopping = {cat: [] for cat in categories.keys()}
+        return self._finalize_shopping_list(categorized_shopping, nutrition_dna)
 
-        for ingredient in all_ingredients:
-            ingredient_name = ingredient.get('name', '').lower()
-            categorized = False
+    def _empty_shopping_categories(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Create an empty category -> ingredients mapping for the shopping list"""
 
-            for category, keywords in categories.items():
-                if any(keyword in ingredient_name for keyword in keywords):
-                    categorized_shopping[category].append(ingredient)
-                    categorized = True
-                    break
+        return {category: [] for category in self.SHOPPING_CATEGORIES}
 
-            if not categorized:
-                categorized_shopping.setdefault('Другое', []).append(ingredient)
+    def _add_day_to_shopping_list(
+        self,
+        categorized_shopping: Dict[str, List[Dict[str, Any]]],
+        day_data: Dict[str, Any]
+    ) -> None:
+        """Group one day's ingredients into shopping categories in place"""
+
+        for meal_type in ['breakfast', 'lunch', 'dinner']:
+            meal = day_data.get(meal_type, {})
+            for ingredient in meal.get('ingredients', []):
+                ingredient_name = ingredient.get('name', '').lower()
+                categorized = False
+
+                for category, keywords in self.SHOPPING_CATEGORIES.items():
+                    if any(keyword in ingredient_name for keyword in keywords):
+                        categorized_shopping[category].append(ingredient)
+                        categorized = True
+                        break
+
+                if not categorized:
+                    categorized_shopping.setdefault('Другое', []).append(ingredient)
+
+    def _finalize_shopping_list(
+        self,
+        categorized_shopping: Dict[str, List[Dict[str, Any]]],
+        nutrition_dna: NutritionDNA
+    ) -> Dict[str, Any]:
+        """Attach AI suggestions to the aggregated shopping categories"""
 
         # Add AI suggestions based on DNA
         ai_suggestions = []
@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field
 from common.db.supabase_service import supabase_service
 from deps import require_auth_context, AuthContext, require_internal_auth
 from common.cache.redis_client import get_async_redis, make_cache_key
+from common.cache.food_plan_cache import get_or_generate_food_plan
 from common.config.feature_flags import feature_flags
 
 try:
@@ -20,7 +21,7 @@ router = APIRouter()
 class GenerateFoodPlanRequest(BaseModel):
     days: int = Field(default=3, ge=1, le=7)
     user_id: str = Field(description="User ID for internal API calls")
-    force: bool = Field(default=False, description="Force regenerate and overwrite existing plan for the same period")
+    force: bool = Field(default=False, description="Force regenerate (bypassing the plan cache) and overwrite existing plan for the same period")
 
 
 def ensure_day_totals(plan_json):
@@ -48,6 +49,16 @@ def ensure_day_totals(plan_json):
     return plan_json
 
 
+async def generate_plan_cached(profile, food_history, days: int, start_date, force: bool = False):
+    """Generate a plan or reuse a cached one for identical inputs (see common.cache.food_plan_cache)."""
+
+    async def _generate():
+        generator = FoodPlanGenerator()
+        return await generator.generate_plan(profile, food_history, days)
+
+    return await get_or_generate_food_plan(profile, food_history, days, start_date, _generate, force=force)
+
+
 @router.post("/food-plan/generate", response_model=dict)
 async def generate_food_plan(payload: GenerateFoodPlanRequest, auth: AuthContext = Depends(require_auth_context)):
     """Generate personalized meal plan using centralized Supabase service"""
@@ -88,17 +99,15 @@ async def generate_food_plan(payload: GenerateFoodPlanRequest, auth: AuthContext
     except Exception:
         pass
     
-    # 4) Generate meal plan using LLM with full context
-    generator = FoodPlanGenerator()
-    generated_plan = await generator.generate_plan(profile, food_history, payload.days)
+    # 4) Generate meal plan using LLM with full context (cached by inputs digest)
+    start_date = datetime.utcnow().date()
+    end_date = start_date + timedelta(days=payload.days - 1)
+    generated_plan = await generate_plan_cached(profile, food_history, payload.days, start_date, payload.force)
     
     # 5) Compute per-day totals server-side
     generated_plan["plan_json"] = ensure_day_totals(generated_plan.get("plan_json", {}))
     
     # 6) Save to database using centralized service
-    start_date = datetime.utcnow().date()
-    end_date = start_date + timedelta(days=payload.days - 1)
-    
     plan_record = {
         "user_id": auth['user_id'],
         "start_date": str(start_date),
@@ -136,6 +145,7 @@ async def generate_food_plan_internal(request: Request, payload: GenerateFoodPla
     profile = context['profile']
     food_history = context['food_history']
     history_summary = context['history_summary']
+    history_by_day = context.get('history_by_day')
     
     # 2) Check unlock status
     unlock_status = await supabase_service.check_food_plan_unlock_status(
@@ -165,17 +175,15 @@ async def generate_food_plan_internal(request: Request, payload: GenerateFoodPla
     except Exception:
         pass
     
-    # 4) Generate meal plan using LLM with full context
-    generator = FoodPlanGenerator()
-    generated_plan = await generator.generate_plan(profile, food_history, payload.days)
+    # 4) Generate meal plan using LLM with full context (cached by inputs digest)
+    start_date = datetime.utcnow().date()
+    end_date = start_date + timedelta(days=payload.days - 1)
+    generated_plan = await generate_plan_cached(profile, food_history, payload.days, start_date, payload.force)
     
     # 5) Compute per-day totals server-side
     generated_plan["plan_json"] = ensure_day_totals(generated_plan.get("plan_json", {}))
     
     # 6) Save to database using centralized service
-    start_date = datetime.utcnow().date()
-    end_date = start_date + timedelta(days=payload.days - 1)
-    
     plan_record = {
         "user_id": user_id,
         "start_date": str(start_date),
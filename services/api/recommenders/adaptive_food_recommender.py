@@ -4,6 +4,7 @@ Generates personalized food recommendations that adapt to user's DNA, context, a
 """
 from __future__ import annotations
 
+import os
 import random
 from datetime import datetime, time, date, timedelta
 from typing import Dict, List, Optional, Any, Tuple
@@ -14,6 +15,10 @@ from ..models.nutrition_profile import (
     NutritionDNA, EatingPersonality, PersonalizedFoodRecommendation
 )
 from ..predictors.behavior_predictor import BehaviorPredictor
+from .food_catalog import FoodCatalog, SlotTarget, exclusion_mask, tags_for_text
+
+# JSON dish catalog (see food_catalog.FoodCatalog.from_records); built-in templates when unset
+FOOD_CATALOG_PATH = os.getenv("FOOD_CATALOG_PATH")
 
 
 class AdaptiveFoodRecommender:
@@ -23,8 +28,16 @@ class AdaptiveFoodRecommender:
     - Current context (time, mood, situation)
     - Predicted behaviors and needs
     - Real-time feedback loop
+
+    Dishes come from FOOD_TEMPLATES by default. When a FoodCatalog is
+    configured (FOOD_CATALOG_PATH or `use_catalog`), daily plans are picked
+    from it in one vectorized pass. Allergen/diet exclusions apply to both
+    paths: templates are tagged from their name and ingredients the same way.
     """
 
+    _catalog: Optional[FoodCatalog] = None
+    _catalog_loaded = False
+
     # Meal templates organized by characteristics
     FOOD_TEMPLATES = {
         'quick_protein': {
@@ -113,7 +126,8 @@ class AdaptiveFoodRecommender:
         )
 
         # Find matching meal template
-        food_template = cls._select_food_template(food_characteristics, food_type, constraints)
+        excluded = cls._exclusion_mask(constraints, enhanced_profile)
+        food_template = cls._select_food_template(food_characteristics, food_type, constraints, excluded)
 
         # Calculate nutrition values
         nutrition = cls._calculate_food_nutrition(food_template, nutrition_dna, food_type)
@@ -121,9 +135,32 @@ class AdaptiveFoodRecommender:
         # Determine optimal timing
         optimal_time = cls._calculate_optimal_timing(nutrition_dna, food_type, context)
 
+        return cls._build_recommendation(
+            nutrition_dna, food_type, context, food_characteristics, food_template, nutrition, optimal_time,
+            exclude_mask=excluded,
+        )
+
+    @classmethod
+    def _build_recommendation(
+        cls,
+        nutrition_dna: NutritionDNA,
+        food_type: str,
+        context: Dict[str, Any],
+        food_characteristics: Dict[str, Any],
+        food_template: Dict[str, Any],
+        nutrition: Dict[str, int],
+        optimal_time: time,
+        exclude_mask: int = 0
+    ) -> PersonalizedFoodRecommendation:
         # Generate reasoning
         reasoning = cls._generate_food_reasoning(nutrition_dna, food_template, context, food_characteristics)
 
+        # Ingredients are guessed from the dish name (e.g. milk for porridge): drop guesses the user must avoid
+        ingredients = [
+            item for item in cls._generate_ingredients_list(food_template, nutrition['calories'])
+            if not tags_for_text(item['name']) & exclude_mask
+        ]
+
         return PersonalizedFoodRecommendation(
             food_type=food_type,
             recommended_time=optimal_time,
@@ -141,7 +178,7 @@ class AdaptiveFoodRecommender:
             fiber=nutrition.get('fiber'),
             prep_time_minutes=food_template['prep_time'],
             difficulty_level=cls._assess_difficulty(food_template, nutrition_dna),
-            ingredients=cls._generate_ingredients_list(food_template, nutrition['calories'])
+            ingredients=ingredients
         )
 
     @classmethod
@@ -264,7 +301,7 @@ class AdaptiveFoodRecommender:
                 characteristics['food_style'] = 'balanced'
 
         # Context-based adjustments
-        weather = context.get('weather', '').lower()
+        weather = (context.get('weather') or '').lower()
         if 'cold' in weather or 'rain' in weather:
             characteristics['temperature_preference'] = 'warm'
 
@@ -288,9 +325,10 @@ class AdaptiveFoodRecommender:
         cls,
         characteristics: Dict[str, Any],
         food_type: str,
-        constraints: Dict[str, Any]
+        constraints: Dict[str, Any],
+        exclude_mask: int = 0
     ) -> Dict[str, Any]:
-        """Select appropriate meal template based on characteristics"""
+        """Select appropriate meal template based on characteristics (never one with an excluded tag)"""
 
         food_style = characteristics.get('food_style', 'balanced')
 
@@ -302,6 +340,17 @@ class AdaptiveFoodRecommender:
         if not food_options:
             food_options = cls.FOOD_TEMPLATES.get('quick_protein', {}).get(food_type, [])
 
+        if exclude_mask:
+            food_options = [option for option in food_options if not tags_for_text(option['name']) & exclude_mask]
+            # Allergies/diets can empty the style: any other style's safe dish for this meal
+            if not food_options:
+                food_options = [
+                    option
+                    for templates in cls.FOOD_TEMPLATES.values()
+                    for option in templates.get(food_type, [])
+                    if not tags_for_text(option['name']) & exclude_mask
+                ]
+
         # Apply constraints
         filtered_options = []
         max_prep_time = constraints.get('max_prep_time', 60)  # minutes
@@ -354,25 +403,12 @@ class AdaptiveFoodRecommender:
     ) -> Dict[str, int]:
         """Calculate nutritional values for the meal"""
 
-        # Base calorie targets by meal type
-        food_calorie_ratios = {
-            'breakfast': 0.25,
-            'lunch': 0.35,
-            'dinner': 0.30,
-            'snack': 0.10
-        }
-
-        # Get user's daily calorie target (use DNA patterns to estimate if not available)
-        daily_calories = 2000  # default
-
-        # Adjust based on archetype and goals
-        if nutrition_dna.archetype == EatingPersonality.BUSY_PROFESSIONAL:
-            daily_calories = 2200  # Higher energy needs
-        elif nutrition_dna.archetype == EatingPersonality.EARLY_BIRD_PLANNER:
-            daily_calories = 1900  # More controlled intake
+        # Catalog dishes carry their own (portioned) nutrition
+        if 'calories' in food_template:
+            return {key: food_template[key] for key in ('calories', 'protein', 'fats', 'carbs', 'fiber')}
 
         # Calculate meal calories
-        food_calories = int(daily_calories * food_calorie_ratios.get(food_type, 0.25))
+        food_calories = cls._food_calorie_target(nutrition_dna, food_type)
 
         # Adjust for meal characteristics
         protein_ratio = food_template.get('protein_ratio', 0.25)
@@ -398,6 +434,29 @@ class AdaptiveFoodRecommender:
             'fiber': fiber_grams
         }
 
+    @classmethod
+    def _food_calorie_target(cls, nutrition_dna: NutritionDNA, food_type: str) -> int:
+        """Calorie target of one meal slot"""
+
+        # Base calorie targets by meal type
+        food_calorie_ratios = {
+            'breakfast': 0.25,
+            'lunch': 0.35,
+            'dinner': 0.30,
+            'snack': 0.10
+        }
+
+        # Get user's daily calorie target (use DNA patterns to estimate if not available)
+        daily_calories = 2000  # default
+
+        # Adjust based on archetype and goals
+        if nutrition_dna.archetype == EatingPersonality.BUSY_PROFESSIONAL:
+            daily_calories = 2200  # Higher energy needs
+        elif nutrition_dna.archetype == EatingPersonality.EARLY_BIRD_PLANNER:
+            daily_calories = 1900  # More controlled intake
+
+        return int(daily_calories * food_calorie_ratios.get(food_type, 0.25))
+
     @classmethod
     def _calculate_optimal_timing(
         cls,
@@ -625,16 +684,15 @@ class AdaptiveFoodRecommender:
         day_context['is_weekend'] = target_date.weekday() >= 5
         day_context['day_of_week'] = target_date.weekday()
 
-        # Get predictions for the day to inform recommendations
-        predictions = BehaviorPredictor.predict_daily_behavior(nutrition_dna, target_date)
+        # Get predictions for the day to inform recommendations (reuse precomputed ones if given)
+        predictions = day_context.get('predictions')
+        if predictions is None:
+            predictions = BehaviorPredictor.predict_daily_behavior(nutrition_dna, target_date)
         day_context['predictions'] = predictions
 
-        # Generate meal recommendations
-        foods = {}
-        food_types = ['breakfast', 'lunch', 'dinner']
-
-        for food_type in food_types:
-            # Adjust context for each meal time
+        # Adjust context for each meal time
+        food_contexts = {}
+        for food_type in ['breakfast', 'lunch', 'dinner']:
             food_context = day_context.copy()
 
             if food_type == 'breakfast':
@@ -644,10 +702,107 @@ class AdaptiveFoodRecommender:
             else:  # dinner
                 food_context['current_time'] = nutrition_dna.temporal_patterns.preferred_dinner_time
 
-            foods[food_type] = cls.recommend_food(
-                nutrition_dna, food_type, food_context, constraints, enhanced_profile
+            food_contexts[food_type] = food_context
+
+        catalog = cls.get_catalog()
+        if catalog is not None and len(catalog):
+            foods = cls._plan_foods_from_catalog(
+                catalog, nutrition_dna, target_date, food_contexts, constraints, enhanced_profile
             )
+        else:
+            foods = {}
+
+        # Generate meal recommendations (template path, or slots the catalog could not fill)
+        for food_type, food_context in food_contexts.items():
+            if food_type not in foods:
+                foods[food_type] = cls.recommend_food(
+                    nutrition_dna, food_type, food_context, constraints, enhanced_profile
+                )
+
+        return {food_type: foods[food_type] for food_type in food_contexts}
+
+    @staticmethod
+    def _exclusion_mask(constraints: Dict[str, Any], enhanced_profile: Dict[str, Any] = None) -> int:
+        """Tag bits excluded by the profile's diets and allergies plus the request's dietary restrictions"""
+        enhanced_profile = enhanced_profile or {}
+        return exclusion_mask(
+            list(enhanced_profile.get('dietary_preferences') or []) + list(constraints.get('dietary_restrictions') or []),
+            enhanced_profile.get('allergies') or [],
+        )
 
+    @classmethod
+    def use_catalog(cls, catalog: Optional[FoodCatalog]) -> None:
+        """Plan from this catalog instead of FOOD_CATALOG_PATH / templates (None resets)"""
+        cls._catalog = catalog
+        cls._catalog_loaded = catalog is not None
+
+    @classmethod
+    def get_catalog(cls) -> Optional[FoodCatalog]:
+        if not cls._catalog_loaded:
+            cls._catalog_loaded = True
+            if FOOD_CATALOG_PATH:
+                try:
+                    cls._catalog = FoodCatalog.from_json(FOOD_CATALOG_PATH)
+                    logger.info(f"Loaded food catalog with {len(cls._catalog)} dishes from {FOOD_CATALOG_PATH}")
+                except Exception as e:
+                    logger.error(f"Failed to load food catalog {FOOD_CATALOG_PATH}, using templates: {e}")
+        return cls._catalog
+
+    @classmethod
+    def _plan_foods_from_catalog(
+        cls,
+        catalog: FoodCatalog,
+        nutrition_dna: NutritionDNA,
+        target_date: date,
+        food_contexts: Dict[str, Dict[str, Any]],
+        constraints: Dict[str, Any],
+        enhanced_profile: Dict[str, Any] = None
+    ) -> Dict[str, PersonalizedFoodRecommendation]:
+        """Pick all meals of the day from the catalog at once"""
+
+        enhanced_profile = enhanced_profile or {}
+        characteristics = {
+            food_type: cls._determine_food_characteristics(nutrition_dna, food_type, food_context, enhanced_profile)
+            for food_type, food_context in food_contexts.items()
+        }
+
+        targets = []
+        for food_type in food_contexts:
+            # Same split as the template path: 25% protein, 30% fat, rest carbs
+            calories = cls._food_calorie_target(nutrition_dna, food_type)
+            targets.append(SlotTarget(
+                slot=food_type,
+                calories=calories,
+                protein=calories * 0.25 / 4,
+                fat=calories * 0.30 / 9,
+                carbs=calories * 0.45 / 4,
+                style=characteristics[food_type].get('food_style'),
+            ))
+
+        excluded = cls._exclusion_mask(constraints, enhanced_profile)
+        picks = catalog.plan_day(
+            targets,
+            exclude_mask=excluded,
+            max_prep_time=constraints.get('max_prep_time', 60),
+            seed=target_date.toordinal(),
+        )
+
+        foods = {}
+        for pick in picks:
+            if pick is None:
+                continue
+            food_type, food_context = pick.slot, food_contexts[pick.slot]
+            food_template = catalog.record(pick.index, pick.portion)
+            foods[food_type] = cls._build_recommendation(
+                nutrition_dna,
+                food_type,
+                food_context,
+                characteristics[food_type],
+                food_template,
+                cls._calculate_food_nutrition(food_template, nutrition_dna, food_type),
+                cls._calculate_optimal_timing(nutrition_dna, food_type, food_context),
+                exclude_mask=excluded,
+            )
         return foods
 
     @classmethod
@@ -665,14 +820,14 @@ class AdaptiveFoodRecommender:
         # Analyze recent meal patterns
         if recent_foods:
             # Check variety
-            recent_dishes = [food.get('dish_name', '') for meal in recent_foods[-7:]]  # Last 7 meals
+            recent_dishes = [food.get('dish_name', '') for food in recent_foods[-7:]]  # Last 7 meals
             unique_dishes = set(recent_dishes)
 
             if len(unique_dishes) < len(recent_dishes) * 0.6:  # Less than 60% variety
                 suggestions.append("Попробуйте разнообразить рацион - добавьте новые блюда или способы приготовления")
 
             # Check prep time patterns
-            prep_times = [food.get('prep_time_minutes', 30) for meal in recent_foods[-5:]]
+            prep_times = [food.get('prep_time_minutes', 30) for food in recent_foods[-5:]]
             avg_prep_time = sum(prep_times) / len(prep_times)
 
             if avg_prep_time > 25 and nutrition_dna.archetype == EatingPersonality.BUSY_PROFESSIONAL:
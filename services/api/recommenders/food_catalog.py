@@ -0,0 +1,281 @@
+"""
+Columnar dish catalog for the adaptive food recommender.
+
+Dishes are stored as NumPy columns (slot mask, style, calories, macros, prep
+time) plus one allergen/diet bitset per dish, precomputed from the dish name
+and ingredients with common/food_taxonomy. Planning a day scores every dish
+against every meal slot in one vectorized pass:
+
+- each dish is portioned toward the slot's calorie target (within limits),
+- the portioned macros are compared with the slot's macro targets,
+- dishes of the wrong slot, with an excluded tag or too long to cook are
+  masked out,
+
+and the best distinct dish per slot is picked from a short candidate list.
+"""
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+from common.food_taxonomy import classify_food, normalize_food_name
+
+SLOTS = ("breakfast", "lunch", "dinner", "snack")
+SLOT_BITS = {slot: 1 << i for i, slot in enumerate(SLOTS)}
+
+# Bit positions of the dish tags; names map to `tag_*` categories in common/food_taxonomy
+TAGS = (
+    "meat", "poultry", "pork", "fish", "shellfish", "dairy", "eggs", "gluten",
+    "nuts", "peanuts", "soy", "sesame", "honey", "sulfites",
+)
+TAG_BITS = {tag: 1 << i for i, tag in enumerate(TAGS)}
+
+
+def tag_mask(*tags: str) -> int:
+    mask = 0
+    for tag in tags:
+        mask |= TAG_BITS[tag]
+    return mask
+
+
+_ANIMAL_FLESH = tag_mask("meat", "poultry", "pork", "fish", "shellfish")
+
+# Profile `dietary_preferences` values that exclude dishes by tag. Macro-shaped
+# diets (keto, low_carb, paleo, mediterranean) are handled by the targets instead.
+DIET_EXCLUSIONS: Dict[str, int] = {
+    "vegetarian": _ANIMAL_FLESH,
+    "vegan": _ANIMAL_FLESH | tag_mask("dairy", "eggs", "honey"),
+    "pescatarian": tag_mask("meat", "poultry", "pork"),
+    "gluten_free": tag_mask("gluten"),
+    "dairy_free": tag_mask("dairy"),
+    "halal": tag_mask("pork"),
+    "kosher": tag_mask("pork", "shellfish"),
+}
+
+# Profile `allergies` values
+ALLERGY_EXCLUSIONS: Dict[str, int] = {
+    "nuts": tag_mask("nuts"),
+    "peanuts": tag_mask("peanuts"),
+    "shellfish": tag_mask("shellfish"),
+    "fish": tag_mask("fish"),
+    "eggs": tag_mask("eggs"),
+    "dairy": tag_mask("dairy"),
+    "soy": tag_mask("soy"),
+    "gluten": tag_mask("gluten"),
+    "sesame": tag_mask("sesame"),
+    "sulfites": tag_mask("sulfites"),
+}
+
+# Portions may be scaled toward the slot calorie target within these bounds
+MIN_PORTION = 0.75
+MAX_PORTION = 1.5
+# Relative weight of each target in the slot score (calories, protein, fat, carbs)
+TARGET_WEIGHTS = np.array([2.0, 1.5, 0.5, 0.5])
+STYLE_BONUS = 0.05
+# Random tie-breaking so identical days do not always get identical dishes
+JITTER = 0.01
+# Best candidates kept per slot before de-duplicating across the day
+CANDIDATES_PER_SLOT = 8
+
+
+# Nut, seed and tomato spreads: "арахисовая паста" is not pasta and "peanut butter" is not dairy.
+# Only the noun is dropped, the ingredient word stays and is tagged.
+_SPREAD_RE = re.compile(
+    r"\b(\w*(?:арахис|орех|миндал|кешью|фисташ|фундук|кунжут|подсолнеч|тыквен|томат|шоколад)\w*) паст\w*"
+    r"|\b((?:peanut|almond|cashew|hazelnut|nut|seed|sunflower|pumpkin|apple)s?) butter\b"
+)
+
+
+def tags_for_text(text: str) -> int:
+    """Bitset of TAGS found in a dish name / ingredient list."""
+    text = _SPREAD_RE.sub(lambda m: m.group(1) or m.group(2), normalize_food_name(text))
+    categories = classify_food(text).categories
+    mask = 0
+    for tag, bit in TAG_BITS.items():
+        if f"tag_{tag}" in categories:
+            mask |= bit
+    return mask
+
+
+def exclusion_mask(dietary_preferences: Iterable[str] = (), allergies: Iterable[str] = ()) -> int:
+    """Tag bits a user must not be served; unknown values are ignored."""
+    mask = 0
+    for diet in dietary_preferences or ():
+        mask |= DIET_EXCLUSIONS.get(str(diet).lower(), 0)
+    for allergy in allergies or ():
+        mask |= ALLERGY_EXCLUSIONS.get(str(allergy).lower(), 0)
+    return mask
+
+
+@dataclass(frozen=True)
+class SlotTarget:
+    """Calorie and macro target (grams) of one meal slot."""
+    slot: str
+    calories: float
+    protein: float
+    fat: float
+    carbs: float
+    style: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class CatalogPick:
+    slot: str
+    index: int
+    portion: float
+    score: float
+
+
+class FoodCatalog:
+    """Immutable columnar dish catalog; build with one of the `from_*` constructors."""
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        slots: np.ndarray,
+        styles: np.ndarray,
+        style_names: Sequence[str],
+        nutrition: np.ndarray,
+        fiber: np.ndarray,
+        prep_time: np.ndarray,
+        tags: np.ndarray,
+    ):
+        self.names = list(names)
+        self.slots = slots.astype(np.uint8)
+        self.styles = styles.astype(np.int16)
+        self.style_names = list(style_names)
+        # (4, n): calories, protein, fat, carbs of one portion, one contiguous column per nutrient
+        self.nutrition = np.ascontiguousarray(nutrition.astype(np.float64).reshape(-1, 4).T)
+        self.fiber = fiber.astype(np.float64)
+        self.prep_time = prep_time.astype(np.float64)
+        self.tags = tags.astype(np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping[str, Any]]) -> "FoodCatalog":
+        """
+        Records: name, slots (list of SLOTS), calories, protein, fat, carbs,
+        prep_time, optional style, fiber, ingredients and tags (list of TAGS;
+        derived from name and ingredients when missing).
+        """
+        names, slots, styles, nutrition, fiber, prep_time, tags = [], [], [], [], [], [], []
+        style_index: Dict[str, int] = {}
+        for record in records:
+            name = record["name"]
+            names.append(name)
+            slot_mask = 0
+            for slot in record.get("slots", ()):
+                slot_mask |= SLOT_BITS.get(slot, 0)
+            slots.append(slot_mask)
+            style = record.get("style")
+            styles.append(style_index.setdefault(style, len(style_index)) if style else -1)
+            nutrition.append((record["calories"], record["protein"], record["fat"], record["carbs"]))
+            fiber.append(record.get("fiber") or 0)
+            prep_time.append(record.get("prep_time", 30))
+            if record.get("tags") is not None:
+                tags.append(tag_mask(*record["tags"]))
+            else:
+                text = " ".join([name, *record.get("ingredients", ())])
+                tags.append(tags_for_text(text))
+        return cls(
+            names,
+            np.array(slots, dtype=np.uint8),
+            np.array(styles, dtype=np.int16),
+            list(style_index),
+            np.array(nutrition, dtype=np.float64),
+            np.array(fiber, dtype=np.float64),
+            np.array(prep_time, dtype=np.float64),
+            np.array(tags, dtype=np.uint64),
+        )
+
+    @classmethod
+    def from_json(cls, path: Union[str, Path]) -> "FoodCatalog":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_records(json.load(f))
+
+    def record(self, index: int, portion: float = 1.0) -> Dict[str, Any]:
+        """Template-shaped dict of a dish, with nutrition scaled to the portion."""
+        calories, protein, fat, carbs = self.nutrition[:, index] * portion
+        return {
+            "name": self.names[index],
+            "prep_time": int(self.prep_time[index]),
+            "protein_ratio": round(float(protein * 4 / calories), 2) if calories else 0.25,
+            "calories": int(round(calories)),
+            "protein": int(round(protein)),
+            "fats": int(round(fat)),
+            "carbs": int(round(carbs)),
+            "fiber": int(round(self.fiber[index] * portion)),
+        }
+
+    def score(
+        self,
+        targets: Sequence[SlotTarget],
+        exclude_mask: int = 0,
+        max_prep_time: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        """
+        Score every dish for every slot: returns (scores, portions), both of shape
+        (len(targets), len(catalog)). Lower is better; infeasible dishes are inf.
+        """
+        target = np.array([(t.calories, t.protein, t.fat, t.carbs) for t in targets], dtype=np.float64)
+        calories = self.nutrition[0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            portions = np.clip(target[:, :1] / calories[None, :], MIN_PORTION, MAX_PORTION)
+        scores = np.zeros(portions.shape)
+        for column, weight in enumerate(TARGET_WEIGHTS):
+            goal = target[:, column:column + 1]
+            relative = (portions * self.nutrition[column] - goal) / np.maximum(goal, 1.0)
+            scores += weight * relative * relative
+
+        for row, t in enumerate(targets):
+            if t.style in self.style_names:
+                scores[row, self.styles == self.style_names.index(t.style)] -= STYLE_BONUS
+        if seed is not None:
+            scores += np.random.default_rng(seed).uniform(0.0, JITTER, size=scores.shape)
+
+        slot_bits = np.array([SLOT_BITS.get(t.slot, 0) for t in targets], dtype=np.uint8)
+        feasible = (self.slots[None, :] & slot_bits[:, None]) != 0
+        feasible &= (calories > 0)[None, :]
+        if exclude_mask:
+            feasible &= ((self.tags & np.uint64(exclude_mask)) == 0)[None, :]
+        if max_prep_time is not None:
+            feasible &= (self.prep_time <= max_prep_time)[None, :]
+        scores[~feasible] = np.inf
+        return scores, portions
+
+    def plan_day(
+        self,
+        targets: Sequence[SlotTarget],
+        exclude_mask: int = 0,
+        max_prep_time: Optional[float] = None,
+        seed: Optional[int] = None,
+    ) -> List[Optional[CatalogPick]]:
+        """Best distinct dish per slot, in `targets` order; None when nothing is feasible."""
+        if not len(self) or not targets:
+            return [None] * len(targets)
+        scores, portions = self.score(targets, exclude_mask, max_prep_time, seed)
+        k = min(CANDIDATES_PER_SLOT, scores.shape[1])
+        candidates = np.argpartition(scores, k - 1, axis=1)[:, :k]
+
+        picks: List[Optional[CatalogPick]] = []
+        used = set()
+        for row, t in enumerate(targets):
+            ranked = candidates[row][np.argsort(scores[row, candidates[row]])]
+            pick = None
+            for index in ranked:
+                if not np.isfinite(scores[row, index]):
+                    break
+                if int(index) not in used:
+                    pick = CatalogPick(t.slot, int(index), float(portions[row, index]), float(scores[row, index]))
+                    used.add(int(index))
+                    break
+            picks.append(pick)
+        return picks
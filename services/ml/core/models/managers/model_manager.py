@@ -11,6 +11,19 @@ from ..config.sota_config import ModelConfig, TaskType, ModelTier, SOTA_MODEL_CO
 from ..config.environment_config import EnvironmentConfig
 from ..providers.base_provider import BaseAIProvider, ModelResponse
 from ..providers.openai_provider import OpenAIProvider
+from ...prompts.base.prompt_builder import RegionalContext, get_prompt_builder
+
+
+# Регион по умолчанию, если контекст не передан или передан частично
+DEFAULT_REGIONAL_CONTEXT = RegionalContext(
+    region_code='RU',
+    cuisine_types=['русская'],
+    common_products=['картофель', 'капуста', 'морковь'],
+    cooking_methods=['варка', 'жарка', 'тушение'],
+    measurement_units='metric',
+    food_culture_notes='Традиционная русская кухня',
+    seasonal_products={}
+)
 
 
 class ModelManager:
@@ -19,7 +32,10 @@ class ModelManager:
     def __init__(self):
         self.providers: Dict[str, BaseAIProvider] = {}
         self.initialized = False
+        # Долгоживущий конструктор промптов: статические части компилируются один раз
+        self.prompt_builder = get_prompt_builder()
         self._initialize_providers()
+        self.prompt_builder.precompile(regional_contexts=[DEFAULT_REGIONAL_CONTEXT])
     
     def _initialize_providers(self):
         """Инициализация всех доступных провайдеров"""
@@ -90,35 +106,15 @@ class ModelManager:
             
             provider = self.providers[provider_key]
             
-            # Используем PromptBuilder для создания улучшенного промпта
-            from ...prompts.base.prompt_builder import PromptBuilder
-            from ....modules.location.models import RegionalContext
-            
-            prompt_builder = PromptBuilder()
-            
-            # Преобразуем regional_context в объект RegionalContext если нужно
-            if regional_context and not isinstance(regional_context, RegionalContext):
-                # Создаем базовый региональный контекст если передан dict
-                from ....modules.location.models import RegionalContext
-                regional_context_obj = RegionalContext(
-                    region_code=regional_context.get('region_code', 'RU'),
-                    cuisine_types=regional_context.get('cuisine_types', ['русская']),
-                    common_products=regional_context.get('common_products', ['картофель', 'капуста', 'морковь']),
-                    cooking_methods=regional_context.get('cooking_methods', ['варка', 'жарка', 'тушение']),
-                    measurement_units=regional_context.get('measurement_units', 'metric'),
-                    food_culture_notes=regional_context.get('food_culture_notes', 'Традиционная русская кухня'),
-                    seasonal_products=regional_context.get('seasonal_products', {})
-                )
-            else:
-                regional_context_obj = regional_context
-            
-            # Создаем улучшенный промпт с мотивацией и региональным контекстом
-            prompt = prompt_builder.build_food_analysis_prompt(
+            assembled = self.prompt_builder.assemble_food_analysis(
                 user_language=user_language,
-                regional_context=regional_context_obj,
+                regional_context=self._regional_context(regional_context),
                 user_profile=user_profile or {},
-                motivation_level="standard"
+                motivation_level="standard",
+                tier=tier
             )
+            prompt = assembled.text
+            logger.debug(f"🧮 Prompt tokens: {assembled.token_estimate()}")
             
             # Генерируем ответ
             logger.debug(f"🚀 Using provider: {provider}")
@@ -170,34 +166,14 @@ class ModelManager:
             
             provider = self.providers[provider_key]
             
-            # Используем PromptBuilder для создания улучшенного промпта рецептов
-            from ...prompts.base.prompt_builder import PromptBuilder
-            from ....modules.location.models import RegionalContext
-            
-            prompt_builder = PromptBuilder()
-            
-            # Преобразуем regional_context в объект RegionalContext если нужно
-            if regional_context and not isinstance(regional_context, RegionalContext):
-                from ....modules.location.models import RegionalContext
-                regional_context_obj = RegionalContext(
-                    region_code=regional_context.get('region_code', 'RU'),
-                    cuisine_types=regional_context.get('cuisine_types', ['русская']),
-                    common_products=regional_context.get('common_products', ['картофель', 'капуста', 'морковь']),
-                    cooking_methods=regional_context.get('cooking_methods', ['варка', 'жарка', 'тушение']),
-                    measurement_units=regional_context.get('measurement_units', 'metric'),
-                    food_culture_notes=regional_context.get('food_culture_notes', 'Традиционная русская кухня'),
-                    seasonal_products=regional_context.get('seasonal_products', {})
-                )
-            else:
-                regional_context_obj = regional_context
-            
-            # Создаем улучшенный промпт для генерации рецептов
-            prompt = prompt_builder.build_recipe_generation_prompt(
+            assembled = self.prompt_builder.assemble_recipe_generation(
                 user_language=user_language,
-                regional_context=regional_context_obj,
+                regional_context=self._regional_context(regional_context),
                 user_profile=user_context or {},
-                recipe_count=3
+                tier=tier
             )
+            prompt = assembled.text
+            logger.debug(f"🧮 Prompt tokens: {assembled.token_estimate()}")
             
             # Генерируем ответ
             logger.debug(f"🚀 Using provider: {provider}")
@@ -242,33 +218,15 @@ class ModelManager:
                 if provider_key in self.providers:
                     logger.info(f"🔄 Trying fallback with {provider_key}")
                     provider = self.providers[provider_key]
-                    # Используем PromptBuilder и для fallback
-                    from ...prompts.base.prompt_builder import PromptBuilder
-                    from ....modules.location.models import RegionalContext
-                    
-                    prompt_builder = PromptBuilder()
-                    
-                    # Преобразуем regional_context в объект RegionalContext если нужно
-                    if regional_context and not isinstance(regional_context, RegionalContext):
-                        from ....modules.location.models import RegionalContext
-                        regional_context_obj = RegionalContext(
-                            region_code=regional_context.get('region_code', 'RU'),
-                            cuisine_types=regional_context.get('cuisine_types', ['русская']),
-                            common_products=regional_context.get('common_products', ['картофель', 'капуста', 'морковь']),
-                            cooking_methods=regional_context.get('cooking_methods', ['варка', 'жарка', 'тушение']),
-                            measurement_units=regional_context.get('measurement_units', 'metric'),
-                            food_culture_notes=regional_context.get('food_culture_notes', 'Традиционная русская кухня'),
-                            seasonal_products=regional_context.get('seasonal_products', {})
-                        )
-                    else:
-                        regional_context_obj = regional_context
-                    
-                    prompt = prompt_builder.build_food_analysis_prompt(
+                    assembled = self.prompt_builder.assemble_food_analysis(
                         user_language=user_language,
-                        regional_context=regional_context_obj,
+                        regional_context=self._regional_context(regional_context),
                         user_profile=user_profile or {},
-                        motivation_level="standard"
+                        motivation_level="standard",
+                        tier=tier
                     )
+                    prompt = assembled.text
+                    logger.debug(f"🧮 Prompt tokens: {assembled.token_estimate()}")
                     response = await provider.generate_with_retry(prompt, image_data)
                     
                     if response.success:
@@ -309,33 +267,14 @@ class ModelManager:
                 if provider_key in self.providers:
                     logger.info(f"🔄 Trying fallback with {provider_key}")
                     provider = self.providers[provider_key]
-                    # Используем PromptBuilder и для fallback рецептов
-                    from ...prompts.base.prompt_builder import PromptBuilder
-                    from ....modules.location.models import RegionalContext
-                    
-                    prompt_builder = PromptBuilder()
-                    
-                    # Преобразуем regional_context в объект RegionalContext если нужно
-                    if regional_context and not isinstance(regional_context, RegionalContext):
-                        from ....modules.location.models import RegionalContext
-                        regional_context_obj = RegionalContext(
-                            region_code=regional_context.get('region_code', 'RU'),
-                            cuisine_types=regional_context.get('cuisine_types', ['русская']),
-                            common_products=regional_context.get('common_products', ['картофель', 'капуста', 'морковь']),
-                            cooking_methods=regional_context.get('cooking_methods', ['варка', 'жарка', 'тушение']),
-                            measurement_units=regional_context.get('measurement_units', 'metric'),
-                            food_culture_notes=regional_context.get('food_culture_notes', 'Традиционная русская кухня'),
-                            seasonal_products=regional_context.get('seasonal_products', {})
-                        )
-                    else:
-                        regional_context_obj = regional_context
-                    
-                    prompt = prompt_builder.build_recipe_generation_prompt(
+                    assembled = self.prompt_builder.assemble_recipe_generation(
                         user_language=user_language,
-                        regional_context=regional_context_obj,
+                        regional_context=self._regional_context(regional_context),
                         user_profile=user_context or {},
-                        recipe_count=3
+                        tier=tier
                     )
+                    prompt = assembled.text
+                    logger.debug(f"🧮 Prompt tokens: {assembled.token_estimate()}")
                     response = await provider.generate_with_retry(prompt, image_data)
                     
                     if response.success:
@@ -358,6 +297,14 @@ class ModelManager:
             error_message="All recipe fallback options failed"
         )
     
+    def _regional_context(self, regional_context: Any) -> RegionalContext:
+        """RegionalContext из dict/None; недостающие поля берутся из региона по умолчанию"""
+        if isinstance(regional_context, RegionalContext):
+            return regional_context
+        if not regional_context:
+            return DEFAULT_REGIONAL_CONTEXT
+        return RegionalContext.from_dict(regional_context, DEFAULT_REGIONAL_CONTEXT)
+    
     def _create_basic_food_analysis_prompt(self, user_language: str, regional_context: Dict[str, Any]) -> str:
         """Создание базового промпта для анализа еды (временная реализация)"""
         
@@ -3,24 +3,46 @@ Enhanced Prompt Builder for c0r.AI ML Service
 Main prompt construction system with regional adaptation and motivation
 """
 
-from typing import Dict, Any, Optional, List
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
 from loguru import logger
 
-from ...models.config.sota_config import TaskType, ModelTier
+from ...models.config.sota_config import TaskType, ModelTier, get_model_config
 # Location models removed - using language-based region detection instead
 from ..motivation.praise_system import MotivationSystem
 from ..utils.plate_weight_estimator import PlateWeightEstimator
 
 
-# Simple stubs for removed location models
+@dataclass
 class RegionalContext:
-    """Simple stub for RegionalContext"""
-    def __init__(self, region_code: str = "INTL"):
-        self.region_code = region_code
-        self.common_products = []
-        self.cooking_methods = []
-        self.measurement_units = "metric"
+    """Regional cuisine context baked into the static part of prompts"""
+    region_code: str = "INTL"
+    cuisine_types: List[str] = field(default_factory=lambda: ["international"])
+    common_products: List[str] = field(default_factory=list)
+    cooking_methods: List[str] = field(default_factory=list)
+    measurement_units: str = "metric"
+    food_culture_notes: str = ""
+    seasonal_products: Dict[str, List[str]] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], defaults: "RegionalContext" = None) -> "RegionalContext":
+        defaults = defaults or cls()
+        return cls(**{name: data.get(name, getattr(defaults, name)) for name in cls.__dataclass_fields__})
+
+    def fingerprint(self) -> Tuple:
+        """Hashable identity of everything the prompt skeleton reads"""
+        return (
+            self.region_code,
+            tuple(self.cuisine_types),
+            tuple(self.common_products[:15]),
+            tuple(self.cooking_methods),
+            self.measurement_units,
+            self.food_culture_notes,
+            tuple(sorted((season, tuple(products[:5])) for season, products in self.seasonal_products.items())),
+        )
 
 
 class LocationInfo:
@@ -29,17 +51,201 @@ class LocationInfo:
         self.country_code = country_code
 
 
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a tokenizer: ~4 ASCII characters per token,
+    while Cyrillic and other non-ASCII text is close to 2 characters per token
+    """
+    non_ascii = len(text.encode("utf-8")) - len(text)
+    return (len(text) - non_ascii) // 4 + non_ascii // 2
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """Static, byte-stable prompt prefix for one (task, language, region, tier, season)"""
+    task: TaskType
+    language: str
+    region_code: str
+    tier: ModelTier
+    prefix: str
+    prefix_tokens: int
+    prefix_hash: str
+    max_output_tokens: int
+
+
+@dataclass(frozen=True)
+class AssembledPrompt:
+    """Compiled prefix plus the per-user suffix filled at request time"""
+    compiled: CompiledPrompt
+    suffix: str
+    suffix_tokens: int
+
+    @property
+    def text(self) -> str:
+        return self.compiled.prefix + self.suffix
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.compiled.prefix_tokens + self.suffix_tokens
+
+    def token_estimate(self) -> Dict[str, Any]:
+        return {
+            "prefix_tokens": self.compiled.prefix_tokens,
+            "suffix_tokens": self.suffix_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "max_output_tokens": self.compiled.max_output_tokens,
+            "prefix_hash": self.compiled.prefix_hash,
+        }
+
+
 class PromptBuilder:
-    """Конструктор промптов с поддержкой региональной адаптации"""
+    """
+    Конструктор промптов с поддержкой региональной адаптации
+
+    Static parts of every prompt (instructions, regional context, response
+    format) are compiled once per (task, language, region, tier, season) into
+    ``prompt_cache``; requests only fill the per-user suffix (motivation,
+    encouragement, user context). The prefix is byte-identical across users,
+    so provider-side prompt caching can reuse it.
+    """
+
+    PROMPT_TASKS = (TaskType.FOOD_ANALYSIS, TaskType.RECIPE_GENERATION)
     
     def __init__(self):
         self.motivation_system = MotivationSystem()
         self.weight_estimator = PlateWeightEstimator()
         
-        # Кэш промптов для оптимизации
-        self.prompt_cache: Dict[str, str] = {}
+        # Кэш скомпилированных промптов
+        self.prompt_cache: Dict[Tuple, CompiledPrompt] = {}
+        self._compile_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
         
         logger.info("🎯 PromptBuilder initialized")
+
+    def precompile(self,
+                   languages: Tuple[str, ...] = ("ru", "en"),
+                   regional_contexts: Optional[List[RegionalContext]] = None,
+                   tiers: Optional[List[ModelTier]] = None) -> int:
+        """
+        Compile skeletons for every task/language/region/tier at startup
+
+        Returns:
+            Number of compiled prompts in the cache
+        """
+        for regional_context in regional_contexts or [RegionalContext()]:
+            for task in self.PROMPT_TASKS:
+                for tier in tiers or list(ModelTier):
+                    for language in languages:
+                        self.compile(task, language, regional_context, tier)
+        logger.info(f"🎯 Precompiled {len(self.prompt_cache)} prompt skeletons")
+        return len(self.prompt_cache)
+
+    def compile(self,
+                task: TaskType,
+                user_language: str,
+                regional_context: RegionalContext,
+                tier: ModelTier = ModelTier.SOTA) -> CompiledPrompt:
+        """Static prompt prefix for the key, compiled on first use"""
+        language = "ru" if user_language == "ru" else "en"
+        season = self._current_season()
+        key = (task, language, tier, season, regional_context.fingerprint())
+        compiled = self.prompt_cache.get(key)
+        if compiled is not None:
+            self.cache_hits += 1
+            return compiled
+        with self._compile_lock:
+            compiled = self.prompt_cache.get(key)
+            if compiled is None:
+                self.cache_misses += 1
+                compiled = self._compile(task, language, regional_context, tier, season)
+                self.prompt_cache[key] = compiled
+        return compiled
+
+    def _compile(self, task: TaskType, language: str, regional_context: RegionalContext,
+                 tier: ModelTier, season: str) -> CompiledPrompt:
+        if task == TaskType.FOOD_ANALYSIS:
+            skeleton = self._build_russian_food_analysis_prompt if language == "ru" else self._build_english_food_analysis_prompt
+            prefix = skeleton(
+                regional_products=", ".join(regional_context.common_products[:10]),  # Топ-10 продуктов
+                seasonal_products=", ".join(regional_context.seasonal_products.get(season, [])[:5]),
+                cooking_methods=", ".join(regional_context.cooking_methods[:5]),  # Топ-5 методов
+                portion_context=self.weight_estimator.get_portion_context(regional_context.region_code),
+                measurement_units=regional_context.measurement_units,
+                regional_context=regional_context
+            )
+        elif task == TaskType.RECIPE_GENERATION:
+            skeleton = self._build_russian_recipe_prompt if language == "ru" else self._build_english_recipe_prompt
+            prefix = skeleton(
+                regional_cuisine=", ".join(regional_context.cuisine_types),
+                available_products=", ".join(regional_context.common_products[:15]),
+                regional_context=regional_context
+            )
+        else:
+            raise ValueError(f"No prompt skeleton for task {task.value}")
+        return CompiledPrompt(
+            task=task,
+            language=language,
+            region_code=regional_context.region_code,
+            tier=tier,
+            prefix=prefix,
+            prefix_tokens=estimate_tokens(prefix),
+            prefix_hash=hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16],
+            max_output_tokens=get_model_config(task, tier).max_tokens,
+        )
+
+    def assemble_food_analysis(self,
+                               user_language: str,
+                               regional_context: RegionalContext,
+                               user_profile: Dict[str, Any],
+                               motivation_level: str = "standard",
+                               tier: ModelTier = ModelTier.SOTA) -> AssembledPrompt:
+        """Food analysis prompt: compiled prefix + motivation suffix"""
+        compiled = self.compile(TaskType.FOOD_ANALYSIS, user_language, regional_context, tier)
+        motivation_greeting = self.motivation_system.get_motivation_greeting(
+            user_language, motivation_level, user_profile.get('analysis_count', 0)
+        )
+        encouragement = self.motivation_system.get_encouragement_message(user_language, "healthy_choice")
+        if compiled.language == "ru":
+            suffix = f"""
+ПЕРСОНАЛЬНОЕ ОБРАЩЕНИЕ:
+{motivation_greeting}
+Поле "encouragement" заполни этим текстом: {encouragement}
+"""
+        else:
+            suffix = f"""
+PERSONAL NOTE:
+{motivation_greeting}
+Fill the "encouragement" field with: {encouragement}
+"""
+        return AssembledPrompt(compiled=compiled, suffix=suffix, suffix_tokens=estimate_tokens(suffix))
+
+    def assemble_recipe_generation(self,
+                                   user_language: str,
+                                   regional_context: RegionalContext,
+                                   user_profile: Dict[str, Any],
+                                   tier: ModelTier = ModelTier.SOTA) -> AssembledPrompt:
+        """Recipe prompt: compiled prefix + user context suffix"""
+        compiled = self.compile(TaskType.RECIPE_GENERATION, user_language, regional_context, tier)
+        motivation_greeting = self.motivation_system.get_cooking_motivation(
+            user_language, user_profile.get('cooking_level', 'beginner')
+        )
+        user_context_str = self._build_user_context_string(user_profile, compiled.language)
+        if compiled.language == "ru":
+            suffix = f"""
+КОНТЕКСТ ПОЛЬЗОВАТЕЛЯ:
+{user_context_str}
+
+{motivation_greeting}
+"""
+        else:
+            suffix = f"""
+USER CONTEXT:
+{user_context_str}
+
+{motivation_greeting}
+"""
+        return AssembledPrompt(compiled=compiled, suffix=suffix, suffix_tokens=estimate_tokens(suffix))
     
     def build_food_analysis_prompt(self, 
                                  user_language: str,
@@ -59,47 +265,7 @@ class PromptBuilder:
             Готовый промпт для анализа еды
         """
         logger.debug(f"🍽️ Building food analysis prompt for {regional_context.region_code} in {user_language}")
-        
-        # Генерируем мотивационное приветствие
-        motivation_greeting = self.motivation_system.get_motivation_greeting(
-            user_language, motivation_level, user_profile.get('analysis_count', 0)
-        )
-        
-        # Получаем региональные особенности
-        regional_products = ", ".join(regional_context.common_products[:10])  # Топ-10 продуктов
-        seasonal_products = self._get_current_seasonal_products(regional_context)
-        cooking_methods = ", ".join(regional_context.cooking_methods[:5])  # Топ-5 методов
-        
-        # Создаем контекст для оценки веса
-        portion_context = self.weight_estimator.get_portion_context(regional_context.region_code)
-        
-        # Генерируем поощрительное сообщение
-        encouragement = self.motivation_system.get_encouragement_message(
-            user_language, "healthy_choice"
-        )
-        
-        if user_language == "ru":
-            return self._build_russian_food_analysis_prompt(
-                motivation_greeting=motivation_greeting,
-                regional_products=regional_products,
-                seasonal_products=seasonal_products,
-                cooking_methods=cooking_methods,
-                portion_context=portion_context,
-                measurement_units=regional_context.measurement_units,
-                encouragement=encouragement,
-                regional_context=regional_context
-            )
-        else:
-            return self._build_english_food_analysis_prompt(
-                motivation_greeting=motivation_greeting,
-                regional_products=regional_products,
-                seasonal_products=seasonal_products,
-                cooking_methods=cooking_methods,
-                portion_context=portion_context,
-                measurement_units=regional_context.measurement_units,
-                encouragement=encouragement,
-                regional_context=regional_context
-            )
+        return self.assemble_food_analysis(user_language, regional_context, user_profile, motivation_level).text
     
     def build_recipe_generation_prompt(self,
                                      user_language: str,
@@ -119,43 +285,11 @@ class PromptBuilder:
             Готовый промпт для генерации рецептов
         """
         logger.debug(f"👨‍🍳 Building recipe generation prompt for {recipe_count} recipes")
-        
-        # Мотивационное приветствие
-        motivation_greeting = self.motivation_system.get_cooking_motivation(
-            user_language, user_profile.get('cooking_level', 'beginner')
-        )
-        
-        # Контекст пользователя
-        user_context_str = self._build_user_context_string(user_profile, user_language)
-        
-        # Региональные особенности
-        regional_cuisine = ", ".join(regional_context.cuisine_types)
-        available_products = ", ".join(regional_context.common_products[:15])
-        
-        if user_language == "ru":
-            return self._build_russian_recipe_prompt(
-                motivation_greeting=motivation_greeting,
-                regional_cuisine=regional_cuisine,
-                available_products=available_products,
-                user_context=user_context_str,
-                regional_context=regional_context,
-                recipe_count=recipe_count
-            )
-        else:
-            return self._build_english_recipe_prompt(
-                motivation_greeting=motivation_greeting,
-                regional_cuisine=regional_cuisine,
-                available_products=available_products,
-                user_context=user_context_str,
-                regional_context=regional_context,
-                recipe_count=recipe_count
-            )
+        return self.assemble_recipe_generation(user_language, regional_context, user_profile).text
     
     def _build_russian_food_analysis_prompt(self, **kwargs) -> str:
-        """Создание русского промпта для анализа еды"""
+        """Статическая часть русского промпта для анализа еды"""
         return f"""
-{kwargs['motivation_greeting']}
-
 Ты - эксперт по питанию, специализирующийся на {kwargs['regional_context'].cuisine_types[0]} кухне. Проанализируй это изображение еды с максимальной точностью.
 
 РЕГИОНАЛЬНЫЙ КОНТЕКСТ ({kwargs['regional_context'].region_code}):
@@ -217,7 +351,7 @@ class PromptBuilder:
         "regional_nutrition_notes": "{{особенности питательности в контексте {kwargs['regional_context'].region_code} кухни}}",
         "balance_assessment": "{{оценка сбалансированности БЖУ}}"
     }},
-    "encouragement": "{kwargs['encouragement']}"
+    "encouragement": "{{поощрение из ПЕРСОНАЛЬНОГО ОБРАЩЕНИЯ ниже}}"
 }}
 
 ДОПОЛНИТЕЛЬНЫЕ ИНСТРУКЦИИ:
@@ -229,10 +363,8 @@ class PromptBuilder:
 """
     
     def _build_english_food_analysis_prompt(self, **kwargs) -> str:
-        """Создание английского промпта для анализа еды"""
+        """Статическая часть английского промпта для анализа еды"""
         return f"""
-{kwargs['motivation_greeting']}
-
 You are a nutrition expert specializing in {kwargs['regional_context'].cuisine_types[0]} cuisine. Analyze this food image with maximum accuracy.
 
 REGIONAL CONTEXT ({kwargs['regional_context'].region_code}):
@@ -294,7 +426,7 @@ RESPONSE FORMAT (strict JSON):
         "regional_nutrition_notes": "{{nutritional characteristics in {kwargs['regional_context'].region_code} cuisine context}}",
         "balance_assessment": "{{assessment of macronutrient balance}}"
     }},
-    "encouragement": "{kwargs['encouragement']}"
+    "encouragement": "{{encouragement from the PERSONAL NOTE below}}"
 }}
 
 ADDITIONAL INSTRUCTIONS:
@@ -306,14 +438,9 @@ ADDITIONAL INSTRUCTIONS:
 """
     
     def _build_russian_recipe_prompt(self, **kwargs) -> str:
-        """Создание русского промпта для генерации рецептов"""
+        """Статическая часть русского промпта для генерации рецептов"""
         return f"""
-{kwargs['motivation_greeting']}
-
-Ты - шеф-повар и эксперт по {kwargs['regional_cuisine']} кухне. Проанализируй изображение и создай ТРИ разных рецепта, ранжированных по соответствию пользователю.
-
-КОНТЕКСТ ПОЛЬЗОВАТЕЛЯ:
-{kwargs['user_context']}
+Ты - шеф-повар и эксперт по {kwargs['regional_cuisine']} кухне. Проанализируй изображение и создай ТРИ разных рецепта, ранжированных по соответствию пользователю (КОНТЕКСТ ПОЛЬЗОВАТЕЛЯ приведен в конце).
 
 РЕГИОНАЛЬНЫЙ КОНТЕКСТ ({kwargs['regional_context'].region_code}):
 - Типы кухни: {kwargs['regional_cuisine']}
@@ -411,14 +538,9 @@ ADDITIONAL INSTRUCTIONS:
 """
     
     def _build_english_recipe_prompt(self, **kwargs) -> str:
-        """Создание английского промпта для генерации рецептов"""
+        """Статическая часть английского промпта для генерации рецептов"""
         return f"""
-{kwargs['motivation_greeting']}
-
-You are a chef and expert in {kwargs['regional_cuisine']} cuisine. Analyze the image and create THREE different recipes, ranked by user suitability.
-
-USER CONTEXT:
-{kwargs['user_context']}
+You are a chef and expert in {kwargs['regional_cuisine']} cuisine. Analyze the image and create THREE different recipes, ranked by user suitability (USER CONTEXT is given at the end).
 
 REGIONAL CONTEXT ({kwargs['regional_context'].region_code}):
 - Cuisine types: {kwargs['regional_cuisine']}
@@ -515,21 +637,18 @@ ADDITIONAL INSTRUCTIONS:
 - All numeric values must be numbers
 """
     
-    def _get_current_seasonal_products(self, regional_context: RegionalContext) -> str:
-        """Получение текущих сезонных продуктов"""
+    @staticmethod
+    def _current_season() -> str:
+        """Текущий сезон для выбора сезонных продуктов"""
         current_month = datetime.now().month
         
         if current_month in [3, 4, 5]:
-            season = "spring"
+            return "spring"
         elif current_month in [6, 7, 8]:
-            season = "summer"
+            return "summer"
         elif current_month in [9, 10, 11]:
-            season = "autumn"
-        else:
-            season = "winter"
-        
-        seasonal_products = regional_context.seasonal_products.get(season, [])
-        return ", ".join(seasonal_products[:5])  # Топ-5 сезонных продуктов
+            return "autumn"
+        return "winter"
     
     def _build_user_context_string(self, user_profile: Dict[str, Any], language: str) -> str:
         """Построение строки контекста пользователя"""
@@ -599,5 +718,24 @@ ADDITIONAL INSTRUCTIONS:
         """Получение статистики кэша"""
         return {
             "cache_size": len(self.prompt_cache),
-            "cache_keys": list(self.prompt_cache.keys())
-        }
\ No newline at end of file
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_keys": [
+                f"{compiled.task.value}:{compiled.language}:{compiled.region_code}:{compiled.tier.value}:{compiled.prefix_hash}"
+                for compiled in self.prompt_cache.values()
+            ]
+        }
+
+
+_prompt_builder: Optional[PromptBuilder] = None
+_prompt_builder_lock = threading.Lock()
+
+
+def get_prompt_builder() -> PromptBuilder:
+    """Process-wide PromptBuilder; its compiled prompts are shared by all requests"""
+    global _prompt_builder
+    if _prompt_builder is None:
+        with _prompt_builder_lock:
+            if _prompt_builder is None:
+                _prompt_builder = PromptBuilder()
+    return _prompt_builder
@@ -6,6 +6,8 @@ Provides regional context for portion size estimation
 from typing import Dict, List, Optional, Tuple
 from loguru import logger
 
+from common.food_taxonomy import classify_food
+
 
 class PlateWeightEstimator:
     """Утилиты для оценки веса порций с учетом региональных особенностей"""
@@ -138,71 +140,10 @@ class PlateWeightEstimator:
     def _get_base_food_weights(self, food_name: str) -> Dict[str, int]:
         """Получение базовых весов для продукта"""
         
-        # Нормализуем название продукта
-        food_lower = food_name.lower()
-        
-        # Базовая база данных весов продуктов (в граммах для среднего размера)
-        food_weights = {
-            # Мясо и птица
-            "курица": {"small": 80, "medium": 120, "large": 180},
-            "говядина": {"small": 90, "medium": 140, "large": 200},
-            "свинина": {"small": 85, "medium": 130, "large": 190},
-            "рыба": {"small": 70, "medium": 110, "large": 160},
-            "котлета": {"small": 60, "medium": 90, "large": 130},
-            
-            # Гарниры
-            "рис": {"small": 60, "medium": 100, "large": 150},
-            "картофель": {"small": 80, "medium": 120, "large": 180},
-            "макароны": {"small": 70, "medium": 110, "large": 160},
-            "гречка": {"small": 65, "medium": 100, "large": 140},
-            "пюре": {"small": 80, "medium": 120, "large": 180},
-            
-            # Овощи
-            "салат": {"small": 50, "medium": 80, "large": 120},
-            "помидор": {"small": 60, "medium": 100, "large": 150},
-            "огурец": {"small": 40, "medium": 70, "large": 100},
-            "капуста": {"small": 50, "medium": 80, "large": 120},
-            "морковь": {"small": 30, "medium": 50, "large": 80},
-            
-            # Молочные продукты
-            "творог": {"small": 60, "medium": 100, "large": 150},
-            "сыр": {"small": 20, "medium": 40, "large": 60},
-            "йогурт": {"small": 80, "medium": 125, "large": 200},
-            
-            # Хлебобулочные
-            "хлеб": {"small": 15, "medium": 25, "large": 40},
-            "булочка": {"small": 30, "medium": 50, "large": 80},
-            
-            # Супы
-            "суп": {"small": 150, "medium": 250, "large": 350},
-            "борщ": {"small": 150, "medium": 250, "large": 350},
-            
-            # Каши
-            "каша": {"small": 80, "medium": 120, "large": 180},
-            "овсянка": {"small": 70, "medium": 110, "large": 160},
-            
-            # Фрукты
-            "яблоко": {"small": 80, "medium": 120, "large": 180},
-            "банан": {"small": 60, "medium": 100, "large": 140},
-            "апельсин": {"small": 80, "medium": 130, "large": 200},
-        }
-        
-        # Поиск по ключевым словам
-        for key, weights in food_weights.items():
-            if key in food_lower or food_lower in key:
-                return weights
-        
-        # Определение по категориям
-        if any(word in food_lower for word in ["мясо", "курица", "говядина", "свинина", "баранина"]):
-            return {"small": 85, "medium": 130, "large": 190}
-        elif any(word in food_lower for word in ["рыба", "лосось", "треска", "судак"]):
-            return {"small": 70, "medium": 110, "large": 160}
-        elif any(word in food_lower for word in ["овощи", "салат", "капуста", "морковь"]):
-            return {"small": 45, "medium": 75, "large": 110}
-        elif any(word in food_lower for word in ["каша", "рис", "гречка", "овсянка"]):
-            return {"small": 70, "medium": 110, "large": 160}
-        elif any(word in food_lower for word in ["суп", "борщ", "солянка", "щи"]):
-            return {"small": 150, "medium": 250, "large": 350}
+        # Конкретный продукт или категория из общей таксономии продуктов
+        portion = classify_food(food_name).portion
+        if portion:
+            return dict(portion)
         
         # Базовый вес по умолчанию
         return {"small": 60, "medium": 100, "large": 150}
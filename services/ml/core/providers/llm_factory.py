@@ -2,14 +2,17 @@
 LLM Provider Factory for dynamic model switching
 """
 
+import asyncio
 import os
 from enum import Enum
-from typing import Dict, Any, Callable, Optional
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional
 from loguru import logger
 
-from services.ml.openai.client import analyze_food_with_openai
+from services.ml.openai.client import analyze_food_with_openai, stream_food_analysis_with_openai
 from services.ml.perplexity.client import analyze_food_with_perplexity
 from services.ml.gemini.client import analyze_food_with_gemini
+from services.ml.streaming import food_analysis_fields, format_sse, iter_partial_events, stream_json_events
+from services.ml.core.providers.tier_router import ModelTierRouter, profile_for_images
 
 
 class LLMProvider(Enum):
@@ -32,6 +35,15 @@ class LLMProviderFactory:
         # Get current provider from environment
         self.current_provider = self._get_current_provider()
         logger.info(f"🤖 LLM Provider initialized: {self.current_provider.value}")
+
+        # Opt-in: pick the cheapest adequate OpenAI model per request and escalate on bad answers
+        self.tier_router: Optional[ModelTierRouter] = None
+        if os.getenv("LLM_TIER_ROUTING", "false").lower() in ("1", "true", "yes"):
+            self.tier_router = ModelTierRouter({"openai": self._run_openai_model})
+            logger.info(f"🔀 Model tier routing enabled: {[c.config.name for c in self.tier_router.candidates]}")
+
+    async def _run_openai_model(self, image_bytes: bytes, user_language: str, model: str) -> Dict[str, Any]:
+        return await self.providers[LLMProvider.OPENAI](image_bytes, user_language, False, model=model)
     
     def _get_current_provider(self) -> LLMProvider:
         """
@@ -95,7 +107,11 @@ class LLMProviderFactory:
         try:
             logger.info(f"🔍 Analyzing food with {effective_provider.value}")
             logger.info(f"🔧 Provider function: {provider_func}")
-            result = await provider_func(image_bytes, user_language, use_premium_model)
+            if self.tier_router and effective_provider == LLMProvider.OPENAI:
+                profile = profile_for_images([image_bytes], user_tier="premium" if use_premium_model else "free")
+                result = await self.tier_router.run(image_bytes, user_language, profile)
+            else:
+                result = await provider_func(image_bytes, user_language, use_premium_model)
             logger.info(f"✅ {effective_provider.value} analysis completed successfully")
             
             # Ensure provider info is included for debugging
@@ -148,6 +164,81 @@ class LLMProviderFactory:
                 }
             }
     
+    async def stream_analyze_food(
+        self,
+        image_bytes: bytes,
+        user_language: str = "en",
+        use_premium_model: bool = False,
+        provider_override: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Analyze food and yield Server-Sent Events as fields become available
+        
+        Providers with token streaming (OpenAI) emit `partial` events while the
+        answer is generated; others emit one `partial` with the full answer.
+        The last event is `result` with the same payload as analyze_food.
+        """
+        effective_provider = self.current_provider
+        if provider_override:
+            try:
+                effective_provider = LLMProvider(provider_override.lower())
+            except ValueError:
+                logger.warning(f"Invalid provider_override '{provider_override}', using default {self.current_provider.value}")
+
+        if effective_provider == LLMProvider.OPENAI and self.tier_router:
+            async for event in self._stream_routed(image_bytes, user_language, use_premium_model):
+                yield event
+            return
+
+        if effective_provider == LLMProvider.OPENAI:
+            deltas, parse = stream_food_analysis_with_openai(image_bytes, user_language, use_premium_model)
+
+            def finalize(content: str) -> Dict[str, Any]:
+                result = parse(content)
+                result.get("analysis", result)["llm_provider"] = effective_provider.value
+                return result
+
+            async for event in stream_json_events(deltas, food_analysis_fields, finalize):
+                yield event
+            return
+
+        result = await self.analyze_food(image_bytes, user_language, use_premium_model, provider_override)
+        yield format_sse("partial", food_analysis_fields(result, final=True))
+        yield format_sse("result", result)
+
+    async def _stream_routed(
+        self, image_bytes: bytes, user_language: str, use_premium_model: bool
+    ) -> AsyncIterator[str]:
+        """
+        Same routing as analyze_food: the first tier is streamed (its `partial`
+        events go out as they come), escalations run blocking through the router.
+        """
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def stream_first(image: bytes, language: str, model: str) -> Dict[str, Any]:
+            deltas, parse = stream_food_analysis_with_openai(image, language, use_premium_model, model=model)
+            chunks: List[str] = []
+            async for event in iter_partial_events(deltas, food_analysis_fields, chunks):
+                events.put_nowait(event)
+            return parse("".join(chunks))
+
+        profile = profile_for_images([image_bytes], user_tier="premium" if use_premium_model else "free")
+        task = asyncio.create_task(self.tier_router.run(image_bytes, user_language, profile, first_runner=stream_first))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            try:
+                result = task.result()
+            except Exception as e:
+                logger.error(f"Routed streaming analysis failed: {e}")
+                yield format_sse("error", {"detail": "Streaming failed"})
+                return
+            result.get("analysis", result)["llm_provider"] = LLMProvider.OPENAI.value
+            yield format_sse("result", result)
+        finally:
+            task.cancel()
+
     def get_current_provider(self) -> str:
         """
         Get current provider name
@@ -185,6 +276,10 @@ class LLMProviderFactory:
         """
         return [provider.value for provider in LLMProvider]
 
+    def routing_stats(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Per-tier routing stats, or None when tier routing is disabled"""
+        return self.tier_router.stats_snapshot() if self.tier_router else None
+
 
 # Global factory instance
 llm_factory = LLMProviderFactory() 
\ No newline at end of file
@@ -0,0 +1,324 @@
+"""
+Cost- and complexity-aware model tier routing for food analysis
+
+The router estimates how hard a request is (image count and size, prompt length,
+task type, user tier), starts on the cheapest tier expected to succeed at that
+complexity and escalates to a more expensive tier only when the answer is
+invalid or low-confidence. Per-tier success, latency and cost are tracked per
+complexity bucket and feed back into the tier choice.
+
+Tiers come from `SOTA_MODEL_CONFIGS`; a tier is only used when a runner is
+registered for its provider (OpenAI in this service), so unsupported entries
+are skipped.
+"""
+
+import io
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from services.ml.core.models.config.sota_config import (
+    SOTA_MODEL_CONFIGS,
+    ModelConfig,
+    ModelTier,
+    TaskType,
+)
+
+# Runner: (image_bytes, user_language, model_name) -> analysis result
+TierRunner = Callable[[bytes, str, str], Awaitable[Dict[str, Any]]]
+
+# Answers below this regional_match_confidence are retried on a stronger tier
+MIN_CONFIDENCE = float(os.getenv("LLM_ROUTER_MIN_CONFIDENCE", "0.5"))
+# Expected success rate a tier needs at the request's complexity to be picked first
+SUCCESS_TARGET = float(os.getenv("LLM_ROUTER_SUCCESS_TARGET", "0.85"))
+
+# Quality order (weakest first) and prior success rates before any observations
+TIER_ORDER = [ModelTier.BUDGET, ModelTier.STANDARD, ModelTier.PREMIUM, ModelTier.SOTA]
+TIER_PRIOR_SUCCESS = {
+    ModelTier.BUDGET: 0.80,
+    ModelTier.STANDARD: 0.88,
+    ModelTier.PREMIUM: 0.92,
+    ModelTier.SOTA: 0.98,
+}
+# How much harder the hardest requests are for each tier (subtracted from the prior at complexity 1.0)
+TIER_COMPLEXITY_PENALTY = {
+    ModelTier.BUDGET: 0.45,
+    ModelTier.STANDARD: 0.30,
+    ModelTier.PREMIUM: 0.20,
+    ModelTier.SOTA: 0.05,
+}
+PRIOR_WEIGHT = 10  # observations the prior is worth
+COMPLEXITY_BUCKETS = (0.33, 0.66)  # low / medium / high
+
+TASK_COMPLEXITY = {
+    TaskType.FOOD_ANALYSIS: 0.3,
+    TaskType.RECIPE_GENERATION: 0.5,
+    TaskType.NUTRITION_EXPLANATION: 0.2,
+    TaskType.MOTIVATION_GENERATION: 0.1,
+}
+
+# Vision token accounting (OpenAI high detail): 85 base + 170 per 512px tile
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+PROMPT_TOKENS = 900
+COMPLETION_TOKENS = 450
+
+
+@dataclass
+class RequestProfile:
+    """What the router knows about a request before calling a model"""
+    task_type: TaskType = TaskType.FOOD_ANALYSIS
+    image_sizes: List[Tuple[int, int]] = field(default_factory=list)
+    prompt_chars: int = 0
+    user_tier: str = "free"  # free | paid | premium
+
+    @property
+    def image_tiles(self) -> int:
+        return sum(image_tiles(width, height) for width, height in self.image_sizes)
+
+    def estimated_tokens(self) -> int:
+        images = len(self.image_sizes) * IMAGE_BASE_TOKENS + self.image_tiles * IMAGE_TILE_TOKENS
+        return PROMPT_TOKENS + self.prompt_chars // 4 + images + COMPLETION_TOKENS
+
+
+def image_tiles(width: int, height: int) -> int:
+    """512px tiles after fitting into 2048x2048 and scaling the short side to 768"""
+    if width <= 0 or height <= 0:
+        return 1
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def profile_for_images(
+    images: List[bytes],
+    task_type: TaskType = TaskType.FOOD_ANALYSIS,
+    prompt_chars: int = 0,
+    user_tier: str = "free",
+) -> RequestProfile:
+    """Build a profile from raw images; only the image headers are read"""
+    sizes = []
+    for data in images:
+        try:
+            from PIL import Image
+            with Image.open(io.BytesIO(data)) as image:
+                sizes.append(image.size)
+        except Exception:
+            # Unknown format: assume a typical phone photo
+            sizes.append((1280, 960))
+    return RequestProfile(task_type=task_type, image_sizes=sizes, prompt_chars=prompt_chars, user_tier=user_tier)
+
+
+def estimate_complexity(profile: RequestProfile) -> float:
+    """0.0 (trivial) .. 1.0 (hardest) from task type, images, prompt length and user tier"""
+    score = TASK_COMPLEXITY.get(profile.task_type, 0.35)
+    # More images and more detail (tiles) usually mean more dishes on the plate
+    score += 0.15 * max(0, len(profile.image_sizes) - 1)
+    score += 0.04 * max(0, profile.image_tiles - 4)
+    score += min(0.2, profile.prompt_chars / 10_000)
+    if profile.user_tier == "premium":
+        # Paying for quality: start higher
+        score += 0.3
+    return max(0.0, min(1.0, score))
+
+
+def complexity_bucket(complexity: float) -> str:
+    if complexity < COMPLEXITY_BUCKETS[0]:
+        return "low"
+    if complexity < COMPLEXITY_BUCKETS[1]:
+        return "medium"
+    return "high"
+
+
+def validate_analysis(result: Dict[str, Any], min_confidence: float = MIN_CONFIDENCE) -> Optional[str]:
+    """Return why a food analysis needs a stronger tier, or None if it is usable"""
+    analysis = result.get("analysis") if isinstance(result, dict) else None
+    if not isinstance(analysis, dict):
+        return "invalid_schema"
+    if analysis.get("error"):
+        return "invalid_schema"
+    nutrition = analysis.get("total_nutrition")
+    if not isinstance(nutrition, dict):
+        return "invalid_schema"
+    try:
+        calories = float(nutrition.get("calories"))
+    except (TypeError, ValueError):
+        return "invalid_schema"
+    if calories <= 0 or not isinstance(analysis.get("food_items"), list) or not analysis["food_items"]:
+        return "invalid_schema"
+    confidence = (analysis.get("regional_analysis") or {}).get("regional_match_confidence")
+    if confidence is not None:
+        try:
+            if float(confidence) < min_confidence:
+                return "low_confidence"
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+@dataclass
+class TierStats:
+    """Observed outcomes of one tier in one complexity bucket"""
+    calls: int = 0
+    successes: int = 0
+    escalations: int = 0
+    errors: int = 0
+    total_latency: float = 0.0
+    total_cost: float = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.calls if self.calls else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "successes": self.successes,
+            "escalations": self.escalations,
+            "errors": self.errors,
+            "avg_latency_sec": round(self.avg_latency, 4),
+            "total_cost_usd": round(self.total_cost, 6),
+        }
+
+
+@dataclass
+class TierCandidate:
+    tier: ModelTier
+    config: ModelConfig
+    runner: TierRunner
+
+
+class ModelTierRouter:
+    """Picks the cheapest adequate tier per request and escalates on bad answers"""
+
+    def __init__(
+        self,
+        runners: Dict[str, TierRunner],
+        task_type: TaskType = TaskType.FOOD_ANALYSIS,
+        configs: Optional[Dict[ModelTier, ModelConfig]] = None,
+        min_confidence: float = MIN_CONFIDENCE,
+        success_target: float = SUCCESS_TARGET,
+        validate: Callable[[Dict[str, Any], float], Optional[str]] = validate_analysis,
+    ):
+        self.task_type = task_type
+        self.min_confidence = min_confidence
+        self.success_target = success_target
+        self.validate = validate
+        configs = configs if configs is not None else SOTA_MODEL_CONFIGS.get(task_type, {})
+        # Cheapest first; tiers without a runner for their provider are not usable here
+        self.candidates: List[TierCandidate] = sorted(
+            (TierCandidate(tier, config, runners[config.provider])
+             for tier, config in configs.items() if config.provider in runners),
+            key=lambda candidate: candidate.config.cost_per_1k_tokens,
+        )
+        if not self.candidates:
+            raise ValueError(f"No runnable tiers for {task_type.value}")
+        self.stats: Dict[Tuple[ModelTier, str], TierStats] = {}
+
+    def _stats(self, tier: ModelTier, bucket: str) -> TierStats:
+        return self.stats.setdefault((tier, bucket), TierStats())
+
+    def expected_success(self, tier: ModelTier, complexity: float) -> float:
+        """Prior for the tier at this complexity, updated with what the bucket has seen"""
+        prior = TIER_PRIOR_SUCCESS.get(tier, 0.85) - TIER_COMPLEXITY_PENALTY.get(tier, 0.2) * complexity
+        stats = self.stats.get((tier, complexity_bucket(complexity)))
+        if not stats or not stats.calls:
+            return prior
+        return (stats.successes + prior * PRIOR_WEIGHT) / (stats.calls + PRIOR_WEIGHT)
+
+    def plan(self, profile: RequestProfile) -> List[TierCandidate]:
+        """Tiers to try in order: the cheapest expected to succeed, then stronger ones as escalation"""
+        complexity = estimate_complexity(profile)
+        start = None
+        for index, candidate in enumerate(self.candidates):
+            if self.expected_success(candidate.tier, complexity) >= self.success_target:
+                start = index
+                break
+        if start is None:
+            # Nothing reaches the target: go straight to the most reliable tier
+            start = max(range(len(self.candidates)),
+                        key=lambda i: self.expected_success(self.candidates[i].tier, complexity))
+        first = self.candidates[start]
+        rank = TIER_ORDER.index(first.tier) if first.tier in TIER_ORDER else 0
+        escalation = [
+            candidate for candidate in self.candidates
+            if candidate is not first and (TIER_ORDER.index(candidate.tier) if candidate.tier in TIER_ORDER else 0) > rank
+        ]
+        escalation.sort(key=lambda candidate: TIER_ORDER.index(candidate.tier) if candidate.tier in TIER_ORDER else 0)
+        return [first] + escalation
+
+    async def run(
+        self,
+        image_bytes: bytes,
+        user_language: str = "en",
+        profile: Optional[RequestProfile] = None,
+        first_runner: Optional[TierRunner] = None,
+    ) -> Dict[str, Any]:
+        """
+        Analyze with routing; the result carries a `routing` block (tier, model, attempts, cost).
+        `first_runner` replaces the runner of the first planned tier (e.g. a streamed call);
+        escalations use the registered runners.
+        """
+        profile = profile or profile_for_images([image_bytes], self.task_type)
+        complexity = estimate_complexity(profile)
+        bucket = complexity_bucket(complexity)
+        tokens = profile.estimated_tokens()
+        attempts: List[Dict[str, Any]] = []
+        result: Optional[Dict[str, Any]] = None
+        last_error: Optional[Exception] = None
+
+        for index, candidate in enumerate(self.plan(profile)):
+            stats = self._stats(candidate.tier, bucket)
+            runner = first_runner if index == 0 and first_runner else candidate.runner
+            started = time.perf_counter()
+            outcome = None
+            try:
+                result = await runner(image_bytes, user_language, candidate.config.name)
+                outcome = self.validate(result, self.min_confidence)
+            except Exception as e:
+                last_error = e
+                outcome = "error"
+                stats.errors += 1
+            latency = time.perf_counter() - started
+            cost = tokens / 1000 * candidate.config.cost_per_1k_tokens
+            stats.calls += 1
+            stats.total_latency += latency
+            stats.total_cost += cost
+            attempts.append({
+                "tier": candidate.tier.value,
+                "model": candidate.config.name,
+                "outcome": outcome or "ok",
+                "latency_sec": round(latency, 4),
+                "cost_usd": cost,
+            })
+            if outcome is None:
+                stats.successes += 1
+                break
+            stats.escalations += 1
+            logger.info(f"🔀 Tier {candidate.tier.value} ({candidate.config.name}) gave {outcome}, escalating")
+
+        if result is None:
+            raise last_error or RuntimeError("No tier produced a result")
+
+        routing = {
+            "complexity": round(complexity, 3),
+            "bucket": bucket,
+            "tier": attempts[-1]["tier"],
+            "model": attempts[-1]["model"],
+            "escalated": len(attempts) > 1,
+            "attempts": attempts,
+            "estimated_cost_usd": round(sum(attempt["cost_usd"] for attempt in attempts), 6),
+        }
+        result.setdefault("analysis", {})["routing"] = routing
+        return result
+
+    def stats_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per tier and complexity bucket: calls, successes, escalations, latency and cost"""
+        return {f"{tier.value}:{bucket}": stats.as_dict() for (tier, bucket), stats in sorted(
+            self.stats.items(), key=lambda item: (item[0][0].value, item[0][1]))}
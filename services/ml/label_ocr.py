@@ -0,0 +1,402 @@
+"""
+Label OCR engine: nutrition-facts table detection and structured OCR.
+
+Pipeline:
+1. Locate the nutrition table on the photo from its ruling lines (row/column
+   projections of dark pixels on a downscaled grayscale copy).
+2. OCR only that crop with `pytesseract.image_to_data`, keeping word boxes
+   and confidences. Without a detectable grid the whole photo is used.
+3. Group words into rows by vertical position and read values by column
+   alignment: numbers are assigned to the nearest column header
+   ("на 100 г" / "порция"), and the per-100 g column is preferred.
+
+The flattened-text parser kept for the legacy path uses the same regexes,
+compiled once at import.
+
+Env:
+- LABEL_OCR_REGION=true|false (default true) — set false to always OCR the full photo
+"""
+from __future__ import annotations
+
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+try:
+    import numpy as np
+    from PIL import Image
+    _REGION_AVAILABLE = True
+except Exception as _e:  # pragma: no cover - depends on image stack
+    _REGION_AVAILABLE = False
+    logger.warning(f"Label table detection not available: {_e}")
+
+LABEL_OCR_REGION = os.getenv("LABEL_OCR_REGION", "true").lower() == "true"
+
+# Detection works on a downscaled copy; coordinates are mapped back
+_DETECT_MAX_SIDE = 800
+# A row counts as a ruling line when it holds an unbroken dark run this long
+# (share of the image width); text rows are broken up by letter spacing
+_H_LINE_RATIO = 0.25
+# Vertical rulings must span this share of the table height
+_V_LINE_RATIO = 0.6
+_MIN_REGION_SHARE = 0.04
+_REGION_PADDING = 0.02
+_MIN_WORD_CONFIDENCE = 30.0
+
+_NUMBER = r"([0-9]+(?:\.[0-9]+)?)"
+_UNIT_GRAMS = r"\s*(g|гр|г)?\b"
+
+# Flattened-text patterns (legacy parser)
+_TEXT_KCAL_RE = re.compile(r"(ккал|kcal)\D{0,15}" + _NUMBER)
+_TEXT_KJ_RE = re.compile(r"(кдж|kj)\D{0,15}" + _NUMBER)
+_TEXT_PROTEIN_RE = re.compile(r"(белк[аи]?|белок|protein[s]?)\D{0,15}" + _NUMBER + _UNIT_GRAMS)
+_TEXT_FAT_RE = re.compile(r"(жир[ыа]?|fat[s]?)\D{0,15}" + _NUMBER + _UNIT_GRAMS)
+_TEXT_CARB_RE = re.compile(r"(углевод[ыа]?|carb[sh]?)\D{0,20}" + _NUMBER + _UNIT_GRAMS)
+_TEXT_SERVING_RE = re.compile(r"(100)\s*(г|g)\b")
+
+# Row labels for the structured parser
+_ROW_FIELDS: Tuple[Tuple[str, "re.Pattern[str]"], ...] = (
+    ("energy", re.compile(r"энерг|калори|energy|calor|ккал|kcal|кдж|\bkj\b")),
+    ("protein", re.compile(r"белк|белок|protein")),
+    ("fat", re.compile(r"жир|\bfat")),
+    ("carbs", re.compile(r"углевод|carb")),
+)
+_NUMBER_TOKEN_RE = re.compile(r"^[<~≈]?" + _NUMBER + r"(ккал|kcal|кдж|kj|г|гр|g|мл|ml)?[.,;:]?$")
+_KCAL_UNIT_RE = re.compile(r"^/?(ккал|kcal)")
+_KJ_UNIT_RE = re.compile(r"^/?(кдж|kj)")
+_PER_100_RE = re.compile(r"^100(г|гр|g|мл|ml)\.?$")
+_SERVING_HEADER_RE = re.compile(r"порци|serving|упаков|package|pack\b")
+
+
+@dataclass
+class OcrWord:
+    text: str
+    left: int
+    top: int
+    width: int
+    height: int
+    confidence: Optional[float] = None
+
+    @property
+    def x_center(self) -> float:
+        return self.left + self.width / 2
+
+    @property
+    def y_center(self) -> float:
+        return self.top + self.height / 2
+
+
+@dataclass
+class OcrRow:
+    words: List[OcrWord]
+
+    @property
+    def text(self) -> str:
+        return " ".join(w.text for w in self.words)
+
+    @property
+    def confidence(self) -> Optional[float]:
+        scores = [w.confidence for w in self.words if w.confidence is not None]
+        return round(sum(scores) / len(scores), 1) if scores else None
+
+
+@dataclass
+class LabelNutrition:
+    kcal: Optional[float] = None
+    kj: Optional[float] = None
+    protein: Optional[float] = None
+    fat: Optional[float] = None
+    carbs: Optional[float] = None
+    basis: str = "per_100g"
+    serving_g: float = 100.0
+
+    def is_empty(self) -> bool:
+        return self.kcal is None and self.kj is None and all(
+            v is None for v in (self.protein, self.fat, self.carbs)
+        )
+
+
+@dataclass
+class LabelOcrResult:
+    text: str = ""
+    rows: List[OcrRow] = field(default_factory=list)
+    nutrition: Optional[LabelNutrition] = None
+    region: Optional[Tuple[int, int, int, int]] = None
+    timings_ms: Dict[str, int] = field(default_factory=dict)
+
+
+def _to_float(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _normalize_label_text(text: str) -> str:
+    return text.replace("\xa0", " ").replace(",", ".").lower()
+
+
+def parse_nutrition_text(text: str) -> Optional[LabelNutrition]:
+    """Regex search over flattened OCR text (no layout information)."""
+    if not text:
+        return None
+    t = _normalize_label_text(text)
+
+    def first(pattern: "re.Pattern[str]") -> Optional[float]:
+        m = pattern.search(t)
+        return _to_float(m.group(2)) if m else None
+
+    values = LabelNutrition(
+        kcal=first(_TEXT_KCAL_RE),
+        kj=first(_TEXT_KJ_RE),
+        protein=first(_TEXT_PROTEIN_RE),
+        fat=first(_TEXT_FAT_RE),
+        carbs=first(_TEXT_CARB_RE),
+    )
+    if _TEXT_SERVING_RE.search(t):
+        values.serving_g = 100.0
+    return values
+
+
+def _line_runs(mask: "np.ndarray", min_gap: int = 2) -> List[Tuple[int, int]]:
+    """Merge indices of a boolean profile into [start, end] runs."""
+    idx = np.flatnonzero(mask)
+    if idx.size == 0:
+        return []
+    runs = []
+    start = prev = int(idx[0])
+    for i in idx[1:]:
+        i = int(i)
+        if i - prev > min_gap:
+            runs.append((start, prev))
+            start = i
+        prev = i
+    runs.append((start, prev))
+    return runs
+
+
+def _has_run(dark: "np.ndarray", length: int) -> "np.ndarray":
+    """Per row: does it contain `length` consecutive dark pixels (sliding-window sum)."""
+    if length <= 0 or length > dark.shape[1]:
+        return np.zeros(dark.shape[0], dtype=bool)
+    cs = np.zeros((dark.shape[0], dark.shape[1] + 1), dtype=np.int32)
+    np.cumsum(dark, axis=1, out=cs[:, 1:])
+    return ((cs[:, length:] - cs[:, :-length]) == length).any(axis=1)
+
+
+def detect_table_region(image: "Image.Image") -> Optional[Tuple[int, int, int, int]]:
+    """
+    Return (left, top, right, bottom) of the ruled nutrition table, or None.
+
+    Needs at least two horizontal ruling lines; vertical lines, when found,
+    tighten the horizontal extent.
+    """
+    if not _REGION_AVAILABLE:
+        return None
+    w, h = image.size
+    scale = min(1.0, _DETECT_MAX_SIDE / max(w, h))
+    small = image.convert("L")
+    if scale < 1.0:
+        small = small.resize((max(1, int(w * scale)), max(1, int(h * scale))))
+    gray = np.asarray(small, dtype=np.uint8)
+    threshold = min(160, int(gray.mean() * 0.75))
+    dark = gray < threshold
+    sh, sw = dark.shape
+
+    h_lines = _line_runs(_has_run(dark, int(sw * _H_LINE_RATIO)))
+    if len(h_lines) < 2:
+        return None
+    top, bottom = h_lines[0][0], h_lines[-1][1]
+
+    # Horizontal extent: the dark span of the ruling rows
+    ruling_rows = np.zeros(sh, dtype=bool)
+    for start, end in h_lines:
+        ruling_rows[start:end + 1] = True
+    cols = np.flatnonzero(dark[ruling_rows].mean(axis=0) >= 0.5)
+    if cols.size == 0:
+        return None
+    left, right = int(cols[0]), int(cols[-1])
+
+    band = dark[top:bottom + 1]
+    if band.shape[0] > 0:
+        v_lines = _line_runs(_has_run(band.T, int(band.shape[0] * _V_LINE_RATIO)))
+        if len(v_lines) >= 2:
+            left, right = max(left, v_lines[0][0]), min(right, v_lines[-1][1])
+
+    if (right - left) * (bottom - top) < _MIN_REGION_SHARE * sw * sh:
+        return None
+
+    pad_x, pad_y = int(sw * _REGION_PADDING), int(sh * _REGION_PADDING)
+    box = (
+        max(0, left - pad_x), max(0, top - pad_y),
+        min(sw, right + pad_x + 1), min(sh, bottom + pad_y + 1),
+    )
+    return tuple(int(round(v / scale)) for v in box)
+
+
+def words_from_tesseract(data: Dict[str, list], offset: Tuple[int, int] = (0, 0)) -> List[OcrWord]:
+    """Convert `image_to_data(..., output_type=DICT)` into words, dropping low-confidence noise."""
+    words = []
+    dx, dy = offset
+    for i, raw in enumerate(data.get("text", [])):
+        text = (raw or "").strip()
+        if not text:
+            continue
+        conf = _to_float(data["conf"][i])
+        if conf is not None and 0 <= conf < _MIN_WORD_CONFIDENCE:
+            continue
+        words.append(OcrWord(
+            text=text,
+            left=int(data["left"][i]) + dx,
+            top=int(data["top"][i]) + dy,
+            width=int(data["width"][i]),
+            height=int(data["height"][i]),
+            confidence=conf if conf is not None and conf >= 0 else None,
+        ))
+    return words
+
+
+def group_rows(words: List[OcrWord]) -> List[OcrRow]:
+    """Cluster words into visual rows by vertical centre, each row sorted left to right."""
+    if not words:
+        return []
+    heights = sorted(w.height for w in words)
+    tolerance = max(4.0, heights[len(heights) // 2] * 0.6)
+    rows: List[List[OcrWord]] = []
+    centres: List[float] = []
+    for word in sorted(words, key=lambda w: w.y_center):
+        if rows and abs(word.y_center - centres[-1]) <= tolerance:
+            rows[-1].append(word)
+            centres[-1] = sum(w.y_center for w in rows[-1]) / len(rows[-1])
+        else:
+            rows.append([word])
+            centres.append(word.y_center)
+    return [OcrRow(words=sorted(r, key=lambda w: w.left)) for r in rows]
+
+
+def _find_columns(rows: List[OcrRow]) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    """Locate the per-100 g and per-serving header columns: (x_100g, x_serving, serving_g)."""
+    per_100_x = serving_x = serving_g = None
+    for row in rows:
+        tokens = [_normalize_label_text(w.text) for w in row.words]
+        for i, token in enumerate(tokens):
+            joined = token + (tokens[i + 1] if i + 1 < len(tokens) else "")
+            if per_100_x is None and (_PER_100_RE.match(token) or _PER_100_RE.match(joined)):
+                per_100_x = row.words[i].x_center
+            elif serving_x is None and _SERVING_HEADER_RE.search(token):
+                serving_x = row.words[i].x_center
+                for follower in tokens[i + 1:i + 4]:
+                    m = _NUMBER_TOKEN_RE.match(follower)
+                    if m and m.group(1) != "100":
+                        serving_g = _to_float(m.group(1))
+                        break
+        if per_100_x is not None and serving_x is not None:
+            break
+    return per_100_x, serving_x, serving_g
+
+
+def _row_numbers(row: OcrRow) -> List[Tuple[float, float, str]]:
+    """Numeric cells of a row as (value, x_center, unit) where unit may come from the next token."""
+    tokens = [_normalize_label_text(w.text) for w in row.words]
+    cells = []
+    for i, token in enumerate(tokens):
+        m = _NUMBER_TOKEN_RE.match(token)
+        if not m:
+            continue
+        unit = m.group(2) or ""
+        if not unit and i + 1 < len(tokens):
+            nxt = tokens[i + 1]
+            if _KCAL_UNIT_RE.match(nxt):
+                unit = "kcal"
+            elif _KJ_UNIT_RE.match(nxt):
+                unit = "kj"
+        elif _KCAL_UNIT_RE.match(unit):
+            unit = "kcal"
+        elif _KJ_UNIT_RE.match(unit):
+            unit = "kj"
+        cells.append((_to_float(m.group(1)), row.words[i].x_center, unit))
+    return [c for c in cells if c[0] is not None]
+
+
+def parse_nutrition_rows(rows: List[OcrRow]) -> Optional[LabelNutrition]:
+    """Read kcal/kJ/macros from OCR rows using column alignment."""
+    if not rows:
+        return None
+    per_100_x, serving_x, serving_g = _find_columns(rows)
+    target_x = per_100_x if per_100_x is not None else serving_x
+    result = LabelNutrition()
+    if per_100_x is None and serving_x is not None:
+        result.basis = "per_serving"
+        result.serving_g = serving_g or 100.0
+
+    for row in rows:
+        label = _normalize_label_text(row.text)
+        name = next((n for n, pattern in _ROW_FIELDS if pattern.search(label)), None)
+        if name is None:
+            continue
+        cells = _row_numbers(row)
+        if not cells:
+            continue
+        if target_x is not None:
+            # Keep the cells closest to the chosen column (energy may hold kJ and kcal side by side)
+            others = [x for x in (per_100_x, serving_x) if x is not None and x != target_x]
+            cells = [c for c in cells if not others or abs(c[1] - target_x) <= min(abs(c[1] - o) for o in others)]
+            if not cells:
+                continue
+        if name == "energy":
+            kcal = next((v for v, _, unit in cells if unit == "kcal"), None)
+            kj = next((v for v, _, unit in cells if unit == "kj"), None)
+            if kcal is None and kj is None:
+                if "кдж" in label or "kj" in label.split():
+                    kj = cells[0][0]
+                else:
+                    kcal = cells[0][0]
+            result.kcal = result.kcal if result.kcal is not None else kcal
+            result.kj = result.kj if result.kj is not None else kj
+        elif getattr(result, name) is None:
+            setattr(result, name, cells[0][0])
+
+    return None if result.is_empty() else result
+
+
+class LabelOcrEngine:
+    """Region-first structured OCR for packaging labels."""
+
+    def __init__(self, use_region: bool = LABEL_OCR_REGION):
+        self.use_region = use_region
+
+    def analyze(self, image_bytes: bytes, lang: str) -> LabelOcrResult:
+        """Blocking; call via `asyncio.to_thread` from request handlers."""
+        import pytesseract
+        from PIL import Image as PILImage
+
+        timings: Dict[str, int] = {}
+        t0 = time.monotonic()
+        img = PILImage.open(BytesIO(image_bytes)).convert("RGB")
+        lang_code = "rus+eng" if lang.startswith("ru") else "eng+rus"
+
+        region = detect_table_region(img) if self.use_region else None
+        timings["detect_ms"] = round((time.monotonic() - t0) * 1000)
+
+        crop = img.crop(region) if region else img
+        offset = (region[0], region[1]) if region else (0, 0)
+        t1 = time.monotonic()
+        data = pytesseract.image_to_data(crop, lang=lang_code, output_type=pytesseract.Output.DICT)
+        timings["ocr_ms"] = round((time.monotonic() - t1) * 1000)
+
+        rows = group_rows(words_from_tesseract(data, offset))
+        text = "\n".join(row.text for row in rows)
+        nutrition = parse_nutrition_rows(rows) or parse_nutrition_text(text)
+        if nutrition is not None and nutrition.is_empty():
+            nutrition = None
+        timings["total_ms"] = round((time.monotonic() - t0) * 1000)
+        logger.info(f"[OCR] region={region} rows={len(rows)} timings={timings}")
+        return LabelOcrResult(text=text, rows=rows, nutrition=nutrition, region=region, timings_ms=timings)
+
+
+label_ocr_engine = LabelOcrEngine()
@@ -4,11 +4,11 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 from io import BytesIO
 from collections import defaultdict, deque
-import uuid
 import time
 import base64
 import json
@@ -17,7 +17,9 @@ import asyncio
 from openai import OpenAI
 from loguru import logger
 from common.routes import Routes
-from shared.health import create_health_response
+from common.food_taxonomy import classify_food
+from shared.metrics import instrument_app, stage
+from shared.health import HealthMonitor, create_health_response, standard_checks
 from shared.auth import require_internal_auth
 from .config import get_model_config, validate_model_for_task
 from services.ml.core.providers.llm_factory import llm_factory
@@ -26,6 +28,9 @@ from common.db.profiles import get_user_profile
 # OpenFoodFacts removed
 from services.ml.chestnyznak_client import fetch_product_by_gtin, map_cz_to_basic
 from services.ml.barcodelist_client import fetch_product_by_barcode as fetch_barcodelist, map_barcodelist_to_basic
+from services.ml.openai.client import async_openai_client, stream_chat_completion
+from services.ml.streaming import SSE_MEDIA_TYPE, recipe_fields, stream_json_events
+from services.ml.label_ocr import LabelNutrition, LabelOcrResult, label_ocr_engine
 
 # Optional imports for barcode detection
 try:
@@ -71,14 +76,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Basic request ID middleware for observability
-@app.middleware("http")
-async def add_request_id(request: Request, call_next):
-    request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-    request.state.request_id = request_id
-    response = await call_next(request)
-    response.headers["X-Request-ID"] = request_id
-    return response
+# Request ID (trace id) propagation, latency histograms and GET /metrics
+instrument_app(app, service="ml")
 
 # Lightweight per-IP rate limiter (internal endpoints still benefit from abuse protection)
 RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "120"))
@@ -224,80 +223,31 @@ def _normalize_text(s: str) -> str:
     return " ".join((s or "").replace("\n", " ").split())
 
 
-async def _ocr_text(image_bytes: bytes, lang: str) -> tuple[str, List[OcrBlock]]:
+async def _ocr_label(image_bytes: bytes, lang: str) -> LabelOcrResult:
     if not _OCR_AVAILABLE:
-        return "", []
+        return LabelOcrResult()
     try:
-        import pytesseract
-        from PIL import Image
-        from io import BytesIO
-        lang_code = "rus+eng" if lang.startswith("ru") else "eng+rus"
-        img = Image.open(BytesIO(image_bytes)).convert("RGB")
-        text = pytesseract.image_to_string(img, lang=lang_code)
-        # Split lines as blocks; pytesseract confidence requires image_to_data; we keep it simple for speed
-        blocks = [OcrBlock(text=line.strip()) for line in text.splitlines() if line.strip()]
-        return text, blocks
+        # Tesseract is CPU-bound; keep the event loop free for concurrent requests
+        with stage("ml", "label_ocr"):
+            return await asyncio.to_thread(label_ocr_engine.analyze, image_bytes, lang)
     except Exception as e:
         logger.warning(f"OCR failed: {e}")
-        return "", []
+        return LabelOcrResult()
 
 
-def _parse_nutrition_from_text(text: str) -> Optional[dict]:
-    if not text:
-        return None
-    import re
-    # Normalize common locale/spacing issues
-    t = text.replace('\xa0', ' ')
-    t = t.replace(',', '.')
-    t = t.lower()
-    # Common RU labels
-    # energy (kcal)
-    kcal = None
-    m = re.search(r"(ккал|kcal)\D{0,15}([0-9]+(?:\.[0-9]+)?)", t)
-    if m:
-        try:
-            kcal = float(m.group(2))
-        except Exception:
-            kcal = None
-    # energy (kJ)
-    kj = None
-    m_kj = re.search(r"(кдж|kj)\D{0,15}([0-9]+(?:\.[0-9]+)?)", t)
-    if m_kj:
-        try:
-            kj = float(m_kj.group(2))
-        except Exception:
-            kj = None
-    # proteins
-    prot = None
-    m = re.search(r"(белк[аи]?|белок|protein[s]?)\D{0,15}([0-9]+(?:\.[0-9]+)?)\s*(g|гр|г)?\b", t)
-    if m:
-        try:
-            prot = float(m.group(2))
-        except Exception:
-            prot = None
-    # fats
-    fat = None
-    m = re.search(r"(жир[ыа]?|fat[s]?)\D{0,15}([0-9]+(?:\.[0-9]+)?)\s*(g|гр|г)?\b", t)
-    if m:
-        try:
-            fat = float(m.group(2))
-        except Exception:
-            fat = None
-    # carbs
-    carb = None
-    m = re.search(r"(углевод[ыа]?|carb[sh]?)\D{0,20}([0-9]+(?:\.[0-9]+)?)\s*(g|гр|г)?\b", t)
-    if m:
-        try:
-            carb = float(m.group(2))
-        except Exception:
-            carb = None
+def _ocr_blocks(result: LabelOcrResult) -> List[OcrBlock]:
+    return [OcrBlock(text=row.text, confidence=row.confidence) for row in result.rows]
 
-    # serving size detection (e.g., 100 г / 100g)
-    serving_g = 100.0
-    m = re.search(r"(100)\s*(г|g)\b", t)
-    if m:
-        serving_g = 100.0
 
+def _nutrition_analysis_from_label(values: Optional[LabelNutrition]) -> Optional[dict]:
+    if values is None:
+        return None
+    kcal, kj = values.kcal, values.kj
+    prot, fat, carb = values.protein, values.fat, values.carbs
+    serving_g = values.serving_g
+
+    if kcal is None and kj is not None:
+        kcal = kj / 4.184
     if kcal is None and all(v is None for v in [prot, fat, carb]):
         return None
 
@@ -339,7 +289,10 @@ def _parse_nutrition_from_text(text: str) -> Optional[dict]:
             },
             "provenance": {
                 "source": "ocr",
-                "debug": {"kcal_raw": kcal, "kj_raw": kj, "prot": prot, "fat": fat, "carb": carb}
+                "debug": {
+                    "kcal_raw": kcal, "kj_raw": kj, "prot": prot, "fat": fat, "carb": carb,
+                    "basis": values.basis,
+                },
             },
         }
     }
@@ -348,67 +301,59 @@ def _parse_nutrition_from_text(text: str) -> Optional[dict]:
 
 def _heuristic_nutrition_from_title(title: Optional[str]) -> Optional[dict]:
     """Very small RU dairy heuristic to avoid zeros when only product name is known.
-    Returns analysis per 100 g using typical values. Provenance: heuristic.
+    Returns analysis per 100 g using typical values from the food taxonomy. Provenance: heuristic.
     """
     if not title:
         return None
-    t = title.lower()
-    # (kcal, proteins, fats, carbs)
-    heuristics: list[tuple[str, tuple[float, float, float, float]]] = [
-        (r"сливочн.*сыр", (330.0, 25.0, 26.0, 3.0)),  # cream-style cheese
-        (r"\bсыр\b", (350.0, 25.0, 27.0, 0.0)),      # generic hard cheese
-        (r"творог", (170.0, 16.0, 9.0, 3.0)),         # cottage cheese
-        (r"молок", (64.0, 3.3, 3.2, 4.7)),            # 3.2% milk
-        (r"йогурт", (60.0, 4.0, 3.0, 5.0)),           # plain yogurt
-        (r"кефир", (52.0, 3.0, 3.0, 4.0)),            # kefir
-    ]
-    import re
-    for pattern, (kcal, prot, fat, carb) in heuristics:
-        if re.search(pattern, t):
-            serving_g = 100.0
-            analysis = {
-                "analysis": {
-                    "food_items": [
-                        {
-                            "name": title,
-                            "weight_grams": serving_g,
-                            "calories": round(kcal, 1),
-                            "emoji": "🍽️",
-                            "health_benefits": "",
-                        }
-                    ],
-                    "total_nutrition": {
-                        "calories": round(kcal, 1),
-                        "proteins": round(prot, 1),
-                        "fats": round(fat, 1),
-                        "carbohydrates": round(carb, 1),
-                    },
-                    "provenance": {
-                        "source": "heuristic",
-                        "basis": "typical per 100 g",
-                        "matched": pattern,
-                    },
+    food_class = classify_food(title)
+    if not food_class.nutrition_per_100g:
+        return None
+    kcal, prot, fat, carb = food_class.nutrition_per_100g
+    serving_g = 100.0
+    return {
+        "analysis": {
+            "food_items": [
+                {
+                    "name": title,
+                    "weight_grams": serving_g,
+                    "calories": round(kcal, 1),
+                    "emoji": "🍽️",
+                    "health_benefits": "",
                 }
-            }
-            return analysis
-    return None
+            ],
+            "total_nutrition": {
+                "calories": round(kcal, 1),
+                "proteins": round(prot, 1),
+                "fats": round(fat, 1),
+                "carbohydrates": round(carb, 1),
+            },
+            "provenance": {
+                "source": "heuristic",
+                "basis": "typical per 100 g",
+                "matched": food_class.nutrition_label,
+            },
+        }
+    }
+
+health_monitor = HealthMonitor(
+    "ml",
+    checks=standard_checks(check_database=True, check_openai=True),
+    additional_info=lambda: {
+        "openai_configured": bool(OPENAI_API_KEY),
+        "gemini_configured": bool(GEMINI_API_KEY),
+        "current_llm_provider": llm_factory.get_current_provider(),
+        "available_providers": llm_factory.list_available_providers(),
+        "model_tier_routing": llm_factory.routing_stats(),
+    },
+    degraded_after={"openai": 3.0},
+)
+# Background refresh, GET /health/live and GET /health/ready
+health_monitor.install(app)
 
 @app.get(Routes.ML_HEALTH)
 async def health():
-    """Comprehensive health check for ML service"""
-    from shared.health import create_comprehensive_health_response
-    
-    return await create_comprehensive_health_response(
-        service_name="ml",
-        check_database=True,
-        check_openai=True,
-        additional_info={
-            "openai_configured": bool(OPENAI_API_KEY),
-            "gemini_configured": bool(GEMINI_API_KEY),
-            "current_llm_provider": llm_factory.get_current_provider(),
-            "available_providers": llm_factory.list_available_providers()
-        }
-    )
+    """Health of the ML service from the latest dependency snapshot"""
+    return await health_monitor.response()
 
 @app.get("/health")
 async def health_alias():
@@ -451,7 +396,8 @@ async def label_analyze(
             logger.info(f"Detected barcodes: {[b.value for b in barcodes]}")
         else:
             logger.info("No barcodes detected")
-        ocr_text, ocr_blocks = await _ocr_text(image_bytes, user_language)
+        # OCR runs alongside provider lookups; it is only awaited when no provider answered
+        ocr_task = asyncio.create_task(_ocr_label(image_bytes, user_language))
 
         # If we have a barcode, try providers in order with time budget: ChestnyZNAK → BarcodeList (RU)
         parsed_nutrition = None
@@ -512,10 +458,18 @@ async def label_analyze(
                             logger.info("[LOOKUP] Applied RU dairy heuristic from title")
                             break
 
+        if parsed_nutrition:
+            # The response does not wait for OCR; a Tesseract call already in its thread still finishes there
+            ocr_task.cancel()
+            ocr_result = LabelOcrResult()
+        else:
+            ocr_result = await ocr_task
+        ocr_text = ocr_result.text
+        ocr_blocks = _ocr_blocks(ocr_result)
+
         # If no provider matched, try OCR nutrition extraction as fallback
         if not parsed_nutrition:
-            # Run OCR parse fast
-            parsed_nutrition = _parse_nutrition_from_text(ocr_text)
+            parsed_nutrition = _nutrition_analysis_from_label(ocr_result.nutrition)
             if parsed_nutrition:
                 logger.info("[OCR] Nutrition extracted from label text")
             else:
@@ -552,6 +506,8 @@ async def label_analyze(
                 provenance['debug'].update({
                     'barcodes_detected': [b.value for b in barcodes] if barcodes else [],
                     'ocr_present': bool(ocr_text),
+                    'ocr_region': list(ocr_result.region) if ocr_result.region else None,
+                    'ocr_ms': ocr_result.timings_ms.get('total_ms'),
                     'time_ms': round((time.monotonic() - start_overall) * 1000),
                 })
         resp = LabelAnalyzeResponse(
@@ -717,30 +673,30 @@ async def ml_generate_food_plan(request: Request, payload: FoodPlanRequest):
             food_items = analysis.get("food_items", [])
             for item in food_items:
                 item_name = item.get("name", "")
-                item_name_lower = item_name.lower()
+                food_class = classify_food(item_name)
 
                 # Breakfast foods
-                if any(word in item_name_lower for word in ["овсянка", "каша", "мюсли", "яйц", "омлет", "йогурт", "творог", "тост", "хлопья"]):
+                if food_class.has("breakfast"):
                     if item_name not in breakfast_items:
                         breakfast_items.append(item_name)
 
                 # Protein sources
-                if any(word in item_name_lower for word in ["курица", "говядина", "рыба", "лосось", "тунец", "яйц", "творог", "сыр", "индейка", "свинина", "треска"]):
+                if food_class.has("protein"):
                     if item_name not in protein_foods:
                         protein_foods.append(item_name)
 
                 # Carbohydrate sources
-                if any(word in item_name_lower for word in ["рис", "гречка", "макарон", "хлеб", "картофель", "овсянка", "киноа", "паста"]):
+                if food_class.has("carb"):
                     if item_name not in carb_foods:
                         carb_foods.append(item_name)
 
                 # Healthy foods
-                if any(word in item_name_lower for word in ["овощи", "салат", "брокколи", "шпинат", "помидор", "огурец", "ягоды", "фрукт", "авокадо", "листья"]):
+                if food_class.has("healthy"):
                     if item_name not in healthy_foods:
                         healthy_foods.append(item_name)
 
                 # Unhealthy foods
-                if any(word in item_name_lower for word in ["пицца", "бургер", "фри", "чипсы", "кола", "торт", "пирожное", "конфеты"]):
+                if food_class.has("unhealthy"):
                     if item_name not in unhealthy_foods:
                         unhealthy_foods.append(item_name)
 
@@ -1292,6 +1248,212 @@ async def analyze_food_with_openai(image_bytes: bytes, user_language: str = "en"
         logger.error(f"OpenAI API error: {e}")
         raise HTTPException(status_code=500, detail=f"OpenAI analysis failed: {str(e)}")
 
+def _build_recipe_prompt(user_context: dict) -> tuple[str, str]:
+    """Personalized recipe prompt; returns (prompt, user_language)"""
+    # Get user language
+    user_language = user_context.get('language', 'en')
+    has_profile = user_context.get('has_profile', False)
+    
+    # Build personalized context
+    context_parts = []
+    
+    if has_profile:
+        # Add profile information to context
+        if user_context.get('dietary_preferences'):
+            dietary_prefs = [pref for pref in user_context['dietary_preferences'] if pref != 'none']
+            if dietary_prefs:
+                context_parts.append(f"Dietary preferences: {', '.join(dietary_prefs)}")
+        
+        if user_context.get('allergies'):
+            allergies = [allergy for allergy in user_context['allergies'] if allergy != 'none']
+            if allergies:
+                context_parts.append(f"Food allergies to avoid: {', '.join(allergies)}")
+        
+        if user_context.get('goal'):
+            goal_map = {
+                'lose_weight': 'weight loss',
+                'maintain_weight': 'weight maintenance',
+                'gain_weight': 'weight gain'
+            }
+            goal = goal_map.get(user_context['goal'], user_context['goal'])
+            context_parts.append(f"Fitness goal: {goal}")
+        
+        if user_context.get('daily_calories_target'):
+            context_parts.append(f"Daily calorie target: {user_context['daily_calories_target']} calories")
+    
+    # Create personalized context string
+    personal_context = "\n".join(context_parts) if context_parts else "No specific dietary requirements"
+    
+    # Create prompt for recipe generation based on user language
+    if user_language == "ru":
+        prompt = f"""
+        Проанализируйте это изображение еды/ингредиентов и создайте персонализированный рецепт.
+
+        ПЕРСОНАЛЬНЫЙ КОНТЕКСТ ПОЛЬЗОВАТЕЛЯ:
+        {personal_context}
+
+        Пожалуйста, создайте рецепт, который:
+        1. Использует ингредиенты, видимые на изображении
+        2. Соответствует диетическим предпочтениям пользователя
+        3. Избегает указанных аллергенов
+        4. Подходит для цели пользователя по фитнесу
+        5. Включает точную информацию о питании
+
+        Верните ТОЛЬКО JSON объект со следующей структурой:
+        {{
+            "name": "название рецепта",
+            "description": "краткое описание блюда",
+            "prep_time": "время подготовки (например, 15 минут)",
+            "cook_time": "время приготовления (например, 30 минут)",
+            "servings": "количество порций (например, 4)",
+            "ingredients": [
+                "ингредиент 1 с количеством",
+                "ингредиент 2 с количеством"
+            ],
+            "instructions": [
+                "шаг 1 инструкции",
+                "шаг 2 инструкции"
+            ],
+            "nutrition": {{
+                "calories": число_калорий_на_порцию,
+                "protein": число_белков_в_граммах,
+                "carbs": число_углеводов_в_граммах,
+                "fat": число_жиров_в_граммах
+            }}
+        }}
+
+        Убедитесь, что рецепт безопасен и подходит для указанных диетических ограничений.
+        Все числовые значения должны быть числами (не строками).
+        """
+    else:
+        prompt = f"""
+        Analyze this food/ingredient image and create a personalized recipe.
+
+        USER'S PERSONAL CONTEXT:
+        {personal_context}
+
+        Please create a recipe that:
+        1. Uses the ingredients visible in the image
+        2. Matches the user's dietary preferences
+        3. Avoids specified allergens
+        4. Suits the user's fitness goal
+        5. Includes accurate nutritional information
+
+        Return ONLY a JSON object with the following structure:
+        {{
+            "name": "recipe name",
+            "description": "brief description of the dish",
+            "prep_time": "preparation time (e.g., 15 minutes)",
+            "cook_time": "cooking time (e.g., 30 minutes)",
+            "servings": "number of servings (e.g., 4)",
+            "ingredients": [
+                "ingredient 1 with quantity",
+                "ingredient 2 with quantity"
+            ],
+            "instructions": [
+                "step 1 instruction",
+                "step 2 instruction"
+            ],
+            "nutrition": {{
+                "calories": calories_per_serving_number,
+                "protein": protein_grams_number,
+                "carbs": carbs_grams_number,
+                "fat": fat_grams_number
+            }}
+        }}
+
+        Ensure the recipe is safe and suitable for the specified dietary restrictions.
+        All numeric values should be numbers (not strings).
+        """
+    return prompt, user_language
+
+
+def _parse_recipe_content(content: str, user_language: str) -> dict:
+    """Parse the model's recipe JSON, falling back to a generic recipe"""
+    # Try to parse JSON from response
+    try:
+        # Remove code block markers if present
+        if content.startswith("```json"):
+            content = content[7:-3]
+        elif content.startswith("```"):
+            content = content[3:-3]
+        
+        recipe_data = json.loads(content)
+        
+        # Validate required fields
+        required_fields = ["name", "ingredients", "instructions"]
+        for field in required_fields:
+            if field not in recipe_data:
+                raise ValueError(f"Missing field: {field}")
+        
+        # Validate nutrition data if present
+        if "nutrition" in recipe_data:
+            nutrition = recipe_data["nutrition"]
+            for nutrient in ["calories", "protein", "carbs", "fat"]:
+                if nutrient in nutrition:
+                    nutrition[nutrient] = float(nutrition[nutrient])
+        
+        return recipe_data
+        
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.error(f"Failed to parse OpenAI recipe response: {e}")
+        # Return fallback recipe based on user language
+        if user_language == "ru":
+            return {
+                "name": "Вкусный рецепт",
+                "description": "Аппетитное блюдо из ингредиентов с вашего фото",
+                "prep_time": "15 минут",
+                "cook_time": "30 минут",
+                "servings": "4",
+                "ingredients": ["Ингредиенты с вашего фото"],
+                "instructions": ["Подготовьте ингредиенты как показано", "Готовьте согласно вашим предпочтениям"],
+                "nutrition": {
+                    "calories": 300,
+                    "protein": 20,
+                    "carbs": 25,
+                    "fat": 12
+                }
+            }
+        else:
+            return {
+                "name": "Delicious Recipe",
+                "description": "A tasty dish made from the ingredients in your photo",
+                "prep_time": "15 minutes",
+                "cook_time": "30 minutes",
+                "servings": "4",
+                "ingredients": ["Ingredients from your photo"],
+                "instructions": ["Prepare ingredients as shown", "Cook according to your preference"],
+                "nutrition": {
+                    "calories": 300,
+                    "protein": 20,
+                    "carbs": 25,
+                    "fat": 12
+                }
+            }
+
+
+RECIPE_MODEL = "gpt-4o"  # Use full GPT-4o for better recipe generation
+RECIPE_MAX_TOKENS = 1000  # More tokens for detailed recipes
+RECIPE_TEMPERATURE = 0.3  # Slightly more creative for recipe generation
+
+
+def _recipe_messages(prompt: str, image_url: str) -> list:
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": image_url
+                    }
+                }
+            ]
+        }
+    ]
+
+
 async def generate_recipe_with_openai(image_url: str, user_context: dict) -> dict:
     """
     Generate recipe from food image using OpenAI GPT-4o
@@ -1301,212 +1463,58 @@ async def generate_recipe_with_openai(image_url: str, user_context: dict) -> dic
         raise HTTPException(status_code=500, detail="OpenAI client not initialized")
     
     try:
-        # Get user language
-        user_language = user_context.get('language', 'en')
-        has_profile = user_context.get('has_profile', False)
-        
-        # Build personalized context
-        context_parts = []
-        
-        if has_profile:
-            # Add profile information to context
-            if user_context.get('dietary_preferences'):
-                dietary_prefs = [pref for pref in user_context['dietary_preferences'] if pref != 'none']
-                if dietary_prefs:
-                    context_parts.append(f"Dietary preferences: {', '.join(dietary_prefs)}")
-            
-            if user_context.get('allergies'):
-                allergies = [allergy for allergy in user_context['allergies'] if allergy != 'none']
-                if allergies:
-                    context_parts.append(f"Food allergies to avoid: {', '.join(allergies)}")
-            
-            if user_context.get('goal'):
-                goal_map = {
-                    'lose_weight': 'weight loss',
-                    'maintain_weight': 'weight maintenance',
-                    'gain_weight': 'weight gain'
-                }
-                goal = goal_map.get(user_context['goal'], user_context['goal'])
-                context_parts.append(f"Fitness goal: {goal}")
-            
-            if user_context.get('daily_calories_target'):
-                context_parts.append(f"Daily calorie target: {user_context['daily_calories_target']} calories")
-        
-        # Create personalized context string
-        personal_context = "\n".join(context_parts) if context_parts else "No specific dietary requirements"
-        
-        # Create prompt for recipe generation based on user language
-        if user_language == "ru":
-            prompt = f"""
-            Проанализируйте это изображение еды/ингредиентов и создайте персонализированный рецепт.
-
-            ПЕРСОНАЛЬНЫЙ КОНТЕКСТ ПОЛЬЗОВАТЕЛЯ:
-            {personal_context}
-
-            Пожалуйста, создайте рецепт, который:
-            1. Использует ингредиенты, видимые на изображении
-            2. Соответствует диетическим предпочтениям пользователя
-            3. Избегает указанных аллергенов
-            4. Подходит для цели пользователя по фитнесу
-            5. Включает точную информацию о питании
-
-            Верните ТОЛЬКО JSON объект со следующей структурой:
-            {{
-                "name": "название рецепта",
-                "description": "краткое описание блюда",
-                "prep_time": "время подготовки (например, 15 минут)",
-                "cook_time": "время приготовления (например, 30 минут)",
-                "servings": "количество порций (например, 4)",
-                "ingredients": [
-                    "ингредиент 1 с количеством",
-                    "ингредиент 2 с количеством"
-                ],
-                "instructions": [
-                    "шаг 1 инструкции",
-                    "шаг 2 инструкции"
-                ],
-                "nutrition": {{
-                    "calories": число_калорий_на_порцию,
-                    "protein": число_белков_в_граммах,
-                    "carbs": число_углеводов_в_граммах,
-                    "fat": число_жиров_в_граммах
-                }}
-            }}
+        prompt, user_language = _build_recipe_prompt(user_context)
 
-            Убедитесь, что рецепт безопасен и подходит для указанных диетических ограничений.
-            Все числовые значения должны быть числами (не строками).
-            """
-        else:
-            prompt = f"""
-            Analyze this food/ingredient image and create a personalized recipe.
-
-            USER'S PERSONAL CONTEXT:
-            {personal_context}
-
-            Please create a recipe that:
-            1. Uses the ingredients visible in the image
-            2. Matches the user's dietary preferences
-            3. Avoids specified allergens
-            4. Suits the user's fitness goal
-            5. Includes accurate nutritional information
-
-            Return ONLY a JSON object with the following structure:
-            {{
-                "name": "recipe name",
-                "description": "brief description of the dish",
-                "prep_time": "preparation time (e.g., 15 minutes)",
-                "cook_time": "cooking time (e.g., 30 minutes)",
-                "servings": "number of servings (e.g., 4)",
-                "ingredients": [
-                    "ingredient 1 with quantity",
-                    "ingredient 2 with quantity"
-                ],
-                "instructions": [
-                    "step 1 instruction",
-                    "step 2 instruction"
-                ],
-                "nutrition": {{
-                    "calories": calories_per_serving_number,
-                    "protein": protein_grams_number,
-                    "carbs": carbs_grams_number,
-                    "fat": fat_grams_number
-                }}
-            }}
-
-            Ensure the recipe is safe and suitable for the specified dietary restrictions.
-            All numeric values should be numbers (not strings).
-            """
-        
         # Call OpenAI Vision API for recipe generation
         response = openai_client.chat.completions.create(
-            model="gpt-4o",  # Use full GPT-4o for better recipe generation
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": image_url
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1000,  # More tokens for detailed recipes
-            temperature=0.3  # Slightly more creative for recipe generation
+            model=RECIPE_MODEL,
+            messages=_recipe_messages(prompt, image_url),
+            max_tokens=RECIPE_MAX_TOKENS,
+            temperature=RECIPE_TEMPERATURE
         )
         
         # Parse response
         content = response.choices[0].message.content.strip()
         logger.info(f"OpenAI recipe response: {content}")
         
-        # Try to parse JSON from response
-        try:
-            # Remove code block markers if present
-            if content.startswith("```json"):
-                content = content[7:-3]
-            elif content.startswith("```"):
-                content = content[3:-3]
-            
-            recipe_data = json.loads(content)
-            
-            # Validate required fields
-            required_fields = ["name", "ingredients", "instructions"]
-            for field in required_fields:
-                if field not in recipe_data:
-                    raise ValueError(f"Missing field: {field}")
-            
-            # Validate nutrition data if present
-            if "nutrition" in recipe_data:
-                nutrition = recipe_data["nutrition"]
-                for nutrient in ["calories", "protein", "carbs", "fat"]:
-                    if nutrient in nutrition:
-                        nutrition[nutrient] = float(nutrition[nutrient])
-            
-            return recipe_data
-            
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.error(f"Failed to parse OpenAI recipe response: {e}")
-            # Return fallback recipe based on user language
-            if user_language == "ru":
-                return {
-                    "name": "Вкусный рецепт",
-                    "description": "Аппетитное блюдо из ингредиентов с вашего фото",
-                    "prep_time": "15 минут",
-                    "cook_time": "30 минут",
-                    "servings": "4",
-                    "ingredients": ["Ингредиенты с вашего фото"],
-                    "instructions": ["Подготовьте ингредиенты как показано", "Готовьте согласно вашим предпочтениям"],
-                    "nutrition": {
-                        "calories": 300,
-                        "protein": 20,
-                        "carbs": 25,
-                        "fat": 12
-                    }
-                }
-            else:
-                return {
-                    "name": "Delicious Recipe",
-                    "description": "A tasty dish made from the ingredients in your photo",
-                    "prep_time": "15 minutes",
-                    "cook_time": "30 minutes",
-                    "servings": "4",
-                    "ingredients": ["Ingredients from your photo"],
-                    "instructions": ["Prepare ingredients as shown", "Cook according to your preference"],
-                    "nutrition": {
-                        "calories": 300,
-                        "protein": 20,
-                        "carbs": 25,
-                        "fat": 12
-                    }
-                }
+        return _parse_recipe_content(content, user_language)
             
     except Exception as e:
         logger.error(f"OpenAI recipe generation error: {e}")
         raise HTTPException(status_code=500, detail=f"Recipe generation failed: {str(e)}")
 
+
+def stream_recipe_with_openai(image_url: str, user_context: dict) -> AsyncIterator[str]:
+    """Recipe generation as Server-Sent Events (`partial` fields, then `result`)"""
+    prompt, user_language = _build_recipe_prompt(user_context)
+    deltas = stream_chat_completion(_recipe_messages(prompt, image_url), RECIPE_MODEL, RECIPE_MAX_TOKENS, RECIPE_TEMPERATURE)
+    return stream_json_events(deltas, recipe_fields, lambda content: _parse_recipe_content(content.strip(), user_language))
+
+async def _read_analyze_upload(request: Request, photo: UploadFile) -> bytes:
+    """Rate limit and validate an analysis upload; returns the image bytes"""
+    # Rate limiting (by client IP)
+    client_ip = request.client.host if request.client else "unknown"
+    if not _rate_limit_ok(f"analyze_file:{client_ip}"):
+        raise HTTPException(status_code=429, detail="Too many requests")
+    # Content length early check (if present)
+    content_length = request.headers.get("content-length")
+    if content_length and int(content_length) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+
+    # Validate file type
+    if not photo.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+
+    # Read image bytes
+    image_bytes = await photo.read()
+
+    if len(image_bytes) == 0:
+        raise HTTPException(status_code=400, detail="Empty image file")
+    if len(image_bytes) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+    return image_bytes
+
+
 @app.post(Routes.ML_ANALYZE)
 @require_internal_auth
 async def analyze_file(
@@ -1520,38 +1528,21 @@ async def analyze_file(
     Analyze food image and return KBZHU data
     """
     try:
-        # Rate limiting (by client IP)
-        client_ip = request.client.host if request.client else "unknown"
-        if not _rate_limit_ok(f"analyze_file:{client_ip}"):
-            raise HTTPException(status_code=429, detail="Too many requests")
-        # Content length early check (if present)
-        content_length = request.headers.get("content-length")
-        if content_length and int(content_length) > MAX_UPLOAD_BYTES:
-            raise HTTPException(status_code=413, detail="Image too large")
-
         logger.info(f"🔥 ANALYZE_FILE CALLED: user={telegram_user_id}, provider={provider}")
         logger.info(f"🎯 Factory current provider: {llm_factory.get_current_provider()}")
         logger.info(f"Analyzing photo for user {telegram_user_id} with provider {provider}")
         
-        # Validate file type
-        if not photo.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Read image bytes
-        image_bytes = await photo.read()
-        
-        if len(image_bytes) == 0:
-            raise HTTPException(status_code=400, detail="Empty image file")
-        if len(image_bytes) > MAX_UPLOAD_BYTES:
-            raise HTTPException(status_code=413, detail="Image too large")
+        with stage("ml", "upload_read"):
+            image_bytes = await _read_analyze_upload(request, photo)
         
         # Use LLM factory for analysis (respects LLM_PROVIDER/ANALYSIS_PROVIDER env vars) and per-request override
-        analysis_result = await llm_factory.analyze_food(
-            image_bytes,
-            user_language,
-            use_premium_model=False,
-            provider_override=provider,
-        )
+        with stage("ml", "llm_call"):
+            analysis_result = await llm_factory.analyze_food(
+                image_bytes,
+                user_language,
+                use_premium_model=False,
+                provider_override=provider,
+            )
         
         logger.info(f"Analysis complete for user {telegram_user_id}: {analysis_result}")
         
@@ -1588,7 +1579,8 @@ async def generate_recipe(
             raise HTTPException(status_code=400, detail="Invalid user_context JSON")
         
         # Generate recipe with OpenAI
-        recipe_result = await generate_recipe_with_openai(image_url, context_data)
+        with stage("ml", "recipe_llm_call"):
+            recipe_result = await generate_recipe_with_openai(image_url, context_data)
         
         logger.info(f"Recipe generation complete for user {telegram_user_id}: {recipe_result['name']}")
         
@@ -1598,3 +1590,62 @@ async def generate_recipe(
         raise
     except Exception as e:
         logger.error(f"Recipe generation error: {e}")
+
+
+# Streaming variants: Server-Sent Events with `partial` fields as they are generated,
+# then `result` (same payload as the blocking endpoint) or `error`
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+async def _staged_events(events: AsyncIterator[str], name: str) -> AsyncIterator[str]:
+    """Time the whole stream under the same stage as the blocking endpoint"""
+    with stage("ml", name):
+        async for event in events:
+            yield event
+
+
+@app.post(Routes.ML_ANALYZE_STREAM)
+@require_internal_auth
+async def analyze_file_stream(
+    request: Request,
+    photo: UploadFile = File(...),
+    telegram_user_id: str = Form(...),
+    provider: str = Form(default="openai"),
+    user_language: str = Form(default="en")
+):
+    """
+    Analyze food image, streaming partial results (dish name, items, totals)
+    """
+    with stage("ml", "upload_read"):
+        image_bytes = await _read_analyze_upload(request, photo)
+    logger.info(f"Streaming analysis for user {telegram_user_id} with provider {provider}")
+    events = llm_factory.stream_analyze_food(
+        image_bytes,
+        user_language,
+        use_premium_model=False,
+        provider_override=provider,
+    )
+    return StreamingResponse(_staged_events(events, "llm_call"), media_type=SSE_MEDIA_TYPE, headers=_SSE_HEADERS)
+
+
+@app.post(Routes.ML_GENERATE_RECIPE_STREAM)
+@require_internal_auth
+async def generate_recipe_stream(
+    request: Request,
+    image_url: str = Form(...),
+    telegram_user_id: str = Form(...),
+    user_context: str = Form(...)
+):
+    """
+    Generate recipe from food image, streaming partial fields (name, ingredients, steps)
+    """
+    try:
+        context_data = json.loads(user_context)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid user_context JSON")
+    if not async_openai_client:
+        raise HTTPException(status_code=500, detail="OpenAI client not initialized")
+
+    logger.info(f"Streaming recipe for user {telegram_user_id}")
+    events = stream_recipe_with_openai(image_url, context_data)
+    return StreamingResponse(_staged_events(events, "recipe_llm_call"), media_type=SSE_MEDIA_TYPE, headers=_SSE_HEADERS)
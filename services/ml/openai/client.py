@@ -6,7 +6,8 @@ import os
 import base64
 import json
 import httpx
-from openai import OpenAI
+from typing import AsyncIterator, Optional
+from openai import AsyncOpenAI, OpenAI
 from fastapi import HTTPException
 from loguru import logger
 
@@ -32,16 +33,31 @@ if OPENAI_API_KEY:
                 verify=False
             )
         )
+        # Streaming client; async so token deltas do not block the event loop
+        async_openai_client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            http_client=httpx.AsyncClient(
+                proxy=http_proxy or https_proxy,
+                verify=False
+            )
+        )
     else:
         openai_client = OpenAI(api_key=OPENAI_API_KEY)
+        async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
     
     logger.info("OpenAI client initialized successfully")
 else:
     openai_client = None
+    async_openai_client = None
     logger.warning("OpenAI API key not found")
 
 
-async def analyze_food_with_openai(image_bytes: bytes, user_language: str = "en", use_premium_model: bool = False) -> dict:
+async def analyze_food_with_openai(
+    image_bytes: bytes,
+    user_language: str = "en",
+    use_premium_model: bool = False,
+    model: Optional[str] = None,
+) -> dict:
     """
     Analyze food image using OpenAI Vision API with shared prompts
     Returns KBZHU data in expected format
@@ -50,6 +66,7 @@ async def analyze_food_with_openai(image_bytes: bytes, user_language: str = "en"
         image_bytes: Image data to analyze
         user_language: User language preference
         use_premium_model: Whether to use premium model settings
+        model: Explicit model name (set by the tier router); overrides the configured model
     """
     # Create language-specific fallback values
     if user_language == "ru":
@@ -64,152 +81,192 @@ async def analyze_food_with_openai(image_bytes: bytes, user_language: str = "en"
         raise HTTPException(status_code=500, detail="OpenAI client not initialized")
     
     try:
-        # Encode image to base64
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-        
-        # Get model configuration for analysis task
         config = get_model_config("analysis", use_premium_model)
-        model = config["model"]
-        max_tokens = config["max_tokens"]
-        temperature = config["temperature"]
-        
-        # Get shared prompts
-        prompt = get_food_analysis_prompt(user_language)
-        system_prompt_text = get_system_prompt()
-        
+        model = model or config["model"]
+
         # Call OpenAI Vision API
         response = openai_client.chat.completions.create(
             model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt_text
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=max_tokens,
-            temperature=temperature
+            messages=_analysis_messages(image_bytes, user_language),
+            max_tokens=config["max_tokens"],
+            temperature=config["temperature"]
         )
         
         # Parse response
         content = response.choices[0].message.content.strip()
         logger.info(f"OpenAI response: {content}")
-        
-        # Try to parse JSON from response with improved handling
-        try:
-            # Clean up the response content
-            content = content.strip()
-            
-            # Remove code block markers if present
-            if content.startswith("```json"):
-                content = content[7:-3].strip()
-            elif content.startswith("```"):
-                content = content[3:-3].strip()
-            
-            # Try to extract JSON from text if it's mixed with other content
-            import re
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                content = json_match.group(0)
-            
-            response_data = json.loads(content)
-            
-            # Add provider info for debugging
-            if "analysis" in response_data:
-                response_data["analysis"]["llm_provider"] = "openai"
-                response_data["analysis"]["model_used"] = model
-            else:
-                response_data["llm_provider"] = "openai"
-                response_data["model_used"] = model
+        return parse_analysis_content(content, model)
             
-            # Check if we have the new analysis format
-            if "analysis" in response_data:
-                # New format - return as is
-                return response_data
-            else:
-                # Old format fallback - convert to new structure
-                # Handle different possible old format keys
-                kbzhu_data = None
-                if "total_nutrition" in response_data:
-                    kbzhu_data = response_data["total_nutrition"]
-                elif "nutrition" in response_data:
-                    kbzhu_data = response_data["nutrition"]
-                elif "kbzhu" in response_data:
-                    kbzhu_data = response_data["kbzhu"]
-                elif "nutritional_info" in response_data:
-                    kbzhu_data = response_data["nutritional_info"]
-                
-                # Convert to new format
-                converted_result = {
-                    "analysis": {
-                        "llm_provider": "openai",
-                        "model_used": model,
-                        "regional_analysis": {
-                            "detected_cuisine_type": response_data.get("cuisine_type", "Mixed"),
-                            "dish_identification": response_data.get("dish_name", "Unknown Dish"),
-                            "regional_match_confidence": 0.7
-                        },
-                        "food_items": response_data.get("food_items", response_data.get("ingredients", [])),
-                        "total_nutrition": kbzhu_data or {
-                            "calories": 0,
-                            "proteins": 0,
-                            "fats": 0,
-                            "carbohydrates": 0
-                        },
-                        "nutrition_analysis": response_data.get("health_analysis", {
-                            "health_score": 7,
-                            "positive_aspects": ["Nutritious meal"],
-                            "improvement_suggestions": ["Add more vegetables"]
-                        }),
-                        "motivation_message": response_data.get("motivation", "Great choice for healthy eating!")
+    except Exception as e:
+        logger.error(f"Unexpected error in OpenAI analysis: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"OpenAI analysis failed: {str(e)}") 
+
+
+async def stream_chat_completion(messages: list, model: str, max_tokens: int, temperature: float) -> AsyncIterator[str]:
+    """Yield text deltas of a streamed chat completion"""
+    if not async_openai_client:
+        raise HTTPException(status_code=500, detail="OpenAI client not initialized")
+    stream = await async_openai_client.chat.completions.create(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def stream_food_analysis_with_openai(
+    image_bytes: bytes,
+    user_language: str = "en",
+    use_premium_model: bool = False,
+    model: Optional[str] = None,
+):
+    """
+    Streamed variant of analyze_food_with_openai.
+
+    Returns (deltas, finalize): an async iterator of raw text deltas and a
+    function turning the full text into the same dict analyze_food_with_openai returns.
+    `model` (set by the tier router) overrides the configured model.
+    """
+    config = get_model_config("analysis", use_premium_model)
+    model = model or config["model"]
+    deltas = stream_chat_completion(
+        _analysis_messages(image_bytes, user_language),
+        model,
+        config["max_tokens"],
+        config["temperature"],
+    )
+    return deltas, lambda content: parse_analysis_content(content.strip(), model)
+
+def _analysis_messages(image_bytes: bytes, user_language: str) -> list:
+    """Chat messages for food photo analysis (shared by the blocking and streaming calls)"""
+    image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+    return [
+        {
+            "role": "system",
+            "content": get_system_prompt()
+        },
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": get_food_analysis_prompt(user_language)},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{image_base64}"
                     }
                 }
-                
-                return converted_result
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse OpenAI JSON response: {e}")
-            logger.error(f"Raw content: {content}")
+            ]
+        }
+    ]
+
+
+def parse_analysis_content(content: str, model: str) -> dict:
+    """Parse the model's JSON answer into the analysis response format"""
+    # Try to parse JSON from response with improved handling
+    try:
+        # Clean up the response content
+        content = content.strip()
+        
+        # Remove code block markers if present
+        if content.startswith("```json"):
+            content = content[7:-3].strip()
+        elif content.startswith("```"):
+            content = content[3:-3].strip()
+        
+        # Try to extract JSON from text if it's mixed with other content
+        import re
+        json_match = re.search(r'\{.*\}', content, re.DOTALL)
+        if json_match:
+            content = json_match.group(0)
+        
+        response_data = json.loads(content)
+        
+        # Add provider info for debugging
+        if "analysis" in response_data:
+            response_data["analysis"]["llm_provider"] = "openai"
+            response_data["analysis"]["model_used"] = model
+        else:
+            response_data["llm_provider"] = "openai"
+            response_data["model_used"] = model
+        
+        # Check if we have the new analysis format
+        if "analysis" in response_data:
+            # New format - return as is
+            return response_data
+        else:
+            # Old format fallback - convert to new structure
+            # Handle different possible old format keys
+            kbzhu_data = None
+            if "total_nutrition" in response_data:
+                kbzhu_data = response_data["total_nutrition"]
+            elif "nutrition" in response_data:
+                kbzhu_data = response_data["nutrition"]
+            elif "kbzhu" in response_data:
+                kbzhu_data = response_data["kbzhu"]
+            elif "nutritional_info" in response_data:
+                kbzhu_data = response_data["nutritional_info"]
             
-            # Return error response in expected format
-            return {
+            # Convert to new format
+            converted_result = {
                 "analysis": {
                     "llm_provider": "openai",
                     "model_used": model,
-                    "error": "Failed to parse response",
-                    "raw_response": content,
                     "regional_analysis": {
-                        "detected_cuisine_type": "Unknown",
-                        "dish_identification": "Analysis Failed",
-                        "regional_match_confidence": 0.0
+                        "detected_cuisine_type": response_data.get("cuisine_type", "Mixed"),
+                        "dish_identification": response_data.get("dish_name", "Unknown Dish"),
+                        "regional_match_confidence": 0.7
                     },
-                    "food_items": [],
-                    "total_nutrition": {
+                    "food_items": response_data.get("food_items", response_data.get("ingredients", [])),
+                    "total_nutrition": kbzhu_data or {
                         "calories": 0,
                         "proteins": 0,
                         "fats": 0,
                         "carbohydrates": 0
                     },
-                    "nutrition_analysis": {
-                        "health_score": 0,
-                        "positive_aspects": [],
-                        "improvement_suggestions": ["Try again with a different photo"]
-                    },
-                    "motivation_message": "Unable to analyze this image. Please try again!"
+                    "nutrition_analysis": response_data.get("health_analysis", {
+                        "health_score": 7,
+                        "positive_aspects": ["Nutritious meal"],
+                        "improvement_suggestions": ["Add more vegetables"]
+                    }),
+                    "motivation_message": response_data.get("motivation", "Great choice for healthy eating!")
                 }
             }
             
-    except Exception as e:
-        logger.error(f"Unexpected error in OpenAI analysis: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"OpenAI analysis failed: {str(e)}") 
\ No newline at end of file
+            return converted_result
+            
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse OpenAI JSON response: {e}")
+        logger.error(f"Raw content: {content}")
+        
+        # Return error response in expected format
+        return {
+            "analysis": {
+                "llm_provider": "openai",
+                "model_used": model,
+                "error": "Failed to parse response",
+                "raw_response": content,
+                "regional_analysis": {
+                    "detected_cuisine_type": "Unknown",
+                    "dish_identification": "Analysis Failed",
+                    "regional_match_confidence": 0.0
+                },
+                "food_items": [],
+                "total_nutrition": {
+                    "calories": 0,
+                    "proteins": 0,
+                    "fats": 0,
+                    "carbohydrates": 0
+                },
+                "nutrition_analysis": {
+                    "health_score": 0,
+                    "positive_aspects": [],
+                    "improvement_suggestions": ["Try again with a different photo"]
+                },
+                "motivation_message": "Unable to analyze this image. Please try again!"
+            }
+        }
+        
@@ -12,7 +12,7 @@ from loguru import logger
 from .core.models.managers.model_manager import ModelManager
 from .core.models.config.sota_config import ModelTier, TaskType
 # Location detector removed - using language-based region detection instead
-from .core.prompts.base.prompt_builder import PromptBuilder
+from .core.prompts.base.prompt_builder import PromptBuilder, get_prompt_builder
 from .core.reliability.circuit_breaker import CircuitBreaker, CircuitBreakerConfig
 from .core.reliability.fallback_manager import FallbackManager, FallbackStrategy
 from .core.reliability.health_monitor import HealthMonitor, HealthCheckConfig
@@ -37,7 +37,7 @@ class MLService:
         # Initialize core components
         self.model_manager = ModelManager()
         # Location detector removed - using language-based region detection
-        self.prompt_builder = PromptBuilder()
+        self.prompt_builder = get_prompt_builder()
         
         # Initialize reliability components
         self._setup_reliability()
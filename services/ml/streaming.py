@@ -0,0 +1,182 @@
+"""
+Streaming helpers for LLM JSON responses.
+
+Providers stream the JSON answer token by token. We re-parse the growing
+buffer as "the longest prefix that is valid JSON once its open brackets are
+closed" and turn newly completed fields into Server-Sent Events, so clients
+can show the dish name and items while the rest of the answer is generated.
+
+Strings and numbers are only surfaced once complete: the prefix is cut at the
+last comma/bracket boundary, never inside a value.
+"""
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from loguru import logger
+
+SSE_MEDIA_TYPE = "text/event-stream"
+# Re-parse the buffer at most once per this many new characters (plus on every closing bracket)
+PARSE_EVERY_CHARS = 24
+
+
+def format_sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def strip_code_fence(text: str) -> str:
+    text = text.lstrip()
+    if text.startswith("```"):
+        text = text[3:]
+        if text.startswith("json"):
+            text = text[4:]
+    end = text.rfind("```")
+    return text[:end] if end != -1 else text
+
+
+def parse_partial_json(text: str) -> Optional[Any]:
+    """
+    Parse the complete part of a JSON document that is still being streamed.
+
+    Returns None until the first object/array opens. Values that are cut off
+    (half a string, a key without its value) are dropped.
+    """
+    start = next((i for i, ch in enumerate(text) if ch in "{["), None)
+    if start is None:
+        return None
+    stack: List[str] = []
+    in_string = escaped = False
+    cut, cut_closers = None, ""
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            cut, cut_closers = i + 1, "".join(reversed(stack))
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            cut, cut_closers = i + 1, "".join(reversed(stack))
+            if not stack:
+                break
+        elif ch == ",":
+            cut, cut_closers = i, "".join(reversed(stack))
+    if cut is None:
+        return None
+    try:
+        return json.loads(text[start:cut] + cut_closers)
+    except json.JSONDecodeError:
+        return None
+
+
+def _settled(parent: Dict[str, Any], key: str, final: bool) -> bool:
+    """A value is settled once the model has moved on to a later key."""
+    keys = list(parent.keys())
+    return final or (key in keys and keys[-1] != key)
+
+
+def _settled_list(parent: Dict[str, Any], key: str, final: bool) -> List[Any]:
+    items = parent.get(key)
+    if not isinstance(items, list):
+        return []
+    # The last element may still be receiving fields
+    return items if _settled(parent, key, final) else items[:-1]
+
+
+def food_analysis_fields(partial: Any, final: bool = False) -> Dict[str, Any]:
+    """Fields of the food analysis answer that are ready to show."""
+    if not isinstance(partial, dict):
+        return {}
+    analysis = partial.get("analysis", partial)
+    if not isinstance(analysis, dict):
+        return {}
+    fields: Dict[str, Any] = {}
+    regional = analysis.get("regional_analysis")
+    if isinstance(regional, dict) and regional.get("dish_identification"):
+        fields["dish_name"] = regional["dish_identification"]
+    items = _settled_list(analysis, "food_items", final)
+    if items:
+        fields["food_items"] = items
+    totals = analysis.get("total_nutrition")
+    if isinstance(totals, dict) and (
+        _settled(analysis, "total_nutrition", final)
+        or {"calories", "proteins", "fats", "carbohydrates"} <= totals.keys()
+    ):
+        fields["total_nutrition"] = totals
+    return fields
+
+
+def recipe_fields(partial: Any, final: bool = False) -> Dict[str, Any]:
+    """Fields of the recipe answer that are ready to show."""
+    if not isinstance(partial, dict):
+        return {}
+    fields: Dict[str, Any] = {}
+    for key in ("name", "description", "prep_time", "cook_time", "servings"):
+        if partial.get(key):
+            fields[key] = partial[key]
+    for key in ("ingredients", "instructions"):
+        items = _settled_list(partial, key, final)
+        if items:
+            fields[key] = items
+    nutrition = partial.get("nutrition")
+    if isinstance(nutrition, dict) and _settled(partial, "nutrition", final):
+        fields["nutrition"] = nutrition
+    return fields
+
+
+async def iter_partial_events(
+    deltas: AsyncIterator[str],
+    extract_fields: Callable[[Any, bool], Dict[str, Any]],
+    chunks: List[str],
+) -> AsyncIterator[str]:
+    """
+    `partial` SSE events with only the fields that changed; the raw deltas are
+    appended to `chunks` (the full answer once the iterator is exhausted).
+    Provider errors propagate.
+    """
+    buffer = ""
+    parsed_at = 0
+    sent: Dict[str, Any] = {}
+    async for delta in deltas:
+        if not delta:
+            continue
+        chunks.append(delta)
+        buffer += delta
+        if len(buffer) - parsed_at < PARSE_EVERY_CHARS and "}" not in delta and "]" not in delta:
+            continue
+        parsed_at = len(buffer)
+        fields = extract_fields(parse_partial_json(strip_code_fence(buffer)), False)
+        changed = {k: v for k, v in fields.items() if sent.get(k) != v}
+        if changed:
+            sent.update(changed)
+            yield format_sse("partial", changed)
+
+
+async def stream_json_events(
+    deltas: AsyncIterator[str],
+    extract_fields: Callable[[Any, bool], Dict[str, Any]],
+    finalize: Callable[[str], Dict[str, Any]],
+) -> AsyncIterator[str]:
+    """
+    Turn provider text deltas into SSE events.
+
+    Emits `partial` with only the fields that changed, then `result` with the
+    same payload the non-streaming endpoint returns, or `error`.
+    """
+    chunks: List[str] = []
+    try:
+        async for event in iter_partial_events(deltas, extract_fields, chunks):
+            yield event
+        yield format_sse("result", finalize("".join(chunks)))
+    except Exception as e:
+        logger.error(f"Streaming response failed after {sum(map(len, chunks))} chars: {e}")
+        yield format_sse("error", {"detail": "Streaming failed"})
@@ -1,3 +1,4 @@
+import asyncio
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -9,16 +10,25 @@ from pydantic import BaseModel
 import httpx
 from loguru import logger
 from common.routes import Routes
-from shared.health import create_health_response
+from shared.health import HealthMonitor, create_health_response, standard_checks
 from shared.auth import require_internal_auth, get_auth_headers
+from shared.metrics import instrument_app, stage
 from services.pay.stripe.client import StripeClient  # type: ignore
+from services.pay.stripe.gateway import get_stripe_gateway  # type: ignore
 from services.pay.stripe.webhooks import stripe_webhook_endpoint  # type: ignore
+from services.pay.subscription_renewal import SupabaseRenewalStore, renewal_outcome  # type: ignore
+from services.pay.webhook_queue import (  # type: ignore
+    WebhookEventProcessor, get_webhook_event_store, ingest_webhook, webhook_queue_enabled,
+)
 from yookassa_handlers.client import create_yookassa_invoice, verify_yookassa_payment, validate_yookassa_webhook
 from yookassa_handlers.config import PLANS_YOOKASSA
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
 
+# Request ID (trace id) propagation, latency histograms and GET /metrics
+instrument_app(app, service="pay")
+
 # Get environment variables
 API_SERVICE_URL = os.getenv("API_SERVICE_URL", "https://api.c0r.ai")
 
@@ -28,25 +38,51 @@ class InvoiceRequest(BaseModel):
     description: str
     plan_id: str = "basic"  # Default plan
 
+# Note: We don't check API service health to avoid circular dependency
+# API service checks Pay service, but Pay service doesn't check API service
+health_monitor = HealthMonitor(
+    "pay",
+    checks=standard_checks(check_database=True),
+    additional_info=lambda: {
+        "api_service_configured": bool(API_SERVICE_URL),
+        "yookassa_configured": bool(os.getenv("YOOKASSA_SHOP_ID") and os.getenv("YOOKASSA_SECRET_KEY")),
+        "stripe_configured": bool(os.getenv("STRIPE_SECRET_KEY")),
+        # From recent Stripe call outcomes, no live probe
+        "stripe": get_stripe_gateway().health(),
+        "webhook_queue_enabled": webhook_queue_enabled(),
+        "available_plans": list(PLANS_YOOKASSA.keys())
+    },
+)
+# Background refresh, GET /health/live and GET /health/ready
+health_monitor.install(app)
+
+_webhook_processor_stop = asyncio.Event()
+_webhook_processor_tasks = []
+
+@app.on_event("startup")
+async def start_webhook_processor():
+    # Queued webhooks are applied here; the endpoints only persist and ack
+    if webhook_queue_enabled():
+        processor = WebhookEventProcessor(
+            get_webhook_event_store(),
+            batch_size=int(os.getenv("PAYMENT_WEBHOOK_BATCH_SIZE", "50")),
+        )
+        _webhook_processor_tasks.append(asyncio.create_task(processor.run_forever(_webhook_processor_stop)))
+
+@app.on_event("shutdown")
+async def stop_webhook_processor():
+    _webhook_processor_stop.set()
+    if _webhook_processor_tasks:
+        await asyncio.gather(*_webhook_processor_tasks, return_exceptions=True)
+
+@app.on_event("shutdown")
+async def close_stripe_gateway():
+    await get_stripe_gateway().close()
+
 @app.get(Routes.PAY_HEALTH)
 async def health():
-    """Comprehensive health check for Payment service"""
-    from shared.health import create_comprehensive_health_response
-    
-    # Note: We don't check API service health to avoid circular dependency
-    # API service checks Pay service, but Pay service doesn't check API service
-    
-    return await create_comprehensive_health_response(
-        service_name="pay",
-        check_database=True,
-        check_external_services={},  # No external service checks to avoid circular dependency
-        additional_info={
-            "api_service_configured": bool(API_SERVICE_URL),
-            "yookassa_configured": bool(os.getenv("YOOKASSA_SHOP_ID") and os.getenv("YOOKASSA_SECRET_KEY")),
-            "stripe_configured": bool(os.getenv("STRIPE_SECRET_KEY")),
-            "available_plans": list(PLANS_YOOKASSA.keys())
-        }
-    )
+    """Health of the Payment service from the latest dependency snapshot"""
+    return await health_monitor.response()
 
 @app.get("/health")
 async def health_alias():
@@ -114,13 +150,18 @@ async def yookassa_webhook(request: Request):
         headers = dict(request.headers)
         
         # Validate webhook (basic validation for now)
-        if not validate_yookassa_webhook(body.decode(), headers):
+        with stage("pay", "yookassa_webhook_verify"):
+            valid = validate_yookassa_webhook(body.decode(), headers)
+        if not valid:
             logger.warning("Invalid YooKassa webhook signature")
             raise HTTPException(status_code=400, detail="Invalid webhook signature")
         
         # Parse webhook data
         data = await request.json()
         logger.info(f"YooKassa webhook received: {data}")
+
+        if webhook_queue_enabled():
+            return await ingest_webhook(get_webhook_event_store(), "yookassa", data)
         
         # Check if this is a payment success notification
         if data.get("event") == "payment.succeeded":
@@ -129,7 +170,13 @@ async def yookassa_webhook(request: Request):
             status = payment_object.get("status")
             metadata = payment_object.get("metadata", {})
             
-            if status == "succeeded" and payment_id:
+            renewal = renewal_outcome("yookassa", payment_object)
+            if renewal is not None:
+                # Subscription renewal: recorded once per period, by the run or by this webhook
+                with stage("pay", "credit_add"):
+                    result = await SupabaseRenewalStore().record_payment(renewal)
+                logger.info(f"Renewal payment {payment_id} of subscription {renewal['subscription_id']}: {result}")
+            elif status == "succeeded" and payment_id:
                 # Extract user info from metadata
                 user_id = metadata.get("user_id")
                 credits_count = int(metadata.get("credits_count", 0))
@@ -138,7 +185,8 @@ async def yookassa_webhook(request: Request):
                 
                 if user_id and credits_count > 0:
                     # Add credits to user account via API service
-                    await add_credits_to_user(user_id, credits_count, payment_id, amount)
+                    with stage("pay", "credit_add"):
+                        await add_credits_to_user(user_id, credits_count, payment_id, amount)
                     logger.info(f"Successfully processed payment {payment_id} for user {user_id}")
                 else:
                     logger.warning(f"Missing user_id or credits_count in payment {payment_id}")
@@ -12,14 +12,17 @@ project_root = os.path.join(os.path.dirname(__file__), '..', '..', '..')
 sys.path.insert(0, project_root)
 
 from common.config.payment_plans import get_payment_plans_for_region
+from .gateway import StripeGateway, checkout_idempotency_key, get_stripe_gateway
 
 # Configure Stripe (support both STRIPE_SECRET_KEY and STRIPE_API_KEY)
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY") or os.getenv("STRIPE_API_KEY")
 
 class StripeClient:
-    def __init__(self):
+    def __init__(self, gateway: Optional[StripeGateway] = None):
         self.webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
         self.api_key = os.getenv("STRIPE_SECRET_KEY") or os.getenv("STRIPE_API_KEY")
+        # API calls go through the shared async gateway (pooled connections, idempotency, caching)
+        self.gateway = gateway or get_stripe_gateway()
         
         if not self.api_key:
             logger.warning("STRIPE_SECRET_KEY not found in environment variables")
@@ -62,8 +65,7 @@ class StripeClient:
             if not cancel_url:
                 cancel_url = f"https://t.me/your_bot_username?start=payment_cancel"
             
-            # Create Stripe checkout session
-            session = stripe.checkout.Session.create(
+            params = dict(
                 payment_method_types=['card'],
                 line_items=[{
                     'price_data': {
@@ -88,7 +90,7 @@ class StripeClient:
                     'language': language,
                     'provider': 'stripe'
                 },
-                customer_email=None,  # Will be collected during checkout
+                # customer_email is collected during checkout
                 billing_address_collection='auto',
                 payment_intent_data={
                     'metadata': {
@@ -99,10 +101,15 @@ class StripeClient:
                 }
             )
             
-            logger.info(f"Created Stripe session {session.id} for user {user_id}, plan {plan_id}")
+            # Create Stripe checkout session; a repeat within the idempotency window returns the same session
+            session = await self.gateway.create_checkout_session(
+                params, checkout_idempotency_key(user_id, plan_id, params)
+            )
+            
+            logger.info(f"Created Stripe session {session['id']} for user {user_id}, plan {plan_id}")
             return {
-                'session_id': session.id,
-                'checkout_url': session.url,
+                'session_id': session['id'],
+                'checkout_url': session.get('url'),
                 'status': 'created',
                 'plan_id': plan_id,
                 'credits': plan['credits'],
@@ -152,15 +159,16 @@ class StripeClient:
             Session data or None if not found
         """
         try:
-            session = stripe.checkout.Session.retrieve(session_id)
+            session = await self.gateway.retrieve_session(session_id)
+            customer_details = session.get('customer_details')
             return {
-                'id': session.id,
-                'status': session.status,
-                'payment_status': session.payment_status,
-                'amount_total': session.amount_total,
-                'currency': session.currency,
-                'metadata': session.metadata,
-                'customer_email': session.customer_details.email if session.customer_details else None
+                'id': session['id'],
+                'status': session.get('status'),
+                'payment_status': session.get('payment_status'),
+                'amount_total': session.get('amount_total'),
+                'currency': session.get('currency'),
+                'metadata': session.get('metadata'),
+                'customer_email': customer_details.get('email') if customer_details else None
             }
         except stripe.error.StripeError as e:
             logger.error(f"Error retrieving Stripe session {session_id}: {e}")
@@ -180,54 +188,22 @@ class StripeClient:
             List of payment methods
         """
         try:
-            payment_methods = stripe.PaymentMethod.list(
-                customer=customer_id,
-                type="card",
-            )
-            return payment_methods.data
+            return await self.gateway.list_payment_methods(customer_id, type="card")
         except stripe.error.StripeError as e:
             logger.error(f"Error listing payment methods for {customer_id}: {e}")
             return []
     
     def health_check(self) -> Dict[str, Any]:
         """
-        Check Stripe API connectivity
+        Stripe API health from the outcomes of recent calls (no live probe)
         
         Returns:
             Health status information
         """
-        try:
-            if not self.api_key:
-                return {
-                    'status': 'error',
-                    'message': 'Stripe API key not configured'
-                }
-            
-            # Try to list a small number of payment intents to test connectivity
-            stripe.PaymentIntent.list(limit=1)
-            
-            return {
-                'status': 'healthy',
-                'message': 'Stripe API accessible',
-                'api_key_configured': bool(self.api_key),
-                'webhook_secret_configured': bool(self.webhook_secret)
-            }
-            
-        except stripe.error.AuthenticationError:
-            return {
-                'status': 'error',
-                'message': 'Stripe API key invalid'
-            }
-        except stripe.error.StripeError as e:
-            return {
-                'status': 'error',
-                'message': f'Stripe API error: {str(e)}'
-            }
-        except Exception as e:
-            return {
-                'status': 'error',
-                'message': f'Unknown error: {str(e)}'
-            }
+        health = self.gateway.health()
+        health['api_key_configured'] = bool(self.api_key)
+        health['webhook_secret_configured'] = bool(self.webhook_secret)
+        return health
 
 # Legacy function for backward compatibility
 async def create_stripe_invoice(user_id: int, plan_id: str) -> dict:
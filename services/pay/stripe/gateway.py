@@ -0,0 +1,287 @@
+"""
+Async Stripe gateway
+
+All Stripe API calls of the pay service go through one `StripeGateway`:
+- non-blocking calls on the SDK's async client over a pooled httpx connection
+  (no blocking `stripe.*.create` inside `async def`)
+- idempotent checkout creation: the key is derived from user, plan, request
+  parameters and a time window, so a double-tapped "Pay" or a retried request
+  gets the same session instead of a second one; a session that was paid or
+  expired is never handed out again, the next purchase gets a new one
+- short-lived cache of retrieved sessions
+- health derived from recent call outcomes instead of live API probes
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import stripe
+from loguru import logger
+
+STRIPE_TIMEOUT_SECONDS = float(os.getenv("STRIPE_TIMEOUT_SECONDS", "20"))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "2"))
+# Same user + plan + parameters within this window -> same checkout session
+CHECKOUT_IDEMPOTENCY_WINDOW_SECONDS = int(os.getenv("STRIPE_CHECKOUT_IDEMPOTENCY_WINDOW", "600"))
+SESSION_CACHE_TTL_SECONDS = float(os.getenv("STRIPE_SESSION_CACHE_TTL", "15"))
+SESSION_CACHE_MAX_ENTRIES = 1024
+# New sessions created for one key after earlier ones were paid or expired, per call
+CHECKOUT_MAX_ATTEMPTS = 10
+HEALTH_WINDOW_CALLS = 50
+HEALTH_DEGRADED_ERROR_RATE = 0.2
+HEALTH_ERROR_ERROR_RATE = 0.5
+HEALTH_DEGRADED_LATENCY_SECONDS = 3.0
+
+# Errors that say something about Stripe availability (not about the request itself)
+AVAILABILITY_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.AuthenticationError,
+    stripe.error.RateLimitError,
+)
+
+
+def checkout_idempotency_key(
+    user_id: int,
+    plan_id: str,
+    params: Dict[str, Any],
+    window_seconds: int = CHECKOUT_IDEMPOTENCY_WINDOW_SECONDS,
+    now: Optional[float] = None,
+) -> str:
+    """Stable for the same user, plan and parameters within one time window"""
+    window = int((time.time() if now is None else now) // window_seconds)
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f"checkout:{user_id}:{plan_id}:{window}:{digest}"
+
+
+class StripeGateway:
+    """Async Stripe API access with idempotency, session caching and outcome-based health"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        api_base: Optional[str] = None,
+        timeout: float = STRIPE_TIMEOUT_SECONDS,
+        max_network_retries: int = STRIPE_MAX_NETWORK_RETRIES,
+        session_cache_ttl: float = SESSION_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.api_key = api_key or os.getenv("STRIPE_SECRET_KEY") or os.getenv("STRIPE_API_KEY")
+        self.api_base = api_base or os.getenv("STRIPE_API_BASE")
+        self.timeout = timeout
+        self.max_network_retries = max_network_retries
+        self.session_cache_ttl = session_cache_ttl
+        self.clock = clock
+        self._client: Optional[stripe.StripeClient] = None
+        self._http_client: Optional[stripe.HTTPXClient] = None
+        # session id -> (expires at, session dict)
+        self._sessions: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        # idempotency key -> in-flight or finished creation
+        self._checkouts: Dict[str, asyncio.Future] = {}
+        # caller's idempotency key -> sessions of it no longer open (the next one gets a suffixed key)
+        self._checkout_attempts: Dict[str, int] = {}
+        # (finished at, ok, latency) of recent calls
+        self._outcomes: Deque[Tuple[float, bool, float]] = deque(maxlen=HEALTH_WINDOW_CALLS)
+        self._last_error: Optional[str] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def client(self) -> stripe.StripeClient:
+        if self._client is None:
+            if not self.api_key:
+                raise RuntimeError("Stripe API key not configured")
+            self._http_client = stripe.HTTPXClient(timeout=self.timeout)
+            self._client = stripe.StripeClient(
+                self.api_key,
+                http_client=self._http_client,
+                base_addresses={"api": self.api_base} if self.api_base else None,
+                max_network_retries=self.max_network_retries,
+            )
+        return self._client
+
+    async def close(self):
+        if self._http_client is not None:
+            await self._http_client.close_async()
+        self._client = self._http_client = None
+
+    async def _call(self, operation: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        started = self.clock()
+        try:
+            result = await fn()
+        except AVAILABILITY_ERRORS as e:
+            self._record(False, started, f"{operation}: {e}")
+            raise
+        except stripe.error.StripeError:
+            # Card declined, invalid request, ...: Stripe itself answered fine
+            self._record(True, started)
+            raise
+        except Exception as e:
+            self._record(False, started, f"{operation}: {e}")
+            raise
+        self._record(True, started)
+        return result
+
+    def _record(self, ok: bool, started: float, error: Optional[str] = None):
+        now = self.clock()
+        self._outcomes.append((now, ok, now - started))
+        if error:
+            self._last_error = error
+
+    async def create_checkout_session(self, params: Dict[str, Any], idempotency_key: str) -> Dict[str, Any]:
+        """
+        Create a checkout session once per idempotency key: concurrent callers
+        share the in-flight request, later callers in this process get the
+        stored result, and Stripe dedupes the key across processes.
+
+        A stored or replayed session that is no longer open (paid or expired)
+        is not returned: the key gets an attempt suffix and a new session is
+        created, so buying the same package twice in one window works.
+        """
+        for _ in range(CHECKOUT_MAX_ATTEMPTS):
+            attempt = self._checkout_attempts.get(idempotency_key, 0)
+            key = f"{idempotency_key}:{attempt}" if attempt else idempotency_key
+            data, reused = await self._create_checkout_once(params, key)
+            if not reused or await self._session_open(data):
+                return data
+            logger.info(f"Checkout session {data.get('id')} is no longer open, creating a new one")
+            self._checkouts.pop(key, None)
+            self._checkout_attempts[idempotency_key] = attempt + 1
+        raise RuntimeError(f"No open checkout session after {CHECKOUT_MAX_ATTEMPTS} attempts")
+
+    async def _create_checkout_once(self, params: Dict[str, Any], idempotency_key: str) -> Tuple[Dict[str, Any], bool]:
+        """The session for this exact key and whether it was created earlier (stored or replayed by Stripe)"""
+        future = self._checkouts.get(idempotency_key)
+        if future is not None:
+            return await asyncio.shield(future), True
+        future = asyncio.get_running_loop().create_future()
+        self._checkouts[idempotency_key] = future
+        try:
+            session = await self._call("checkout.create", lambda: self.client.v1.checkout.sessions.create_async(
+                params=params, options={"idempotency_key": idempotency_key},
+            ))
+        except BaseException as e:
+            self._checkouts.pop(idempotency_key, None)
+            future.set_exception(e)
+            future.exception()
+            raise
+        data = session.to_dict()
+        future.set_result(data)
+        replayed = _idempotent_replay(session)
+        if not replayed:
+            # A replay is the session as it was created, not as it is now
+            self._cache_session(data)
+        self._expire_checkouts()
+        return data, replayed
+
+    async def _session_open(self, data: Dict[str, Any]) -> bool:
+        # Cached for a few seconds, and dropped by the webhook when the session completes
+        return (await self.retrieve_session(data["id"])).get("status") == "open"
+
+    async def retrieve_session(self, session_id: str) -> Dict[str, Any]:
+        cached = self._sessions.get(session_id)
+        if cached and cached[0] > self.clock():
+            return cached[1]
+        session = await self._call("checkout.retrieve", lambda: self.client.v1.checkout.sessions.retrieve_async(session_id))
+        data = session.to_dict()
+        self._cache_session(data)
+        return data
+
+    async def create_payment_intent(self, params: Dict[str, Any], idempotency_key: str) -> Dict[str, Any]:
+        """Create (and, with ``confirm``, charge) a PaymentIntent; Stripe dedupes the key for 24h"""
+        intent = await self._call("payment_intent.create", lambda: self.client.v1.payment_intents.create_async(
+            params=params, options={"idempotency_key": idempotency_key},
+        ))
+        return intent.to_dict()
+
+    async def retrieve_payment_intent(self, intent_id: str) -> Dict[str, Any]:
+        intent = await self._call("payment_intent.retrieve", lambda: self.client.v1.payment_intents.retrieve_async(intent_id))
+        return intent.to_dict()
+
+    async def search_payment_intents(self, query: str) -> list:
+        """PaymentIntents matching a search query; Stripe indexes new intents within about a minute"""
+        result = await self._call("payment_intent.search", lambda: self.client.v1.payment_intents.search_async(
+            params={"query": query},
+        ))
+        return [intent.to_dict() for intent in result.data]
+
+    async def list_payment_methods(self, customer_id: str, type: str = "card") -> list:
+        result = await self._call("payment_methods.list", lambda: self.client.v1.payment_methods.list_async(
+            params={"customer": customer_id, "type": type},
+        ))
+        return [method.to_dict() for method in result.data]
+
+    def invalidate_session(self, session_id: str):
+        """Drop a cached session (e.g. when a webhook reports it completed)"""
+        self._sessions.pop(session_id, None)
+
+    def _cache_session(self, data: Dict[str, Any]):
+        if not data.get("id"):
+            return
+        if len(self._sessions) >= SESSION_CACHE_MAX_ENTRIES:
+            now = self.clock()
+            for key in [key for key, (expires, _) in self._sessions.items() if expires <= now]:
+                del self._sessions[key]
+            while len(self._sessions) >= SESSION_CACHE_MAX_ENTRIES:
+                self._sessions.pop(next(iter(self._sessions)))
+        self._sessions[data["id"]] = (self.clock() + self.session_cache_ttl, data)
+
+    def _expire_checkouts(self):
+        # Stripe keeps idempotency keys for 24h; in process only the current window matters
+        if len(self._checkouts) > SESSION_CACHE_MAX_ENTRIES:
+            for key in list(self._checkouts)[: len(self._checkouts) // 2]:
+                if self._checkouts[key].done():
+                    del self._checkouts[key]
+        if len(self._checkout_attempts) > SESSION_CACHE_MAX_ENTRIES:
+            for key in list(self._checkout_attempts)[: len(self._checkout_attempts) // 2]:
+                del self._checkout_attempts[key]
+
+    def health(self) -> Dict[str, Any]:
+        """Status from the last calls: healthy / degraded / error, or unknown before any call"""
+        if not self.api_key:
+            return {"status": "error", "message": "Stripe API key not configured"}
+        outcomes = list(self._outcomes)
+        if not outcomes:
+            return {"status": "unknown", "message": "No Stripe calls yet", "recent_calls": 0}
+        failures = sum(1 for _, ok, _ in outcomes if not ok)
+        error_rate = failures / len(outcomes)
+        latencies = sorted(latency for _, _, latency in outcomes)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        if error_rate >= HEALTH_ERROR_ERROR_RATE:
+            status = "error"
+        elif error_rate >= HEALTH_DEGRADED_ERROR_RATE or p95 >= HEALTH_DEGRADED_LATENCY_SECONDS:
+            status = "degraded"
+        else:
+            status = "healthy"
+        return {
+            "status": status,
+            "recent_calls": len(outcomes),
+            "error_rate": round(error_rate, 3),
+            "p95_latency_sec": round(p95, 3),
+            "last_call_age_sec": round(self.clock() - outcomes[-1][0], 1),
+            "last_error": self._last_error,
+        }
+
+
+def _idempotent_replay(obj: Any) -> bool:
+    """True when Stripe answered with the stored response of an earlier request with the same key"""
+    response = getattr(obj, "last_response", None)
+    headers = getattr(response, "headers", None) or {}
+    return any(name.lower() == "idempotent-replayed" and value == "true" for name, value in headers.items())
+
+
+_gateway: Optional[StripeGateway] = None
+
+
+def get_stripe_gateway() -> StripeGateway:
+    """Process-wide gateway (one connection pool)"""
+    global _gateway
+    if _gateway is None:
+        _gateway = StripeGateway()
+        logger.info(f"Stripe gateway initialized (configured={_gateway.configured})")
+    return _gateway
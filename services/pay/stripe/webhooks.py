@@ -20,6 +20,11 @@ except ImportError as e:
     logger.warning(f"Supabase client not available: {e}")
     SUPABASE_AVAILABLE = False
 
+from shared.metrics import stage
+from services.pay.subscription_renewal import SupabaseRenewalStore, renewal_outcome
+from services.pay.webhook_queue import (
+    STRIPE_CREDIT_EVENTS, get_webhook_event_store, ingest_webhook, webhook_queue_enabled,
+)
 from .client import StripeClient
 
 class StripeWebhookHandler:
@@ -38,7 +43,9 @@ class StripeWebhookHandler:
             Tuple of (response_data, status_code)
         """
         # Verify webhook signature
-        if not await self.stripe_client.verify_webhook_signature(payload, signature):
+        with stage("pay", "stripe_webhook_verify"):
+            valid = await self.stripe_client.verify_webhook_signature(payload, signature)
+        if not valid:
             logger.error("Invalid webhook signature")
             return {'error': 'Invalid signature'}, 400
             
@@ -48,6 +55,12 @@ class StripeWebhookHandler:
             )
             
             logger.info(f"Processing Stripe webhook event: {event['type']}")
+
+            if webhook_queue_enabled():
+                if event['type'] in STRIPE_CREDIT_EVENTS:
+                    # The cached copy still says "open"
+                    self.stripe_client.gateway.invalidate_session(event['data']['object']['id'])
+                return await ingest_webhook(get_webhook_event_store(), 'stripe', json.loads(payload)), 200
             
             # Handle different event types
             if event['type'] == 'checkout.session.completed':
@@ -83,6 +96,8 @@ class StripeWebhookHandler:
         """
         try:
             logger.info(f"Processing checkout completion for session {session['id']}")
+            # The cached copy still says "open"
+            self.stripe_client.gateway.invalidate_session(session['id'])
             
             # Extract metadata
             metadata = session.get('metadata', {})
@@ -113,7 +128,8 @@ class StripeWebhookHandler:
                         return {'error': 'User not found'}, 404
                     
                     # Add credits to user account
-                    await add_credits(user['id'], credits)
+                    with stage("pay", "credit_add"):
+                        await add_credits(user['id'], credits)
                     logger.info(f"Added {credits} credits to user {user_id}")
                     
                     # Log payment
@@ -179,6 +195,14 @@ class StripeWebhookHandler:
         try:
             logger.info(f"Processing payment intent success: {payment_intent['id']}")
             
+            renewal = renewal_outcome('stripe', payment_intent)
+            if renewal is not None:
+                # Subscription renewal: recorded once per period, by the run or by this webhook
+                with stage("pay", "credit_add"):
+                    result = await SupabaseRenewalStore().record_payment(renewal)
+                logger.info(f"Renewal payment {payment_intent['id']} of subscription {renewal['subscription_id']}: {result}")
+                return {'status': 'success', 'payment_intent_id': payment_intent['id']}, 200
+
             # Extract metadata
             metadata = payment_intent.get('metadata', {})
             user_id = metadata.get('user_id')
@@ -0,0 +1,551 @@
+"""
+Subscription renewal engine
+
+Renews recurring plans whose ``next_renewal_at`` is due by a run's cutoff
+(migrations/database/2025-10-25_subscription_renewals.sql):
+
+- due subscriptions are read in keyset pages over ``(next_renewal_at, id)``
+  (``due_subscriptions``, backed by a partial index), never with OFFSET
+- a page is charged with bounded concurrency; every gateway call first takes
+  a token from that gateway's rate limiter
+- the outcomes of a page are written in one ``record_subscription_renewals``
+  call together with the run checkpoint (credits, payment rows, next periods
+  and retry schedule included), while the next page is being charged
+- a run is identified by ``run_id``: running it again resumes after the last
+  written page with the original cutoff
+- a written success or decline moves the subscription past the run's cutoff
+  (2025-10-27_subscription_renewal_overdue.sql), so a run charges each
+  subscription at most once; periods missed while overdue are skipped, not charged
+- charges carry an idempotency key and metadata per subscription period and
+  attempt. An outcome the run could not learn (gateway error, pending payment,
+  a page charged but not written before a crash) is looked up at the gateway
+  before charging again (2025-10-28_subscription_renewal_pending_charges.sql),
+  and a late success is recorded from the payment webhook. The gateways keep
+  idempotency keys for 24 hours only; YooKassa payments cannot be searched by
+  metadata, so a YooKassa charge whose payment id was never seen is covered by
+  its ``payment.succeeded`` webhook, not by a lookup
+
+Usage::
+
+    python -m services.pay.subscription_renewal run [--run-id renewal-2025-10-25] [--concurrency 20]
+    python -m services.pay.subscription_renewal status --run-id renewal-2025-10-25
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from shared.metrics import REGISTRY, stage
+
+RENEWAL_GATEWAYS = ("stripe", "yookassa")
+OUTCOMES = ("succeeded", "declined", "error")
+
+RENEWAL_PAGE_SIZE = int(os.getenv("SUBSCRIPTION_RENEWAL_PAGE_SIZE", "500"))
+RENEWAL_CONCURRENCY = int(os.getenv("SUBSCRIPTION_RENEWAL_CONCURRENCY", "20"))
+# Charges per second per gateway, well under the providers' API limits
+RENEWAL_RATE_LIMITS = {
+    "stripe": float(os.getenv("SUBSCRIPTION_RENEWAL_STRIPE_RPS", "25")),
+    "yookassa": float(os.getenv("SUBSCRIPTION_RENEWAL_YOOKASSA_RPS", "10")),
+}
+# Declines before a subscription becomes past_due (retries after 1, 2, 4... days)
+RENEWAL_MAX_ATTEMPTS = 4
+# Pages of a resumed run that may have been charged without being written (the failed write and the
+# page charged meanwhile); their charges are looked up before charging again
+RENEWAL_RESUME_LOOKUP_PAGES = 2
+# Stripe PaymentIntent statuses after which this attempt will not succeed
+STRIPE_DECLINED_STATUSES = ("requires_payment_method", "canceled")
+# record_subscription_renewals() run id of successes reported by payment webhooks
+WEBHOOK_RUN_ID = "webhook"
+
+_RENEWALS = REGISTRY.counter(
+    "c0r_subscription_renewals_total",
+    "Subscription renewal charges by gateway and outcome",
+    ("gateway", "outcome"),
+)
+# Per charge without a log line per call (stage() logs each one)
+_CHARGE_SECONDS = REGISTRY.histogram(
+    "c0r_subscription_renewal_charge_seconds",
+    "Subscription renewal gateway call latency",
+    ("gateway",),
+)
+
+
+@dataclass
+class DueSubscription:
+    """A subscription row due for renewal"""
+    id: int
+    user_id: str
+    plan_id: str
+    gateway: str
+    payment_method_id: str
+    amount: Decimal
+    currency: str
+    credits: int
+    current_period_end: datetime
+    next_renewal_at: datetime
+    failed_attempts: int = 0
+    gateway_customer_id: Optional[str] = None
+    # The last charge of this period and attempt ended without a final answer
+    charge_pending: bool = False
+    pending_transaction_id: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "DueSubscription":
+        return cls(
+            id=int(row["id"]),
+            user_id=str(row["user_id"]),
+            plan_id=row["plan_id"],
+            gateway=row["gateway"],
+            payment_method_id=row["payment_method_id"],
+            amount=Decimal(str(row["amount"])),
+            currency=row["currency"],
+            credits=int(row["credits"]),
+            current_period_end=_as_datetime(row["current_period_end"]),
+            next_renewal_at=_as_datetime(row["next_renewal_at"]),
+            failed_attempts=int(row.get("failed_attempts") or 0),
+            gateway_customer_id=row.get("gateway_customer_id"),
+            charge_pending=bool(row.get("charge_pending")),
+            pending_transaction_id=row.get("pending_transaction_id"),
+        )
+
+    @property
+    def idempotency_key(self) -> str:
+        """Same period and attempt -> same key, so a replayed charge is deduplicated by the gateway"""
+        return f"renewal:{self.id}:{int(self.current_period_end.timestamp())}:{self.failed_attempts}"
+
+    @property
+    def metadata(self) -> Dict[str, str]:
+        """Gateway payment metadata: finds the charge of a period and attempt, and credits it from a webhook"""
+        return {
+            "subscription_id": str(self.id),
+            "plan_id": self.plan_id,
+            "renewal": "true",
+            "period_start": self.current_period_end.isoformat(),
+            "attempt": str(self.failed_attempts),
+        }
+
+
+@dataclass
+class ChargeResult:
+    """What a gateway answered for one renewal charge"""
+    status: str
+    transaction_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class RenewalRun:
+    """Stored state of a run: the cutoff it renews up to and how far it got"""
+    run_id: str
+    cutoff: datetime
+    status: str = "running"
+    checkpoint: Optional[Tuple[datetime, int]] = None
+    counts: Dict[str, int] = field(default_factory=dict)
+    # Started before: pages after the checkpoint may already have been charged
+    resumed: bool = False
+
+
+def renewal_outcome(gateway: str, payment: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Outcome row of a succeeded renewal payment reported by a webhook (a Stripe
+    PaymentIntent or a YooKassa payment object); None for anything else
+    """
+    metadata = payment.get("metadata") or {}
+    if metadata.get("renewal") != "true" or payment.get("status") != "succeeded":
+        return None
+    if not metadata.get("subscription_id") or not metadata.get("period_start"):
+        return None
+    if gateway == "stripe":
+        # Amounts are in the smallest currency unit
+        amount = Decimal(payment.get("amount") or 0) / 100
+        currency = (payment.get("currency") or "").upper()
+    else:
+        value = payment.get("amount") or {}
+        amount, currency = Decimal(str(value.get("value", 0))), value.get("currency")
+    return {
+        "subscription_id": int(metadata["subscription_id"]),
+        "period_start": metadata["period_start"],
+        "attempt": int(metadata.get("attempt") or 0),
+        "status": "succeeded",
+        "transaction_id": payment["id"],
+        "amount": str(amount),
+        "currency": currency,
+        "error": None,
+    }
+
+
+def _as_datetime(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+class RenewalRateLimiter:
+    """Token bucket: ``rate`` acquisitions per second on average, bursts up to ``burst``"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+
+    async def acquire(self) -> None:
+        # Reserve a token now (the balance may go negative) and wait until it is earned,
+        # so callers are served in arrival order
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate) - 1
+        self._updated = now
+        if self._tokens < 0:
+            await self.sleep(-self._tokens / self.rate)
+
+
+class StripeRenewalGateway:
+    """Off-session PaymentIntent on the saved card"""
+
+    def __init__(self, gateway=None):
+        if gateway is None:
+            from services.pay.stripe.gateway import get_stripe_gateway
+            gateway = get_stripe_gateway()
+        self.gateway = gateway
+
+    async def charge(self, subscription: DueSubscription) -> ChargeResult:
+        import stripe
+
+        params = {
+            # Amounts are in the smallest currency unit
+            "amount": int(subscription.amount * 100),
+            "currency": subscription.currency.lower(),
+            "customer": subscription.gateway_customer_id,
+            "payment_method": subscription.payment_method_id,
+            "off_session": True,
+            "confirm": True,
+            "metadata": subscription.metadata,
+        }
+        try:
+            intent = await self.gateway.create_payment_intent(params, subscription.idempotency_key)
+        except stripe.error.CardError as e:
+            return ChargeResult("declined", error=e.user_message or str(e))
+        return _intent_result(intent)
+
+    async def find(self, subscription: DueSubscription) -> Optional[ChargeResult]:
+        """The PaymentIntent of this period and attempt, if one was created"""
+        if subscription.pending_transaction_id:
+            return _intent_result(await self.gateway.retrieve_payment_intent(subscription.pending_transaction_id))
+        metadata = subscription.metadata
+        query = " AND ".join(
+            f"metadata['{name}']:'{metadata[name]}'" for name in ("subscription_id", "period_start", "attempt")
+        )
+        intents = await self.gateway.search_payment_intents(query)
+        if not intents:
+            # Search misses only intents from the last minute, whose idempotency key still dedupes a charge
+            return None
+        # A succeeded intent wins over failed ones of the same attempt
+        intents.sort(key=lambda intent: intent.get("status") != "succeeded")
+        return _intent_result(intents[0])
+
+
+def _intent_result(intent: Dict[str, Any]) -> ChargeResult:
+    status = intent.get("status")
+    if status == "succeeded":
+        return ChargeResult("succeeded", transaction_id=intent["id"])
+    if status in STRIPE_DECLINED_STATUSES:
+        error = (intent.get("last_payment_error") or {}).get("message") or f"payment intent {status}"
+        return ChargeResult("declined", transaction_id=intent.get("id"), error=error)
+    # processing / requires_action / requires_confirmation: not final, looked up by the next run
+    return ChargeResult("error", transaction_id=intent.get("id"), error=f"payment intent {status}")
+
+
+class YooKassaRenewalGateway:
+    """Auto-payment with the saved ``payment_method_id``"""
+
+    async def charge(self, subscription: DueSubscription) -> ChargeResult:
+        from yookassa import Payment
+
+        payment_data = {
+            "amount": {"value": f"{subscription.amount:.2f}", "currency": subscription.currency},
+            "capture": True,
+            "payment_method_id": subscription.payment_method_id,
+            "description": f"Subscription renewal: {subscription.plan_id}",
+            # No user_id/credits_count: credits come from the renewal, not from the one-off payment path
+            "metadata": subscription.metadata,
+        }
+        payment = await asyncio.to_thread(Payment.create, payment_data, subscription.idempotency_key)
+        return _yookassa_result(payment)
+
+    async def find(self, subscription: DueSubscription) -> Optional[ChargeResult]:
+        """The payment the last attempt created; without its id there is nothing to search by"""
+        if not subscription.pending_transaction_id:
+            return None
+        from yookassa import Payment
+
+        return _yookassa_result(await asyncio.to_thread(Payment.find_one, subscription.pending_transaction_id))
+
+
+def _yookassa_result(payment) -> ChargeResult:
+    if payment.status == "succeeded":
+        return ChargeResult("succeeded", transaction_id=payment.id)
+    if payment.status == "canceled":
+        details = getattr(payment, "cancellation_details", None)
+        return ChargeResult("declined", transaction_id=payment.id, error=getattr(details, "reason", None) or "canceled")
+    # pending / waiting_for_capture: the next run looks the payment up by id
+    return ChargeResult("error", transaction_id=payment.id, error=f"payment {payment.status}")
+
+
+class SupabaseRenewalStore:
+    """Renewal tables access; blocking client calls run off the event loop"""
+
+    runs_table = "subscription_renewal_runs"
+
+    def __init__(self, client=None):
+        if client is None:
+            from common.db.client import supabase as client
+        self.client = client
+
+    async def start_run(self, run_id: str, cutoff: datetime) -> RenewalRun:
+        """The stored run with this id, created with ``cutoff`` if new"""
+        row = {"run_id": run_id, "cutoff": cutoff.isoformat()}
+        created = await asyncio.to_thread(
+            lambda: self.client.table(self.runs_table)
+            .upsert(row, on_conflict="run_id", ignore_duplicates=True)
+            .execute()
+        )
+        result = await asyncio.to_thread(
+            lambda: self.client.table(self.runs_table).select("*").eq("run_id", run_id).execute()
+        )
+        run = _run_from_row(result.data[0])
+        run.resumed = not created.data
+        return run
+
+    async def get_run(self, run_id: str) -> Optional[RenewalRun]:
+        result = await asyncio.to_thread(
+            lambda: self.client.table(self.runs_table).select("*").eq("run_id", run_id).execute()
+        )
+        return _run_from_row(result.data[0]) if result.data else None
+
+    async def due_page(self, cutoff: datetime, after: Optional[Tuple[datetime, int]],
+                       limit: int) -> List[DueSubscription]:
+        params = {
+            "p_cutoff": cutoff.isoformat(),
+            "p_after_renewal_at": after[0].isoformat() if after else None,
+            "p_after_id": after[1] if after else 0,
+            "p_limit": limit,
+        }
+        result = await asyncio.to_thread(lambda: self.client.rpc("due_subscriptions", params).execute())
+        return [DueSubscription.from_row(row) for row in result.data or []]
+
+    async def record(self, run_id: str, outcomes: List[Dict[str, Any]], checkpoint: Optional[Tuple[datetime, int]],
+                     counts: Dict[str, int], max_attempts: int) -> Dict[str, Any]:
+        params = {
+            "p_run_id": run_id,
+            "p_outcomes": outcomes,
+            "p_checkpoint_renewal_at": checkpoint[0].isoformat() if checkpoint else None,
+            "p_checkpoint_id": checkpoint[1] if checkpoint else None,
+            "p_counts": counts,
+            "p_max_attempts": max_attempts,
+        }
+        result = await asyncio.to_thread(lambda: self.client.rpc("record_subscription_renewals", params).execute())
+        return result.data or {}
+
+    async def record_payment(self, outcome: Dict[str, Any]) -> Dict[str, Any]:
+        """A renewal success reported by a payment webhook; a no-op when a run already recorded it"""
+        return await self.record(WEBHOOK_RUN_ID, [outcome], None, {}, RENEWAL_MAX_ATTEMPTS)
+
+    async def finish_run(self, run_id: str, counts: Dict[str, int]) -> None:
+        update = {"status": "completed", "counts": counts, "finished_at": datetime.now(timezone.utc).isoformat()}
+        await asyncio.to_thread(
+            lambda: self.client.table(self.runs_table).update(update).eq("run_id", run_id).execute()
+        )
+
+
+def _run_from_row(row: Dict[str, Any]) -> RenewalRun:
+    checkpoint = None
+    if row.get("checkpoint_renewal_at") is not None:
+        checkpoint = (_as_datetime(row["checkpoint_renewal_at"]), int(row["checkpoint_id"]))
+    return RenewalRun(
+        run_id=row["run_id"],
+        cutoff=_as_datetime(row["cutoff"]),
+        status=row.get("status", "running"),
+        checkpoint=checkpoint,
+        counts=dict(row.get("counts") or {}),
+    )
+
+
+class SubscriptionRenewalEngine:
+    """Renews due subscriptions page by page; a crashed run is resumed by running it again"""
+
+    def __init__(self, store, gateways: Dict[str, Any], page_size: int = RENEWAL_PAGE_SIZE,
+                 concurrency: int = RENEWAL_CONCURRENCY, rate_limits: Optional[Dict[str, float]] = None,
+                 max_attempts: int = RENEWAL_MAX_ATTEMPTS, clock: Callable[[], float] = time.perf_counter):
+        self.store = store
+        self.gateways = gateways
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.clock = clock
+        rate_limits = {**RENEWAL_RATE_LIMITS, **(rate_limits or {})}
+        self.limiters = {name: RenewalRateLimiter(rate_limits[name]) for name in gateways if rate_limits.get(name)}
+
+    async def run(self, run_id: Optional[str] = None, cutoff: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Renew everything due by ``cutoff`` (now by default); returns a report with
+        outcome counts and throughput. An existing ``run_id`` keeps its stored
+        cutoff and continues after its checkpoint.
+        """
+        cutoff = cutoff or datetime.now(timezone.utc)
+        run_id = run_id or f"renewal-{cutoff:%Y%m%dT%H%M%S}"
+        run = await self.store.start_run(run_id, cutoff)
+        counts = {outcome: int(run.counts.get(outcome, 0)) for outcome in OUTCOMES}
+        started = self.clock()
+        charged = pages = 0
+        if run.status == "completed":
+            logger.info(f"Subscription renewal run {run_id} already completed: {counts}")
+            return self._report(run, counts, charged, pages, 0.0)
+        if run.checkpoint:
+            logger.info(f"Resuming subscription renewal run {run_id} after {run.checkpoint}")
+
+        checkpoint = run.checkpoint
+        lookup_pages = RENEWAL_RESUME_LOOKUP_PAGES if run.resumed else 0
+        writing: Optional[asyncio.Task] = None
+        try:
+            while True:
+                page = await self.store.due_page(run.cutoff, checkpoint, self.page_size)
+                if not page:
+                    break
+                outcomes = await self.charge_page(page, lookup=pages < lookup_pages)
+                checkpoint = (page[-1].next_renewal_at, page[-1].id)
+                for outcome in outcomes:
+                    counts[outcome["status"]] += 1
+                charged += len(page)
+                pages += 1
+                # Pages are written in order: wait for the previous page before handing off this one
+                if writing is not None:
+                    await writing
+                writing = asyncio.create_task(self._write(run_id, outcomes, checkpoint, dict(counts)))
+            if writing is not None:
+                await writing
+                writing = None
+        finally:
+            if writing is not None and not writing.done():
+                # Let the last handed-off page land so a resume does not repeat it
+                await asyncio.gather(writing, return_exceptions=True)
+
+        await self.store.finish_run(run_id, counts)
+        report = self._report(run, counts, charged, pages, self.clock() - started)
+        logger.info(f"Subscription renewal run {run_id} completed: {report}")
+        return report
+
+    async def charge_page(self, page: List[DueSubscription], lookup: bool = False) -> List[Dict[str, Any]]:
+        """
+        Charge a page with at most ``concurrency`` calls in flight; outcome rows
+        in page order. With ``lookup`` every charge is looked up first.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def charge(subscription: DueSubscription) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.charge_one(subscription, lookup)
+
+        return list(await asyncio.gather(*(charge(subscription) for subscription in page)))
+
+    async def charge_one(self, subscription: DueSubscription, lookup: bool = False) -> Dict[str, Any]:
+        gateway = self.gateways.get(subscription.gateway)
+        if gateway is None:
+            result = ChargeResult("error", error=f"gateway {subscription.gateway} not configured")
+        else:
+            try:
+                result = None
+                if lookup or subscription.charge_pending:
+                    # An earlier charge may have gone through unseen, and its idempotency key may have expired
+                    result = await self._gateway_call(subscription, gateway.find)
+                if result is None:
+                    result = await self._gateway_call(subscription, gateway.charge)
+            except Exception as e:
+                # Timeouts, rate limits, outages: the subscription stays due and is looked up next run
+                logger.warning(f"Renewal charge of subscription {subscription.id} failed: {e}")
+                result = ChargeResult("error", error=str(e))
+        _RENEWALS.inc(gateway=subscription.gateway, outcome=result.status)
+        return {
+            "subscription_id": subscription.id,
+            "period_start": subscription.current_period_end.isoformat(),
+            "attempt": subscription.failed_attempts,
+            "status": result.status,
+            "transaction_id": result.transaction_id,
+            "amount": str(subscription.amount),
+            "currency": subscription.currency,
+            "error": result.error,
+        }
+
+    async def _gateway_call(self, subscription: DueSubscription,
+                            call: Callable[[DueSubscription], Awaitable[Any]]) -> Any:
+        limiter = self.limiters.get(subscription.gateway)
+        if limiter is not None:
+            await limiter.acquire()
+        started = time.perf_counter()
+        try:
+            return await call(subscription)
+        finally:
+            _CHARGE_SECONDS.observe(time.perf_counter() - started, gateway=subscription.gateway)
+
+    async def _write(self, run_id: str, outcomes: List[Dict[str, Any]], checkpoint: Tuple[datetime, int],
+                     counts: Dict[str, int]) -> None:
+        with stage("pay", "renewal_page_write"):
+            await self.store.record(run_id, outcomes, checkpoint, counts, self.max_attempts)
+
+    def _report(self, run: RenewalRun, counts: Dict[str, int], charged: int, pages: int,
+                elapsed: float) -> Dict[str, Any]:
+        return {
+            "run_id": run.run_id,
+            "cutoff": run.cutoff.isoformat(),
+            "counts": counts,
+            "charged": charged,
+            "pages": pages,
+            "elapsed_seconds": round(elapsed, 3),
+            "per_second": round(charged / elapsed, 1) if elapsed > 0 else None,
+        }
+
+
+def default_gateways() -> Dict[str, Any]:
+    return {"stripe": StripeRenewalGateway(), "yookassa": YooKassaRenewalGateway()}
+
+
+async def _cli(args: argparse.Namespace) -> None:
+    store = SupabaseRenewalStore()
+    if args.command == "status":
+        run = await store.get_run(args.run_id)
+        print(run if run else f"No renewal run {args.run_id}")
+        return
+    engine = SubscriptionRenewalEngine(
+        store, default_gateways(), page_size=args.page_size, concurrency=args.concurrency,
+    )
+    cutoff = _as_datetime(args.cutoff) if args.cutoff else None
+    print(await engine.run(args.run_id, cutoff))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m services.pay.subscription_renewal")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="renew due subscriptions (or resume a run)")
+    run.add_argument("--run-id", help="resume this run; default: a new run named after the cutoff")
+    run.add_argument("--cutoff", help="ISO date/time, UTC unless an offset is given; default: now")
+    run.add_argument("--page-size", type=int, default=RENEWAL_PAGE_SIZE)
+    run.add_argument("--concurrency", type=int, default=RENEWAL_CONCURRENCY)
+    status = commands.add_parser("status", help="show a stored run")
+    status.add_argument("--run-id", required=True)
+    asyncio.run(_cli(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""
+Queued, idempotent payment webhook ingestion
+
+With ``PAYMENT_WEBHOOK_QUEUE_ENABLED=true`` the Stripe and YooKassa webhook
+endpoints only verify the request, store the raw event in
+``payment_webhook_events`` (unique per provider + event id) and ack. A
+``WebhookEventProcessor`` running inside the pay service then applies credits
+in batches through ``apply_payment_webhook_event``, which credits the user,
+records the payment and marks the event in one transaction, so provider
+retries and replays never credit twice. Succeeded subscription renewal
+payments go to ``record_subscription_renewals`` instead, which keeps one
+success per subscription period (services/pay/subscription_renewal.py).
+
+Replay tooling::
+
+    python -m services.pay.webhook_queue list --status failed
+    python -m services.pay.webhook_queue replay --provider stripe --status failed --since 2025-10-22
+    python -m services.pay.webhook_queue run --once
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from services.pay.subscription_renewal import SupabaseRenewalStore, renewal_outcome
+from shared.metrics import stage
+
+PROVIDERS = ("stripe", "yookassa")
+STRIPE_CREDIT_EVENTS = ("checkout.session.completed", "checkout.session.async_payment_succeeded")
+YOOKASSA_CREDIT_EVENTS = ("payment.succeeded",)
+STRIPE_RENEWAL_EVENTS = ("payment_intent.succeeded",)
+
+
+class WebhookEventError(ValueError):
+    """A stored event that can never be applied as-is (e.g. missing metadata); not retried"""
+
+
+@dataclass
+class PaymentCredit:
+    """What a paid webhook event grants"""
+    telegram_id: int
+    credits: int
+    amount: float
+    gateway: str
+    transaction_id: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def webhook_queue_enabled() -> bool:
+    return os.getenv("PAYMENT_WEBHOOK_QUEUE_ENABLED", "false").lower() == "true"
+
+
+def event_identity(provider: str, payload: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Deduplication key and type of a raw webhook event
+
+    Stripe events carry a unique ``id``. YooKassa notifications do not, so the
+    event name plus the payment id identifies a delivery.
+    """
+    if provider == "stripe":
+        event_id, event_type = payload.get("id"), payload.get("type")
+    elif provider == "yookassa":
+        event_type = payload.get("event")
+        payment_id = (payload.get("object") or {}).get("id")
+        event_id = f"{event_type}:{payment_id}" if event_type and payment_id else None
+    else:
+        raise WebhookEventError(f"Unknown payment provider: {provider}")
+    if not event_id or not event_type:
+        raise WebhookEventError(f"{provider} webhook without event id/type")
+    return event_id, event_type
+
+
+def extract_credit(provider: str, payload: Dict[str, Any]) -> Optional[PaymentCredit]:
+    """
+    Credit granted by an event, or None when the event grants nothing (other
+    event types, unpaid sessions)
+
+    Raises:
+        WebhookEventError: a paid event whose metadata cannot be applied
+    """
+    if provider == "stripe":
+        return _extract_stripe_credit(payload)
+    if provider == "yookassa":
+        return _extract_yookassa_credit(payload)
+    raise WebhookEventError(f"Unknown payment provider: {provider}")
+
+
+def extract_renewal(provider: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Renewal outcome row of a succeeded subscription renewal payment, or None
+    for every other event. A renewal the run saw only as an error or pending
+    payment is recorded from here.
+    """
+    if provider == "stripe" and payload.get("type") in STRIPE_RENEWAL_EVENTS:
+        return renewal_outcome(provider, (payload.get("data") or {}).get("object") or {})
+    if provider == "yookassa" and payload.get("event") in YOOKASSA_CREDIT_EVENTS:
+        return renewal_outcome(provider, payload.get("object") or {})
+    return None
+
+
+def _extract_stripe_credit(event: Dict[str, Any]) -> Optional[PaymentCredit]:
+    if event.get("type") not in STRIPE_CREDIT_EVENTS:
+        return None
+    session = (event.get("data") or {}).get("object") or {}
+    if session.get("payment_status") != "paid":
+        return None
+    metadata = session.get("metadata") or {}
+    try:
+        telegram_id = int(metadata["user_id"])
+        credits = int(metadata["credits"])
+    except (KeyError, TypeError, ValueError):
+        raise WebhookEventError(f"Missing user_id/credits metadata in session {session.get('id')}")
+    return PaymentCredit(
+        telegram_id=telegram_id,
+        credits=credits,
+        # amount_total is in the smallest currency unit
+        amount=(session.get("amount_total") or 0) / 100,
+        gateway="stripe",
+        transaction_id=session["id"],
+        metadata={
+            "plan_id": metadata.get("plan_id"),
+            "currency": (session.get("currency") or "").upper(),
+            "language": metadata.get("language", "en"),
+            "stripe_event_id": event.get("id"),
+        },
+    )
+
+
+def _extract_yookassa_credit(event: Dict[str, Any]) -> Optional[PaymentCredit]:
+    if event.get("event") not in YOOKASSA_CREDIT_EVENTS:
+        return None
+    payment = event.get("object") or {}
+    if payment.get("status") != "succeeded":
+        return None
+    metadata = payment.get("metadata") or {}
+    if metadata.get("renewal") == "true":
+        # Subscription renewals are credited per period, see extract_renewal()
+        return None
+    try:
+        telegram_id = int(metadata["user_id"])
+        credits = int(metadata.get("credits_count", 0))
+    except (KeyError, TypeError, ValueError):
+        raise WebhookEventError(f"Missing user_id metadata in payment {payment.get('id')}")
+    if credits <= 0:
+        raise WebhookEventError(f"Missing credits_count metadata in payment {payment.get('id')}")
+    amount = payment.get("amount") or {}
+    return PaymentCredit(
+        telegram_id=telegram_id,
+        credits=credits,
+        amount=float(amount.get("value", 0)),
+        gateway="yookassa",
+        transaction_id=payment["id"],
+        metadata={"plan_id": metadata.get("plan_id"), "currency": amount.get("currency")},
+    )
+
+
+class SupabaseWebhookEventStore:
+    """``payment_webhook_events`` access; blocking client calls run off the event loop"""
+
+    table = "payment_webhook_events"
+
+    def __init__(self, client=None):
+        if client is None:
+            from common.db.client import supabase as client
+        self.client = client
+
+    async def record(self, provider: str, event_id: str, event_type: str, payload: Dict[str, Any]) -> bool:
+        """Store a raw event; False when (provider, event_id) is already stored"""
+        row = {"provider": provider, "event_id": event_id, "event_type": event_type, "payload": payload}
+        result = await asyncio.to_thread(
+            lambda: self.client.table(self.table)
+            .upsert(row, on_conflict="provider,event_id", ignore_duplicates=True)
+            .execute()
+        )
+        return bool(result.data)
+
+    async def claim(self, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        result = await asyncio.to_thread(
+            lambda: self.client.rpc(
+                "claim_payment_webhook_events", {"p_limit": limit, "p_lease_seconds": lease_seconds}
+            ).execute()
+        )
+        return result.data or []
+
+    async def apply(self, row_id: int, credit: PaymentCredit) -> Dict[str, Any]:
+        result = await asyncio.to_thread(
+            lambda: self.client.rpc("apply_payment_webhook_event", {
+                "p_event_row_id": row_id,
+                "p_telegram_id": credit.telegram_id,
+                "p_credits": credit.credits,
+                "p_amount": credit.amount,
+                "p_gateway": credit.gateway,
+                "p_transaction_id": credit.transaction_id,
+                "p_metadata": credit.metadata,
+            }).execute()
+        )
+        return result.data or {}
+
+    async def record_renewal(self, row_id: int, outcome: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a renewal success reported by the event and mark the event applied"""
+        result = await SupabaseRenewalStore(self.client).record_payment(outcome)
+        await self.mark(row_id, "applied")
+        return result
+
+    async def mark(self, row_id: int, status: str, error: Optional[str] = None,
+                   retry_at: Optional[datetime] = None) -> None:
+        update = {
+            "status": status,
+            "last_error": error,
+            "locked_until": retry_at.isoformat() if retry_at else None,
+        }
+        if status in ("applied", "ignored", "failed"):
+            update["processed_at"] = datetime.now(timezone.utc).isoformat()
+        await asyncio.to_thread(
+            lambda: self.client.table(self.table).update(update).eq("id", row_id).execute()
+        )
+
+    async def list_events(self, provider: Optional[str] = None, status: Optional[str] = None,
+                          since: Optional[datetime] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        def query():
+            q = self.client.table(self.table).select(
+                "id, provider, event_id, event_type, status, attempts, last_error, received_at, processed_at"
+            )
+            if provider:
+                q = q.eq("provider", provider)
+            if status:
+                q = q.eq("status", status)
+            if since:
+                q = q.gte("received_at", since.isoformat())
+            return q.order("received_at").limit(limit).execute()
+
+        result = await asyncio.to_thread(query)
+        return result.data or []
+
+    async def replay(self, row_ids: List[int]) -> int:
+        """Put events back in the queue; applied ones stay no-ops in the apply function"""
+        if not row_ids:
+            return 0
+        result = await asyncio.to_thread(
+            lambda: self.client.table(self.table)
+            .update({"status": "pending", "attempts": 0, "locked_until": None, "last_error": None})
+            .in_("id", row_ids)
+            .neq("status", "applied")
+            .execute()
+        )
+        return len(result.data or [])
+
+    async def audit(self, user_id: str, action_type: str, metadata: Dict[str, Any]) -> None:
+        from common.db.logs import log_user_action
+        await log_user_action(user_id=user_id, action_type=action_type, metadata=metadata)
+
+
+async def ingest_webhook(store, provider: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Persist a verified webhook event; the response body the endpoint acks with"""
+    event_id, event_type = event_identity(provider, payload)
+    with stage("pay", "webhook_persist"):
+        created = await store.record(provider, event_id, event_type, payload)
+    if not created:
+        logger.info(f"Duplicate {provider} webhook {event_id} ignored")
+    return {"status": "queued" if created else "duplicate", "event_id": event_id}
+
+
+class WebhookEventProcessor:
+    """Applies stored webhook events in batches; safe to run in several processes"""
+
+    def __init__(self, store, batch_size: int = 50, lease_seconds: int = 60,
+                 max_attempts: int = 5, retry_base_seconds: float = 5.0):
+        self.store = store
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+
+    async def process_batch(self) -> Dict[str, int]:
+        """Claim and process one batch; returns outcome counts"""
+        counts: Dict[str, int] = {}
+        events = await self.store.claim(self.batch_size, self.lease_seconds)
+        for event in events:
+            outcome = await self.process_event(event)
+            counts[outcome] = counts.get(outcome, 0) + 1
+        if events:
+            logger.info(f"Processed {len(events)} payment webhook events: {counts}")
+        return counts
+
+    async def process_event(self, event: Dict[str, Any]) -> str:
+        row_id, provider = event["id"], event["provider"]
+        renewal = extract_renewal(provider, event["payload"])
+        if renewal is not None:
+            return await self._record_renewal(event, renewal)
+        try:
+            credit = extract_credit(provider, event["payload"])
+        except WebhookEventError as e:
+            logger.error(f"Payment webhook {provider}:{event['event_id']} cannot be applied: {e}")
+            await self.store.mark(row_id, "failed", str(e))
+            return "failed"
+        if credit is None:
+            await self.store.mark(row_id, "ignored")
+            return "ignored"
+
+        try:
+            with stage("pay", "credit_add"):
+                outcome = await self.store.apply(row_id, credit)
+        except Exception as e:
+            return await self._retry_or_fail(event, f"apply failed: {e}")
+
+        result = outcome.get("result")
+        if result == "applied":
+            logger.info(f"Added {credit.credits} credits to user {credit.telegram_id} "
+                        f"for {provider} payment {credit.transaction_id}")
+            await self._audit(outcome.get("user_id"), credit)
+            return "applied"
+        if result == "duplicate":
+            logger.info(f"{provider} payment {credit.transaction_id} already applied")
+            return "duplicate"
+        # user_not_found: the bot may not have created the user yet
+        return await self._retry_or_fail(event, result or "empty apply result")
+
+    async def _record_renewal(self, event: Dict[str, Any], outcome: Dict[str, Any]) -> str:
+        try:
+            with stage("pay", "credit_add"):
+                result = await self.store.record_renewal(event["id"], outcome)
+        except Exception as e:
+            return await self._retry_or_fail(event, f"renewal record failed: {e}")
+        if result.get("renewed"):
+            logger.info(f"Renewed subscription {outcome['subscription_id']} from {event['provider']} "
+                        f"payment {outcome['transaction_id']}")
+            return "applied"
+        # The renewal run recorded it first, or the period has moved on
+        logger.info(f"{event['provider']} renewal payment {outcome['transaction_id']} already recorded")
+        return "duplicate"
+
+    async def _retry_or_fail(self, event: Dict[str, Any], error: str) -> str:
+        attempts = event.get("attempts") or 1
+        if attempts >= self.max_attempts:
+            logger.error(f"Payment webhook {event['provider']}:{event['event_id']} failed "
+                         f"after {attempts} attempts: {error}")
+            await self.store.mark(event["id"], "failed", error)
+            return "failed"
+        delay = self.retry_base_seconds * 2 ** (attempts - 1)
+        logger.warning(f"Payment webhook {event['provider']}:{event['event_id']} retry in {delay:.0f}s: {error}")
+        await self.store.mark(event["id"], "pending", error,
+                              retry_at=datetime.now(timezone.utc) + timedelta(seconds=delay))
+        return "retry"
+
+    async def _audit(self, user_id: Optional[str], credit: PaymentCredit) -> None:
+        if not user_id:
+            return
+        try:
+            await self.store.audit(user_id, f"{credit.gateway}_payment_completed", {
+                **credit.metadata,
+                "credits": credit.credits,
+                "amount": credit.amount,
+                "transaction_id": credit.transaction_id,
+            })
+        except Exception as e:
+            logger.warning(f"Failed to log payment action for user {user_id}: {e}")
+
+    async def run_forever(self, stop: asyncio.Event, idle_seconds: float = 1.0) -> None:
+        while not stop.is_set():
+            try:
+                counts = await self.process_batch()
+            except Exception as e:
+                logger.error(f"Payment webhook batch failed: {e}")
+                counts = {}
+            if not counts:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=idle_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+
+_store: Optional[SupabaseWebhookEventStore] = None
+
+
+def get_webhook_event_store() -> SupabaseWebhookEventStore:
+    global _store
+    if _store is None:
+        _store = SupabaseWebhookEventStore()
+    return _store
+
+
+def _parse_since(value: str) -> datetime:
+    since = datetime.fromisoformat(value)
+    return since if since.tzinfo else since.replace(tzinfo=timezone.utc)
+
+
+async def _cli(args: argparse.Namespace) -> None:
+    store = get_webhook_event_store()
+    since = _parse_since(args.since) if getattr(args, "since", None) else None
+    if args.command == "run":
+        processor = WebhookEventProcessor(store, batch_size=args.batch_size)
+        if args.once:
+            print(await processor.process_batch())
+            return
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await processor.run_forever(stop)
+    elif args.command == "list":
+        for event in await store.list_events(args.provider, args.status, since, args.limit):
+            print(f"{event['id']}\t{event['provider']}\t{event['event_id']}\t{event['event_type']}\t"
+                  f"{event['status']}\t{event['attempts']}\t{event.get('last_error') or ''}")
+    elif args.command == "replay":
+        events = await store.list_events(args.provider, args.status, since, args.limit)
+        replayed = await store.replay([event["id"] for event in events])
+        print(f"Re-queued {replayed} of {len(events)} events")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m services.pay.webhook_queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="apply pending events")
+    run.add_argument("--once", action="store_true", help="process one batch and exit")
+    run.add_argument("--batch-size", type=int, default=50)
+    for name, default_status in (("list", None), ("replay", "failed")):
+        command = commands.add_parser(name, help=f"{name} stored events")
+        command.add_argument("--provider", choices=PROVIDERS)
+        command.add_argument("--status", default=default_status,
+                             choices=("pending", "processing", "applied", "ignored", "failed"))
+        command.add_argument("--since", help="ISO date/time, UTC unless an offset is given")
+        command.add_argument("--limit", type=int, default=100)
+    asyncio.run(_cli(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import os
 from functools import wraps
 from fastapi import HTTPException, Request
 from loguru import logger
+from shared.metrics import TRACE_HEADER, get_trace_id
 
 # Internal API token for service-to-service communication
 INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")
@@ -66,16 +67,22 @@ def get_auth_headers() -> dict:
     Get headers for internal service requests
     
     Returns:
-        dict: Headers with internal authentication token
+        dict: Headers with internal authentication token (and X-Request-ID
+        when called under a trace)
     """
     if not INTERNAL_API_TOKEN:
         logger.error("INTERNAL_API_TOKEN not configured for outgoing requests")
         raise ValueError("Internal API token not configured")
     
-    return {
+    headers = {
         "X-Internal-Token": INTERNAL_API_TOKEN,
         "Content-Type": "application/json"
     }
+    # Propagate the current trace id so the callee logs/metrics share it
+    trace_id = get_trace_id()
+    if trace_id:
+        headers[TRACE_HEADER] = trace_id
+    return headers
 
 class AuthenticationError(Exception):
     """Custom exception for authentication errors"""
@@ -1,14 +1,33 @@
 """
 Enhanced health check functionality for all services
 Provides comprehensive service monitoring with dependency checks
+
+Dependency checks run concurrently, each under its own timeout. Services keep
+a `HealthMonitor` that refreshes the checks on a background schedule, so
+health, liveness and readiness probes answer from the last snapshot instead
+of calling every dependency on every probe.
 """
-from typing import Dict, Any, Optional, List
+from typing import Awaitable, Callable, Dict, Any, Iterable, Optional, List, Union
 from datetime import datetime
 import asyncio
+import time
+import weakref
 import httpx
 import os
 from loguru import logger
 
+LIVENESS_PATH = "/health/live"
+READINESS_PATH = "/health/ready"
+
+# Defaults for every service; per-check overrides are passed to HealthMonitor
+HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "30"))
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "5"))
+# A healthy check slower than this is reported as degraded (unset = never)
+_degraded_after_ms = os.getenv("HEALTH_DEGRADED_AFTER_MS")
+HEALTH_DEGRADED_AFTER_SECONDS = float(_degraded_after_ms) / 1000 if _degraded_after_ms else None
+
+CheckFn = Callable[[], Awaitable["DependencyCheck"]]
+
 
 class HealthStatus:
     """Health status constants"""
@@ -44,8 +63,9 @@ async def check_database_health() -> DependencyCheck:
         # Import here to avoid circular imports
         from common.supabase_client import supabase
         
-        # Simple query to test database connectivity
-        result = supabase.table("users").select("id").limit(1).execute()
+        # Simple query to test database connectivity; the client is synchronous,
+        # so run it in a thread to keep the event loop (and the check timeout) responsive
+        result = await asyncio.to_thread(lambda: supabase.table("users").select("id").limit(1).execute())
         
         end_time = asyncio.get_event_loop().time()
         response_time = end_time - start_time
@@ -187,22 +207,229 @@ async def create_comprehensive_health_response(
     Returns:
         Comprehensive health response with dependency status
     """
-    dependencies = []
+    checks = standard_checks(check_database, check_external_services, check_openai)
+    dependencies = await run_checks(checks)
     
-    # Check database if requested
+    return create_health_response(service_name, additional_info, dependencies)
+
+
+def standard_checks(
+    check_database: bool = True,
+    check_external_services: Optional[Dict[str, str]] = None,
+    check_openai: bool = False,
+) -> Dict[str, CheckFn]:
+    """Name -> check function for the usual dependencies of a service"""
+    checks: Dict[str, CheckFn] = {}
+    # Lambdas resolve the module-level check functions at call time (patchable in tests)
     if check_database:
-        db_check = await check_database_health()
-        dependencies.append(db_check)
-    
-    # Check external services if provided
-    if check_external_services:
-        for service_name_ext, url in check_external_services.items():
-            service_check = await check_external_service_health(service_name_ext, url)
-            dependencies.append(service_check)
-    
-    # Check OpenAI if requested
+        checks["database"] = lambda: check_database_health()
+    for name, url in (check_external_services or {}).items():
+        checks[name] = lambda name=name, url=url: check_external_service_health(name, url)
     if check_openai:
-        openai_check = await check_openai_health()
-        dependencies.append(openai_check)
+        checks["openai"] = lambda: check_openai_health()
+    return checks
+
+
+async def run_check(
+    name: str,
+    check: CheckFn,
+    timeout: float = HEALTH_CHECK_TIMEOUT_SECONDS,
+    degraded_after: Optional[float] = HEALTH_DEGRADED_AFTER_SECONDS,
+    critical: bool = True,
+) -> DependencyCheck:
+    """
+    Run one check under a timeout. Hangs and exceptions become unhealthy results;
+    slow healthy results become degraded; failures of non-critical checks are
+    reported as degraded so they do not make the whole service unhealthy.
+    """
+    try:
+        result = await asyncio.wait_for(check(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"{name} health check timed out after {timeout:g}s")
+        result = DependencyCheck(name, HealthStatus.UNHEALTHY, timeout, f"Timed out after {timeout:g}s")
+    except Exception as e:
+        logger.error(f"{name} health check failed: {e}")
+        result = DependencyCheck(name, HealthStatus.UNHEALTHY, error=str(e))
+    
+    if (
+        result.status == HealthStatus.HEALTHY
+        and degraded_after is not None
+        and result.response_time is not None
+        and result.response_time > degraded_after
+    ):
+        result = DependencyCheck(
+            result.name, HealthStatus.DEGRADED, result.response_time,
+            f"Slow response (over {degraded_after * 1000:g}ms)"
+        )
+    if result.status == HealthStatus.UNHEALTHY and not critical:
+        result = DependencyCheck(result.name, HealthStatus.DEGRADED, result.response_time, result.error)
+    return result
+
+
+async def run_checks(
+    checks: Dict[str, CheckFn],
+    timeout: float = HEALTH_CHECK_TIMEOUT_SECONDS,
+    degraded_after: Optional[Dict[str, float]] = None,
+    critical: Optional[Iterable[str]] = None,
+) -> List[DependencyCheck]:
+    """
+    Run all checks concurrently. `degraded_after` maps check names to slow-response
+    thresholds (seconds); `critical` names the checks whose failure makes the
+    service unhealthy (default: all).
+    """
+    degraded_after = degraded_after or {}
+    critical = set(checks) if critical is None else set(critical)
+    return list(await asyncio.gather(*(
+        run_check(
+            name,
+            check,
+            timeout,
+            degraded_after.get(name, HEALTH_DEGRADED_AFTER_SECONDS),
+            name in critical,
+        )
+        for name, check in checks.items()
+    )))
+
+
+class HealthMonitor:
+    """
+    Dependency health snapshot of one service, refreshed in the background.
     
-    return create_health_response(service_name, additional_info, dependencies)
\ No newline at end of file
+    Probes read the last snapshot. Without a running background task (tests,
+    apps started without lifespan events) a probe refreshes a missing or
+    expired snapshot itself; concurrent probes share that one refresh.
+    """
+
+    _instances: "weakref.WeakSet[HealthMonitor]" = weakref.WeakSet()
+
+    def __init__(
+        self,
+        service_name: str,
+        checks: Union[Dict[str, CheckFn], Callable[[], Dict[str, CheckFn]]],
+        additional_info: Union[Dict[str, Any], Callable[[], Dict[str, Any]], None] = None,
+        interval_seconds: float = HEALTH_CHECK_INTERVAL_SECONDS,
+        timeout_seconds: float = HEALTH_CHECK_TIMEOUT_SECONDS,
+        degraded_after: Optional[Dict[str, float]] = None,
+        critical: Optional[Iterable[str]] = None,
+        stale_after_seconds: Optional[float] = None,
+    ):
+        self.service_name = service_name
+        self.checks = checks
+        self.additional_info = additional_info
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.degraded_after = degraded_after or {}
+        self.critical = critical
+        # A snapshot this old means the refresher is stuck; the service reports degraded
+        self.stale_after_seconds = stale_after_seconds or 3 * interval_seconds + timeout_seconds
+        self._dependencies: Optional[List[DependencyCheck]] = None
+        self._checked_at: Optional[float] = None
+        self._checked_at_wall: Optional[datetime] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        HealthMonitor._instances.add(self)
+
+    @classmethod
+    def invalidate_all(cls) -> None:
+        """Drop every snapshot (tests)"""
+        for monitor in list(cls._instances):
+            monitor.invalidate()
+
+    def invalidate(self) -> None:
+        self._dependencies = None
+        self._checked_at = None
+        self._checked_at_wall = None
+
+    @property
+    def age_seconds(self) -> Optional[float]:
+        return None if self._checked_at is None else time.monotonic() - self._checked_at
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def refresh(self) -> List[DependencyCheck]:
+        """Run all checks now (shared with concurrent callers) and store the snapshot"""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self._refresh())
+        return await asyncio.shield(self._refreshing)
+
+    async def _refresh(self) -> List[DependencyCheck]:
+        checks = self.checks() if callable(self.checks) else self.checks
+        dependencies = await run_checks(checks, self.timeout_seconds, self.degraded_after, self.critical)
+        self._dependencies = dependencies
+        self._checked_at = time.monotonic()
+        self._checked_at_wall = datetime.utcnow()
+        return dependencies
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"{self.service_name} health refresh failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        """Start background refreshing (call from a startup hook, inside the event loop)"""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def dependencies(self) -> List[DependencyCheck]:
+        age = self.age_seconds
+        if self._dependencies is None or (not self.running and age > self.interval_seconds):
+            await self.refresh()
+        return self._dependencies
+
+    async def response(self) -> Dict[str, Any]:
+        """Standard health response from the snapshot, with its age"""
+        dependencies = await self.dependencies()
+        info = self.additional_info() if callable(self.additional_info) else dict(self.additional_info or {})
+        info.update({
+            "checked_at": self._checked_at_wall.isoformat() + "Z",
+            "snapshot_age_seconds": round(self.age_seconds, 3),
+        })
+        response = create_health_response(self.service_name, info, dependencies)
+        if self.age_seconds > self.stale_after_seconds and response["status"] == HealthStatus.HEALTHY:
+            response["status"] = HealthStatus.DEGRADED
+            response["stale"] = True
+        return response
+
+    def liveness(self) -> Dict[str, Any]:
+        """The process is up and serving; never touches dependencies"""
+        return {"service": f"{self.service_name}.c0r.ai", "status": "alive"}
+
+    async def readiness(self) -> Dict[str, Any]:
+        """Ready unless a critical dependency is unhealthy in the snapshot"""
+        response = await self.response()
+        return {
+            "service": response["service"],
+            "ready": response["status"] != HealthStatus.UNHEALTHY,
+            "status": response["status"],
+            "snapshot_age_seconds": response["snapshot_age_seconds"],
+        }
+
+    def install(self, app) -> None:
+        """Refresh in the background while `app` runs and serve the liveness/readiness probes"""
+        from fastapi.responses import JSONResponse
+
+        app.on_event("startup")(self.start)
+        app.on_event("shutdown")(self.stop)
+
+        @app.get(LIVENESS_PATH, include_in_schema=False)
+        async def liveness():
+            return self.liveness()
+
+        @app.get(READINESS_PATH, include_in_schema=False)
+        async def readiness():
+            result = await self.readiness()
+            return JSONResponse(result, status_code=200 if result["ready"] else 503)
@@ -0,0 +1,263 @@
+"""
+Dependency-free Prometheus metrics and request tracing for all services
+
+- Counter / Histogram render in the Prometheus text exposition format
+- `stage()` times one pipeline stage (download, R2 upload, LLM call, ...)
+- The request id (X-Request-ID) is the trace id: it is read from incoming
+  requests, kept in a context variable and sent on service-to-service calls
+  by `shared.auth.get_auth_headers()`
+- `instrument_app()` adds the tracing middleware, request latency histogram
+  and a `/metrics` endpoint to a FastAPI app
+"""
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+TRACE_HEADER = "X-Request-ID"
+METRICS_PATH = "/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers cache hits (ms) up to slow LLM calls (tens of seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id: Optional[str] = None) -> Iterator[str]:
+    """Run a block under a trace id (a new one unless given)."""
+    token = _trace_id.set(trace_id or new_trace_id())
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (per-bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def sum(self, **labels: str) -> float:
+        series = self._series.get(self._key(labels))
+        return series[1] if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the metrics of one process; `clock` is injectable for tests."""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+    @contextmanager
+    def stage(self, service: str, stage_name: str) -> Iterator[None]:
+        """Time a pipeline stage; failures are counted and re-raised."""
+        started = self.clock()
+        try:
+            yield
+        except BaseException:
+            self.counter(
+                "c0r_stage_errors_total", "Pipeline stage failures", ("service", "stage")
+            ).inc(service=service, stage=stage_name)
+            raise
+        finally:
+            elapsed = self.clock() - started
+            self.histogram(
+                "c0r_stage_duration_seconds", "Pipeline stage latency", ("service", "stage")
+            ).observe(elapsed, service=service, stage=stage_name)
+            logger.debug(f"⏱️ [{get_trace_id() or '-'}] {service}.{stage_name} {elapsed * 1000:.1f}ms")
+
+
+REGISTRY = MetricsRegistry()
+
+
+def stage(service: str, stage_name: str):
+    """`with stage("api", "r2_upload"): ...` on the process-wide registry."""
+    return REGISTRY.stage(service, stage_name)
+
+
+def instrument_app(app, service: str, registry: MetricsRegistry = REGISTRY) -> None:
+    """
+    Add request tracing, per-route latency and GET /metrics to a FastAPI app.
+
+    The incoming X-Request-ID (or a new id) becomes the trace id of the
+    request, is stored on `request.state.request_id` and echoed back.
+    """
+    from fastapi import Request
+    from fastapi.responses import Response
+
+    requests = registry.histogram(
+        "c0r_http_request_duration_seconds",
+        "HTTP request latency",
+        ("service", "method", "route", "status"),
+    )
+
+    @app.middleware("http")
+    async def trace_and_time(request: Request, call_next):
+        trace_id = request.headers.get(TRACE_HEADER) or new_trace_id()
+        request.state.request_id = trace_id
+        token = _trace_id.set(trace_id)
+        started = registry.clock()
+        status = "500"
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            response.headers[TRACE_HEADER] = trace_id
+            return response
+        finally:
+            _trace_id.reset(token)
+            route = request.scope.get("route")
+            # Route templates keep label cardinality bounded; unmatched paths share one series
+            route_path = getattr(route, "path", None) or "unmatched"
+            if route_path != METRICS_PATH:
+                requests.observe(
+                    registry.clock() - started,
+                    service=service,
+                    method=request.method,
+                    route=route_path,
+                    status=status,
+                )
+
+    @app.get(METRICS_PATH, include_in_schema=False)
+    async def metrics():
+        return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -13,6 +13,13 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
 from fastapi.testclient import TestClient
 
 
+@pytest.fixture(autouse=True)
+def fresh_health_snapshots():
+    """Each test patches the checks differently; never serve a previous test's snapshot"""
+    from shared.health import HealthMonitor
+    HealthMonitor.invalidate_all()
+
+
 class TestAPIServiceHealthEndpoint:
     """Test API service health endpoint"""
     
@@ -0,0 +1,269 @@
+"""
+Integration tests for migrations/database/2025-10-23_weekly_nutrition_rollups.sql
+against a local Postgres (13+)
+
+Synthetic multi-week histories are rolled up by the backfill (rows logged
+before the migration) and by the logs trigger (rows logged, corrected and
+deleted after it); both must match a recomputation from the raw rows.
+Retention deletes (2025-10-26_logs_retention_keeps_rollups.sql) leave them as they are.
+
+Point NUTRITION_ROLLUPS_TEST_DSN at an empty scratch database, e.g.
+
+    NUTRITION_ROLLUPS_TEST_DSN=postgresql://postgres@localhost/c0r_rollups \\
+        pytest tests/integration/test_nutrition_rollups_postgres.py
+
+Everything runs in one transaction that is rolled back.
+"""
+
+import json
+import os
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+DSN = os.getenv("NUTRITION_ROLLUPS_TEST_DSN")
+MIGRATION = (
+    Path(__file__).resolve().parents[2]
+    / "migrations" / "database" / "2025-10-23_weekly_nutrition_rollups.sql"
+)
+RETENTION_MIGRATION = MIGRATION.with_name("2025-10-26_logs_retention_keeps_rollups.sql")
+
+pytestmark = [
+    pytest.mark.integration,
+    pytest.mark.skipif(not DSN, reason="NUTRITION_ROLLUPS_TEST_DSN not set"),
+]
+
+FIRST_MONDAY = date(2025, 9, 1)
+WEEKS = 6
+MIGRATED_AFTER_WEEKS = 4
+
+SCHEMA = """
+DO $$ BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'service_role') THEN
+        CREATE ROLE service_role;
+    END IF;
+END $$;
+CREATE TABLE IF NOT EXISTS public.migrations_log (
+    migration_name TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE public.users (id UUID PRIMARY KEY DEFAULT gen_random_uuid());
+CREATE TABLE public.user_profiles (user_id UUID NOT NULL, daily_calories_target INTEGER);
+CREATE TABLE public.logs (
+    id BIGSERIAL,
+    user_id UUID,
+    action_type TEXT NOT NULL,
+    "timestamp" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    kbzhu JSONB,
+    metadata JSONB DEFAULT '{}'::jsonb,
+    PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp");
+CREATE TABLE public.logs_p2025_09 PARTITION OF public.logs
+    FOR VALUES FROM ('2025-09-01 00:00:00+00') TO ('2025-10-01 00:00:00+00');
+CREATE TABLE public.logs_default PARTITION OF public.logs DEFAULT;
+"""
+
+
+def synthetic_history(user_ids, seed=7):
+    """Seeded meals over WEEKS weeks: gaps, multi-meal days, corrected and metadata-only rows"""
+    rng = random.Random(seed)
+    rows = []
+    for user_id in user_ids:
+        for offset in range(WEEKS * 7):
+            day = FIRST_MONDAY + timedelta(days=offset)
+            if rng.random() < 0.3:
+                continue
+            for meal in range(rng.randint(1, 4)):
+                at = datetime(day.year, day.month, day.day, 6 + 4 * meal, rng.randint(0, 59), tzinfo=timezone.utc)
+                calories = rng.randint(300, 900)
+                macros = {"proteins": rng.randint(5, 60), "fats": rng.randint(5, 40), "carbohydrates": rng.randint(10, 120)}
+                kind = rng.random()
+                if kind < 0.1:
+                    kbzhu, metadata = macros, {"analysis": {"total_nutrition": {"calories": calories}}}
+                elif kind < 0.2:
+                    kbzhu, metadata = dict(macros, calories=calories + 150), {"corrected_total_calories": calories}
+                else:
+                    kbzhu, metadata = dict(macros, calories=calories), {}
+                rows.append({"user_id": user_id, "timestamp": at, "kbzhu": kbzhu, "metadata": metadata,
+                             "calories": calories, **macros})
+            # Other actions never count
+            rows.append({"user_id": user_id, "timestamp": at, "action_type": "daily", "kbzhu": None, "metadata": {}})
+    return rows
+
+
+def expected_rollups(rows, targets):
+    days = defaultdict(lambda: {"meals_count": 0, "calories": 0, "proteins": 0, "fats": 0, "carbohydrates": 0})
+    for row in rows:
+        if row.get("action_type", "photo_analysis") != "photo_analysis":
+            continue
+        day = days[(row["user_id"], row["timestamp"].date())]
+        day["meals_count"] += 1
+        for field in ("calories", "proteins", "fats", "carbohydrates"):
+            day[field] += row[field]
+
+    weeks = {}
+    run_by_user = {}
+    for (user_id, day), totals in sorted(days.items()):
+        last, run = run_by_user.get(user_id, (None, 0))
+        run = run + 1 if last == day - timedelta(days=1) else 1
+        run_by_user[user_id] = (day, run)
+
+        target = targets.get(user_id)
+        week = weeks.setdefault((user_id, day - timedelta(days=day.weekday())), {
+            "meals_count": 0, "days_logged": 0, "calories": 0, "calorie_target": target,
+            "days_on_target": 0, "longest_streak": 0,
+        })
+        week["meals_count"] += totals["meals_count"]
+        week["days_logged"] += 1
+        week["calories"] += totals["calories"]
+        if target and 9 * target <= 10 * totals["calories"] <= 11 * target:
+            week["days_on_target"] += 1
+        week["longest_streak"] = max(week["longest_streak"], run)
+        week["streak_days"] = run
+        week["last_logged_day"] = day
+    return dict(days), weeks
+
+
+def insert_logs(cursor, rows):
+    for row in rows:
+        cursor.execute(
+            'INSERT INTO public.logs (user_id, action_type, "timestamp", kbzhu, metadata) '
+            "VALUES (%s, %s, %s, %s, %s) RETURNING id",
+            (row["user_id"], row.get("action_type", "photo_analysis"), row["timestamp"],
+             json.dumps(row["kbzhu"]) if row["kbzhu"] is not None else None, json.dumps(row["metadata"])),
+        )
+        row["id"] = cursor.fetchone()[0]
+
+
+def stored_rollups(cursor):
+    cursor.execute(
+        "SELECT user_id::text, day, meals_count, calories, proteins, fats, carbohydrates FROM public.user_daily_nutrition"
+    )
+    days = {
+        (user_id, day): {"meals_count": meals, "calories": float(calories), "proteins": float(proteins),
+                         "fats": float(fats), "carbohydrates": float(carbohydrates)}
+        for user_id, day, meals, calories, proteins, fats, carbohydrates in cursor.fetchall()
+    }
+    cursor.execute(
+        "SELECT user_id::text, week_start, meals_count, days_logged, calories, calorie_target, days_on_target, "
+        "longest_streak, streak_days, last_logged_day FROM public.user_weekly_nutrition_rollups"
+    )
+    weeks = {
+        (row[0], row[1]): {
+            "meals_count": row[2], "days_logged": row[3], "calories": float(row[4]), "calorie_target": row[5],
+            "days_on_target": row[6], "longest_streak": row[7], "streak_days": row[8], "last_logged_day": row[9],
+        }
+        for row in cursor.fetchall()
+    }
+    return days, weeks
+
+
+@pytest.fixture
+def cursor():
+    connection = psycopg2.connect(DSN)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(SCHEMA)
+            yield cursor
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+@pytest.fixture
+def users(cursor):
+    cursor.execute("INSERT INTO public.users (id) SELECT gen_random_uuid() FROM generate_series(1, 3)")
+    cursor.execute("SELECT id::text FROM public.users ORDER BY id")
+    user_ids = [row[0] for row in cursor.fetchall()]
+    # The last user has no calorie target
+    targets = {user_ids[0]: 1800, user_ids[1]: 1200}
+    for user_id, target in targets.items():
+        cursor.execute("INSERT INTO public.user_profiles (user_id, daily_calories_target) VALUES (%s, %s)",
+                       (user_id, target))
+    return user_ids, targets
+
+
+def test_backfill_then_trigger_match_raw_logs(cursor, users):
+    user_ids, targets = users
+    history = synthetic_history(user_ids)
+    cutoff = datetime.combine(FIRST_MONDAY + timedelta(weeks=MIGRATED_AFTER_WEEKS), datetime.min.time(), timezone.utc)
+    before = [row for row in history if row["timestamp"] < cutoff]
+    after = [row for row in history if row["timestamp"] >= cutoff]
+
+    # Existing users: history logged before the migration, rebuilt by the backfill
+    insert_logs(cursor, before)
+    cursor.execute(MIGRATION.read_text())
+    cursor.execute("SELECT * FROM public.backfill_user_nutrition_rollups(%s)", (FIRST_MONDAY + timedelta(days=3),))
+    users_count, days_count, weeks_count = cursor.fetchone()
+
+    expected_days, expected_weeks = expected_rollups(before, targets)
+    assert stored_rollups(cursor) == (expected_days, expected_weeks)
+    assert (users_count, days_count, weeks_count) == (3, len(expected_days), len(expected_weeks))
+
+    # New analyses go through the trigger, including a correction and a deletion
+    insert_logs(cursor, after)
+    meals = [row for row in after if row.get("action_type", "photo_analysis") == "photo_analysis"]
+    corrected, deleted = meals[0], meals[1]
+    corrected["calories"] = 1234
+    cursor.execute(
+        "UPDATE public.logs SET metadata = metadata || %s::jsonb WHERE id = %s",
+        (json.dumps({"corrected_total_calories": 1234}), corrected["id"]),
+    )
+    cursor.execute("DELETE FROM public.logs WHERE id = %s", (deleted["id"],))
+    history = [row for row in history if row is not deleted]
+
+    expected = expected_rollups(history, targets)
+    assert stored_rollups(cursor) == expected
+
+    # A backfill over the same range is idempotent
+    cursor.execute("SELECT * FROM public.backfill_user_nutrition_rollups(%s)", (FIRST_MONDAY,))
+    assert stored_rollups(cursor) == expected
+
+
+def test_moving_an_analysis_to_another_week_updates_both(cursor, users):
+    user_ids, targets = users
+    cursor.execute(MIGRATION.read_text())
+    rows = [
+        {"user_id": user_ids[0], "timestamp": datetime(2025, 9, day, 12, tzinfo=timezone.utc),
+         "kbzhu": {"calories": 1800, "proteins": 90, "fats": 60, "carbohydrates": 200}, "metadata": {},
+         "calories": 1800, "proteins": 90, "fats": 60, "carbohydrates": 200}
+        for day in (5, 6, 7, 8)  # Friday..Monday: the streak carries into the second week
+    ]
+    insert_logs(cursor, rows)
+    assert stored_rollups(cursor) == expected_rollups(rows, targets)
+
+    # Filling the gap on Thursday extends the streak in both weeks
+    rows[0]["timestamp"] = datetime(2025, 9, 4, 12, tzinfo=timezone.utc)
+    cursor.execute('UPDATE public.logs SET "timestamp" = %s WHERE id = %s', (rows[0]["timestamp"], rows[0]["id"]))
+    insert_logs(cursor, [dict(rows[1], timestamp=datetime(2025, 9, 5, 8, tzinfo=timezone.utc))])
+    rows.append(dict(rows[1], timestamp=datetime(2025, 9, 5, 8, tzinfo=timezone.utc)))
+
+    days, weeks = stored_rollups(cursor)
+    assert (days, weeks) == expected_rollups(rows, targets)
+    assert weeks[(user_ids[0], date(2025, 9, 8))]["streak_days"] == 5
+
+
+
+def test_retention_deletes_keep_rollups(cursor, users):
+    user_ids, targets = users
+    cursor.execute(MIGRATION.read_text())
+    cursor.execute(RETENTION_MIGRATION.read_text())
+    rows = synthetic_history(user_ids)
+    insert_logs(cursor, rows)
+    expected = expected_rollups(rows, targets)
+
+    # September partition and October stragglers in logs_default: history stays in the rollups
+    cutoff = datetime(2025, 10, 5, tzinfo=timezone.utc)
+    cursor.execute("SELECT public.delete_old_logs(%s)", (cutoff,))
+    assert cursor.fetchone()[0] == sum(1 for row in rows if row["timestamp"] < cutoff)
+    assert stored_rollups(cursor) == expected
+
+    # A user deleting an analysis after retention still updates them
+    kept = [row for row in rows if row["timestamp"] >= cutoff and row.get("action_type", "photo_analysis") == "photo_analysis"]
+    cursor.execute("DELETE FROM public.logs WHERE id = %s", (kept[0]["id"],))
+    assert stored_rollups(cursor) == expected_rollups([row for row in rows if row is not kept[0]], targets)
@@ -0,0 +1,57 @@
+"""
+Shared fixtures for performance tests (micro-benchmarks).
+
+Run with: python tests/run_tests.py performance
+"""
+
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+
+class BenchmarkResult:
+    """Timing statistics for one benchmarked callable (seconds per call)."""
+
+    def __init__(self, name: str, samples: List[float]):
+        self.name = name
+        self.samples = samples
+        self.mean = statistics.mean(samples)
+        self.median = statistics.median(samples)
+        self.min = min(samples)
+        ordered = sorted(samples)
+        self.p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.name}: mean={self.mean * 1e6:.1f}µs median={self.median * 1e6:.1f}µs "
+            f"p95={self.p95 * 1e6:.1f}µs min={self.min * 1e6:.1f}µs (n={len(self.samples)})"
+        )
+
+
+@pytest.fixture
+def bench():
+    """
+    Minimal pytest-benchmark style runner.
+
+    Usage: result = bench(fn, *args, rounds=200, name="...") → BenchmarkResult
+    """
+    results: Dict[str, BenchmarkResult] = {}
+
+    def run(fn: Callable[..., Any], *args, rounds: int = 200, warmup: int = 5, name: str = None, **kwargs):
+        for _ in range(warmup):
+            fn(*args, **kwargs)
+        samples = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            fn(*args, **kwargs)
+            samples.append(time.perf_counter() - started)
+        result = BenchmarkResult(name or getattr(fn, "__name__", "bench"), samples)
+        results[result.name] = result
+        return result
+
+    yield run
+
+    for result in results.values():
+        print(f"\n⏱️  {result!r}")
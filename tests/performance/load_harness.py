@@ -0,0 +1,330 @@
+"""
+Offline load harness: boots the api, ml and pay apps against local stand-ins
+for OpenAI, Supabase, R2 and Redis (tests/performance/stubs.py) and drives a
+weighted mix of end-to-end scenarios against them.
+
+Scenarios:
+- photo:   R2 upload → ML /api/v1/analyze (multipart) → credit decrement, as the bot does it
+- plan:    ML /api/v1/food-plan/generate for 7 days from a synthetic food history
+- payment: YooKassa webhook → pay service → api /credits/add → Supabase
+
+The worker loop plays the bot process, so in-process steps (R2 upload, credit
+decrement) run on it exactly like they do in the bot.
+
+Usage:
+    python -m tests.performance.load_harness --duration 30 --concurrency 16 \
+        --mix photo=6,plan=3,payment=1 --llm-latency-ms 800
+
+Prints per-scenario throughput and p50/p95/p99 latency (--json for machine output).
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+DEFAULT_MIX = {"photo": 6, "plan": 3, "payment": 1}
+INTERNAL_TOKEN = "load-harness-internal-token-0123456789abcdef"
+R2_BUCKET = "load-harness"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown scenario '{name}' (expected one of {', '.join(DEFAULT_MIX)})")
+        mix[name] = int(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("Scenario mix has no positive weights")
+    return mix
+
+
+@dataclass
+class ScenarioStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    last_error: Optional[str] = None
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        return {
+            "count": len(ordered),
+            "errors": self.errors,
+            "rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 1),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 1),
+            "max_ms": round((ordered[-1] if ordered else 0.0) * 1000, 1),
+            "last_error": self.last_error,
+        }
+
+
+class ServerThread(threading.Thread):
+    """One uvicorn server on its own thread and event loop (like a separate service process)."""
+
+    def __init__(self, app, port: int):
+        super().__init__(daemon=True)
+        import uvicorn
+
+        config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+        self.server = uvicorn.Server(config)
+        self.url = f"http://127.0.0.1:{port}"
+
+    def run(self):
+        self.server.run()
+
+    def start_and_wait(self, timeout: float = 10.0) -> "ServerThread":
+        self.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.is_alive():
+                raise RuntimeError(f"Server on {self.url} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join(timeout=5)
+
+
+def configure_environment(stub_url: str, ports: Dict[str, int], rate_limit: int) -> None:
+    """Point every external dependency of the services at the stand-in server."""
+    os.environ.update({
+        "ENV": "development",
+        "INTERNAL_API_TOKEN": INTERNAL_TOKEN,
+        "OPENAI_API_KEY": "sk-load-harness",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "LLM_PROVIDER": "openai",
+        "SUPABASE_URL": stub_url,
+        "SUPABASE_SERVICE_KEY": "load-harness",
+        "TELEGRAM_BOT_TOKEN": "123456:ABCdefGhIJKlmNoPQRsTUVwxyZ",
+        "R2_ACCOUNT_ID": "load-harness",
+        "R2_ACCESS_KEY_ID": "load-harness",
+        "R2_SECRET_ACCESS_KEY": "load-harness",
+        "R2_BUCKET_NAME": R2_BUCKET,
+        "R2_ENDPOINT_URL": stub_url,
+        "API_SERVICE_URL": f"http://127.0.0.1:{ports['api']}",
+        "ML_SERVICE_URL": f"http://127.0.0.1:{ports['ml']}",
+        "PAY_SERVICE_URL": f"http://127.0.0.1:{ports['pay']}",
+        "RATE_LIMIT_PER_MINUTE": str(rate_limit),
+        "NO_PROXY": "127.0.0.1,localhost",
+    })
+    for variable in ("HTTP_PROXY", "HTTPS_PROXY", "http_proxy", "https_proxy", "ALL_PROXY", "all_proxy"):
+        os.environ.pop(variable, None)
+
+
+def load_service_apps() -> Dict[str, Any]:
+    """Import the service apps; must run after configure_environment()."""
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    from services.api.bot.main import app as api_app
+    from services.ml.main import app as ml_app
+    from services.pay.main import app as pay_app
+
+    return {"api": api_app, "ml": ml_app, "pay": pay_app}
+
+
+def _sample_photo() -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (180, 120, 60)).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class LoadRun:
+    def __init__(self, urls: Dict[str, str], users: List[Dict[str, Any]], mix: Dict[str, int], seed: int = 0):
+        self.urls = urls
+        self.users = users
+        self.rng = random.Random(seed)
+        self.names = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.names]
+        self.stats = {name: ScenarioStats() for name in self.names}
+        self.photo = _sample_photo()
+        self.headers = {"X-Internal-Token": INTERNAL_TOKEN}
+        from tests.performance.synthetic import synthetic_food_logs, synthetic_profile
+
+        self.histories = [(synthetic_profile(i), synthetic_food_logs(days=14, seed=i)) for i in range(8)]
+
+    async def photo_scenario(self, client, user):
+        from common.supabase_client import decrement_credits
+        from services.api.bot.utils.r2 import upload_photo_to_r2
+
+        photo_url = await upload_photo_to_r2(self.photo, user["id"])
+        if not photo_url:
+            raise RuntimeError("R2 upload failed")
+        response = await client.post(
+            f"{self.urls['ml']}/api/v1/analyze",
+            headers=self.headers,
+            files={"photo": ("photo.jpg", self.photo, "image/jpeg")},
+            data={"telegram_user_id": str(user["telegram_id"]), "provider": "openai", "user_language": user["language"]},
+        )
+        response.raise_for_status()
+        if not response.json().get("analysis"):
+            raise RuntimeError("ML analysis returned no result")
+        if not await decrement_credits(user["telegram_id"]):
+            raise RuntimeError("Credit decrement failed")
+
+    async def plan_scenario(self, client, user):
+        profile, history = self.rng.choice(self.histories)
+        response = await client.post(
+            f"{self.urls['ml']}/api/v1/food-plan/generate",
+            headers=self.headers,
+            json={"profile": profile, "food_history": history, "days": 7},
+        )
+        response.raise_for_status()
+        if len(response.json().get("plan_json", {})) != 7:
+            raise RuntimeError("Food plan does not cover 7 days")
+
+    async def payment_scenario(self, client, user):
+        payload = {
+            "event": "payment.succeeded",
+            "object": {
+                "id": f"pay-{uuid.uuid4().hex}",
+                "status": "succeeded",
+                "amount": {"value": "99.00", "currency": "RUB"},
+                "metadata": {"user_id": str(user["telegram_id"]), "credits_count": "20", "plan_id": "basic"},
+            },
+        }
+        response = await client.post(f"{self.urls['pay']}/webhook/yookassa", json=payload)
+        response.raise_for_status()
+
+    async def worker(self, client, deadline: float):
+        scenarios: Dict[str, Callable] = {
+            "photo": self.photo_scenario,
+            "plan": self.plan_scenario,
+            "payment": self.payment_scenario,
+        }
+        while time.monotonic() < deadline:
+            name = self.rng.choices(self.names, self.weights)[0]
+            user = self.rng.choice(self.users)
+            stats = self.stats[name]
+            started = time.perf_counter()
+            try:
+                await scenarios[name](client, user)
+            except Exception as e:
+                stats.errors += 1
+                stats.last_error = f"{type(e).__name__}: {e}"[:200]
+            else:
+                stats.latencies.append(time.perf_counter() - started)
+
+    async def run(self, duration: float, concurrency: int) -> float:
+        import httpx
+
+        limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+        async with httpx.AsyncClient(timeout=60.0, limits=limits, trust_env=False) as client:
+            started = time.monotonic()
+            deadline = started + duration
+            await asyncio.gather(*(self.worker(client, deadline) for _ in range(concurrency)))
+            return time.monotonic() - started
+
+
+def run_harness(
+    duration: float = 10.0,
+    concurrency: int = 8,
+    mix: Optional[Dict[str, int]] = None,
+    llm_latency_ms: float = 50.0,
+    users: int = 50,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    from loguru import logger
+
+    from tests.performance.stubs import InMemoryRedis, StubState, create_stub_app
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    state = StubState(llm_latency_sec=llm_latency_ms / 1000)
+    seeded_users = state.seed_users(users)
+    stub = ServerThread(create_stub_app(state), _free_port()).start_and_wait()
+    ports = {name: _free_port() for name in ("api", "ml", "pay")}
+    configure_environment(stub.url, ports, rate_limit=1_000_000)
+
+    import common.cache.redis_client as redis_client
+
+    redis_client._client = InMemoryRedis()
+
+    servers = [ServerThread(app, ports[name]).start_and_wait() for name, app in load_service_apps().items()]
+    try:
+        load = LoadRun({name: f"http://127.0.0.1:{port}" for name, port in ports.items()},
+                       seeded_users, mix or DEFAULT_MIX, seed)
+        elapsed = asyncio.run(load.run(duration, concurrency))
+    finally:
+        for server in servers + [stub]:
+            server.stop()
+
+    return {
+        "duration_sec": round(elapsed, 2),
+        "concurrency": concurrency,
+        "llm_latency_ms": llm_latency_ms,
+        "scenarios": {name: stats.summary(elapsed) for name, stats in load.stats.items()},
+        "stub_calls": dict(sorted(state.calls.items())),
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"Load run: {report['duration_sec']}s, concurrency {report['concurrency']}, "
+        f"LLM latency {report['llm_latency_ms']}ms",
+        f"{'scenario':<10}{'count':>8}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for name, s in report["scenarios"].items():
+        lines.append(
+            f"{name:<10}{s['count']:>8}{s['errors']:>8}{s['rps']:>9}"
+            f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}"
+        )
+        if s["last_error"]:
+            lines.append(f"  last error: {s['last_error']}")
+    lines.append("Stub calls: " + ", ".join(f"{k}={v}" for k, v in report["stub_calls"].items()))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline load harness for the api, ml and pay services")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run (default: 10)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent virtual users (default: 8)")
+    parser.add_argument("--mix", default="photo=6,plan=3,payment=1", help="Scenario weights")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Stub LLM response delay")
+    parser.add_argument("--users", type=int, default=50, help="Seeded users")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run_harness(
+        duration=args.duration,
+        concurrency=args.concurrency,
+        mix=parse_mix(args.mix),
+        llm_latency_ms=args.llm_latency_ms,
+        users=args.users,
+        seed=args.seed,
+    )
+    print(json.dumps(report, indent=2, ensure_ascii=False) if args.json else format_report(report))
+    return 1 if any(s["errors"] for s in report["scenarios"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,419 @@
+"""
+Local stand-ins for the external services, used by the load harness.
+
+One FastAPI app serves:
+- OpenAI:   POST /v1/chat/completions (canned food analysis after a configurable delay)
+- Supabase: /rest/v1/{table} (in-memory PostgREST subset: eq filters, insert, update, delete, rpc)
+- R2:       PUT/HEAD /{bucket}/{key} (S3 path-style object store) and multipart uploads
+
+Redis is replaced in-process by `InMemoryRedis` (the services talk to it through
+common/cache/redis_client). The subscription renewal engine runs against
+`InMemoryRenewalStore` (the renewal SQL functions over lists) and
+`FakeRenewalGateway`.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import time
+import uuid
+from bisect import bisect_right, insort
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from services.pay.subscription_renewal import (
+    RENEWAL_MAX_ATTEMPTS,
+    WEBHOOK_RUN_ID,
+    ChargeResult,
+    DueSubscription,
+    RenewalRun,
+)
+from tests.performance.synthetic import synthetic_analysis
+
+
+@dataclass
+class StubState:
+    llm_latency_sec: float = 0.05
+    tables: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    objects: Dict[str, bytes] = field(default_factory=dict)
+    # False: bodies are streamed and only their size and sha256 are kept (memory tests)
+    keep_objects: bool = True
+    object_digests: Dict[str, Tuple[int, str]] = field(default_factory=dict)
+    # upload id -> (object path, part number -> body or (size, sha256))
+    uploads: Dict[str, Tuple[str, Dict[int, Any]]] = field(default_factory=dict)
+    calls: Dict[str, int] = field(default_factory=dict)
+
+    def count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def seed_users(self, count: int, credits: int = 1_000_000) -> List[Dict[str, Any]]:
+        users = [
+            {
+                "id": str(uuid.uuid4()),
+                "telegram_id": 100_000 + i,
+                "credits_remaining": credits,
+                "language": "ru" if i % 2 else "en",
+                "created_at": datetime.utcnow().isoformat(),
+            }
+            for i in range(count)
+        ]
+        self.tables.setdefault("users", []).extend(users)
+        return users
+
+
+class InMemoryRedis:
+    """Async subset of redis.asyncio used by common/cache/redis_client."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[str, float]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._data.get(key)
+        if value is None or value[1] < time.monotonic():
+            return None
+        return value[0]
+
+    async def setex(self, key: str, ttl_seconds: int, value: str) -> None:
+        self._data[key] = (value, time.monotonic() + ttl_seconds)
+
+    async def set(self, key: str, value: str, nx: bool = False, ex: Optional[int] = None) -> bool:
+        if nx and await self.get(key) is not None:
+            return False
+        self._data[key] = (value, time.monotonic() + (ex or 10 ** 9))
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+
+class InMemoryRenewalStore:
+    """
+    Renewal store with the semantics of due_subscriptions() and
+    record_subscription_renewals(): keyset pages, one success per period,
+    credits per user, declines retried after 1, 2, 4... days, every
+    written success or decline moved past the run's cutoff, and errors
+    marking the charge for a lookup.
+    """
+
+    def __init__(self, subscriptions: List[Dict[str, Any]], fail_record_at: Optional[int] = None):
+        self.subscriptions = {row["id"]: dict(row) for row in subscriptions}
+        # (next_renewal_at, id) in order, like subscriptions_due_idx
+        self._index = sorted((row["next_renewal_at"], row["id"]) for row in subscriptions)
+        self.runs: Dict[str, Dict[str, Any]] = {}
+        self.renewals: List[Dict[str, Any]] = []
+        self._succeeded = set()
+        self.credits: Dict[str, int] = {}
+        self.payments: List[Dict[str, Any]] = []
+        self.records = 0
+        # Raise on the n-th record() call (1-based), like a crash before the page commits
+        self.fail_record_at = fail_record_at
+
+    async def start_run(self, run_id, cutoff):
+        resumed = run_id in self.runs
+        row = self.runs.setdefault(run_id, {"cutoff": cutoff, "status": "running", "checkpoint": None, "counts": {}})
+        return RenewalRun(run_id, row["cutoff"], row["status"], row["checkpoint"], dict(row["counts"]), resumed)
+
+    async def due_page(self, cutoff, after, limit):
+        start = bisect_right(self._index, after) if after else 0
+        page = []
+        for position in range(start, len(self._index)):
+            renewal_at, subscription_id = self._index[position]
+            if renewal_at > cutoff or len(page) == limit:
+                break
+            row = self.subscriptions[subscription_id]
+            # Keys of rows that moved since are left behind in the index; skip them
+            if row["status"] == "active" and row["next_renewal_at"] == renewal_at:
+                page.append(DueSubscription.from_row(row))
+        return page
+
+    def _reindex(self, row: Dict[str, Any]) -> None:
+        insort(self._index, (row["next_renewal_at"], row["id"]))
+
+    async def record(self, run_id, outcomes, checkpoint, counts, max_attempts):
+        self.records += 1
+        if self.fail_record_at == self.records:
+            raise ConnectionError("database went away")
+        renewed = declined = 0
+        now = datetime.now(timezone.utc)
+        run = self.runs.get(run_id)
+        after = max(now, run["cutoff"]) if run else now
+        for outcome in outcomes:
+            key = (outcome["subscription_id"], outcome["period_start"])
+            if outcome["status"] == "succeeded" and key in self._succeeded:
+                continue
+            self.renewals.append(dict(outcome, run_id=run_id))
+            if outcome["status"] == "succeeded":
+                self._succeeded.add(key)
+            row = self.subscriptions[outcome["subscription_id"]]
+            if row["current_period_end"].isoformat() != outcome["period_start"]:
+                continue
+            if outcome["status"] == "succeeded":
+                interval = row.get("renewal_interval") or timedelta(days=30)
+                periods = 1
+                while row["current_period_end"] + interval * periods <= after:
+                    periods += 1
+                row["current_period_end"] = row["next_renewal_at"] = row["current_period_end"] + interval * periods
+                row["failed_attempts"] = 0
+                row["charge_pending"], row["pending_transaction_id"] = False, None
+                self._reindex(row)
+                self.credits[row["user_id"]] = self.credits.get(row["user_id"], 0) + row["credits"]
+                self.payments.append({"user_id": row["user_id"], "transaction_id": outcome["transaction_id"]})
+                renewed += 1
+            elif outcome["status"] == "declined" and row["failed_attempts"] == outcome["attempt"]:
+                row["next_renewal_at"] = after + timedelta(days=2 ** row["failed_attempts"])
+                row["failed_attempts"] += 1
+                if row["failed_attempts"] >= max_attempts:
+                    row["status"] = "past_due"
+                row["charge_pending"], row["pending_transaction_id"] = False, None
+                self._reindex(row)
+                declined += 1
+            elif outcome["status"] == "error" and row["failed_attempts"] == outcome["attempt"]:
+                row["charge_pending"] = True
+                row["pending_transaction_id"] = outcome["transaction_id"] or row.get("pending_transaction_id")
+        if run:
+            run.update(checkpoint=checkpoint, counts=dict(counts))
+        return {"renewed": renewed, "declined": declined}
+
+    async def record_payment(self, outcome):
+        return await self.record(WEBHOOK_RUN_ID, [outcome], None, {}, RENEWAL_MAX_ATTEMPTS)
+
+    async def finish_run(self, run_id, counts):
+        self.runs[run_id].update(status="completed", counts=dict(counts))
+
+
+class FakeRenewalGateway:
+    """
+    Charges by idempotency key like the real gateways (a repeated key returns
+    the first result until ``expire_keys``), finds payments by id or by their
+    period and attempt, with an optional per-call latency and scripted
+    declines, errors and pending payments by subscription id.
+    """
+
+    def __init__(self, latency_sec: float = 0.0, decline_ids=(), error_ids=(), pending_ids=()):
+        self.latency_sec = latency_sec
+        self.decline_ids = set(decline_ids)
+        self.error_ids = set(error_ids)
+        self.pending_ids = set(pending_ids)
+        # idempotency key -> result, forgotten by expire_keys()
+        self.charges: Dict[str, Any] = {}
+        # every payment ever created, by transaction id
+        self.payments: Dict[str, ChargeResult] = {}
+        self._by_attempt: Dict[Tuple[int, str, int], str] = {}
+        self.calls = 0
+        self.lookups = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def charge(self, subscription):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency_sec)
+            if subscription.id in self.error_ids:
+                raise TimeoutError("gateway timeout")
+            key = subscription.idempotency_key
+            if key not in self.charges:
+                transaction_id = f"pay_{len(self.payments)}"
+                if subscription.id in self.decline_ids:
+                    result = ChargeResult("declined", transaction_id, "insufficient_funds")
+                elif subscription.id in self.pending_ids:
+                    result = ChargeResult("error", transaction_id, "payment pending")
+                else:
+                    result = ChargeResult("succeeded", transaction_id)
+                self.charges[key] = self.payments[transaction_id] = result
+                self._by_attempt[self._attempt(subscription)] = transaction_id
+            return self.payments[self.charges[key].transaction_id]
+        finally:
+            self.in_flight -= 1
+
+    async def find(self, subscription):
+        self.lookups += 1
+        await asyncio.sleep(self.latency_sec)
+        transaction_id = subscription.pending_transaction_id or self._by_attempt.get(self._attempt(subscription))
+        return self.payments.get(transaction_id)
+
+    def settle(self, transaction_id: str, status: str = "succeeded") -> None:
+        """A pending payment reaches its final status"""
+        self.payments[transaction_id] = ChargeResult(status, transaction_id)
+
+    def expire_keys(self) -> None:
+        """The gateway forgets idempotency keys (after 24 hours)"""
+        self.charges.clear()
+
+    @staticmethod
+    def _attempt(subscription) -> Tuple[int, str, int]:
+        return subscription.id, subscription.current_period_end.isoformat(), subscription.failed_attempts
+
+
+_completion_ids = itertools.count()
+
+
+def _eq_filters(request: Request) -> List[Tuple[str, str]]:
+    filters = []
+    for key, value in request.query_params.multi_items():
+        if key in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+            continue
+        if value.startswith("eq."):
+            filters.append((key, value[3:]))
+    return filters
+
+
+def _matches(row: Dict[str, Any], filters: List[Tuple[str, str]]) -> bool:
+    return all(str(row.get(key)) == value for key, value in filters)
+
+
+def _rows_response(request: Request, rows: List[Dict[str, Any]]) -> Response:
+    limit = request.query_params.get("limit")
+    if limit:
+        rows = rows[: int(limit)]
+    if "vnd.pgrst.object" in request.headers.get("accept", ""):
+        if len(rows) != 1:
+            return JSONResponse({"message": "JSON object requested, multiple (or no) rows returned"}, 406)
+        return JSONResponse(rows[0])
+    return JSONResponse(rows)
+
+
+def create_stub_app(state: StubState) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        state.count("openai")
+        await asyncio.sleep(state.llm_latency_sec)
+        completion_id = next(_completion_ids)
+        content = json.dumps(synthetic_analysis(completion_id), ensure_ascii=False)
+        return {
+            "id": f"chatcmpl-stub-{completion_id}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": f"```json\n{content}\n```"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 900, "completion_tokens": 400, "total_tokens": 1300},
+        }
+
+    @app.post("/rest/v1/rpc/{function}")
+    async def rpc(function: str):
+        state.count(f"supabase.rpc.{function}")
+        return JSONResponse(None)
+
+    @app.get("/rest/v1/{table}")
+    async def select(table: str, request: Request):
+        state.count("supabase.select")
+        filters = _eq_filters(request)
+        return _rows_response(request, [row for row in state.tables.get(table, []) if _matches(row, filters)])
+
+    @app.post("/rest/v1/{table}")
+    async def insert(table: str, request: Request):
+        state.count("supabase.insert")
+        payload = await request.json()
+        rows = payload if isinstance(payload, list) else [payload]
+        inserted = []
+        for row in rows:
+            row = {"id": str(uuid.uuid4()), "created_at": datetime.utcnow().isoformat(), **row}
+            state.tables.setdefault(table, []).append(row)
+            inserted.append(row)
+        return JSONResponse(inserted, status_code=201)
+
+    @app.patch("/rest/v1/{table}")
+    async def update(table: str, request: Request):
+        state.count("supabase.update")
+        changes = await request.json()
+        filters = _eq_filters(request)
+        updated = []
+        for row in state.tables.get(table, []):
+            if _matches(row, filters):
+                row.update(changes)
+                updated.append(row)
+        return _rows_response(request, updated)
+
+    @app.delete("/rest/v1/{table}")
+    async def delete(table: str, request: Request):
+        state.count("supabase.delete")
+        filters = _eq_filters(request)
+        rows = state.tables.get(table, [])
+        removed = [row for row in rows if _matches(row, filters)]
+        state.tables[table] = [row for row in rows if not _matches(row, filters)]
+        return _rows_response(request, removed)
+
+    async def read_body(request: Request) -> Any:
+        if state.keep_objects:
+            return await request.body()
+        digest, size = hashlib.sha256(), 0
+        async for chunk in request.stream():
+            digest.update(chunk)
+            size += len(chunk)
+        return size, digest.hexdigest()
+
+    def store(path: str, body: Any) -> None:
+        if state.keep_objects:
+            state.objects[path] = body
+        else:
+            state.object_digests[path] = body
+
+    def xml(body: str) -> Response:
+        return Response(f'<?xml version="1.0" encoding="UTF-8"?>{body}', media_type="application/xml")
+
+    @app.put("/{bucket}/{key:path}")
+    async def put_object(bucket: str, key: str, request: Request):
+        upload_id = request.query_params.get("uploadId")
+        if upload_id is not None:
+            state.count("r2.upload_part")
+            if upload_id not in state.uploads:
+                return Response(status_code=404)
+            state.uploads[upload_id][1][int(request.query_params["partNumber"])] = await read_body(request)
+        else:
+            state.count("r2.put")
+            store(f"{bucket}/{key}", await read_body(request))
+        return Response(headers={"ETag": f'"{uuid.uuid4().hex}"'})
+
+    @app.post("/{bucket}/{key:path}")
+    async def multipart(bucket: str, key: str, request: Request):
+        if "uploads" in request.query_params:
+            state.count("r2.create_multipart")
+            upload_id = uuid.uuid4().hex
+            state.uploads[upload_id] = (f"{bucket}/{key}", {})
+            return xml(
+                f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{key}</Key>"
+                f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            )
+        state.count("r2.complete_multipart")
+        path, parts = state.uploads.pop(request.query_params["uploadId"])
+        ordered = [parts[number] for number in sorted(parts)]
+        if state.keep_objects:
+            store(path, b"".join(ordered))
+        else:
+            # Parts are digested separately; keep the total size and the part digests' digest
+            combined = hashlib.sha256("".join(digest for _, digest in ordered).encode()).hexdigest()
+            store(path, (sum(size for size, _ in ordered), combined))
+        return xml(
+            f"<CompleteMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{key}</Key>"
+            f'<ETag>"{uuid.uuid4().hex}-{len(ordered)}"</ETag></CompleteMultipartUploadResult>'
+        )
+
+    @app.delete("/{bucket}/{key:path}")
+    async def abort_multipart(bucket: str, key: str, request: Request):
+        state.count("r2.abort_multipart")
+        state.uploads.pop(request.query_params.get("uploadId"), None)
+        return Response(status_code=204)
+
+    @app.head("/{bucket}/{key:path}")
+    async def head_object(bucket: str, key: str):
+        path = f"{bucket}/{key}"
+        if path in state.objects:
+            return Response(headers={"Content-Length": str(len(state.objects[path]))})
+        if path in state.object_digests:
+            return Response(headers={"Content-Length": str(state.object_digests[path][0])})
+        return Response(status_code=404)
+
+    return app
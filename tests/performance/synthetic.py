@@ -0,0 +1,154 @@
+"""
+Seeded synthetic users, food logs and ML results for benchmarks and the load harness.
+
+Same seed → same data, so timings from different runs compare like for like.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+DISHES = [
+    ("Овсянка с ягодами", "breakfast", [("Овсянка", 60, 220), ("Ягоды", 80, 45), ("Мед", 10, 30)]),
+    ("Омлет с овощами", "breakfast", [("Яйца", 120, 170), ("Помидоры", 80, 15), ("Сыр", 20, 70)]),
+    ("Сырники со сметаной", "breakfast", [("Сырники", 150, 330), ("Сметана", 30, 60)]),
+    ("Куриная грудка с рисом", "lunch", [("Куриная грудка", 150, 250), ("Рис", 150, 195), ("Огурец", 60, 9)]),
+    ("Борщ со сметаной", "lunch", [("Борщ", 300, 150), ("Сметана", 20, 40), ("Хлеб", 40, 100)]),
+    ("Греческий салат", "lunch", [("Овощи", 200, 60), ("Фета", 50, 130), ("Оливковое масло", 10, 90)]),
+    ("Лосось с брокколи", "dinner", [("Лосось", 150, 310), ("Брокколи", 150, 50)]),
+    ("Паста болоньезе", "dinner", [("Паста", 120, 190), ("Фарш", 100, 250), ("Томатный соус", 80, 40)]),
+    ("Пицца Маргарита", "dinner", [("Пицца", 250, 680)]),
+    ("Гречка с грибами", "dinner", [("Гречка", 180, 200), ("Грибы", 100, 30)]),
+    ("Шоколадный батончик", "snack", [("Шоколад", 50, 270)]),
+    ("Яблоко", "snack", [("Яблоко", 180, 95)]),
+]
+MEAL_HOURS = {"breakfast": (7, 10), "lunch": (12, 15), "dinner": (18, 22), "snack": (10, 23)}
+GOALS = ["weight_loss", "maintain_weight", "weight_gain"]
+DIETS = [[], [], ["vegetarian"], ["gluten_free"], ["low_carb"]]
+ALLERGIES = [[], [], ["nuts"], ["dairy"]]
+
+
+def synthetic_profile(seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    gender = rng.choice(["male", "female"])
+    weight = rng.randint(50, 100)
+    return {
+        "user_id": f"user-{seed}",
+        "age": rng.randint(18, 65),
+        "gender": gender,
+        "height_cm": rng.randint(155, 195),
+        "weight_kg": weight,
+        "activity_level": rng.choice(["sedentary", "light", "moderate", "active"]),
+        "goal": rng.choice(GOALS),
+        "dietary_preferences": rng.choice(DIETS),
+        "allergies": rng.choice(ALLERGIES),
+        "daily_calories_target": rng.randrange(1500, 3000, 50),
+        "language": rng.choice(["ru", "en"]),
+    }
+
+
+def synthetic_analysis(seed: int = 0, dish_index: int = None) -> Dict[str, Any]:
+    """An ML analysis result in the shape returned by `/api/v1/analyze`."""
+    rng = random.Random(seed)
+    name, _, items = DISHES[dish_index if dish_index is not None else rng.randrange(len(DISHES))]
+    food_items = []
+    totals = {"calories": 0, "proteins": 0.0, "fats": 0.0, "carbohydrates": 0.0}
+    for item_name, weight, calories in items:
+        scale = rng.uniform(0.8, 1.2)
+        item = {
+            "name": item_name,
+            "weight_grams": round(weight * scale),
+            "calories": round(calories * scale),
+            "proteins": round(calories * scale * 0.2 / 4, 1),
+            "fats": round(calories * scale * 0.3 / 9, 1),
+            "carbohydrates": round(calories * scale * 0.5 / 4, 1),
+        }
+        food_items.append(item)
+        totals["calories"] += item["calories"]
+        for key in ("proteins", "fats", "carbohydrates"):
+            totals[key] = round(totals[key] + item[key], 1)
+    return {
+        "analysis": {
+            "regional_analysis": {"detected_cuisine_type": "Russian", "dish_identification": name},
+            "food_items": food_items,
+            "total_nutrition": totals,
+            "nutrition_analysis": {
+                "health_score": rng.randint(4, 9),
+                "positive_aspects": ["Достаточно белка", "Есть овощи"],
+                "improvement_suggestions": ["Добавьте клетчатку"],
+            },
+            "motivation_message": "Отличный выбор!",
+        }
+    }
+
+
+def synthetic_food_logs(days: int = 14, seed: int = 0, end: datetime = None) -> List[Dict[str, Any]]:
+    """
+    Photo analysis logs over `days` days, 2-5 meals a day. Each log carries both
+    the `kbzhu` summary (analyzers) and the full `analysis` (plan generation).
+    """
+    rng = random.Random(seed)
+    end = end or datetime(2026, 3, 1, 23, 0)
+    logs = []
+    for day in range(days):
+        date = end - timedelta(days=days - day)
+        slots = ["breakfast", "lunch", "dinner"][: rng.randint(1, 3)] + ["snack"] * rng.randint(0, 2)
+        for slot in slots:
+            candidates = [i for i, dish in enumerate(DISHES) if dish[1] == slot]
+            analysis = synthetic_analysis(rng.randrange(1 << 30), rng.choice(candidates))
+            low, high = MEAL_HOURS[slot]
+            timestamp = date.replace(hour=rng.randint(low, high - 1), minute=rng.randrange(0, 60, 5))
+            totals = analysis["analysis"]["total_nutrition"]
+            logs.append({
+                "timestamp": timestamp.isoformat(),
+                "action_type": "photo_analysis",
+                "kbzhu": {
+                    "calories": totals["calories"],
+                    "protein": totals["proteins"],
+                    "fats": totals["fats"],
+                    "carbs": totals["carbohydrates"],
+                    "fiber": rng.randint(1, 8),
+                },
+                "analysis": analysis["analysis"],
+                "metadata": {"description": analysis["analysis"]["regional_analysis"]["dish_identification"]},
+            })
+    return logs
+
+
+SUBSCRIPTION_PLANS = [
+    ("pro", "yookassa", "349.00", "RUB", 100),
+    ("pro", "stripe", "7.99", "USD", 100),
+]
+
+
+def synthetic_subscriptions(count: int, seed: int = 0, now: datetime = None,
+                            due_share: float = 0.8) -> List[Dict[str, Any]]:
+    """
+    Subscription rows for the renewal engine: ``due_share`` of them renew within
+    the last 3 days of ``now`` (some with earlier declines), the rest later this month.
+    """
+    rng = random.Random(seed)
+    now = now or datetime(2026, 3, 1, 3, 0, tzinfo=timezone.utc)
+    rows = []
+    for i in range(count):
+        plan_id, gateway, amount, currency, credits = rng.choice(SUBSCRIPTION_PLANS)
+        if rng.random() < due_share:
+            period_end = now - timedelta(minutes=rng.randrange(1, 3 * 24 * 60))
+        else:
+            period_end = now + timedelta(minutes=rng.randrange(1, 28 * 24 * 60))
+        rows.append({
+            "id": i + 1,
+            "user_id": f"user-{i % (count // 2 or 1)}",
+            "plan_id": plan_id,
+            "gateway": gateway,
+            "gateway_customer_id": f"cus_{i}" if gateway == "stripe" else None,
+            "payment_method_id": f"pm_{i}",
+            "amount": amount,
+            "currency": currency,
+            "credits": credits,
+            "status": "active",
+            "current_period_end": period_end,
+            "next_renewal_at": period_end,
+            "failed_attempts": 0 if rng.random() < 0.95 else rng.randint(1, 2),
+        })
+    return rows
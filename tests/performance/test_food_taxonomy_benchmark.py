@@ -0,0 +1,64 @@
+"""
+Micro-benchmarks for common/food_taxonomy.py against the ad-hoc keyword scans it replaced.
+"""
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from common.food_taxonomy import FOOD_CATEGORIES, classify_food, normalize_food_name
+
+NAMES = [
+    "Курица с рисом и овощами", "Картофель фри", "Греческий салат с оливковым маслом",
+    "Овсяная каша на молоке с ягодами", "Лосось на гриле с брокколи", "Пицца Маргарита",
+    "Сырники со сметаной", "Борщ со сметаной", "Grilled chicken with rice", "Avocado toast",
+]
+# Unique names so the lru_cache does not hide the matcher cost
+CORPUS = [f"{name} {index}" for index in range(100) for name in NAMES]
+
+
+def legacy_scan(names):
+    """Keyword lists rebuilt as literals and scanned once per list, as before."""
+    for name in names:
+        lowered = name.lower()
+        categories = FOOD_CATEGORIES.copy()
+        {category for category, keywords in categories.items()
+         if any(keyword.lstrip("=") in lowered for keyword in keywords)}
+
+
+def compiled_scan(names):
+    for name in names:
+        classify_food.__wrapped__(name)
+
+
+def cached_scan(names):
+    for name in names:
+        classify_food(name)
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_compiled_matcher_not_slower_than_keyword_scans(bench):
+    legacy = bench(legacy_scan, CORPUS, rounds=20, name="legacy keyword scans (1k names)")
+    compiled = bench(compiled_scan, CORPUS, rounds=20, name="compiled taxonomy (1k names)")
+
+    assert compiled.median <= legacy.median * 1.25
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_cached_lookups_are_sub_microsecond_per_name(bench):
+    cached_scan(CORPUS)
+    cached = bench(cached_scan, CORPUS, rounds=50, name="cached taxonomy (1k names)")
+
+    assert cached.median / len(CORPUS) < 5e-6
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_normalization_cost(bench):
+    result = bench(lambda: [normalize_food_name(name) for name in CORPUS], rounds=20, name="normalize (1k names)")
+
+    assert result.median / len(CORPUS) < 50e-6
@@ -0,0 +1,133 @@
+"""
+Micro-benchmarks for the CPU-heavy request paths, on seeded synthetic users and logs.
+
+Budgets are generous upper bounds meant to catch order-of-magnitude regressions;
+the printed timings are the numbers to compare between runs.
+"""
+
+import asyncio
+import json
+import os
+from datetime import date
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+# The bot handler module builds a Supabase client at import time; nothing is requested from it here
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "benchmark")
+
+from services.api.analyzers.nutrition_dna_generator import NutritionDNAGenerator
+from services.api.analyzers.psychological_profile import PsychologicalProfileAnalyzer
+from services.api.analyzers.temporal_patterns import TemporalPatternsAnalyzer
+from services.api.bot.handlers.photo import format_analysis_result
+from services.api.predictors.behavior_predictor import BehaviorPredictor
+from services.api.visualization.nutrition_visualizer import NutritionVisualizer
+from services.ml.main import FoodPlanRequest, ml_generate_food_plan
+from services.ml.openai.client import parse_analysis_content
+from tests.performance.synthetic import synthetic_analysis, synthetic_food_logs, synthetic_profile
+
+USERS = 5
+
+
+@pytest.fixture(scope="module")
+def users():
+    return [(synthetic_profile(seed), synthetic_food_logs(days=30, seed=seed)) for seed in range(USERS)]
+
+
+@pytest.fixture(scope="module")
+def dnas(users):
+    return [NutritionDNAGenerator.generate_nutrition_dna(profile, logs) for profile, logs in users]
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_format_analysis_result(bench, users):
+    results = [synthetic_analysis(seed) for seed in range(20)]
+    profile = users[0][0]
+
+    def run():
+        for result in results:
+            format_analysis_result(result, "ru", profile)
+
+    result = bench(run, rounds=20, name="format_analysis_result x20")
+
+    assert result.median / len(results) < 0.01
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_parse_analysis_content(bench):
+    contents = ["```json\n" + json.dumps(synthetic_analysis(seed), ensure_ascii=False) + "\n```" for seed in range(20)]
+
+    def run():
+        for content in contents:
+            parse_analysis_content(content, "gpt-4o")
+
+    result = bench(run, rounds=50, name="parse_analysis_content x20")
+
+    assert result.median / len(contents) < 0.005
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_ml_generate_food_plan(bench, users):
+    payloads = [FoodPlanRequest(profile=profile, food_history=logs, days=7) for profile, logs in users]
+    generate = ml_generate_food_plan.__wrapped__  # skip the internal-token check
+    loop = asyncio.new_event_loop()
+
+    def run():
+        for payload in payloads:
+            loop.run_until_complete(generate(None, payload))
+
+    try:
+        plan = loop.run_until_complete(generate(None, payloads[0]))
+        result = bench(run, rounds=10, name=f"ml_generate_food_plan 7 days x{len(payloads)}")
+    finally:
+        loop.close()
+
+    assert len(plan["plan_json"]) == 7
+    assert result.median / len(payloads) < 0.25
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_nutrition_dna_analyzers(bench, users):
+    logs = users[0][1]
+
+    bench(TemporalPatternsAnalyzer.analyze_temporal_patterns, logs, rounds=20, name="temporal patterns (30 days)")
+    bench(PsychologicalProfileAnalyzer.analyze_social_eating_patterns, logs, rounds=20,
+          name="social eating patterns (30 days)")
+    result = bench(
+        lambda: [NutritionDNAGenerator.generate_nutrition_dna(profile, logs) for profile, logs in users],
+        rounds=5,
+        name=f"generate_nutrition_dna (30 days) x{len(users)}",
+    )
+
+    assert result.median / len(users) < 0.5
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_predict_weekly_outcomes(bench, dnas):
+    week = date(2026, 3, 2)
+
+    result = bench(lambda: [BehaviorPredictor.predict_weekly_outcomes(dna, week) for dna in dnas],
+                   rounds=10, name=f"predict_weekly_outcomes x{len(dnas)}")
+
+    assert len(BehaviorPredictor.predict_weekly_outcomes(dnas[0], week)) == 7
+    assert result.median / len(dnas) < 0.25
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_generate_nutrition_report(bench, users, dnas):
+    pairs = list(zip(dnas, (logs for _, logs in users)))
+
+    result = bench(lambda: [NutritionVisualizer.generate_nutrition_report(dna, logs) for dna, logs in pairs],
+                   rounds=10, name=f"generate_nutrition_report x{len(pairs)}")
+
+    assert result.median / len(pairs) < 0.5
@@ -0,0 +1,71 @@
+"""
+Benchmark of i18n rendering: the compiled catalog against the previous lookup path.
+
+`legacy_get_text` is the manager's former get_text (per-call dict lookups,
+fallback checks and str.format). The workload is a typical bot reply: a mix
+of plain strings and templates with parameters, in both languages.
+"""
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from i18n.i18n import i18n
+
+RENDERS = [
+    ("favorites_title", {}),
+    ("btn_main_menu", {}),
+    ("btn_favorites", {}),
+    ("favorite_add_daily", {}),
+    ("favorite_delete", {}),
+    ("language_changed", {"lang_name": "English"}),
+    ("language_current", {"lang_name": "Русский"}),
+    ("profile_telegram_language", {"lang": "ru"}),
+    ("cal", {}),
+    ("error_general", {}),
+]
+
+
+def legacy_get_text(translations, key, language="en", **kwargs):
+    if language not in translations:
+        language = "en"
+    if key not in translations[language]:
+        if key in translations["en"]:
+            text = translations["en"][key]
+        else:
+            return f"[Missing translation: {key}]"
+    else:
+        text = translations[language][key]
+    try:
+        return text.format(**kwargs)
+    except KeyError:
+        return text
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_render_cost_against_legacy_lookup(bench):
+    translations = i18n.translations
+
+    def run_legacy():
+        for language in ("en", "ru"):
+            for key, kwargs in RENDERS:
+                legacy_get_text(translations, key, language, **kwargs)
+
+    def run_compiled():
+        for language in ("en", "ru"):
+            for key, kwargs in RENDERS:
+                i18n.get_text(key, language, **kwargs)
+
+    for language in ("en", "ru"):
+        for key, kwargs in RENDERS:
+            assert i18n.get_text(key, language, **kwargs) == legacy_get_text(translations, key, language, **kwargs)
+
+    renders = 2 * len(RENDERS)
+    legacy = bench(run_legacy, rounds=2000, name=f"legacy get_text x{renders}")
+    compiled = bench(run_compiled, rounds=2000, name=f"compiled get_text x{renders}")
+
+    print(f"\nper render: legacy {legacy.median / renders * 1e9:.0f}ns, compiled {compiled.median / renders * 1e9:.0f}ns")
+    assert compiled.median / renders < 5e-6
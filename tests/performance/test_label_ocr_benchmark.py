@@ -0,0 +1,125 @@
+"""
+Corpus benchmark for services/ml/label_ocr.py: OCR time and field accuracy.
+
+Uses a synthetic corpus of ruled labels by default. Point LABEL_OCR_CORPUS at a
+directory of `<name>.jpg|png` photos with `<name>.json` expectations
+({"kcal": 250, "protein": 12.5, "fat": 8, "carbs": 31}) to benchmark real labels.
+"""
+
+import json
+import os
+import random
+import shutil
+import time
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from services.ml.label_ocr import LabelOcrEngine, detect_table_region, parse_nutrition_text
+
+FIELDS = ("kcal", "protein", "fat", "carbs")
+
+
+def render_label(values, seed):
+    rng = random.Random(seed)
+    font = ImageFont.load_default(size=30)
+    img = Image.new("RGB", (1400, 1900), "white")
+    draw = ImageDraw.Draw(img)
+    for i in range(12):
+        draw.text((80, 60 + i * 45), "Ingredients: milk, sugar, cocoa, starch, salt " * 2, fill="black", font=font)
+    left, top = rng.randint(120, 300), rng.randint(720, 900)
+    right = left + 900
+    rows = [
+        ("Nutrition facts", "per 100g", "per serving 30g"),
+        ("Energy", f"{values['kcal']:g} kcal", f"{values['kcal'] * 0.3:g} kcal"),
+        ("Protein", f"{values['protein']:g} g", f"{values['protein'] * 0.3:.1f} g"),
+        ("Fat", f"{values['fat']:g} g", f"{values['fat'] * 0.3:.1f} g"),
+        ("Carbohydrates", f"{values['carbs']:g} g", f"{values['carbs'] * 0.3:.1f} g"),
+    ]
+    for r, cells in enumerate(rows):
+        y = top + r * 80
+        draw.line([(left, y), (right, y)], fill="black", width=4)
+        for c, cell in enumerate(cells):
+            draw.text((left + 20 + c * 300, y + 22), cell, fill="black", font=font)
+    bottom = top + len(rows) * 80
+    draw.line([(left, bottom), (right, bottom)], fill="black", width=4)
+    for x in (left, left + 300, left + 600, right):
+        draw.line([(x, top), (x, bottom)], fill="black", width=4)
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def load_corpus():
+    corpus_dir = os.getenv("LABEL_OCR_CORPUS")
+    if corpus_dir:
+        items = []
+        for expected in sorted(Path(corpus_dir).glob("*.json")):
+            image = next((p for p in (expected.with_suffix(".jpg"), expected.with_suffix(".png")) if p.exists()), None)
+            if image:
+                items.append((image.read_bytes(), json.loads(expected.read_text())))
+        return items
+    rng = random.Random(7)
+    items = []
+    for seed in range(8):
+        values = {"kcal": rng.randint(40, 550), "protein": rng.randint(1, 30),
+                  "fat": rng.randint(0, 35), "carbs": rng.randint(2, 80)}
+        items.append((render_label(values, seed), values))
+    return items
+
+
+def field_accuracy(nutrition, expected):
+    hits = 0
+    for name in FIELDS:
+        value = getattr(nutrition, name, None) if nutrition else None
+        if value is not None and expected.get(name) is not None and abs(value - float(expected[name])) < 0.05:
+            hits += 1
+    return hits / len(FIELDS)
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_table_detection_cost(bench):
+    image = Image.open(BytesIO(load_corpus()[0][0])).convert("RGB")
+    result = bench(detect_table_region, image, rounds=20, name="detect_table_region (1400x1900)")
+
+    assert detect_table_region(image) is not None
+    assert result.median < 0.25
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+@pytest.mark.skipif(shutil.which("tesseract") is None, reason="tesseract binary not installed")
+def test_region_ocr_vs_full_page():
+    import pytesseract
+
+    corpus = load_corpus()
+    engine = LabelOcrEngine(use_region=True)
+    region_ms, region_acc, full_ms, full_acc = [], [], [], []
+    for image_bytes, expected in corpus:
+        started = time.perf_counter()
+        result = engine.analyze(image_bytes, "en")
+        region_ms.append((time.perf_counter() - started) * 1000)
+        region_acc.append(field_accuracy(result.nutrition, expected))
+
+        # Previous pipeline: full-page image_to_string + flattened regexes
+        started = time.perf_counter()
+        text = pytesseract.image_to_string(Image.open(BytesIO(image_bytes)).convert("RGB"), lang="eng+rus")
+        full_acc.append(field_accuracy(parse_nutrition_text(text), expected))
+        full_ms.append((time.perf_counter() - started) * 1000)
+
+    def mean(values):
+        return sum(values) / len(values)
+
+    print(f"\n⏱️  label OCR on {len(corpus)} labels")
+    print(f"   full page:  {mean(full_ms):.0f} ms/label, field accuracy {mean(full_acc):.0%}")
+    print(f"   table crop: {mean(region_ms):.0f} ms/label, field accuracy {mean(region_acc):.0%}")
+
+    assert mean(region_acc) >= mean(full_acc)
+    assert mean(region_ms) < mean(full_ms)
@@ -0,0 +1,34 @@
+"""
+Smoke run of the offline load harness: every scenario must complete without errors.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_load_harness_smoke():
+    # A separate process: the harness configures env vars before importing the services
+    completed = subprocess.run(
+        [sys.executable, "-m", "tests.performance.load_harness",
+         "--duration", "2", "--concurrency", "4", "--llm-latency-ms", "10", "--json"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    report = json.loads(completed.stdout[completed.stdout.index("{\n"):])
+
+    for name, scenario in report["scenarios"].items():
+        print(f"\n⏱️  {name}: {scenario}")
+        assert scenario["count"] > 0, name
+        assert scenario["errors"] == 0, scenario["last_error"]
+    assert report["stub_calls"]["openai"] == report["scenarios"]["photo"]["count"]
+    assert completed.returncode == 0
@@ -0,0 +1,115 @@
+"""
+Peak memory of photo uploads at 200 concurrent requests, through boto3 to the
+S3-compatible stand-in (tests/performance/stubs.py, bodies streamed and not kept).
+
+Streamed: Telegram chunks -> spool (shared in-memory budget, then temp files) ->
+R2 multipart parts, one in flight per photo. Whole-body: the previous path, a
+BytesIO download turned into bytes and PUT in one piece. Python allocations are
+traced (tracemalloc), so the numbers do not depend on the allocator or on what
+the test process loaded before.
+"""
+
+import asyncio
+import io
+import os
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from services.api.bot.utils import photo_stream, r2
+from services.api.bot.utils.photo_stream import SpoolBudget, stream_telegram_photo
+from tests.performance.load_harness import ServerThread, _free_port
+from tests.performance.stubs import StubState, create_stub_app
+
+PHOTO_BYTES = 1024 * 1024
+CHUNK_BYTES = 64 * 1024
+PART_BYTES = 256 * 1024
+BUDGET_BYTES = 8 * 1024 * 1024
+MiB = 1024 * 1024
+
+
+def fake_bot(data):
+    async def stream_content(url, timeout, chunk_size, raise_for_status):
+        for offset in range(0, len(data), chunk_size):
+            # Network reads: a new buffer per chunk, and other downloads get a turn
+            yield bytes(data[offset:offset + chunk_size])
+            await asyncio.sleep(0)
+
+    api = SimpleNamespace(is_local=False, file_url=lambda token, path: f"https://api.telegram.org/file/bot{token}/{path}")
+    return SimpleNamespace(token="token", session=SimpleNamespace(api=api, stream_content=stream_content))
+
+
+async def streamed_upload(bot, index):
+    photo = await stream_telegram_photo(
+        bot, f"photos/{index}.jpg", expected_size=PHOTO_BYTES, user_id=f"user-{index}", upload=True,
+        part_size=PART_BYTES,
+    )
+    photo.close()
+    return photo.url
+
+
+async def whole_body_upload(bot, index):
+    buffer = io.BytesIO()
+    async for chunk in photo_stream.iter_telegram_file(bot, f"photos/{index}.jpg"):
+        buffer.write(chunk)
+    photo_data = buffer.getvalue()
+    client = r2.get_r2_client()
+    key = r2.generate_photo_filename(f"user-{index}")
+    await asyncio.to_thread(client.put_object, Bucket=r2.R2_BUCKET_NAME, Key=key, Body=photo_data)
+    return key
+
+
+def peak_traced(upload, bot, concurrency):
+    async def run():
+        return await asyncio.gather(*(upload(bot, index) for index in range(concurrency)))
+
+    tracemalloc.start()
+    try:
+        results = asyncio.run(run())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert all(results)
+    return peak
+
+
+@pytest.fixture
+def r2_stand_in(monkeypatch):
+    state = StubState(keep_objects=False)
+    server = ServerThread(create_stub_app(state), _free_port()).start_and_wait()
+    monkeypatch.setattr(r2, "R2_ENABLED", True)
+    monkeypatch.setattr(r2, "R2_ENDPOINT_URL", server.url)
+    monkeypatch.setattr(r2, "R2_BUCKET_NAME", "photos")
+    for name in ("R2_ACCOUNT_ID", "R2_ACCESS_KEY_ID", "R2_SECRET_ACCESS_KEY"):
+        monkeypatch.setattr(r2, name, "stand-in")
+    monkeypatch.setattr(r2, "_r2_client", None)
+    monkeypatch.setattr(photo_stream, "spool_budget", SpoolBudget(BUDGET_BYTES))
+    yield state
+    server.stop()
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_streamed_upload_memory_stays_flat_with_concurrency(r2_stand_in):
+    bot = fake_bot(b"\xff\xd8\xff" + os.urandom(PHOTO_BYTES - 3))
+    # Warm up the client, its connection pool and the worker threads
+    peak_traced(streamed_upload, bot, 8)
+
+    streamed = {concurrency: peak_traced(streamed_upload, bot, concurrency) for concurrency in (50, 200)}
+    whole_body = peak_traced(whole_body_upload, bot, 200)
+
+    print(
+        f"\n⏱️  peak traced memory, {PHOTO_BYTES // 1024} KB photos: streamed 50={streamed[50] / MiB:.1f}MiB "
+        f"200={streamed[200] / MiB:.1f}MiB; whole-body 200={whole_body / MiB:.1f}MiB"
+    )
+    assert r2_stand_in.calls["r2.complete_multipart"] == 8 + 50 + 200
+    assert photo_stream.spool_budget.in_use == 0
+    # 4x the requests, nowhere near 4x the memory: spools past the budget are on disk
+    assert streamed[200] < streamed[50] * 2
+    assert streamed[200] < 200 * PHOTO_BYTES / 4
+    assert streamed[200] < whole_body / 3
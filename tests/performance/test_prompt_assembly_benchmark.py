@@ -0,0 +1,60 @@
+"""
+Benchmark of ML prompt assembly: compiled skeletons against the previous
+per-request path.
+
+The previous path built a new `PromptBuilder` for every request (loading the
+motivation and portion tables) and formatted the whole prompt. The compiled
+path reuses the shared builder and only fills the per-user suffix.
+"""
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from services.ml.core.models.managers.model_manager import DEFAULT_REGIONAL_CONTEXT
+from services.ml.core.prompts.base.prompt_builder import PromptBuilder, get_prompt_builder
+
+PROFILES = [
+    ("ru", {"analysis_count": 0}),
+    ("en", {"analysis_count": 12, "goal": "lose_weight", "allergies": ["nuts"]}),
+    ("ru", {"analysis_count": 70, "cooking_level": "advanced", "dietary_preferences": ["vegetarian"]}),
+]
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_assembly_cost_against_per_request_builder(bench):
+    builder = get_prompt_builder()
+    builder.precompile(regional_contexts=[DEFAULT_REGIONAL_CONTEXT])
+
+    def run_legacy():
+        for language, profile in PROFILES:
+            PromptBuilder().build_food_analysis_prompt(language, DEFAULT_REGIONAL_CONTEXT, profile)
+            PromptBuilder().build_recipe_generation_prompt(language, DEFAULT_REGIONAL_CONTEXT, profile)
+
+    def run_compiled():
+        for language, profile in PROFILES:
+            builder.assemble_food_analysis(language, DEFAULT_REGIONAL_CONTEXT, profile)
+            builder.assemble_recipe_generation(language, DEFAULT_REGIONAL_CONTEXT, profile)
+
+    prompts = 2 * len(PROFILES)
+    legacy = bench(run_legacy, rounds=200, name=f"per-request PromptBuilder x{prompts}")
+    compiled = bench(run_compiled, rounds=2000, name=f"compiled assembly x{prompts}")
+
+    print(f"\nper prompt: per-request {legacy.median / prompts * 1e6:.1f}µs, "
+          f"compiled {compiled.median / prompts * 1e6:.1f}µs")
+    assert compiled.median < legacy.median
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_prefix_share_of_prompt_tokens():
+    builder = get_prompt_builder()
+    for language, profile in PROFILES:
+        prompt = builder.assemble_food_analysis(language, DEFAULT_REGIONAL_CONTEXT, profile)
+        estimate = prompt.token_estimate()
+        print(f"\n{language} food_analysis: {estimate}")
+        # The cacheable prefix is the bulk of every prompt
+        assert estimate["prefix_tokens"] / estimate["prompt_tokens"] > 0.9
@@ -0,0 +1,48 @@
+"""
+Throughput of a full subscription renewal run over 100k synthetic subscribers,
+against the in-memory renewal store and fake gateways with a fixed per-charge
+latency (tests/performance/stubs.py).
+
+With a 5ms gateway and 50 calls in flight the ceiling is 10k charges/s; the
+budget only catches regressions to one-at-a-time processing or per-row writes.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from services.pay.subscription_renewal import SubscriptionRenewalEngine
+from tests.performance.stubs import FakeRenewalGateway, InMemoryRenewalStore
+from tests.performance.synthetic import synthetic_subscriptions
+
+SUBSCRIBERS = 100_000
+NOW = datetime(2026, 3, 1, 3, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.slow
+@pytest.mark.performance
+def test_full_renewal_run_throughput():
+    rows = synthetic_subscriptions(SUBSCRIBERS, now=NOW)
+    due = sum(row["next_renewal_at"] <= NOW for row in rows)
+    store = InMemoryRenewalStore(rows)
+    gateways = {
+        "stripe": FakeRenewalGateway(latency_sec=0.005, decline_ids=range(1, SUBSCRIBERS, 50)),
+        "yookassa": FakeRenewalGateway(latency_sec=0.005, decline_ids=range(1, SUBSCRIBERS, 50)),
+    }
+    engine = SubscriptionRenewalEngine(
+        store, gateways, page_size=1000, concurrency=50, rate_limits={"stripe": 0, "yookassa": 0},
+    )
+
+    report = asyncio.run(engine.run("bench", NOW))
+
+    print(f"\n⏱️  renewal run: {report['charged']} charges in {report['elapsed_seconds']}s "
+          f"({report['per_second']}/s, {report['pages']} pages)")
+    assert report["charged"] == due
+    assert sum(report["counts"].values()) == due
+    assert store.records == report["pages"]
+    assert report["per_second"] > 2000
@@ -14,6 +14,7 @@ def test_favorites_and_recipes_routes_present(monkeypatch):
     expected = {
         ("/favorites/save", None),
         ("/favorites/list", None),
+        ("/favorites/relog", None),
         ("/favorites/{favorite_id}", None),
         ("/recipes/save", None),
         ("/recipes/list", None),
@@ -0,0 +1,141 @@
+"""
+Unit tests for the per-update user context: one user/profile load per Telegram
+update, shared by middlewares and handlers, with explicit invalidation.
+"""
+
+import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from aiogram import Bot, Dispatcher, types
+
+from common.db import profiles as db_profiles
+from services.api.bot.utils import user_context
+from services.api.bot.utils.user_context import (
+    UserContextMiddleware,
+    get_or_create_user,
+    get_user_with_profile,
+    invalidate_user_context,
+)
+
+
+class CountingDB:
+    """The common.supabase_client functions the context uses, counting round-trips"""
+
+    def __init__(self):
+        self.calls = []
+        self.user = {"id": "user-1", "telegram_id": 42, "language": "ru", "credits_remaining": 3}
+
+    async def load_user_with_profile(self, telegram_id, language=None):
+        self.calls.append(("load_user_with_profile", telegram_id))
+        return {"user": dict(self.user), "profile": {"age": 30}, "has_profile": True}
+
+    async def get_or_create_user(self, telegram_id, language=None):
+        self.calls.append(("get_or_create_user", telegram_id))
+        return dict(self.user)
+
+    async def get_user_with_profile(self, telegram_id):
+        self.calls.append(("get_user_with_profile", telegram_id))
+        return {"user": dict(self.user), "profile": None, "has_profile": False}
+
+
+@pytest.fixture
+def db():
+    fake = CountingDB()
+    with patch.object(user_context, "db", fake):
+        yield fake
+
+
+def _message_update(telegram_id=42):
+    return types.Update(update_id=1, message=types.Message(
+        message_id=1,
+        date=datetime.datetime.now(),
+        chat=types.Chat(id=telegram_id, type="private"),
+        from_user=types.User(id=telegram_id, is_bot=False, first_name="Test", language_code="ru"),
+        text="/daily",
+    ))
+
+
+async def _dispatch(handler, *inner_middlewares):
+    dp = Dispatcher()
+    dp.update.outer_middleware(UserContextMiddleware())
+    for middleware in inner_middlewares:
+        dp.message.middleware(middleware)
+    dp.message.register(handler)
+    await dp.feed_update(Bot(token="42:TEST"), _message_update())
+
+
+class TestUserContext:
+    @pytest.mark.asyncio
+    async def test_handlers_share_one_load_per_update(self, db):
+        seen = {}
+
+        async def language_middleware(handler, event, data):
+            seen["language"] = await data["user_context"].language()
+            return await handler(event, data)
+
+        async def handler(message: types.Message):
+            user = await get_or_create_user(message.from_user.id)
+            data = await get_user_with_profile(message.from_user.id)
+            # An error path or a chained handler fetching the same user again
+            again = await get_or_create_user(message.from_user.id)
+            seen.update(user=user, data=data, again=again)
+
+        await _dispatch(handler, language_middleware)
+
+        assert db.calls == [("load_user_with_profile", 42)]
+        assert seen["language"] == "ru"
+        assert seen["user"]["id"] == seen["again"]["id"] == "user-1"
+        assert seen["data"]["has_profile"] is True
+
+    @pytest.mark.asyncio
+    async def test_each_update_loads_fresh(self, db):
+        async def handler(message: types.Message):
+            await get_user_with_profile(message.from_user.id)
+
+        await _dispatch(handler)
+        await _dispatch(handler)
+
+        assert len(db.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_invalidate_after_write_reloads(self, db):
+        credits = []
+
+        async def handler(message: types.Message):
+            credits.append((await get_or_create_user(42))["credits_remaining"])
+            db.user["credits_remaining"] = 2
+            credits.append((await get_or_create_user(42))["credits_remaining"])
+            invalidate_user_context(42)
+            credits.append((await get_or_create_user(42))["credits_remaining"])
+
+        await _dispatch(handler)
+
+        assert credits == [3, 3, 2]
+        assert len(db.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_other_users_and_no_update_go_to_database(self, db):
+        async def handler(message: types.Message):
+            await get_or_create_user(7)
+
+        await _dispatch(handler)
+        await get_user_with_profile(42)
+
+        assert db.calls == [("get_or_create_user", 7), ("get_user_with_profile", 42)]
+
+
+class TestLoadUserWithProfile:
+    @pytest.mark.asyncio
+    async def test_profile_is_embedded_in_one_select(self):
+        client = MagicMock()
+        query = client.table.return_value.select.return_value.eq.return_value.limit.return_value
+        query.execute.return_value = SimpleNamespace(data=[{"id": "user-1", "user_profiles": [{"age": 30}]}])
+
+        with patch.object(db_profiles, "supabase", client):
+            data = await db_profiles.load_user_with_profile(42)
+
+        client.table.assert_called_once_with("users")
+        client.table.return_value.select.assert_called_once_with("*, user_profiles(*)")
+        assert data == {"user": {"id": "user-1"}, "profile": {"age": 30}, "has_profile": True}
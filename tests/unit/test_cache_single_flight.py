@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Unit tests for common/cache/single_flight.py and its use in photo analysis
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from common.cache import redis_client
+from common.cache.single_flight import SingleFlight
+from common.db import client as db_client
+
+# The handler module wires the Supabase client at import time; nothing is requested from it here
+_supabase = db_client.supabase
+if _supabase is None:
+    db_client.supabase = MagicMock()
+try:
+    from services.api.bot.handlers import photo
+finally:
+    db_client.supabase = _supabase
+
+
+class FakeAsyncRedis:
+    """get/setex/set NX/delete, enough for the cache helpers and the flight lock."""
+
+    def __init__(self):
+        self.store = {}
+
+    async def setex(self, key, ttl_seconds, value):
+        self.store[key] = value
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.store:
+            return False
+        self.store[key] = value
+        return True
+
+    async def delete(self, *keys):
+        return sum(self.store.pop(key, None) is not None for key in keys)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeAsyncRedis()
+    monkeypatch.setattr(redis_client, "_client", fake)
+    return fake
+
+
+def make_work(result="done", delay=0.05, error=None):
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return result
+
+    return work, calls
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_run(self, fake_redis):
+        flight = SingleFlight("test")
+        work, calls = make_work()
+
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+
+        assert len(calls) == 1
+        assert [value for value, _ in results] == ["done"] * 5
+        assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+        assert not flight.in_flight("k")
+
+    @pytest.mark.asyncio
+    async def test_different_keys_and_sequential_calls_run_separately(self, fake_redis):
+        flight = SingleFlight("test")
+        work, calls = make_work()
+
+        await asyncio.gather(flight.do("a", work), flight.do("b", work))
+        await flight.do("a", work)
+
+        assert len(calls) == 3
+
+    @pytest.mark.asyncio
+    async def test_error_is_raised_in_every_caller(self, fake_redis):
+        flight = SingleFlight("test")
+        work, calls = make_work(error=RuntimeError("ml down"))
+
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(3)), return_exceptions=True)
+
+        assert len(calls) == 1
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert not flight.in_flight("k")
+
+    @pytest.mark.asyncio
+    async def test_other_worker_waits_for_published_result(self, fake_redis):
+        # Two instances stand in for two worker processes sharing Redis
+        leader, follower = SingleFlight("test", poll_seconds=0.01), SingleFlight("test", poll_seconds=0.01)
+        published = {}
+
+        async def work():
+            await asyncio.sleep(0.05)
+            published["value"] = "done"
+            return "done"
+
+        async def load_shared():
+            return published.get("value")
+
+        follower_work, follower_calls = make_work("duplicate")
+        first = asyncio.create_task(leader.do("k", work, load_shared))
+        await asyncio.sleep(0.01)
+        second = await follower.do("k", follower_work, load_shared)
+
+        assert await first == ("done", False)
+        assert second == ("done", True)
+        assert follower_calls == []
+        assert fake_redis.store == {}  # lock released
+
+    @pytest.mark.asyncio
+    async def test_other_worker_takes_over_when_leader_fails(self, fake_redis):
+        leader, follower = SingleFlight("test", poll_seconds=0.01), SingleFlight("test", poll_seconds=0.01)
+        failing, _ = make_work(error=RuntimeError("ml down"))
+        retry, retry_calls = make_work("retried", delay=0)
+
+        async def nothing_published():
+            return None
+
+        first = asyncio.create_task(leader.do("k", failing, nothing_published))
+        await asyncio.sleep(0.01)
+        second = await follower.do("k", retry, nothing_published)
+
+        with pytest.raises(RuntimeError):
+            await first
+        assert second == ("retried", False)
+        assert len(retry_calls) == 1
+
+
+def make_message(telegram_id=42, photo_bytes=b"\xff\xd8\xff same photo"):
+    processing_msg = AsyncMock()
+    message = AsyncMock()
+    message.from_user = SimpleNamespace(id=telegram_id)
+    message.photo = [SimpleNamespace(file_id="file-1", file_size=1024)]
+    message.bot = MagicMock()
+    message.bot.get_file = AsyncMock(return_value=SimpleNamespace(file_path="photos/1.jpg", file_size=len(photo_bytes)))
+    message.bot.session.api.is_local = False
+
+    async def stream_content(**kwargs):
+        yield photo_bytes
+
+    message.bot.session.stream_content = stream_content
+    message.answer = AsyncMock(return_value=processing_msg)
+    return message, processing_msg
+
+
+class DelayedMLClient:
+    """httpx.AsyncClient stand-in whose analyze endpoint answers after a delay."""
+
+    calls = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def post(self, url, **kwargs):
+        DelayedMLClient.calls.append(url)
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(status_code=200, text="", json=lambda: {
+            "analysis": {
+                "food_items": [{"name": "Apple", "weight_grams": 150, "calories": 80}],
+                "total_nutrition": {"calories": 80, "proteins": 0.4, "fats": 0.3, "carbohydrates": 21},
+            }
+        })
+
+
+class TestPhotoAnalysisSingleFlight:
+    @pytest.fixture
+    def pipeline(self, fake_redis, monkeypatch):
+        DelayedMLClient.calls = []
+        user = {"id": "user-uuid", "credits_remaining": 5, "language": "en"}
+        mocks = SimpleNamespace(
+            upload=AsyncMock(return_value="https://r2.example/photo.jpg"),
+            decrement=AsyncMock(return_value={"credits_remaining": 4}),
+            add_calories=MagicMock(return_value={"total_calories": 80}),
+        )
+        monkeypatch.setattr(photo, "get_user_with_profile",
+                            AsyncMock(return_value={"user": user, "profile": {}, "has_profile": False}))
+        monkeypatch.setattr(photo, "upload_streamed_photo", mocks.upload)
+        monkeypatch.setattr(photo, "decrement_credits", mocks.decrement)
+        monkeypatch.setattr(photo, "add_calories_from_analysis", mocks.add_calories)
+        monkeypatch.setattr(photo, "ML_STREAMING_ENABLED", False)
+        monkeypatch.setattr(photo.httpx, "AsyncClient", DelayedMLClient)
+        monkeypatch.setattr(photo, "analysis_flight", SingleFlight("photo_analysis"))
+        monkeypatch.setattr("shared.auth.middleware.INTERNAL_API_TOKEN", "t" * 32)
+        return mocks
+
+    @pytest.mark.asyncio
+    async def test_duplicate_submissions_share_one_analysis_and_charge(self, pipeline):
+        first, first_reply = make_message()
+        second, second_reply = make_message()
+
+        await asyncio.gather(
+            photo.process_nutrition_analysis(first, AsyncMock()),
+            photo.process_nutrition_analysis(second, AsyncMock()),
+        )
+
+        assert len(DelayedMLClient.calls) == 1
+        pipeline.upload.assert_awaited_once()
+        pipeline.decrement.assert_awaited_once_with(42)
+        pipeline.add_calories.assert_called_once()
+        for reply in (first_reply, second_reply):
+            assert "Apple" in reply.edit_text.await_args.args[0]
+
+    @pytest.mark.asyncio
+    async def test_different_photos_are_analyzed_separately(self, pipeline):
+        first, _ = make_message(photo_bytes=b"\xff\xd8\xff photo one")
+        second, _ = make_message(photo_bytes=b"\xff\xd8\xff photo two")
+
+        started = time.monotonic()
+        await asyncio.gather(
+            photo.process_nutrition_analysis(first, AsyncMock()),
+            photo.process_nutrition_analysis(second, AsyncMock()),
+        )
+
+        assert len(DelayedMLClient.calls) == 2
+        assert pipeline.decrement.await_count == 2
+        assert time.monotonic() - started < 0.5
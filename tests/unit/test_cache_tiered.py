@@ -0,0 +1,267 @@
+"""
+Unit tests for common/cache/tiered.py and the redis_client codec: hashed keys,
+compression, the L1 LRU, early refresh, one recompute across workers on
+concurrent expiry, and tag/namespace invalidation.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from common.cache import redis_client, tiered
+from common.cache.redis_client import COMPRESS_MIN_BYTES, decode_value, encode_value, make_cache_key
+from common.cache.tiered import TieredCache, invalidate_user
+
+
+class FakeAsyncRedis:
+    """Strings with TTL, SET NX and sets: the subset the cache uses"""
+
+    def __init__(self):
+        self.store = {}
+        self.expires = {}
+        self.sets = {}
+        self.now = time.time()
+
+    def _alive(self, key):
+        if key in self.expires and self.expires[key] <= self.now:
+            self.store.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.store
+
+    async def get(self, key):
+        return self.store.get(key) if self._alive(key) else None
+
+    async def setex(self, key, ttl_seconds, value):
+        self.store[key] = value
+        self.expires[key] = self.now + ttl_seconds
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and self._alive(key):
+            return None
+        self.store[key] = value
+        if ex:
+            self.expires[key] = self.now + ex
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+            self.sets.pop(key, None)
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def expire(self, key, ttl_seconds):
+        return True
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeAsyncRedis()
+    monkeypatch.setattr(redis_client, "_client", fake)
+    return fake
+
+
+def make_compute(value="plan", delay=0.0):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        if delay:
+            await asyncio.sleep(delay)
+        return {"value": value, "n": len(calls)}
+
+    return compute, calls
+
+
+class TestKeysAndCodec:
+    def test_keys_are_hashed_and_order_independent(self):
+        key = make_cache_key("food_plan", {"digest": "x" * 500, "days": 3})
+
+        assert key == make_cache_key("food_plan", {"days": 3, "digest": "x" * 500})
+        assert key.startswith("c0r:food_plan:") and len(key) == len("c0r:food_plan:") + 32
+        assert key != make_cache_key("profile", {"digest": "x" * 500, "days": 3})
+
+    def test_large_values_are_compressed(self):
+        small = {"a": 1}
+        large = {"items": ["chicken breast with rice"] * 200}
+
+        assert encode_value(small).startswith("j:")
+        encoded = encode_value(large)
+        assert encoded.startswith("z:") and len(encoded) < COMPRESS_MIN_BYTES
+        assert decode_value(encoded) == large
+        assert decode_value(encode_value(small)) == small
+        # Entries written before the codec are plain JSON
+        assert decode_value('{"a": 1}') == small
+
+
+class TestTiers:
+    @pytest.mark.asyncio
+    async def test_l2_fills_l1_and_lru_is_bounded(self, fake_redis):
+        writer = TieredCache("t_lru", 3600, l1_max_entries=2)
+        for i in range(3):
+            await writer.set({"i": i}, {"i": i})
+
+        assert len(writer._l1) == 2
+        assert writer.counts["l1_eviction"] == 1
+
+        reader = TieredCache("t_lru", 3600)
+        assert await reader.get({"i": 0}) == {"i": 0}
+        assert await reader.get({"i": 0}) == {"i": 0}
+        assert await reader.get({"i": 9}) is None
+        assert (reader.counts["l2_hit"], reader.counts["l1_hit"], reader.counts["miss"]) == (1, 1, 1)
+        assert reader.stats()["hit_ratio"] == 0.667
+
+    @pytest.mark.asyncio
+    async def test_uncacheable_values_are_returned_not_stored(self, fake_redis):
+        cache = TieredCache("t_uncacheable", 3600)
+        compute, calls = make_compute("fallback")
+        reject = lambda value: value["value"] != "fallback"
+
+        await cache.get_or_compute({"k": 1}, compute, cacheable=reject)
+        await cache.get_or_compute({"k": 1}, compute, cacheable=reject)
+
+        assert len(calls) == 2
+        assert fake_redis.store == {}
+
+    @pytest.mark.asyncio
+    async def test_callers_get_their_own_copy(self, fake_redis):
+        cache = TieredCache("t_copy", 3600)
+        plan = {"day_1": {"meals": [{"calories": 400}]}, "totals": (1, 2)}
+        await cache.set({"k": 1}, plan)
+        # The writer keeps mutating its object, like ensure_day_totals on a served plan
+        plan["day_1"]["total_calories"] = 400
+
+        first = await cache.get({"k": 1})
+        first["day_1"]["meals"].append({"calories": 9999})
+        second = await cache.get({"k": 1})
+
+        assert second == {"day_1": {"meals": [{"calories": 400}]}, "totals": [1, 2]}
+        assert cache.counts["l1_hit"] == 2
+        # Same types as a Redis hit in another process
+        assert await TieredCache("t_copy", 3600).get({"k": 1}) == second
+
+    @pytest.mark.asyncio
+    async def test_joined_flight_callers_get_their_own_copy(self, fake_redis):
+        cache = TieredCache("t_copy_flight", 3600)
+        compute, _ = make_compute(delay=0.01)
+
+        first, second = await asyncio.gather(
+            cache.get_or_compute({"k": 1}, compute), cache.get_or_compute({"k": 1}, compute),
+        )
+
+        assert first == second and first is not second
+
+
+class TestStampedeProtection:
+    @pytest.mark.asyncio
+    async def test_concurrent_expiry_recomputes_once_across_workers(self, fake_redis):
+        # Three workers (separate processes: separate L1 and single-flight state) share Redis
+        workers = [TieredCache("t_expiry", 60, poll_seconds=0.01) for _ in range(3)]
+        compute, calls = make_compute(delay=0.05)
+        await workers[0].get_or_compute({"k": 1}, compute)
+
+        # The entry expires in Redis and drops out of every L1
+        fake_redis.now += 61
+        for worker in workers:
+            worker.clear_local()
+
+        results = await asyncio.gather(*[
+            worker.get_or_compute({"k": 1}, compute) for worker in workers for _ in range(4)
+        ])
+
+        assert len(calls) == 2
+        assert all(result["n"] == 2 for result in results)
+        assert sum(worker.counts.get("shared", 0) for worker in workers) == 11
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_is_served_while_one_worker_refreshes(self, fake_redis):
+        clock = Clock()
+        workers = [TieredCache("t_stale", 3600, fresh_seconds=60, clock=clock) for _ in range(2)]
+        compute, calls = make_compute()
+        await workers[0].get_or_compute({"k": 1}, compute)
+
+        clock.now += 120
+        stale = [await worker.get_or_compute({"k": 1}, compute) for worker in workers for _ in range(3)]
+        await asyncio.gather(*[task for worker in workers for task in list(worker.refresh_tasks.values())])
+
+        assert all(result["n"] == 1 for result in stale)
+        # The refresh lock lets only one worker recompute
+        assert len(calls) == 2
+        workers[1].clear_local()
+        assert (await workers[1].get_or_compute({"k": 1}, compute))["n"] == 2
+
+    @pytest.mark.asyncio
+    async def test_expensive_entries_refresh_early(self, fake_redis):
+        clock = Clock()
+        draws = iter([0.9, 1e-9])
+        cache = TieredCache("t_early", 3600, fresh_seconds=60, clock=clock, rng=lambda: next(draws))
+        compute, calls = make_compute()
+        await cache.get_or_compute({"k": 1}, compute)
+        cache._l1[cache.key({"k": 1})][0]["d"] = 2.0  # pretend the compute took 2s
+
+        clock.now += 50
+        # Likely draw: 10s before the deadline is not close enough for a 2s compute
+        await cache.get_or_compute({"k": 1}, compute)
+        assert not cache.refresh_tasks
+        # Unlucky draw: -2 * ln(1e-9) ~ 41s of headroom, refresh now
+        await cache.get_or_compute({"k": 1}, compute)
+        await asyncio.gather(*cache.refresh_tasks.values())
+
+        assert len(calls) == 2
+        assert cache.counts["early_refresh"] == 1
+
+
+class TestInvalidation:
+    @pytest.mark.asyncio
+    async def test_user_tag_spans_namespaces(self, fake_redis):
+        plans = TieredCache("t_plans", 3600)
+        profiles = TieredCache("t_profiles", 3600)
+        await plans.set({"d": 1}, {"plan": 1}, tags=["user:u1"])
+        await profiles.set({"u": "u1"}, {"age": 30}, tags=["user:u1"])
+        await plans.set({"d": 2}, {"plan": 2}, tags=["user:u2"])
+
+        assert await invalidate_user("u1") == 2
+
+        assert await plans.get({"d": 1}) is None
+        assert await profiles.get({"u": "u1"}) is None
+        assert await plans.get({"d": 2}) == {"plan": 2}
+
+    @pytest.mark.asyncio
+    async def test_namespace_invalidation(self, fake_redis):
+        plans = TieredCache("t_ns_plans", 3600)
+        other = TieredCache("t_ns_other", 3600)
+        await plans.set({"d": 1}, 1)
+        await plans.set({"d": 2}, 2)
+        await other.set({"d": 1}, 1)
+
+        assert await plans.invalidate_namespace() == 2
+        assert await plans.get({"d": 1}) is None and await plans.get({"d": 2}) is None
+        assert await other.get({"d": 1}) == 1
+
+    @pytest.mark.asyncio
+    async def test_redis_outage_degrades_to_compute(self, monkeypatch):
+        monkeypatch.setattr(redis_client, "_client", redis_client._DummyAsyncRedis())
+        cache = TieredCache("t_dummy", 3600, l1_max_entries=0)
+        compute, calls = make_compute()
+
+        await cache.get_or_compute({"k": 1}, compute)
+        await cache.get_or_compute({"k": 1}, compute)
+        assert len(calls) == 2
+        assert await tiered.invalidate_tag("user:u1") == 0
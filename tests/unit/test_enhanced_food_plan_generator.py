@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Unit tests for EnhancedFoodPlanGenerator concurrent day generation
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from services.api.engines.personalized_insights import PersonalizedInsightsEngine
+from services.api.llm.enhanced_food_plan_generator import EnhancedFoodPlanGenerator
+
+
+@pytest.fixture
+def profile():
+    return {
+        "user_id": None,
+        "age": 32,
+        "gender": "female",
+        "height_cm": 165,
+        "weight_kg": 60,
+        "goal": "weight_loss",
+        "daily_calories_target": 1800,
+    }
+
+
+@pytest.fixture
+def food_history():
+    base_date = datetime.now() - timedelta(days=14)
+    history = []
+    for i in range(42):
+        log_date = (base_date + timedelta(days=i % 14)).replace(hour=8 + (i % 3) * 5, minute=0)
+        history.append({
+            "timestamp": log_date.isoformat(),
+            "action_type": "photo_analysis",
+            "kbzhu": {"calories": 300 + (i % 5) * 80, "protein": 20, "fats": 10, "carbs": 40},
+        })
+    return history
+
+
+@pytest.mark.asyncio
+async def test_plan_has_all_days_in_order(profile, food_history):
+    generator = EnhancedFoodPlanGenerator()
+
+    plan = await generator.generate_enhanced_plan(profile, food_history, days=5)
+
+    assert plan["model_used"] == "enhanced_ai_nutrition_system_v1.0"
+    assert list(plan["plan_json"].keys()) == [f"day_{n}" for n in range(1, 6)]
+    assert list(plan["daily_insights"].keys()) == list(plan["plan_json"].keys())
+    for day in plan["plan_json"].values():
+        assert {"breakfast", "lunch", "dinner", "summary"} <= set(day.keys())
+
+
+@pytest.mark.asyncio
+async def test_days_run_concurrently_within_cap(profile, food_history):
+    generator = EnhancedFoodPlanGenerator(max_concurrent_days=7)
+    in_flight = 0
+    peak = 0
+
+    async def slow_day(*args, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.2)
+        in_flight -= 1
+        return {"breakfast": {"ingredients": [{"name": "курица"}]}}
+
+    with patch.object(generator, "_generate_ai_daily_plan", side_effect=slow_day):
+        started = time.perf_counter()
+        plan = await generator.generate_enhanced_plan(profile, food_history, days=7)
+        elapsed = time.perf_counter() - started
+
+    assert len(plan["plan_json"]) == 7
+    assert peak == 7
+    assert elapsed < 0.2 * 3
+    # Ingredients from every day were streamed into the shopping list
+    assert len(plan["shopping_list_json"]["Белки"]) == 7
+
+
+@pytest.mark.asyncio
+async def test_concurrency_cap_is_respected(profile, food_history):
+    generator = EnhancedFoodPlanGenerator(max_concurrent_days=2)
+    in_flight = 0
+    peak = 0
+
+    async def slow_day(*args, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {}
+
+    with patch.object(generator, "_generate_ai_daily_plan", side_effect=slow_day):
+        plan = await generator.generate_enhanced_plan(profile, food_history, days=6)
+
+    assert len(plan["plan_json"]) == 6
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_recent_log_insights_computed_once(profile, food_history):
+    generator = EnhancedFoodPlanGenerator()
+
+    with patch.object(
+        PersonalizedInsightsEngine, "_get_recent_behavior_insights", return_value=["recent"]
+    ) as recent_insights:
+        plan = await generator.generate_enhanced_plan(profile, food_history, days=7)
+
+    # Once for the daily window and once for the weekly window, independent of day count
+    assert recent_insights.call_count == 2
+    assert all("recent" in insights for insights in plan["daily_insights"].values())
@@ -0,0 +1,131 @@
+"""
+Unit tests for ranked favorites / recipes search and instant favorite re-logging
+"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from common.db import client as db_client
+from common.db import favorites as db_favorites
+from common.db import recipes as db_recipes
+
+# The handler module wires the Supabase client at import time; nothing is requested from it here
+_supabase = db_client.supabase
+try:
+    db_client.supabase = MagicMock()
+    from services.api.bot.handlers import favorites as handler
+finally:
+    db_client.supabase = _supabase
+
+
+class RecordingQuery:
+    """Chainable stand-in for a PostgREST query that records its calls"""
+
+    def __init__(self, data=None):
+        self.calls = []
+        self.data = data or []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+        return method
+
+    def execute(self):
+        return SimpleNamespace(data=self.data)
+
+
+def _favorite(**overrides):
+    favorite = {
+        "id": "fav-1",
+        "user_id": "user-1",
+        "name": "Овсянка с бананом",
+        "composition_hash": "abc123",
+        "items_json": {"analysis": {"total_nutrition": {"calories": 350, "proteins": 12, "fats": 8, "carbohydrates": 55}}},
+    }
+    favorite.update(overrides)
+    return favorite
+
+
+class TestSearch:
+    def test_search_uses_ranked_rpc(self):
+        client = MagicMock()
+        client.rpc.return_value.execute.return_value = SimpleNamespace(data=[_favorite(rank=0.9)])
+
+        with patch.object(db_favorites, "supabase", client):
+            items = asyncio.run(db_favorites.search_favorites("user-1", "  овсянка ", limit=5, offset=10))
+
+        assert items[0]["id"] == "fav-1"
+        client.rpc.assert_called_once_with("search_favorites", {
+            "p_user_id": "user-1", "p_query": "овсянка", "p_limit": 5, "p_offset": 10,
+        })
+        client.table.assert_not_called()
+
+    def test_search_falls_back_to_ilike_without_rpc(self):
+        query = RecordingQuery(data=[{"id": "r-1"}])
+        client = MagicMock()
+        client.rpc.return_value.execute.side_effect = Exception("function search_recipes does not exist")
+        client.table.return_value = query
+
+        with patch.object(db_recipes, "supabase", client):
+            items = asyncio.run(db_recipes.search_recipes("user-1", "soup", limit=5, offset=5))
+
+        assert items == [{"id": "r-1"}]
+        assert ("ilike", ("title", "%soup%")) in query.calls
+        assert ("range", (5, 9)) in query.calls
+
+    def test_list_with_search_delegates_to_search(self):
+        with patch.object(db_favorites, "search_favorites", AsyncMock(return_value=[])) as search:
+            asyncio.run(db_favorites.list_favorites("user-1", limit=5, search="borscht", offset=5))
+
+        search.assert_awaited_once_with("user-1", "borscht", limit=5, offset=5)
+
+    def test_list_paginates_with_range(self):
+        query = RecordingQuery()
+        client = MagicMock()
+        client.table.return_value = query
+
+        with patch.object(db_favorites, "supabase", client):
+            asyncio.run(db_favorites.list_favorites("user-1", limit=6, offset=12))
+
+        assert ("range", (12, 17)) in query.calls
+
+
+class TestRelog:
+    def test_relog_by_hash_writes_stored_nutrition(self):
+        add_calories = MagicMock(return_value=True)
+        with patch.object(handler, "get_favorite_by_composition_hash", AsyncMock(return_value=_favorite())), \
+                patch.object(handler, "add_calories_from_analysis", add_calories):
+            favorite = asyncio.run(handler.relog_favorite_by_hash("user-1", "abc123"))
+
+        assert favorite["id"] == "fav-1"
+        user_id, analysis_data = add_calories.call_args.args
+        assert user_id == "user-1"
+        assert analysis_data["analysis"]["total_nutrition"]["calories"] == 350
+        assert analysis_data["source"] == "favorite"
+        assert analysis_data["composition_hash"] == "abc123"
+
+    def test_relog_unknown_hash_returns_none(self):
+        add_calories = MagicMock(return_value=True)
+        with patch.object(handler, "get_favorite_by_composition_hash", AsyncMock(return_value=None)), \
+                patch.object(handler, "add_calories_from_analysis", add_calories):
+            assert asyncio.run(handler.relog_favorite_by_hash("user-1", "missing")) is None
+
+        add_calories.assert_not_called()
+
+    def test_saving_same_composition_twice_keeps_one_favorite(self):
+        analysis = _favorite()["items_json"]["analysis"] | {"food_items": [{"name": "oats", "weight_grams": 80, "calories": 300}]}
+        callback = MagicMock()
+        callback.from_user.id = 42
+        callback.message.answer = AsyncMock()
+        save = AsyncMock()
+        with patch.object(handler, "get_or_create_user", AsyncMock(return_value={"id": "user-1", "language": "en"})), \
+                patch.object(handler, "get_latest_photo_analysis_log_id", return_value="log-1"), \
+                patch.object(handler, "get_log_by_id", return_value={"metadata": {"analysis": analysis}}), \
+                patch.object(handler, "get_favorite_by_composition_hash", AsyncMock(return_value=_favorite())), \
+                patch.object(handler, "save_favorite_food", save):
+            asyncio.run(handler.save_latest_analysis_to_favorites(callback, MagicMock()))
+
+        save.assert_not_awaited()
+        callback.message.answer.assert_awaited_once()
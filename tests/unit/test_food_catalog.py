@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Unit tests for services/api/recommenders/food_catalog.py and the catalog path of the adaptive recommender
+"""
+
+from datetime import date, time, timedelta
+
+import numpy as np
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from services.api.models.nutrition_profile import (
+    EatingPersonality,
+    EnergyPattern,
+    NutritionDNA,
+    SocialEatingPattern,
+    TemporalPattern,
+)
+from services.api.recommenders.adaptive_food_recommender import AdaptiveFoodRecommender
+from services.api.recommenders.food_catalog import (
+    TAG_BITS,
+    FoodCatalog,
+    SlotTarget,
+    exclusion_mask,
+    tag_mask,
+    tags_for_text,
+)
+
+DISHES = [
+    {"name": "Омлет с сыром", "slots": ["breakfast"], "calories": 420, "protein": 26, "fat": 30, "carbs": 6, "prep_time": 8},
+    {"name": "Овсянка с ягодами и медом", "slots": ["breakfast"], "calories": 480, "protein": 14, "fat": 10, "carbs": 80, "prep_time": 10},
+    {"name": "Тофу-скрэмбл с овощами", "slots": ["breakfast"], "calories": 450, "protein": 28, "fat": 16, "carbs": 45, "prep_time": 12},
+    {"name": "Куриная грудка с булгуром", "slots": ["lunch", "dinner"], "calories": 650, "protein": 48, "fat": 18, "carbs": 70, "prep_time": 25},
+    {"name": "Лосось с рисом", "slots": ["lunch", "dinner"], "calories": 700, "protein": 40, "fat": 26, "carbs": 75, "prep_time": 20},
+    {"name": "Чечевица с овощами", "slots": ["lunch", "dinner"], "calories": 600, "protein": 32, "fat": 14, "carbs": 85, "prep_time": 30},
+    {"name": "Гречка с грибами", "slots": ["lunch", "dinner"], "calories": 550, "protein": 18, "fat": 15, "carbs": 85, "prep_time": 90},
+]
+
+
+def targets(style=None):
+    return [
+        SlotTarget("breakfast", 500, 31, 17, 56, style),
+        SlotTarget("lunch", 700, 44, 23, 79, style),
+        SlotTarget("dinner", 600, 38, 20, 68, style),
+    ]
+
+
+@pytest.fixture
+def catalog():
+    return FoodCatalog.from_records(DISHES)
+
+
+@pytest.fixture
+def nutrition_dna():
+    return NutritionDNA(
+        archetype=EatingPersonality.STRUCTURED_BALANCED,
+        confidence_score=0.8,
+        energy_patterns=EnergyPattern(
+            morning_appetite=0.5, afternoon_hunger=0.5, evening_comfort_eating=0.3,
+            peak_hunger_time=time(13, 0), lowest_energy_time=time(15, 0),
+        ),
+        social_patterns=SocialEatingPattern(
+            weekend_indulgence_score=0.3, work_stress_snacking=0.2, restaurant_frequency=0.2,
+            social_meal_impact=0.3, planning_score=0.6,
+        ),
+        temporal_patterns=TemporalPattern(
+            preferred_breakfast_time=time(8, 0), preferred_lunch_time=time(13, 0),
+            preferred_dinner_time=time(19, 0), meal_timing_consistency=0.7,
+            weekend_shift_hours=1.0, late_night_eating_frequency=0.1,
+        ),
+        diversity_score=0.6, consistency_score=0.7, goal_alignment_score=0.6, data_quality_score=0.7,
+    )
+
+
+class TestTags:
+    @pytest.mark.parametrize("text, tags", [
+        ("Куриная грудка с булгуром", {"poultry", "gluten"}),
+        ("Овсянка с ягодами и медом", {"honey"}),
+        ("Паста с морепродуктами", {"gluten", "shellfish"}),
+        ("Медовик", {"honey", "gluten"}),
+        ("Гречка с грибами", set()),
+    ])
+    def test_tags_from_dish_name(self, text, tags):
+        assert tags_for_text(text) == tag_mask(*tags)
+
+    @pytest.mark.parametrize("text, tag", [
+        ("Яичница с помидорами", "eggs"),
+        ("Глазунья", "eggs"),
+        ("Салат с майонезом", "eggs"),
+        ("Блины со сметаной", "gluten"),
+        ("Блины со сметаной", "eggs"),
+        ("Пельмени", "gluten"),
+        ("Пельмени", "meat"),
+        ("Куриная лапша", "gluten"),
+        ("Булгур с овощами", "gluten"),
+        ("Манная каша", "gluten"),
+        ("Овсяное печенье", "gluten"),
+        ("Stir-fried noodles", "gluten"),
+        ("Couscous salad", "gluten"),
+        ("Форель на гриле", "fish"),
+        ("Тилапия с рисом", "fish"),
+        ("Жареная барабулька", "fish"),
+        ("Hamburger", "meat"),
+    ])
+    def test_common_dishes_are_tagged(self, text, tag):
+        # Allergy filters rely on these: a missing tag lets the dish through
+        assert tags_for_text(text) & TAG_BITS[tag]
+
+    @pytest.mark.parametrize("text, tag", [
+        ("Grilled eggplant", "eggs"),
+        ("Hamburger", "pork"),
+        ("Арахисовая паста", "gluten"),
+        ("Тост с арахисовой пастой", "dairy"),
+        ("Peanut butter", "dairy"),
+        ("Творожная запеканка", "nuts"),
+        ("Конфеты", "dairy"),
+    ])
+    def test_short_terms_do_not_match_inside_words(self, text, tag):
+        assert not tags_for_text(text) & TAG_BITS[tag]
+
+    def test_spreads_keep_their_ingredient_tag(self):
+        assert tags_for_text("Арахисовая паста") == tag_mask("peanuts")
+        assert tags_for_text("Паста с арахисовой пастой") == tag_mask("gluten", "peanuts")
+
+    def test_diet_and_allergy_exclusions(self):
+        mask = exclusion_mask(["Vegetarian"], ["nuts", "unknown"])
+
+        assert mask & TAG_BITS["fish"] and mask & TAG_BITS["nuts"]
+        assert not mask & TAG_BITS["dairy"]
+        assert exclusion_mask(["vegan"]) & TAG_BITS["honey"]
+
+
+class TestPlanDay:
+    def test_one_distinct_dish_per_slot(self, catalog):
+        picks = catalog.plan_day(targets())
+
+        assert [pick.slot for pick in picks] == ["breakfast", "lunch", "dinner"]
+        assert len({pick.index for pick in picks}) == 3
+        assert catalog.names[picks[0].index] in {d["name"] for d in DISHES if "breakfast" in d["slots"]}
+
+    def test_matches_naive_scoring(self, catalog):
+        scores, portions = catalog.score(targets())
+
+        for row, target in enumerate(targets()):
+            for index, dish in enumerate(DISHES):
+                if target.slot not in dish["slots"]:
+                    assert scores[row, index] == np.inf
+                    continue
+                portion = min(max(target.calories / dish["calories"], 0.75), 1.5)
+                expected = sum(
+                    weight * ((portion * dish[key] - goal) / goal) ** 2
+                    for weight, key, goal in zip(
+                        (2.0, 1.5, 0.5, 0.5), ("calories", "protein", "fat", "carbs"),
+                        (target.calories, target.protein, target.fat, target.carbs),
+                    )
+                )
+                assert scores[row, index] == pytest.approx(expected)
+                assert portions[row, index] == pytest.approx(portion)
+
+    def test_exclusions_and_prep_time(self, catalog):
+        picks = catalog.plan_day(targets(), exclude_mask=exclusion_mask(["vegan"]), max_prep_time=60)
+
+        assert [catalog.names[pick.index] for pick in picks[:2]] == ["Тофу-скрэмбл с овощами", "Чечевица с овощами"]
+        # The only other vegan dish takes 90 minutes
+        assert picks[2] is None
+
+    def test_record_is_portioned(self, catalog):
+        record = catalog.record(3, portion=1.2)
+
+        assert record["name"] == "Куриная грудка с булгуром"
+        assert (record["calories"], record["protein"]) == (780, 58)
+
+
+class TestRecommenderCatalogPath:
+    def test_daily_plan_uses_catalog_and_falls_back_to_templates(self, catalog, nutrition_dna):
+        AdaptiveFoodRecommender.use_catalog(catalog)
+        try:
+            foods = AdaptiveFoodRecommender.generate_daily_food_plan(
+                nutrition_dna, date(2026, 3, 2), {"predictions": []},
+                enhanced_profile={"dietary_preferences": ["vegan"]},
+            )
+        finally:
+            AdaptiveFoodRecommender.use_catalog(None)
+
+        assert list(foods) == ["breakfast", "lunch", "dinner"]
+        assert foods["breakfast"].dish_name == "Тофу-скрэмбл с овощами"
+        assert foods["lunch"].dish_name == "Чечевица с овощами"
+        assert 450 <= foods["lunch"].calories <= 900
+        # Nothing vegan is left for dinner in the catalog: template path, same exclusions
+        assert foods["dinner"].dish_name not in {d["name"] for d in DISHES}
+        assert not tags_for_text(foods["dinner"].dish_name) & exclusion_mask(["vegan"])
+
+    @pytest.mark.parametrize("allergies", [["nuts"], ["eggs"], ["dairy", "gluten"], ["nuts", "eggs", "dairy", "soy"]])
+    def test_template_fallback_applies_allergy_exclusions(self, catalog, nutrition_dna, allergies):
+        mask = exclusion_mask(allergies=allergies)
+        AdaptiveFoodRecommender.use_catalog(catalog)
+        try:
+            plans = [
+                AdaptiveFoodRecommender.generate_daily_food_plan(
+                    nutrition_dna, date(2026, 3, 2) + timedelta(days=offset), {"predictions": []},
+                    constraints={"max_prep_time": 20}, enhanced_profile={"allergies": allergies},
+                )
+                for offset in range(7)
+            ]
+        finally:
+            AdaptiveFoodRecommender.use_catalog(None)
+
+        for foods in plans:
+            for food in foods.values():
+                text = " ".join([food.dish_name, *(item["name"] for item in food.ingredients)])
+                assert not tags_for_text(text) & mask, (allergies, food.dish_name)
+
+    def test_templates_alone_apply_allergy_exclusions(self, nutrition_dna):
+        for style in AdaptiveFoodRecommender.FOOD_TEMPLATES:
+            template = AdaptiveFoodRecommender._select_food_template(
+                {"food_style": style}, "breakfast", {}, exclusion_mask(allergies=["nuts", "dairy"])
+            )
+            assert template["name"] != "Греческий йогурт с орехами"
+            assert not tags_for_text(template["name"]) & exclusion_mask(allergies=["nuts", "dairy"])
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Unit tests for common/cache/food_plan_cache.py - stale-while-revalidate plan cache
+"""
+
+import asyncio
+from datetime import date
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from common.cache import food_plan_cache, redis_client
+
+
+class FakeAsyncRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def setex(self, key, ttl_seconds, value):
+        self.store[key] = value
+
+    async def get(self, key):
+        return self.store.get(key)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeAsyncRedis()
+    monkeypatch.setattr(redis_client, "_client", fake)
+    food_plan_cache.plan_cache.clear_local()
+    yield fake
+    food_plan_cache.plan_cache.clear_local()
+
+
+@pytest.fixture
+def profile():
+    return {
+        "user_id": "u1",
+        "age": 30,
+        "goal": "lose_weight",
+        "dietary_preferences": ["vegetarian", "low_carb"],
+        "daily_calories_target": 1800,
+        "recent_history_by_day": {"2025-10-01": []},
+    }
+
+
+@pytest.fixture
+def history():
+    return [{"timestamp": "2025-10-01T08:00:00"}, {"timestamp": "2025-10-02T13:00:00"}]
+
+
+def make_generator(plan=None):
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        return dict(plan or {"plan_json": {"day_1": {}}, "model_used": "enhanced"}, n=len(calls))
+
+    return generate, calls
+
+
+class TestFoodPlanDigest:
+    def test_digest_ignores_preference_order_and_derived_fields(self, profile, history):
+        reordered = dict(profile, dietary_preferences=["low_carb", "vegetarian"], recent_history_by_day={})
+        start = date(2025, 10, 3)
+
+        assert food_plan_cache.food_plan_digest(profile, history, 3, start) == \
+            food_plan_cache.food_plan_digest(reordered, history, 3, start)
+
+    def test_digest_changes_with_inputs(self, profile, history):
+        start = date(2025, 10, 3)
+        base = food_plan_cache.food_plan_digest(profile, history, 3, start)
+
+        assert base != food_plan_cache.food_plan_digest(profile, history, 5, start)
+        assert base != food_plan_cache.food_plan_digest(dict(profile, goal="gain"), history, 3, start)
+        assert base != food_plan_cache.food_plan_digest(
+            profile, history + [{"timestamp": "2025-10-03T09:00:00"}], 3, start
+        )
+        assert base != food_plan_cache.food_plan_digest(profile, history, 3, date(2025, 10, 4))
+
+
+class TestGetOrGenerateFoodPlan:
+    @pytest.mark.asyncio
+    async def test_second_call_is_served_from_cache(self, fake_redis, profile, history):
+        generate, calls = make_generator()
+        start = date(2025, 10, 3)
+
+        first = await food_plan_cache.get_or_generate_food_plan(profile, history, 3, start, generate)
+        second = await food_plan_cache.get_or_generate_food_plan(profile, history, 3, start, generate)
+
+        assert len(calls) == 1
+        assert first == second
+
+    @pytest.mark.asyncio
+    async def test_force_bypasses_cache(self, fake_redis, profile, history):
+        generate, calls = make_generator()
+        start = date(2025, 10, 3)
+
+        await food_plan_cache.get_or_generate_food_plan(profile, history, 3, start, generate)
+        forced = await food_plan_cache.get_or_generate_food_plan(profile, history, 3, start, generate, force=True)
+
+        assert len(calls) == 2
+        assert forced["n"] == 2
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_is_served_and_revalidated(self, fake_redis, profile, history, monkeypatch):
+        generate, calls = make_generator()
+        start = date(2025, 10, 3)
+        await food_plan_cache.get_or_generate_food_plan(profile, history, 3, start, generate)
+
+        monkeypatch.setattr(food_plan_cache, "FOOD_PLAN_FRESH_SECONDS", -1)
+        stale = await food_plan_cache.get_or_generate_food_plan(profile, history, 3, start, generate)
+        assert stale["n"] == 1
+
+        await asyncio.gather(*food_plan_cache._revalidating.values())
+        monkeypatch.setattr(food_plan_cache, "FOOD_PLAN_FRESH_SECONDS", 3600)
+        refreshed = await food_plan_cache.get_or_generate_food_plan(profile, history, 3, start, generate)
+
+        assert len(calls) == 2
+        assert refreshed["n"] == 2
+
+    @pytest.mark.asyncio
+    async def test_fallback_plans_are_not_cached(self, fake_redis, profile, history):
+        generate, calls = make_generator({"plan_json": {}, "model_used": "fallback"})
+        start = date(2025, 10, 3)
+
+        await food_plan_cache.get_or_generate_food_plan(profile, history, 3, start, generate)
+        await food_plan_cache.get_or_generate_food_plan(profile, history, 3, start, generate)
+
+        assert len(calls) == 2
+        assert fake_redis.store == {}
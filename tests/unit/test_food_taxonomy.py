@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Unit tests for common/food_taxonomy.py - compiled food keyword index
+"""
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from common.food_taxonomy import (
+    FOOD_CATEGORIES,
+    classify_food,
+    classify_foods,
+    normalize_food_name,
+    stem_keyword,
+)
+
+
+def naive_categories(name: str):
+    """Reference implementation: the substring scans the taxonomy replaced."""
+    text = normalize_food_name(name)
+    found = set()
+    for category, keywords in FOOD_CATEGORIES.items():
+        for raw in keywords:
+            if raw.startswith("="):
+                if raw[1:] in text.split():
+                    found.add(category)
+            elif stem_keyword(raw) in text:
+                found.add(category)
+    return found
+
+
+class TestNormalization:
+    def test_normalize_folds_case_yo_and_punctuation(self):
+        assert normalize_food_name("  Свёкла, ТУШЁНАЯ!! ") == "свекла тушеная"
+
+    def test_stem_drops_single_ending_only_for_long_stems(self):
+        assert stem_keyword("курица") == "куриц"
+        assert stem_keyword("гречка") == "гречк"
+        assert stem_keyword("рыба") == "рыба"
+        assert stem_keyword("кола") == "кола"
+        assert stem_keyword("salmon") == "salmon"
+
+
+class TestClassifyFood:
+    @pytest.mark.parametrize("name", [
+        "Курица с рисом", "Картофель фри", "Овощи на пару", "Щи из капусты", "Сливочный сыр",
+        "Сырники со сметаной", "Pizza Margherita", "Греческий салат с оливковым маслом",
+        "Овсяная каша на молоке", "Лосось на гриле с брокколи", "",
+    ])
+    def test_matches_reference_scan(self, name):
+        assert set(classify_food(name).categories) == naive_categories(name)
+
+    def test_inflected_forms_match_stemmed_keywords(self):
+        assert classify_food("Гречка с курицей").has("protein", "meat")
+        assert classify_food("гречкой").has("carb")
+
+    def test_whole_word_terms_do_not_match_inside_words(self):
+        assert classify_food("Картофель фри").has("unhealthy")
+        assert not classify_food("Фрикадельки").has("unhealthy")
+        assert classify_food("Щи").has("soup")
+        assert not classify_food("Овощи").has("soup")
+
+    def test_portion_prefers_specific_food_then_category(self):
+        assert dict(classify_food("Курица с рисом").portion)["medium"] == 120
+        assert dict(classify_food("Баранина тушеная").portion)["medium"] == 130
+        assert classify_food("Мороженое").portion is None
+
+    def test_nutrition_heuristics(self):
+        assert classify_food("Сливочный сыр Hochland").nutrition_label == "cream_cheese"
+        assert classify_food("Сыр Российский").nutrition_label == "hard_cheese"
+        assert classify_food("Сырок глазированный").nutrition_label is None
+        assert classify_food("Кефир 2.5%").nutrition_per_100g == (52.0, 3.0, 3.0, 4.0)
+
+    def test_count_distinct_terms(self):
+        plate = classify_foods(["Лосось", "Авокадо", "Лосось на гриле", "Картофель фри"])
+        assert plate.count("healthy_ingredient") == 2
+        assert plate.count("unhealthy_ingredient") == 1
+        assert plate.count("missing") == 0
+
+    def test_result_is_cached_and_immutable(self):
+        first = classify_food("Курица с рисом")
+        assert classify_food("Курица с рисом") is first
+        with pytest.raises(TypeError):
+            first.portion["medium"] = 1
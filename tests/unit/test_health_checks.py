@@ -17,7 +17,9 @@ from shared.health import (
     create_comprehensive_health_response,
     check_database_health,
     check_external_service_health,
-    check_openai_health
+    check_openai_health,
+    HealthMonitor,
+    run_checks,
 )
 
 
@@ -281,5 +283,148 @@ class TestComprehensiveHealthResponse:
         assert "openai" in response["dependencies"]
 
 
+def stub_check(name, status=HealthStatus.HEALTHY, delay=0.0, error=None, calls=None):
+    """Dependency stand-in that can be slow, hang (delay > timeout) or raise"""
+    async def check():
+        if calls is not None:
+            calls.append(name)
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return DependencyCheck(name, status, delay)
+    return check
+
+
+class TestRunChecks:
+    """Test concurrent checks with timeouts and thresholds"""
+    
+    @pytest.mark.asyncio
+    async def test_checks_run_concurrently_and_hangs_time_out(self):
+        checks = {
+            "database": stub_check("database", delay=0.05),
+            "ml_service": stub_check("ml_service", delay=0.05),
+            "openai": stub_check("openai", delay=10),
+        }
+        started = asyncio.get_running_loop().time()
+        
+        results = {dep.name: dep for dep in await run_checks(checks, timeout=0.2)}
+        
+        assert asyncio.get_running_loop().time() - started < 0.5
+        assert results["database"].status == HealthStatus.HEALTHY
+        assert results["ml_service"].status == HealthStatus.HEALTHY
+        assert results["openai"].status == HealthStatus.UNHEALTHY
+        assert "Timed out" in results["openai"].error
+    
+    @pytest.mark.asyncio
+    async def test_exception_becomes_unhealthy(self):
+        results = await run_checks({"database": stub_check("database", error=RuntimeError("refused"))})
+        
+        assert results[0].status == HealthStatus.UNHEALTHY
+        assert results[0].error == "refused"
+    
+    @pytest.mark.asyncio
+    async def test_slow_and_non_critical_checks_are_degraded(self):
+        checks = {
+            "database": stub_check("database", delay=0.05),
+            "pay_service": stub_check("pay_service", error=RuntimeError("down")),
+        }
+        
+        results = {dep.name: dep for dep in await run_checks(
+            checks, degraded_after={"database": 0.01}, critical={"database"}
+        )}
+        
+        assert results["database"].status == HealthStatus.DEGRADED
+        assert "Slow response" in results["database"].error
+        assert results["pay_service"].status == HealthStatus.DEGRADED
+        assert results["pay_service"].error == "down"
+
+
+class TestHealthMonitor:
+    """Test snapshot-based health monitor"""
+    
+    @pytest.mark.asyncio
+    async def test_probes_answer_from_snapshot(self):
+        calls = []
+        monitor = HealthMonitor("test", {"database": stub_check("database", calls=calls)}, additional_info={"x": 1})
+        
+        first = await monitor.response()
+        second = await monitor.response()
+        
+        assert calls == ["database"]
+        assert second["status"] == HealthStatus.HEALTHY
+        assert second["x"] == 1
+        assert second["snapshot_age_seconds"] >= first["snapshot_age_seconds"]
+        assert "checked_at" in second
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_probes_share_one_refresh(self):
+        calls = []
+        monitor = HealthMonitor("test", {"database": stub_check("database", delay=0.05, calls=calls)})
+        
+        await asyncio.gather(*(monitor.response() for _ in range(5)))
+        
+        assert calls == ["database"]
+    
+    @pytest.mark.asyncio
+    async def test_background_refresh_updates_snapshot(self):
+        calls = []
+        monitor = HealthMonitor("test", {"database": stub_check("database", calls=calls)}, interval_seconds=0.02)
+        
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+        
+        assert len(calls) >= 3
+        assert (await monitor.response())["snapshot_age_seconds"] < 0.1
+    
+    @pytest.mark.asyncio
+    async def test_hanging_dependency_does_not_block_probe(self):
+        monitor = HealthMonitor(
+            "test",
+            {"database": stub_check("database"), "openai": stub_check("openai", delay=10)},
+            timeout_seconds=0.1,
+        )
+        await monitor.refresh()
+        
+        started = asyncio.get_running_loop().time()
+        response = await monitor.response()
+        readiness = await monitor.readiness()
+        
+        assert asyncio.get_running_loop().time() - started < 0.01
+        assert response["status"] == HealthStatus.UNHEALTHY
+        assert response["dependencies"]["openai"]["status"] == HealthStatus.UNHEALTHY
+        assert readiness["ready"] is False
+    
+    @pytest.mark.asyncio
+    async def test_stale_snapshot_is_degraded(self):
+        monitor = HealthMonitor("test", {"database": stub_check("database")}, interval_seconds=60)
+        await monitor.refresh()
+        monitor._checked_at -= 3600
+        monitor._task = MagicMock(done=MagicMock(return_value=False))  # refresher "running" but stuck
+        
+        response = await monitor.response()
+        
+        assert response["status"] == HealthStatus.DEGRADED
+        assert response["stale"] is True
+    
+    def test_probe_endpoints(self):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        
+        calls = []
+        monitor = HealthMonitor("test", {"database": stub_check("database", error=RuntimeError("down"), calls=calls)})
+        app = FastAPI()
+        monitor.install(app)
+        client = TestClient(app)
+        
+        live = client.get("/health/live")
+        assert live.status_code == 200
+        assert calls == []
+        
+        ready = client.get("/health/ready")
+        assert ready.status_code == 503
+        assert ready.json()["ready"] is False
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
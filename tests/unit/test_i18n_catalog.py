@@ -0,0 +1,68 @@
+"""
+Unit tests for the compiled i18n message catalog
+"""
+
+import pytest
+
+from i18n.catalog import CompiledMessage, MessageCatalog
+from i18n.i18n import I18nManager, i18n
+
+
+class TestCompiledMessage:
+    @pytest.mark.parametrize("template, kwargs", [
+        ("Plain text", {}),
+        ("Escaped {{braces}}", {"unused": 1}),
+        ("Hello, {name}! You have {credits} credits", {"name": "Ann", "credits": 3}),
+        ("{calories:.0f} kcal, {ratio:.1%}", {"calories": 512.4, "ratio": 0.25}),
+        ("{user[name]} / {value!r}", {"user": {"name": "Bob"}, "value": "x"}),
+    ])
+    def test_render_matches_str_format(self, template, kwargs):
+        assert CompiledMessage("key", "en", template).render(kwargs) == template.format(**kwargs)
+
+    def test_missing_parameter_raises_key_error(self):
+        with pytest.raises(KeyError):
+            CompiledMessage("key", "en", "Hi {name}").render({})
+
+    def test_non_string_values_are_returned_as_is(self):
+        headers = ["One", "Two"]
+        assert CompiledMessage("headers", "en", headers).render({}) is headers
+
+
+class TestMessageCatalog:
+    def test_missing_keys_reported_and_filled_from_fallback(self):
+        catalog = MessageCatalog({
+            "en": {"hello": "Hello", "bye": "Bye"},
+            "ru": {"hello": "Привет", "only_ru": "Только"},
+        }, fallback_language="en")
+
+        assert catalog.missing == {"en": ["only_ru"], "ru": ["bye"]}
+        assert catalog.lookup("bye", "ru").render({}) == "Bye"
+        assert catalog.lookup("only_ru", "en") is None
+        assert catalog.lookup("hello", "de") is None
+
+
+class TestManager:
+    def test_get_text_keeps_fallbacks(self):
+        assert i18n.get_text("favorites_title", "ru") == i18n.translations["ru"]["favorites_title"]
+        assert i18n.get_text("favorites_title", "de") == i18n.translations["en"]["favorites_title"]
+        assert i18n.get_text("no_such_key", "en") == "[Missing translation: no_such_key]"
+
+    def test_missing_format_parameter_returns_raw_text(self):
+        raw = i18n.translations["en"]["language_changed"]
+        assert i18n.get_text("language_changed", "en") == raw
+
+    def test_every_translation_renders_like_str_format(self):
+        for language, table in i18n.translations.items():
+            for key, value in table.items():
+                if isinstance(value, str) and "{" not in value:
+                    assert i18n.get_text(key, language) == value.format()
+
+    def test_resolve_language_prefers_remembered_language(self):
+        manager = I18nManager()
+        assert manager.resolve_language(7, "uk") == "ru"
+        assert manager.resolve_language(7, "de") == "en"
+
+        manager.remember_language(7, "ru")
+
+        assert manager.resolve_language(7, "de") == "ru"
+        assert manager.resolve_language(None, None) == "en"
@@ -0,0 +1,275 @@
+"""
+Unit tests for the durable job queue: retries, dead-lettering, crash redelivery
+and the idempotent post-analysis job.
+
+Runs against fakeredis when it is installed, otherwise against a small
+in-memory stand-in with the commands the queue uses.
+"""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from common.db import client as db_client
+from common.jobs import queue as job_queue
+from common.jobs.queue import JobContext, JobQueue, JobWorker, retry_delay
+
+# The calories manager wires the Supabase client at import time; nothing is requested from it here
+_supabase = db_client.supabase
+try:
+    db_client.supabase = MagicMock()
+    from common.jobs import post_analysis
+finally:
+    db_client.supabase = _supabase
+
+
+class FakeAsyncRedis:
+    """Strings, hashes, lists and sorted sets; enough for the job queue."""
+
+    def __init__(self):
+        self.strings, self.hashes, self.lists, self.zsets = {}, {}, {}, {}
+
+    async def get(self, key):
+        return self.strings.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return False
+        self.strings[key] = value
+        return True
+
+    async def hsetnx(self, key, field, value):
+        table = self.hashes.setdefault(key, {})
+        if field in table:
+            return 0
+        table[field] = value
+        return 1
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def hdel(self, key, field):
+        return int(self.hashes.get(key, {}).pop(field, None) is not None)
+
+    async def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    async def lmove(self, source, destination, src="RIGHT", dest="LEFT"):
+        items = self.lists.get(source)
+        if not items:
+            return None
+        value = items.pop() if src == "RIGHT" else items.pop(0)
+        self.lists.setdefault(destination, []).insert(0 if dest == "LEFT" else len(self.lists[destination]), value)
+        return value
+
+    async def lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        if value in items:
+            items.remove(value)
+            return 1
+        return 0
+
+    async def lrange(self, key, start, end):
+        items = self.lists.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    async def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zrem(self, key, member):
+        return int(self.zsets.get(key, {}).pop(member, None) is not None)
+
+    async def zrangebyscore(self, key, low, high):
+        return sorted((m for m, score in self.zsets.get(key, {}).items() if score <= high),
+                      key=lambda m: self.zsets[key][m])
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+
+@pytest.fixture
+def redis():
+    try:
+        import fakeredis
+        return fakeredis.aioredis.FakeRedis(decode_responses=True)
+    except ImportError:
+        return FakeAsyncRedis()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def queue(redis, clock):
+    return JobQueue(redis, "test", visibility_seconds=30, clock=clock)
+
+
+class TestQueue:
+    @pytest.mark.asyncio
+    async def test_enqueue_claim_ack(self, queue):
+        runs = []
+
+        async def handler(ctx):
+            runs.append(ctx.job.payload["n"])
+
+        await queue.enqueue("count", {"n": 1})
+        await queue.enqueue("count", {"n": 2})
+        worker = JobWorker(queue, {"count": handler}, batch_size=10)
+
+        assert await worker.run_once() == 2
+        assert sorted(runs) == [1, 2]
+        assert await queue.stats() == {"ready": 0, "processing": 0, "delayed": 0, "dead": 0}
+
+    @pytest.mark.asyncio
+    async def test_same_job_id_is_enqueued_and_run_once(self, queue):
+        handler = AsyncMock()
+        worker = JobWorker(queue, {"count": handler})
+
+        await queue.enqueue("count", {}, job_id="job-1")
+        await queue.enqueue("count", {}, job_id="job-1")
+        await worker.run_once()
+        await queue.enqueue("count", {}, job_id="job-1")
+        await worker.run_once()
+
+        handler.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_failures_retry_with_backoff_then_dead_letter(self, queue, clock):
+        handler = AsyncMock(side_effect=RuntimeError("db down"))
+        worker = JobWorker(queue, {"flaky": handler})
+        await queue.enqueue("flaky", {}, max_attempts=3)
+
+        await worker.run_once()
+        assert (await queue.stats())["delayed"] == 1
+        await worker.run_once()
+        assert handler.await_count == 1  # not due yet
+
+        clock.now += retry_delay(1)
+        await worker.run_once()
+        clock.now += retry_delay(2)
+        await worker.run_once()
+
+        assert handler.await_count == 3
+        dead = await queue.dead_jobs()
+        assert [job.last_error for job in dead] == ["db down"]
+        assert (await queue.stats())["delayed"] == 0
+
+    @pytest.mark.asyncio
+    async def test_unknown_job_type_is_dead_lettered(self, queue):
+        await queue.enqueue("nobody", {})
+        await JobWorker(queue, {}).run_once()
+        assert len(await queue.dead_jobs()) == 1
+
+    @pytest.mark.asyncio
+    async def test_crashed_worker_job_is_redelivered_after_lease(self, queue, clock):
+        await queue.enqueue("count", {"n": 1})
+        # A worker claims the job and dies without acking
+        claimed = await queue.claim()
+        assert len(claimed) == 1
+
+        handler = AsyncMock()
+        worker = JobWorker(queue, {"count": handler})
+        await worker.run_once()
+        handler.assert_not_awaited()
+
+        clock.now += 31
+        await worker.run_once()
+        handler.assert_awaited_once()
+        assert handler.await_args.args[0].job.attempts == 2
+
+    @pytest.mark.asyncio
+    async def test_finished_steps_are_not_repeated_on_redelivery(self, queue, clock):
+        effects = []
+
+        async def handler(ctx):
+            await ctx.step("charge", AsyncMock(side_effect=lambda: effects.append("charge")))
+            if ctx.job.attempts == 1:
+                raise RuntimeError("crashed after charging")
+            await ctx.step("write", AsyncMock(side_effect=lambda: effects.append("write")))
+
+        worker = JobWorker(queue, {"paid": handler})
+        await queue.enqueue("paid", {})
+        await worker.run_once()
+        clock.now += retry_delay(1)
+        await worker.run_once()
+
+        assert effects == ["charge", "write"]
+
+
+class TestPostAnalysis:
+    ANALYSIS = {"analysis": {"total_nutrition": {"calories": 80, "proteins": 1, "fats": 0, "carbohydrates": 20}}}
+
+    @pytest.mark.asyncio
+    async def test_redelivered_analysis_charges_once(self, queue, clock):
+        decrement = AsyncMock(return_value={"credits_remaining": 4})
+        add_calories = MagicMock(return_value=True)
+        log = AsyncMock(side_effect=[False, True])
+        with patch.object(job_queue, "JOB_QUEUE_ENABLED", True), \
+                patch.object(job_queue, "get_async_redis", AsyncMock(return_value=queue.redis)), \
+                patch.object(job_queue, "JobQueue", lambda redis, name: queue), \
+                patch.object(post_analysis, "decrement_credits", decrement), \
+                patch.object(post_analysis, "add_calories_from_analysis", add_calories), \
+                patch.object(post_analysis, "log_food_analysis", log):
+            queued = await post_analysis.enqueue_post_analysis("user-1", 42, self.ANALYSIS, analysis_id="a1")
+            worker = JobWorker(queue)
+            await worker.run_once()
+            clock.now += retry_delay(1)
+            await worker.run_once()
+
+        assert queued is True
+        decrement.assert_awaited_once_with(42)
+        add_calories.assert_called_once_with("user-1", self.ANALYSIS, None, log_analysis=False)
+        assert log.await_count == 2
+        assert await queue.stats() == {"ready": 0, "processing": 0, "delayed": 0, "dead": 0}
+
+    @pytest.mark.asyncio
+    async def test_same_analysis_queued_twice_charges_once(self, queue, clock):
+        decrement = AsyncMock(return_value={"credits_remaining": 4})
+        with patch.object(job_queue, "JOB_QUEUE_ENABLED", True), \
+                patch.object(job_queue, "get_async_redis", AsyncMock(return_value=queue.redis)), \
+                patch.object(job_queue, "JobQueue", lambda redis, name: queue), \
+                patch.object(post_analysis, "decrement_credits", decrement), \
+                patch.object(post_analysis, "add_calories_from_analysis", MagicMock(return_value=True)), \
+                patch.object(post_analysis, "log_food_analysis", AsyncMock(return_value=True)):
+            worker = JobWorker(queue)
+            await post_analysis.enqueue_post_analysis("user-1", 42, self.ANALYSIS, analysis_id="analysis:user-1:abc")
+            await worker.run_once()
+            await post_analysis.enqueue_post_analysis("user-1", 42, self.ANALYSIS, analysis_id="analysis:user-1:abc")
+            await worker.run_once()
+
+        decrement.assert_awaited_once_with(42)
+
+    @pytest.mark.asyncio
+    async def test_without_queue_runs_inline(self):
+        decrement = AsyncMock(return_value={"credits_remaining": 4})
+        with patch.object(job_queue, "JOB_QUEUE_ENABLED", False), \
+                patch.object(post_analysis, "decrement_credits", decrement), \
+                patch.object(post_analysis, "add_calories_from_analysis", MagicMock(return_value=True)), \
+                patch.object(post_analysis, "log_food_analysis", AsyncMock(return_value=True)):
+            queued = await post_analysis.enqueue_post_analysis("user-1", 42, self.ANALYSIS, analysis_id="a1")
+
+        assert queued is False
+        decrement.assert_awaited_once_with(42)
+
+    @pytest.mark.asyncio
+    async def test_context_without_queue_runs_every_step(self):
+        fn = AsyncMock()
+        ctx = JobContext(job_queue.Job(type="t", payload={}))
+        assert await ctx.step("a", fn) and await ctx.step("a", fn)
+        assert fn.await_count == 2
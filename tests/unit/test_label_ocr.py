@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Unit tests for services/ml/label_ocr.py - table detection and structured label parsing
+"""
+
+import pytest
+from PIL import Image, ImageDraw
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from services.ml.label_ocr import (
+    OcrWord,
+    detect_table_region,
+    group_rows,
+    parse_nutrition_rows,
+    parse_nutrition_text,
+    words_from_tesseract,
+)
+
+
+def row_words(y, *cells):
+    """cells: (text, left) pairs on one visual line"""
+    return [OcrWord(text=text, left=left, top=y, width=10 * len(text), height=20, confidence=90.0)
+            for text, left in cells]
+
+
+def ruled_label(size=(1200, 1600), box=(300, 700, 1000, 1300)):
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    draw.text((100, 100), "Brand name and marketing copy", fill="black")
+    left, top, right, bottom = box
+    for y in range(top, bottom + 1, 100):
+        draw.line([(left, y), (right, y)], fill="black", width=4)
+    for x in (left, left + 400, right):
+        draw.line([(x, top), (x, bottom)], fill="black", width=4)
+    return img
+
+
+class TestDetectTableRegion:
+    def test_finds_ruled_table(self):
+        region = detect_table_region(ruled_label())
+
+        assert region is not None
+        left, top, right, bottom = region
+        assert 250 <= left <= 310 and 650 <= top <= 710
+        assert 990 <= right <= 1060 and 1290 <= bottom <= 1350
+
+    def test_plain_photo_has_no_region(self):
+        img = Image.new("RGB", (800, 600), "white")
+        ImageDraw.Draw(img).text((50, 50), "Protein 10 g", fill="black")
+
+        assert detect_table_region(img) is None
+
+
+class TestStructuredParsing:
+    def test_rows_are_grouped_and_ordered(self):
+        words = row_words(103, ("10", 300), ("Protein", 10)) + row_words(100, ("g", 340)) + row_words(140, ("Fat", 10))
+
+        rows = group_rows(words)
+
+        assert [row.text for row in rows] == ["Protein 10 g", "Fat"]
+
+    def test_prefers_per_100g_column(self):
+        rows = group_rows(
+            row_words(0, ("Nutrition", 10), ("per", 300), ("100g", 340), ("per", 500), ("serving", 540), ("30g", 620))
+            + row_words(40, ("Energy", 10), ("250", 330), ("kcal", 370), ("75", 540), ("kcal", 570))
+            + row_words(80, ("Protein", 10), ("12.5", 330), ("3.8", 540))
+            + row_words(120, ("Fat", 10), ("8", 330), ("2.4", 540))
+            + row_words(160, ("Carbohydrates", 10), ("31", 330), ("9.3", 540))
+        )
+
+        values = parse_nutrition_rows(rows)
+
+        assert (values.kcal, values.protein, values.fat, values.carbs) == (250.0, 12.5, 8.0, 31.0)
+        assert values.basis == "per_100g"
+
+    def test_serving_only_label(self):
+        rows = group_rows(
+            row_words(0, ("Порция", 300), ("30", 380), ("г", 410))
+            + row_words(40, ("Белки", 10), ("3,8", 330))
+        )
+
+        values = parse_nutrition_rows(rows)
+
+        assert values.protein == 3.8
+        assert (values.basis, values.serving_g) == ("per_serving", 30.0)
+
+    def test_energy_row_with_kj_and_kcal(self):
+        rows = group_rows(row_words(0, ("Энергетическая", 10), ("ценность", 160), ("1046", 300), ("кДж/250", 350), ("ккал", 430)))
+
+        values = parse_nutrition_rows(rows)
+
+        assert values.kj == 1046.0
+
+    def test_low_confidence_words_are_dropped(self):
+        data = {
+            "text": ["Fat", "", "7", "~"],
+            "conf": ["91", "-1", "88", "12"],
+            "left": [0, 0, 100, 150], "top": [5, 5, 5, 5], "width": [30, 0, 10, 5], "height": [20, 0, 20, 20],
+        }
+
+        words = words_from_tesseract(data, offset=(10, 20))
+
+        assert [(w.text, w.left, w.top) for w in words] == [("Fat", 10, 25), ("7", 110, 25)]
+
+
+class TestTextParser:
+    def test_flattened_text(self):
+        values = parse_nutrition_text("Пищевая ценность на 100 г: белки 3,2 г, жиры 2,5 г, углеводы 4,7 г; 52 ккал")
+
+        assert (values.protein, values.fat, values.carbs) == (3.2, 2.5, 4.7)
+
+    @pytest.mark.parametrize("text", ["", None])
+    def test_empty_text(self, text):
+        assert parse_nutrition_text(text) is None
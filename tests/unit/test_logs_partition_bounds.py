@@ -0,0 +1,115 @@
+"""
+Unit tests for time-bounded logs access (monthly partitioned logs table)
+"""
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from common.db import logs as db_logs
+from common.db import profiles as db_profiles
+from common.db.logs import log_day_bounds, log_window_bounds
+
+
+class RecordingQuery:
+    """Chainable stand-in for a PostgREST query that records its filters"""
+
+    def __init__(self, data=None):
+        self.filters = []
+        self.data = data or []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.filters.append((name, args))
+            return self
+        return method
+
+    def execute(self):
+        return SimpleNamespace(data=self.data, count=len(self.data))
+
+
+class TestBounds:
+    def test_window_bounds_cover_requested_days(self):
+        since, until = log_window_bounds(7, until=datetime(2025, 10, 20, 12, 0, 0))
+
+        assert since == "2025-10-13T12:00:00"
+        assert until == "2025-10-20T12:00:00"
+
+    def test_day_bounds_include_last_second_of_day(self):
+        assert log_day_bounds("2025-10-31") == ("2025-10-31T00:00:00", "2025-11-01T00:00:00")
+        assert log_day_bounds("2025-12-30", "2025-12-31") == ("2025-12-30T00:00:00", "2026-01-01T00:00:00")
+
+
+class TestBoundedQueries:
+    def test_daily_calories_query_has_both_bounds(self):
+        query = RecordingQuery(data=[{
+            "timestamp": "2025-10-20T23:59:30",
+            "kbzhu": {"calories": 500, "proteins": 20, "fats": 10, "carbohydrates": 60},
+        }])
+        client = MagicMock()
+        client.table.return_value = query
+
+        with patch.object(db_profiles, "supabase", client):
+            result = asyncio.run(db_profiles.get_daily_calories_consumed("user-1", "2025-10-20"))
+
+        assert ("gte", ("timestamp", "2025-10-20T00:00:00")) in query.filters
+        assert ("lt", ("timestamp", "2025-10-21T00:00:00")) in query.filters
+        assert result["total_calories"] == 500
+
+    def test_analysis_count_date_range_has_both_bounds(self):
+        query = RecordingQuery()
+        client = MagicMock()
+        client.table.return_value = query
+
+        with patch.object(db_logs, "supabase", client):
+            asyncio.run(db_logs.get_user_analysis_count("user-1", "2025-10-01", "2025-10-31"))
+
+        assert ("gte", ("timestamp", "2025-10-01T00:00:00")) in query.filters
+        assert ("lt", ("timestamp", "2025-11-01T00:00:00")) in query.filters
+
+
+class TestCleanupOldLogs:
+    def test_drops_partitions_through_rpc(self):
+        client = MagicMock()
+        client.rpc.return_value.execute.return_value = SimpleNamespace(data=[
+            {"partition_name": "logs_p2025_06", "estimated_rows": 1200},
+            {"partition_name": "logs_default", "estimated_rows": 3},
+        ])
+
+        with patch.object(db_logs, "supabase", client):
+            deleted = asyncio.run(db_logs.cleanup_old_logs(days_to_keep=90))
+
+        assert deleted == 1203
+        name, params = client.rpc.call_args.args
+        assert name == "drop_old_logs_partitions"
+        assert params["cutoff"].endswith("Z")
+        client.table.assert_not_called()
+
+    def test_falls_back_to_retention_delete_function(self):
+        client = MagicMock()
+        client.rpc.return_value.execute.side_effect = [
+            Exception("function drop_old_logs_partitions does not exist"),
+            SimpleNamespace(data=5),
+        ]
+
+        with patch.object(db_logs, "supabase", client):
+            deleted = asyncio.run(db_logs.cleanup_old_logs(days_to_keep=30))
+
+        assert deleted == 5
+        assert [call.args[0] for call in client.rpc.call_args_list] == ["drop_old_logs_partitions", "delete_old_logs"]
+        # The retention function keeps the nutrition rollups; a table DELETE would not
+        client.table.assert_not_called()
+
+    def test_falls_back_to_delete_without_partition_function(self):
+        query = RecordingQuery(data=[{"id": 1}, {"id": 2}])
+        client = MagicMock()
+        client.rpc.return_value.execute.side_effect = Exception("function drop_old_logs_partitions does not exist")
+        client.table.return_value = query
+
+        with patch.object(db_logs, "supabase", client):
+            deleted = asyncio.run(db_logs.cleanup_old_logs(days_to_keep=30))
+
+        assert deleted == 2
+        assert query.filters[0] == ("delete", ())
+        assert query.filters[1][0] == "lt"
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Unit tests for shared/metrics.py - Prometheus rendering, stage timing and trace propagation
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+import shared.auth.middleware as auth_middleware
+from shared.metrics import TRACE_HEADER, MetricsRegistry, get_trace_id, instrument_app, trace
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def registry(clock):
+    return MetricsRegistry(clock=clock)
+
+
+class TestRendering:
+    def test_counter_and_histogram_text_format(self, registry):
+        registry.counter("jobs_total", "Jobs", ("kind",)).inc(kind='a"b')
+        histogram = registry.histogram("latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, stage="x")
+        histogram.observe(0.5, stage="x")
+        histogram.observe(3, stage="x")
+
+        text = registry.render()
+
+        assert '# TYPE jobs_total counter\njobs_total{kind="a\\"b"} 1' in text
+        assert 'latency_seconds_bucket{stage="x",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{stage="x",le="1"} 2' in text
+        assert 'latency_seconds_bucket{stage="x",le="+Inf"} 3' in text
+        assert 'latency_seconds_sum{stage="x"} 3.55' in text
+        assert 'latency_seconds_count{stage="x"} 3' in text
+
+    def test_label_mismatch_is_rejected(self, registry):
+        counter = registry.counter("jobs_total", "Jobs", ("kind",))
+
+        with pytest.raises(ValueError):
+            counter.inc(other="x")
+        with pytest.raises(ValueError):
+            registry.histogram("jobs_total", "Jobs", ("kind",))
+
+
+class TestStage:
+    def test_stage_duration_uses_clock(self, registry, clock):
+        with registry.stage("api", "r2_upload"):
+            clock.advance(0.2)
+
+        histogram = registry.histogram("c0r_stage_duration_seconds", "", ("service", "stage"))
+        assert histogram.count(service="api", stage="r2_upload") == 1
+        assert histogram.sum(service="api", stage="r2_upload") == pytest.approx(0.2)
+
+    def test_failed_stage_is_counted_and_reraised(self, registry, clock):
+        with pytest.raises(RuntimeError):
+            with registry.stage("api", "llm_call"):
+                clock.advance(1.5)
+                raise RuntimeError("timeout")
+
+        errors = registry.counter("c0r_stage_errors_total", "", ("service", "stage"))
+        assert errors.value(service="api", stage="llm_call") == 1
+        assert "c0r_stage_duration_seconds_count" in registry.render()
+
+
+class TestTracing:
+    def test_trace_id_is_scoped(self):
+        assert get_trace_id() is None
+        with trace("abc") as trace_id:
+            assert trace_id == get_trace_id() == "abc"
+        assert get_trace_id() is None
+
+    def test_auth_headers_carry_trace_id(self, monkeypatch):
+        monkeypatch.setattr(auth_middleware, "INTERNAL_API_TOKEN", "x" * 32)
+
+        assert TRACE_HEADER not in auth_middleware.get_auth_headers()
+        with trace("trace-1"):
+            assert auth_middleware.get_auth_headers()[TRACE_HEADER] == "trace-1"
+
+
+class TestInstrumentedApp:
+    @pytest.fixture
+    def client(self, registry, clock):
+        app = FastAPI()
+        instrument_app(app, service="ml", registry=registry)
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: int):
+            clock.advance(0.3)
+            return {"item_id": item_id, "trace_id": get_trace_id()}
+
+        return TestClient(app)
+
+    def test_request_trace_id_is_used_and_echoed(self, client):
+        response = client.get("/items/1", headers={TRACE_HEADER: "from-api"})
+
+        assert response.json()["trace_id"] == "from-api"
+        assert response.headers[TRACE_HEADER] == "from-api"
+
+    def test_scrape_reports_route_templates(self, client):
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/missing")
+
+        text = client.get("/metrics").text
+
+        assert ('c0r_http_request_duration_seconds_count'
+                '{service="ml",method="GET",route="/items/{item_id}",status="200"} 2') in text
+        sum_line = next(line for line in text.splitlines()
+                        if line.startswith("c0r_http_request_duration_seconds_sum") and "item_id" in line)
+        assert float(sum_line.rsplit(" ", 1)[1]) == pytest.approx(0.6)
+        assert 'route="unmatched",status="404"' in text
+        assert 'route="/metrics"' not in text
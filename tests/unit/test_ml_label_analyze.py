@@ -38,3 +38,45 @@ def test_label_analyze_skeleton_ok(monkeypatch):
     assert data["language"] == "en"
     assert isinstance(data["barcodes"], list)
     assert data["ocr_text"] == ""
+
+
+def test_label_analyze_does_not_wait_for_ocr_after_provider_match(monkeypatch):
+    import asyncio
+    import sys
+    import time
+    from unittest import mock
+
+    # Some legacy unit modules replace common/i18n with mocks in sys.modules at collection
+    for name in [name for name, module in sys.modules.items() if isinstance(module, mock.MagicMock)]:
+        monkeypatch.delitem(sys.modules, name)
+    monkeypatch.setenv("INTERNAL_API_TOKEN", "z" * 40)
+    # The middleware reads the token once, at import
+    monkeypatch.setattr("shared.auth.middleware.INTERNAL_API_TOKEN", "z" * 40)
+    from services.ml import main as ml_main
+    reload(ml_main)
+
+    ocr = {}
+
+    async def detect(image_bytes):
+        return [ml_main.DetectedBarcode(type="EAN13", value="4600000000001")]
+
+    async def slow_ocr(image_bytes, lang):
+        await asyncio.sleep(5)
+        ocr["finished"] = True
+        return ml_main.LabelOcrResult(text="never used")
+
+    matched = {"analysis": {"provenance": {"source": "chestnyznak"}, "total_nutrition": {"calories": 60}}}
+    monkeypatch.setattr(ml_main, "_detect_barcodes", detect)
+    monkeypatch.setattr(ml_main, "_ocr_label", slow_ocr)
+    monkeypatch.setitem(ml_main._barcode_cache, "4600000000001", (time.monotonic(), matched))
+
+    client = TestClient(ml_main.app)
+    files = {"photo": ("test.png", make_image_bytes(), "image/png")}
+    started = time.monotonic()
+    resp = client.post("/api/v1/label/analyze", files=files, headers={"X-Internal-Token": "z" * 40})
+
+    assert resp.status_code == 200
+    assert time.monotonic() - started < 2
+    assert resp.json()["parsed_nutrition"]["analysis"]["provenance"]["source"] == "chestnyznak"
+    assert resp.json()["ocr_text"] == ""
+    assert "finished" not in ocr
@@ -0,0 +1,114 @@
+"""
+Unit tests for compiled prompt assembly: static prefixes are compiled once per
+(task, language, region, tier, season), stay byte-identical across users, and
+requests only fill the per-user suffix.
+"""
+
+import pytest
+
+from services.ml.core.models.config.sota_config import ModelTier, TaskType, get_model_config
+from services.ml.core.models.managers.model_manager import DEFAULT_REGIONAL_CONTEXT, ModelManager
+from services.ml.core.models.providers.base_provider import ModelResponse
+from services.ml.core.prompts.base.prompt_builder import PromptBuilder, RegionalContext, estimate_tokens
+
+ITALY = RegionalContext(
+    region_code="IT",
+    cuisine_types=["italian"],
+    common_products=["pasta", "tomatoes", "olive oil"],
+    cooking_methods=["boiling", "baking"],
+    food_culture_notes="Mediterranean",
+)
+
+
+@pytest.fixture
+def builder():
+    builder = PromptBuilder()
+    builder.precompile(regional_contexts=[DEFAULT_REGIONAL_CONTEXT])
+    return builder
+
+
+class TestCompiledPrefix:
+    def test_prefix_is_byte_stable_across_users(self, builder):
+        prompts = [
+            builder.assemble_food_analysis("ru", DEFAULT_REGIONAL_CONTEXT, {"analysis_count": count})
+            for count in (0, 5, 40, 500)
+        ]
+
+        assert len({prompt.compiled.prefix for prompt in prompts}) == 1
+        assert len({prompt.compiled.prefix_hash for prompt in prompts}) == 1
+        assert all(prompt.text.startswith(prompt.compiled.prefix) for prompt in prompts)
+        assert all("ПЕРСОНАЛЬНОЕ ОБРАЩЕНИЕ" in prompt.suffix for prompt in prompts)
+        # Nothing was compiled at request time
+        assert builder.cache_misses == len(builder.prompt_cache)
+
+    def test_user_context_only_in_suffix(self, builder):
+        profile = {"allergies": ["nuts"], "goal": "lose_weight", "cooking_level": "advanced"}
+        personal = builder.assemble_recipe_generation("en", DEFAULT_REGIONAL_CONTEXT, profile)
+        anonymous = builder.assemble_recipe_generation("en", DEFAULT_REGIONAL_CONTEXT, {})
+
+        assert personal.compiled is anonymous.compiled
+        assert "Allergies (avoid): nuts" in personal.suffix
+        assert "nuts" not in personal.compiled.prefix
+        assert "No specific requirements" in anonymous.suffix
+
+    def test_keys_separate_language_region_and_tier(self, builder):
+        ru = builder.compile(TaskType.FOOD_ANALYSIS, "ru", DEFAULT_REGIONAL_CONTEXT, ModelTier.SOTA)
+        en = builder.compile(TaskType.FOOD_ANALYSIS, "en", DEFAULT_REGIONAL_CONTEXT, ModelTier.SOTA)
+        budget = builder.compile(TaskType.FOOD_ANALYSIS, "en", DEFAULT_REGIONAL_CONTEXT, ModelTier.BUDGET)
+        italy = builder.compile(TaskType.FOOD_ANALYSIS, "en", ITALY, ModelTier.SOTA)
+        # Unsupported languages share the English skeleton
+        fallback = builder.compile(TaskType.FOOD_ANALYSIS, "de", DEFAULT_REGIONAL_CONTEXT, ModelTier.SOTA)
+
+        assert ru.prefix != en.prefix
+        assert "italian cuisine" in italy.prefix and italy.prefix != en.prefix
+        assert budget.max_output_tokens == get_model_config(TaskType.FOOD_ANALYSIS, ModelTier.BUDGET).max_tokens
+        assert fallback is en
+
+
+class TestTokenEstimates:
+    def test_cyrillic_costs_more_than_ascii(self):
+        assert estimate_tokens("a" * 400) == 100
+        assert estimate_tokens("б" * 400) == 200
+
+    def test_estimates_add_up(self, builder):
+        prompt = builder.assemble_food_analysis("en", DEFAULT_REGIONAL_CONTEXT, {})
+        estimate = prompt.token_estimate()
+
+        assert estimate["prompt_tokens"] == estimate["prefix_tokens"] + estimate["suffix_tokens"]
+        assert estimate["prefix_tokens"] == estimate_tokens(prompt.compiled.prefix)
+        assert estimate["prefix_tokens"] > 10 * estimate["suffix_tokens"]
+
+
+class RecordingProvider:
+    def __init__(self):
+        self.prompts = []
+
+    async def generate_with_retry(self, prompt, image_data=None, system_prompt=None, **kwargs):
+        self.prompts.append(prompt)
+        return ModelResponse(content="{}", model_used="stub", provider="stub", tokens_used=1,
+                             cost=0.0, response_time=0.0, success=True)
+
+
+class TestModelManager:
+    @pytest.mark.asyncio
+    async def test_requests_reuse_the_shared_builder(self):
+        manager = ModelManager()
+        provider = RecordingProvider()
+        manager.providers = {
+            "food_analysis_sota_openai": provider,
+            "recipe_generation_sota_openai": provider,
+        }
+        compiled_at_startup = len(manager.prompt_builder.prompt_cache)
+
+        first = await manager.generate_food_analysis(b"img", "ru", None, {"analysis_count": 1}, tier=ModelTier.SOTA)
+        second = await manager.generate_food_analysis(b"img", "ru", {"region_code": "RU"}, {}, tier=ModelTier.SOTA)
+        recipes = await manager.generate_triple_recipes(b"img", "en", {"goal": "gain_weight"}, None, tier=ModelTier.SOTA)
+
+        assert first.success and second.success and recipes.success
+        prefix = manager.prompt_builder.compile(
+            TaskType.FOOD_ANALYSIS, "ru", DEFAULT_REGIONAL_CONTEXT, ModelTier.SOTA
+        ).prefix
+        assert provider.prompts[0].startswith(prefix) and provider.prompts[1].startswith(prefix)
+        assert "Goal: weight gain" in provider.prompts[2]
+        assert len(manager.prompt_builder.prompt_cache) == compiled_at_startup
+        assert ModelManager().prompt_builder is manager.prompt_builder
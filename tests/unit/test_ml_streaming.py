@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Unit tests for streaming LLM responses: services/ml/streaming.py and the bot-side
+SSE reader / progressive message editor in services/api/bot/utils/ml_stream.py
+"""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from common.db import client as db_client
+from services.api.bot.utils.ml_stream import MLStreamError, ProgressiveMessage, iter_sse_events
+from services.ml.core.providers import llm_factory as llm_factory_module
+from services.ml.core.providers.tier_router import ModelTierRouter, profile_for_images
+from services.ml.streaming import (
+    food_analysis_fields,
+    format_sse,
+    parse_partial_json,
+    recipe_fields,
+    stream_json_events,
+)
+
+# The handler module wires the Supabase client at import time; nothing is requested from it here
+_supabase = db_client.supabase
+if _supabase is None:
+    db_client.supabase = MagicMock()
+try:
+    from services.api.bot.handlers import photo
+finally:
+    db_client.supabase = _supabase
+
+ANALYSIS = {
+    "analysis": {
+        "regional_analysis": {"detected_cuisine_type": "Russian", "dish_identification": "Борщ со сметаной"},
+        "food_items": [
+            {"name": "Борщ", "weight_grams": 300, "calories": 150},
+            {"name": "Сметана", "weight_grams": 20, "calories": 40},
+        ],
+        "total_nutrition": {"calories": 190, "proteins": 6, "fats": 9, "carbohydrates": 18},
+        "motivation_message": "Отличный выбор!",
+    }
+}
+
+
+async def chunks(text, size=7):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+async def collect(aiter):
+    return [item async for item in aiter]
+
+
+def parse_sse(raw_events):
+    events = []
+    for raw in raw_events:
+        lines = raw.strip().split("\n")
+        events.append((lines[0][len("event: "):], json.loads(lines[1][len("data: "):])))
+    return events
+
+
+class TestParsePartialJson:
+    def test_values_are_never_truncated(self):
+        text = '{"name": "Овсянка", "weight": 25'
+        assert parse_partial_json(text) == {"name": "Овсянка"}
+        assert parse_partial_json('{"name": "Овся') == {}
+
+    def test_nested_containers_are_closed(self):
+        text = '```json\n{"a": {"b": [1, 2, {"c": "x"}, {"d"'
+        assert parse_partial_json(text) == {"a": {"b": [1, 2, {"c": "x"}, {}]}}
+
+    def test_escaped_quotes_and_brackets_inside_strings(self):
+        text = '{"q": "say \\"hi\\" [not a list]", "n": 1}'
+        assert parse_partial_json(text) == {"q": 'say "hi" [not a list]', "n": 1}
+
+    def test_no_json_yet(self):
+        assert parse_partial_json("Sure, here is") is None
+
+
+class TestFieldExtraction:
+    def test_last_list_item_waits_until_settled(self):
+        text = json.dumps(ANALYSIS, ensure_ascii=False)
+        partial = parse_partial_json(text[:text.index('"calories": 40')])
+        fields = food_analysis_fields(partial)
+
+        assert fields["dish_name"] == "Борщ со сметаной"
+        assert [item["name"] for item in fields.get("food_items", [])] == ["Борщ"]
+        assert "total_nutrition" not in fields
+
+    def test_final_fields(self):
+        fields = food_analysis_fields(ANALYSIS, final=True)
+
+        assert len(fields["food_items"]) == 2
+        assert fields["total_nutrition"]["calories"] == 190
+
+    def test_recipe_fields(self):
+        partial = {"name": "Омлет", "ingredients": ["Яйца", "Моло"]}
+        assert recipe_fields(partial) == {"name": "Омлет", "ingredients": ["Яйца"]}
+
+
+class TestStreamJsonEvents:
+    @pytest.mark.asyncio
+    async def test_partial_events_then_result(self):
+        text = "```json\n" + json.dumps(ANALYSIS, ensure_ascii=False) + "\n```"
+        events = parse_sse(await collect(
+            stream_json_events(chunks(text), food_analysis_fields, lambda content: {"done": len(content)})
+        ))
+
+        kinds = [kind for kind, _ in events]
+        assert kinds[-1] == "result" and kinds.count("result") == 1
+        partial_keys = [key for kind, data in events if kind == "partial" for key in data]
+        assert partial_keys[0] == "dish_name"
+        assert {"food_items", "total_nutrition"} <= set(partial_keys)
+        assert events[-1][1] == {"done": len(text)}
+
+    @pytest.mark.asyncio
+    async def test_provider_error_becomes_error_event(self):
+        async def broken():
+            yield '{"name": "x",'
+            raise RuntimeError("connection reset")
+
+        events = parse_sse(await collect(stream_json_events(broken(), recipe_fields, lambda c: {})))
+
+        assert events[-1][0] == "error"
+
+
+class TestRoutedStream:
+    @pytest.mark.asyncio
+    async def test_first_tier_is_streamed_through_the_router(self, monkeypatch):
+        text = json.dumps(ANALYSIS, ensure_ascii=False)
+        streamed_models = []
+
+        def fake_stream(image_bytes, user_language, use_premium_model=False, model=None):
+            streamed_models.append(model)
+            return chunks(text), lambda content: json.loads(content)
+
+        monkeypatch.setattr(llm_factory_module, "stream_food_analysis_with_openai", fake_stream)
+        blocking = AsyncMock(return_value=ANALYSIS)
+        factory = llm_factory_module.LLMProviderFactory()
+        factory.tier_router = ModelTierRouter({"openai": blocking})
+
+        events = parse_sse(await collect(factory.stream_analyze_food(b"", provider_override="openai")))
+
+        # The router picked the model, the answer was streamed and it was not asked again
+        assert streamed_models == [factory.tier_router.plan(profile_for_images([b""]))[0].config.name]
+        blocking.assert_not_called()
+        assert any(kind == "partial" for kind, _ in events)
+        assert events[-1][0] == "result"
+        assert events[-1][1]["analysis"]["routing"]["model"] == streamed_models[0]
+        assert events[-1][1]["analysis"]["llm_provider"] == "openai"
+
+
+class TestSseClient:
+    @pytest.mark.asyncio
+    async def test_reads_events_from_bytes_lines(self):
+        raw = format_sse("partial", {"dish_name": "Плов"}) + format_sse("result", {"ok": True})
+
+        async def lines():
+            for line in raw.splitlines(keepends=True):
+                yield line.encode("utf-8")
+
+        assert await collect(iter_sse_events(lines())) == [
+            ("partial", {"dish_name": "Плов"}),
+            ("result", {"ok": True}),
+        ]
+
+
+class TestProgressiveMessage:
+    @pytest.mark.asyncio
+    async def test_edits_are_rate_limited_and_deduplicated(self):
+        message = AsyncMock()
+        progress = ProgressiveMessage(message, min_interval=0.05)
+
+        assert await progress.update("one") is True
+        assert await progress.update("two") is False  # too soon
+        await asyncio.sleep(0.06)
+        assert await progress.update("two") is True
+        await asyncio.sleep(0.06)
+        assert await progress.update("two") is False  # unchanged
+
+        assert [call.args[0] for call in message.edit_text.await_args_list] == ["one", "two"]
+
+    @pytest.mark.asyncio
+    async def test_edit_errors_are_swallowed(self):
+        message = AsyncMock()
+        message.edit_text.side_effect = RuntimeError("boom")
+        progress = ProgressiveMessage(message, min_interval=0)
+
+        assert await progress.update("text") is False
+        assert progress.edits == 0
+
+
+class TestStreamFallback:
+    """The blocking endpoint is only used when the stream never started"""
+
+    @pytest.fixture(autouse=True)
+    def ml_url(self, monkeypatch):
+        monkeypatch.setattr(photo, "ML_SERVICE_URL", "http://ml:8001")
+
+    async def stream(self, handler):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await photo.stream_nutrition_analysis(client, {"photo": ("p.jpg", b"x", "image/jpeg")}, {}, {}, AsyncMock(), "en")
+
+    @pytest.mark.asyncio
+    async def test_unavailable_stream_falls_back(self):
+        assert await self.stream(lambda request: httpx.Response(404)) is None
+
+        def refuse(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        assert await self.stream(refuse) is None
+
+    @pytest.mark.asyncio
+    async def test_result_event(self):
+        body = format_sse("partial", {"dish_name": "Плов"}) + format_sse("result", ANALYSIS)
+
+        assert await self.stream(lambda request: httpx.Response(200, text=body)) == ANALYSIS
+
+    @pytest.mark.asyncio
+    async def test_failure_after_accept_is_not_retried(self):
+        error = format_sse("partial", {"dish_name": "Плов"}) + format_sse("error", {"error": "provider failed"})
+        with pytest.raises(MLStreamError):
+            await self.stream(lambda request: httpx.Response(200, text=error))
+
+        # Connection dropped before any event: the model call is already running
+        with pytest.raises(MLStreamError):
+            await self.stream(lambda request: httpx.Response(200, text=""))
@@ -0,0 +1,157 @@
+"""
+Unit tests for the cost- and complexity-aware model tier router
+
+Providers are offline stubs with configurable latency and accuracy, so the
+routing policy (cheapest adequate tier first, escalation on bad answers,
+adaptation from observed outcomes) is tested without any API calls.
+"""
+
+import asyncio
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from services.ml.core.models.config.sota_config import SOTA_MODEL_CONFIGS, ModelTier, TaskType
+from services.ml.core.providers.tier_router import (
+    ModelTierRouter,
+    RequestProfile,
+    estimate_complexity,
+    profile_for_images,
+    validate_analysis,
+)
+
+MODELS = {config.name: tier for tier, config in SOTA_MODEL_CONFIGS[TaskType.FOOD_ANALYSIS].items()}
+
+
+def _analysis(confidence=0.9, calories=420):
+    return {"analysis": {
+        "food_items": [{"name": "borscht", "weight_grams": 300, "calories": calories}],
+        "total_nutrition": {"calories": calories, "proteins": 15, "fats": 12, "carbohydrates": 50},
+        "regional_analysis": {"regional_match_confidence": confidence},
+    }}
+
+
+class StubProvider:
+    """Answers well with a per-model probability, after a per-model delay"""
+
+    def __init__(self, accuracy, latency=None, seed=7):
+        self.accuracy = accuracy
+        self.latency = latency or {}
+        self.random = random.Random(seed)
+        self.calls = []
+
+    async def __call__(self, image_bytes, user_language, model):
+        self.calls.append(model)
+        await asyncio.sleep(self.latency.get(model, 0))
+        if self.random.random() < self.accuracy[model]:
+            return _analysis(confidence=0.9)
+        return _analysis(confidence=0.2)
+
+
+def _jpeg(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class TestComplexity:
+    def test_profile_reads_image_size(self):
+        profile = profile_for_images([_jpeg(64, 48)])
+        assert profile.image_sizes == [(64, 48)]
+        assert profile.image_tiles == 1
+
+    def test_more_images_and_premium_users_raise_complexity(self):
+        one = RequestProfile(image_sizes=[(800, 600)])
+        three = RequestProfile(image_sizes=[(800, 600)] * 3)
+        premium = RequestProfile(image_sizes=[(800, 600)], user_tier="premium")
+        assert estimate_complexity(one) < estimate_complexity(three)
+        assert estimate_complexity(one) < estimate_complexity(premium)
+
+    def test_validation(self):
+        assert validate_analysis(_analysis()) is None
+        assert validate_analysis(_analysis(confidence=0.1)) == "low_confidence"
+        assert validate_analysis(_analysis(calories="n/a")) == "invalid_schema"
+        assert validate_analysis({"analysis": {"error": "boom"}}) == "invalid_schema"
+
+
+class TestRouting:
+    def test_tiers_without_provider_are_skipped(self):
+        router = ModelTierRouter({"openai": StubProvider({})})
+        assert all(candidate.config.provider == "openai" for candidate in router.candidates)
+        costs = [candidate.config.cost_per_1k_tokens for candidate in router.candidates]
+        assert costs == sorted(costs)
+
+    def test_simple_request_starts_on_cheapest_tier(self):
+        router = ModelTierRouter({"openai": StubProvider({})})
+        plan = router.plan(RequestProfile(image_sizes=[(512, 512)]))
+        assert plan[0].tier == ModelTier.PREMIUM
+        assert plan[-1].tier == ModelTier.SOTA
+
+    def test_premium_user_starts_on_top_tier(self):
+        router = ModelTierRouter({"openai": StubProvider({})})
+        plan = router.plan(RequestProfile(image_sizes=[(2048, 2048)] * 2, user_tier="premium"))
+        assert [candidate.tier for candidate in plan] == [ModelTier.SOTA]
+
+    def test_low_confidence_escalates(self):
+        provider = StubProvider({"gpt-4o-mini": 0.0, "gpt-4o": 1.0})
+        router = ModelTierRouter({"openai": provider})
+
+        result = asyncio.run(router.run(b"", "en", RequestProfile(image_sizes=[(512, 512)])))
+
+        routing = result["analysis"]["routing"]
+        assert provider.calls == ["gpt-4o-mini", "gpt-4o"]
+        assert routing["escalated"] is True
+        assert routing["model"] == "gpt-4o"
+        assert [attempt["outcome"] for attempt in routing["attempts"]] == ["low_confidence", "ok"]
+
+    def test_provider_error_escalates(self):
+        async def failing(image_bytes, user_language, model):
+            if model == "gpt-4o-mini":
+                raise RuntimeError("timeout")
+            return _analysis()
+
+        router = ModelTierRouter({"openai": failing})
+        result = asyncio.run(router.run(b"", "en", RequestProfile(image_sizes=[(512, 512)])))
+
+        assert result["analysis"]["routing"]["attempts"][0]["outcome"] == "error"
+        assert router.stats_snapshot()["premium:low"]["errors"] == 1
+
+    def test_first_runner_replaces_only_the_first_tier(self):
+        streamed = []
+
+        async def stream_first(image_bytes, user_language, model):
+            streamed.append(model)
+            return _analysis(confidence=0.2)
+
+        provider = StubProvider({"gpt-4o-mini": 1.0, "gpt-4o": 1.0})
+        router = ModelTierRouter({"openai": provider})
+        result = asyncio.run(router.run(b"", "en", RequestProfile(image_sizes=[(512, 512)]), first_runner=stream_first))
+
+        assert streamed == ["gpt-4o-mini"] and provider.calls == ["gpt-4o"]
+        assert result["analysis"]["routing"]["model"] == "gpt-4o"
+        assert router.stats_snapshot()["premium:low"]["escalations"] == 1
+
+    def test_cheaper_than_always_sota_and_adapts(self):
+        accuracy = {"gpt-4o-mini": 0.9, "gpt-4o": 0.99}
+        router = ModelTierRouter({"openai": StubProvider(accuracy, latency={"gpt-4o": 0.001})})
+        profile = RequestProfile(image_sizes=[(1024, 768)])
+
+        results = [asyncio.run(router.run(b"", "en", profile)) for _ in range(60)]
+
+        routed_cost = sum(r["analysis"]["routing"]["estimated_cost_usd"] for r in results)
+        sota_cost = 60 * profile.estimated_tokens() / 1000 * SOTA_MODEL_CONFIGS[TaskType.FOOD_ANALYSIS][ModelTier.SOTA].cost_per_1k_tokens
+        assert routed_cost < sota_cost / 3
+        assert all(validate_analysis(r) is None for r in results)
+
+        # A cheap tier that keeps failing loses its place for this complexity bucket
+        router = ModelTierRouter({"openai": StubProvider({"gpt-4o-mini": 0.3, "gpt-4o": 1.0})})
+        for _ in range(30):
+            asyncio.run(router.run(b"", "en", profile))
+        assert MODELS[router.plan(profile)[0].config.name] == ModelTier.SOTA
+        assert router.stats_snapshot()["premium:low"]["escalations"] > 0
+
+    def test_no_runnable_tier(self):
+        with pytest.raises(ValueError):
+            ModelTierRouter({"gemini": StubProvider({})})
@@ -0,0 +1,153 @@
+"""
+Unit tests for common/cache/insights_cache.py and the cached insights sections
+in the nutrition handler: one calculation pass per profile version and
+language, menu taps served from the cache, profile updates invalidate.
+"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from common.cache import insights_cache, redis_client
+from common.cache.tiered import invalidate_user
+from services.api.bot.handlers import nutrition as handler
+
+CALCULATORS = (
+    "calculate_bmi", "calculate_ideal_weight", "calculate_water_needs",
+    "calculate_macro_distribution", "calculate_metabolic_age", "calculate_meal_portions",
+)
+
+
+@pytest.fixture(autouse=True)
+def local_cache(monkeypatch):
+    # Redis unavailable: the in-process tier alone must serve repeated taps
+    monkeypatch.setattr(redis_client, "_client", redis_client._DummyAsyncRedis())
+    insights_cache.insights_cache.clear_local()
+    yield
+    insights_cache.insights_cache.clear_local()
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Invocation counts of the nutrition calculators used by the handler"""
+    counts = {name: 0 for name in CALCULATORS}
+    for name in CALCULATORS:
+        original = getattr(handler, name)
+
+        def counted(*args, _name=name, _original=original):
+            counts[_name] += 1
+            return _original(*args)
+
+        counted.__name__ = name
+        monkeypatch.setattr(handler, name, counted)
+    return counts
+
+
+@pytest.fixture
+def profile():
+    return {
+        "user_id": "u1",
+        "age": 30,
+        "gender": "male",
+        "weight_kg": 80.0,
+        "height_cm": 180.0,
+        "activity_level": "moderately_active",
+        "goal": "lose_weight",
+        "daily_calories_target": 2000,
+        "updated_at": "2025-10-25T10:00:00+00:00",
+    }
+
+
+USER = {"id": "u1", "language": "en", "credits_remaining": 7}
+
+
+class TestProfileVersion:
+    def test_digest_follows_the_profile_row(self, profile):
+        reordered = dict(reversed(list(profile.items())))
+
+        assert insights_cache.profile_version(profile) == insights_cache.profile_version(reordered)
+        assert insights_cache.profile_version(profile) != insights_cache.profile_version(
+            dict(profile, updated_at="2025-10-26T10:00:00+00:00")
+        )
+
+
+class TestRenderedSections:
+    @pytest.mark.asyncio
+    async def test_one_render_pass_computes_each_metric_once(self, calls, profile):
+        sections = await handler.render_insight_sections(profile, "en")
+
+        assert set(sections) == set(handler.INSIGHT_SECTIONS) | {"summary"}
+        # Sections and the summary share inputs for every calculator
+        assert all(count == 1 for count in calls.values()), calls
+
+    @pytest.mark.asyncio
+    async def test_repeated_taps_do_not_recompute(self, calls, profile):
+        first = await handler.get_insight_sections(profile, USER)
+        for _ in range(5):
+            assert await handler.get_insight_sections(profile, USER) == first
+        await handler.generate_nutrition_insights(profile, USER)
+
+        assert sum(calls.values()) == len(CALCULATORS)
+
+    @pytest.mark.asyncio
+    async def test_each_language_is_rendered_once(self, calls, profile):
+        english = await handler.get_insight_sections(profile, USER)
+        russian = await handler.get_insight_sections(profile, dict(USER, language="ru"))
+        await handler.get_insight_sections(profile, dict(USER, language="ru"))
+
+        assert english["summary"] != russian["summary"]
+        assert calls["calculate_bmi"] == 2
+
+    @pytest.mark.asyncio
+    async def test_profile_update_renders_again(self, calls, profile):
+        await handler.get_insight_sections(profile, USER)
+        updated = dict(profile, weight_kg=75.0, updated_at="2025-10-26T10:00:00+00:00")
+
+        sections = await handler.get_insight_sections(updated, USER)
+
+        assert calls["calculate_bmi"] == 2
+        assert "23.1" in sections["bmi"]
+
+    @pytest.mark.asyncio
+    async def test_user_invalidation_drops_rendered_sections(self, calls, profile):
+        await handler.get_insight_sections(profile, USER)
+        await invalidate_user("u1")
+        await handler.get_insight_sections(profile, USER)
+
+        assert calls["calculate_bmi"] == 2
+
+    @pytest.mark.asyncio
+    async def test_footer_is_live(self, profile):
+        await handler.generate_nutrition_insights(profile, USER)
+        text = await handler.generate_nutrition_insights(profile, dict(USER, credits_remaining=3))
+
+        assert "3" in text.splitlines()[-1]
+        assert text.count("**") % 2 == 0
+
+
+class TestSectionCallback:
+    @pytest.mark.asyncio
+    async def test_sections_are_served_from_the_cache(self, calls, profile):
+        user_data = {"user": USER, "profile": profile, "has_profile": True}
+        answers = []
+
+        async def answer(text, **kwargs):
+            answers.append(text)
+
+        for section in ("bmi", "water_needs", "bmi", "goal_advice"):
+            callback = SimpleNamespace(
+                data=f"nutrition_section_{section}",
+                from_user=SimpleNamespace(id=1),
+                answer=AsyncMock(),
+                message=SimpleNamespace(answer=answer),
+            )
+            with patch.object(handler, "get_user_with_profile", AsyncMock(return_value=user_data)):
+                await handler.handle_nutrition_section_callback(callback)
+
+        assert len(answers) == 4 and answers[0] == answers[2]
+        assert sum(calls.values()) == len(CALCULATORS)
@@ -0,0 +1,155 @@
+"""
+Unit tests for weekly nutrition rollups: report figures from a rollup row and
+the weekly report rendered from them (rollup maintenance itself is covered
+against Postgres in tests/integration/test_nutrition_rollups_postgres.py)
+"""
+
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from common.db import nutrition_rollups
+from common.db.nutrition_rollups import summarize_weekly_rollup, week_start
+from services.api.bot.handlers import nutrition as handler
+
+# Thursday
+TODAY = date(2025, 10, 23)
+
+
+def _rollup(**overrides):
+    rollup = {
+        "week_start": "2025-10-20",
+        "meals_count": 8,
+        "days_logged": 3,
+        "calories": 5700.0,
+        "proteins": 300.0,
+        "fats": 180.0,
+        "carbohydrates": 660.0,
+        "calorie_target": 2000,
+        "days_on_target": 2,
+        "longest_streak": 3,
+        "streak_days": 3,
+        "last_logged_day": "2025-10-22",
+    }
+    rollup.update(overrides)
+    return rollup
+
+
+class RollupQuery:
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.filters.append((name, args))
+            return self
+        return method
+
+    def execute(self):
+        return SimpleNamespace(data=self.rows)
+
+
+class TestSummary:
+    def test_week_start_is_monday(self):
+        assert week_start(TODAY) == date(2025, 10, 20)
+        assert week_start(date(2025, 10, 20)) == date(2025, 10, 20)
+        assert week_start(date(2025, 10, 26)) == date(2025, 10, 20)
+
+    def test_figures_from_one_row(self):
+        summary = summarize_weekly_rollup(_rollup(), today=TODAY)
+
+        assert summary["week_start"] == date(2025, 10, 20)
+        assert summary["elapsed_days"] == 4
+        assert (summary["avg_calories"], summary["avg_proteins"], summary["avg_carbohydrates"]) == (1900, 100, 220)
+        assert summary["goal_progress_percent"] == 67
+        # 60% * 3/4 logged + 40% * 2/3 on target
+        assert summary["consistency_score"] == 72
+        assert summary["current_streak"] == 3
+
+    def test_without_target_only_logging_counts(self):
+        summary = summarize_weekly_rollup(_rollup(calorie_target=None, days_on_target=0), today=TODAY)
+
+        assert summary["goal_progress_percent"] is None
+        assert summary["consistency_score"] == 75
+
+    def test_past_week_and_broken_streak(self):
+        summary = summarize_weekly_rollup(
+            _rollup(week_start="2025-10-13", days_logged=7, days_on_target=7, last_logged_day="2025-10-19"),
+            today=TODAY,
+        )
+
+        assert summary["elapsed_days"] == 7
+        assert summary["consistency_score"] == 100
+        assert summary["current_streak"] == 0
+
+    def test_empty_week(self):
+        summary = summarize_weekly_rollup(None, today=TODAY)
+
+        assert summary["week_start"] == date(2025, 10, 20)
+        assert summary["meals_count"] == 0
+        assert summary["avg_calories"] is None and summary["consistency_score"] is None
+
+
+class TestWeeklyReport:
+    def test_renders_real_numbers(self):
+        text = handler.render_weekly_report(summarize_weekly_rollup(_rollup(), today=TODAY), "en")
+
+        assert "Oct 20, 2025" in text
+        assert "1900 kcal/day" in text
+        assert "P 100g · F 60g · C 220g" in text
+        assert "2/3 days on target (67%)" in text
+        assert "72/100" in text
+        assert "3 days in a row" in text
+        assert "Start analyzing your meals" not in text
+
+    def test_empty_week_keeps_placeholders(self):
+        text = handler.render_weekly_report(summarize_weekly_rollup(None, today=TODAY), "ru")
+
+        assert "Пока недостаточно данных" in text
+        assert "N/A" in text
+        assert "ккал/день" not in text
+
+    @pytest.mark.asyncio
+    async def test_reads_one_range_of_rollup_rows(self):
+        query = RollupQuery([_rollup(week_start="2025-10-13", meals_count=20, days_logged=6)])
+        client = SimpleNamespace(tables=[])
+        client.table = lambda name: client.tables.append(name) or query
+
+        with patch.object(nutrition_rollups, "supabase", client):
+            rollups = await nutrition_rollups.get_weekly_rollups("user-1", today=TODAY)
+
+        assert client.tables == ["user_weekly_nutrition_rollups"]
+        assert ("gte", ("week_start", "2025-10-13")) in query.filters
+        assert ("lte", ("week_start", "2025-10-20")) in query.filters
+        assert rollups["current"] is None and rollups["previous"]["meals_count"] == 20
+
+    @pytest.mark.asyncio
+    async def test_previous_week_is_shown_until_current_has_meals(self):
+        previous = _rollup(week_start="2025-10-13", meals_count=20, days_logged=6)
+
+        async def rollups(user_id):
+            return {"current": None, "previous": previous}
+
+        with patch.object(handler, "get_weekly_rollups", rollups):
+            text = await handler.build_weekly_report("user-1", "en")
+
+        assert "Oct 13, 2025" in text
+        assert "Analyzed for You:** 20" in text
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_meal_count_without_rollups(self):
+        async def unavailable(user_id):
+            return None
+
+        async def meals_count(user_id):
+            return 5
+
+        with patch.object(handler, "get_weekly_rollups", unavailable), \
+                patch.object(handler, "get_weekly_meals_count", meals_count):
+            text = await handler.build_weekly_report("user-1", "en")
+
+        assert "Analyzed for You:** 5" in text
+        assert "Not enough data" in text
@@ -0,0 +1,232 @@
+"""
+Unit tests for the async Stripe gateway against a local fake Stripe HTTP server:
+idempotent checkout creation, session caching, outcome-based health and an
+event loop that stays responsive while Stripe is slow.
+"""
+
+import asyncio
+import socket
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs
+
+import pytest
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from services.pay.stripe.client import StripeClient
+from services.pay.stripe.gateway import StripeGateway, checkout_idempotency_key
+
+
+class FakeStripe:
+    """Checkout sessions and payment methods endpoints with configurable latency and failures"""
+
+    def __init__(self):
+        self.latency = 0.0
+        self.fail_next = 0
+        self.requests = []
+        self.sessions = {}
+        self.idempotent = {}
+        self.app = Starlette(routes=[
+            Route("/v1/checkout/sessions", self.create_session, methods=["POST"]),
+            Route("/v1/checkout/sessions/{session_id}", self.get_session, methods=["GET"]),
+            Route("/v1/payment_methods", self.list_payment_methods, methods=["GET"]),
+        ])
+
+    async def _begin(self, request: Request):
+        self.requests.append((request.method, request.url.path))
+        await asyncio.sleep(self.latency)
+        if self.fail_next:
+            self.fail_next -= 1
+            return JSONResponse({"error": {"type": "api_error", "message": "Stripe is down"}}, status_code=500)
+        return None
+
+    async def create_session(self, request: Request):
+        failure = await self._begin(request)
+        if failure:
+            return failure
+        key = request.headers.get("idempotency-key")
+        if key in self.idempotent:
+            # Stripe replays the stored response, not the session's current state
+            return JSONResponse(self.idempotent[key], headers={"Idempotent-Replayed": "true"})
+        form = parse_qs((await request.body()).decode())
+        session = {
+            "id": f"cs_test_{uuid.uuid4().hex[:12]}",
+            "object": "checkout.session",
+            "url": "https://checkout.stripe.test/pay",
+            "status": "open",
+            "payment_status": "unpaid",
+            "amount_total": int(form["line_items[0][price_data][unit_amount]"][0]),
+            "currency": form["line_items[0][price_data][currency]"][0],
+            "metadata": {"user_id": form["metadata[user_id]"][0], "plan_id": form["metadata[plan_id]"][0]},
+            "customer_details": None,
+        }
+        self.sessions[session["id"]] = session
+        if key:
+            self.idempotent[key] = dict(session)
+        return JSONResponse(session)
+
+    async def get_session(self, request: Request):
+        failure = await self._begin(request)
+        if failure:
+            return failure
+        session = self.sessions.get(request.path_params["session_id"])
+        if session is None:
+            return JSONResponse({"error": {"type": "invalid_request_error", "message": "No such session"}}, status_code=404)
+        return JSONResponse(session)
+
+    async def list_payment_methods(self, request: Request):
+        failure = await self._begin(request)
+        if failure:
+            return failure
+        return JSONResponse({"object": "list", "url": "/v1/payment_methods", "has_more": False, "data": [
+            {"id": "pm_1", "object": "payment_method", "type": "card", "card": {"last4": "4242"}},
+        ]})
+
+
+@pytest.fixture(scope="module")
+def fake_stripe():
+    fake = FakeStripe()
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(fake.app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    fake.base_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    yield fake
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def gateway(fake_stripe):
+    fake_stripe.latency = 0.0
+    fake_stripe.fail_next = 0
+    fake_stripe.requests.clear()
+    return StripeGateway(api_key="sk_test_fake", api_base=fake_stripe.base_url, max_network_retries=0)
+
+
+class TestCheckout:
+    @pytest.mark.asyncio
+    async def test_repeated_checkout_returns_same_session(self, gateway, fake_stripe):
+        client = StripeClient(gateway=gateway)
+
+        first, second = await asyncio.gather(
+            client.create_checkout_session(user_id=42, plan_id="basic"),
+            client.create_checkout_session(user_id=42, plan_id="basic"),
+        )
+        third = await client.create_checkout_session(user_id=42, plan_id="basic")
+        other_plan = await client.create_checkout_session(user_id=42, plan_id="pro")
+        await gateway.close()
+
+        assert first["session_id"] == second["session_id"] == third["session_id"]
+        assert other_plan["session_id"] != first["session_id"]
+        assert first["checkout_url"] == "https://checkout.stripe.test/pay"
+        assert fake_stripe.requests.count(("POST", "/v1/checkout/sessions")) == 2
+
+    @pytest.mark.asyncio
+    async def test_paid_session_is_not_handed_out_again(self, gateway, fake_stripe):
+        client = StripeClient(gateway=gateway)
+        first = await client.create_checkout_session(user_id=42, plan_id="basic")
+        fake_stripe.sessions[first["session_id"]]["status"] = "complete"
+        gateway.invalidate_session(first["session_id"])
+
+        second = await client.create_checkout_session(user_id=42, plan_id="basic")
+        third = await client.create_checkout_session(user_id=42, plan_id="basic")
+
+        # A process without the stored result gets Stripe's replay of the paid session
+        fake_stripe.sessions[second["session_id"]]["status"] = "complete"
+        other_process = StripeGateway(api_key="sk_test_fake", api_base=fake_stripe.base_url, max_network_retries=0)
+        fourth = await StripeClient(gateway=other_process).create_checkout_session(user_id=42, plan_id="basic")
+        await gateway.close()
+        await other_process.close()
+
+        assert second["session_id"] != first["session_id"]
+        assert third["session_id"] == second["session_id"]
+        assert fourth["session_id"] not in (first["session_id"], second["session_id"])
+        assert fake_stripe.sessions[fourth["session_id"]]["status"] == "open"
+
+    def test_idempotency_key_windows(self):
+        params = {"mode": "payment", "success_url": "https://t.me/bot"}
+        key = checkout_idempotency_key(42, "basic", params, window_seconds=600, now=1200)
+        assert key == checkout_idempotency_key(42, "basic", dict(params), window_seconds=600, now=1799)
+        assert key != checkout_idempotency_key(42, "basic", params, window_seconds=600, now=1800)
+        assert key != checkout_idempotency_key(43, "basic", params, window_seconds=600, now=1200)
+        assert key != checkout_idempotency_key(42, "basic", {**params, "success_url": "x"}, window_seconds=600, now=1200)
+
+
+class TestSessionsAndHealth:
+    @pytest.mark.asyncio
+    async def test_retrieved_sessions_are_cached_briefly(self, gateway, fake_stripe):
+        client = StripeClient(gateway=gateway)
+        created = await client.create_checkout_session(user_id=7, plan_id="basic")
+
+        first = await client.retrieve_session(created["session_id"])
+        second = await client.retrieve_session(created["session_id"])
+        gateway.invalidate_session(created["session_id"])
+        await client.retrieve_session(created["session_id"])
+        methods = await client.list_payment_methods("cus_1")
+        await gateway.close()
+
+        assert first == second
+        assert first["payment_status"] == "unpaid"
+        assert fake_stripe.requests.count(("GET", f"/v1/checkout/sessions/{created['session_id']}")) == 1
+        assert [method["id"] for method in methods] == ["pm_1"]
+
+    @pytest.mark.asyncio
+    async def test_health_follows_recent_outcomes_without_probing(self, gateway, fake_stripe):
+        client = StripeClient(gateway=gateway)
+        assert client.health_check()["status"] == "unknown"
+        assert fake_stripe.requests == []
+
+        await client.list_payment_methods("cus_1")
+        assert client.health_check()["status"] == "healthy"
+
+        fake_stripe.fail_next = 2
+        assert await client.list_payment_methods("cus_1") == []
+        assert await client.list_payment_methods("cus_1") == []
+        await gateway.close()
+
+        health = client.health_check()
+        assert health["status"] == "error"
+        assert health["recent_calls"] == 3
+        assert "Stripe is down" in health["last_error"]
+        assert len(fake_stripe.requests) == 3
+
+
+class TestEventLoop:
+    @pytest.mark.asyncio
+    async def test_loop_stays_responsive_while_stripe_is_slow(self, gateway, fake_stripe):
+        fake_stripe.latency = 0.3
+        client = StripeClient(gateway=gateway)
+        gaps = []
+        stop = asyncio.Event()
+
+        async def ticker():
+            last = time.perf_counter()
+            while not stop.is_set():
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        tick = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        sessions = await asyncio.gather(*(
+            client.create_checkout_session(user_id=1000 + i, plan_id="basic") for i in range(10)
+        ))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await tick
+        await gateway.close()
+
+        assert len({session["session_id"] for session in sessions}) == 10
+        # Ten 0.3s calls overlap instead of running one after another on a blocked loop
+        assert elapsed < 1.5
+        assert max(gaps) < 0.15
@@ -0,0 +1,241 @@
+"""
+Unit tests for queued payment webhook ingestion: recorded Stripe/YooKassa
+events are persisted once, applied exactly once, retried, failed and replayed
+against an in-memory store with the same semantics as the SQL functions.
+"""
+
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+import services.pay.stripe.webhooks as stripe_webhooks
+from services.pay.webhook_queue import (
+    WebhookEventProcessor,
+    event_identity,
+    extract_credit,
+    ingest_webhook,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures" / "payment_webhooks"
+
+
+def load_fixture(name):
+    return json.loads((FIXTURES / f"{name}.json").read_text())
+
+
+class InMemoryWebhookEventStore:
+    """Mirrors payment_webhook_events + claim/apply_payment_webhook_event"""
+
+    def __init__(self, users=None):
+        self.events = {}
+        self.users = users or {}  # telegram_id -> {"id", "credits_remaining"}
+        self.payments = []
+        self.actions = []
+        self.apply_failures = 0
+        self._next_id = 1
+
+    async def record(self, provider, event_id, event_type, payload):
+        if any(e["provider"] == provider and e["event_id"] == event_id for e in self.events.values()):
+            return False
+        self.events[self._next_id] = {
+            "id": self._next_id, "provider": provider, "event_id": event_id, "event_type": event_type,
+            "payload": payload, "status": "pending", "attempts": 0, "last_error": None, "locked_until": None,
+        }
+        self._next_id += 1
+        return True
+
+    async def claim(self, limit, lease_seconds):
+        now = time.time()
+        due = [
+            e for e in self.events.values()
+            if (e["status"] == "pending" and (e["locked_until"] is None or e["locked_until"] < now))
+            or (e["status"] == "processing" and e["locked_until"] < now)
+        ][:limit]
+        for event in due:
+            event.update(status="processing", attempts=event["attempts"] + 1, locked_until=now + lease_seconds)
+        return [dict(event) for event in due]
+
+    async def apply(self, row_id, credit):
+        if self.apply_failures:
+            self.apply_failures -= 1
+            raise ConnectionError("database timeout")
+        event = self.events[row_id]
+        if event["status"] == "applied":
+            return {"result": "duplicate"}
+        if any(p["gateway"] == credit.gateway and p["metadata"]["transaction_id"] == credit.transaction_id
+               for p in self.payments):
+            event.update(status="applied", locked_until=None)
+            return {"result": "duplicate"}
+        user = self.users.get(credit.telegram_id)
+        if user is None:
+            return {"result": "user_not_found"}
+        user["credits_remaining"] += credit.credits
+        self.payments.append({
+            "user_id": user["id"], "amount": credit.amount, "gateway": credit.gateway, "status": "succeeded",
+            "metadata": {**credit.metadata, "transaction_id": credit.transaction_id},
+        })
+        event.update(status="applied", locked_until=None, last_error=None)
+        return {"result": "applied", "user_id": user["id"]}
+
+    async def mark(self, row_id, status, error=None, retry_at=None):
+        self.events[row_id].update(
+            status=status, last_error=error, locked_until=retry_at.timestamp() if retry_at else None
+        )
+
+    async def list_events(self, provider=None, status=None, since=None, limit=100):
+        return [
+            e for e in self.events.values()
+            if (provider is None or e["provider"] == provider) and (status is None or e["status"] == status)
+        ][:limit]
+
+    async def replay(self, row_ids):
+        replayed = 0
+        for row_id in row_ids:
+            event = self.events[row_id]
+            if event["status"] != "applied":
+                event.update(status="pending", attempts=0, locked_until=None, last_error=None)
+                replayed += 1
+        return replayed
+
+    async def audit(self, user_id, action_type, metadata):
+        self.actions.append((user_id, action_type, metadata))
+
+
+@pytest.fixture
+def store():
+    return InMemoryWebhookEventStore(users={
+        313131: {"id": "uuid-stripe-user", "credits_remaining": 5},
+        424242: {"id": "uuid-yookassa-user", "credits_remaining": 0},
+    })
+
+
+class TestExtraction:
+    def test_recorded_events(self):
+        stripe_event = load_fixture("stripe_checkout_completed")
+        credit = extract_credit("stripe", stripe_event)
+        assert event_identity("stripe", stripe_event) == ("evt_1QCheckoutCompleted01", "checkout.session.completed")
+        assert (credit.telegram_id, credit.credits, credit.amount) == (313131, 20, 4.99)
+        assert credit.transaction_id == "cs_test_a1B2c3D4e5F6"
+
+        yookassa_event = load_fixture("yookassa_payment_succeeded")
+        credit = extract_credit("yookassa", yookassa_event)
+        assert event_identity("yookassa", yookassa_event)[0] == "payment.succeeded:2e8f1a7c-000f-5000-9000-1b2c3d4e5f60"
+        assert (credit.telegram_id, credit.credits, credit.amount) == (424242, 20, 99.0)
+
+        assert extract_credit("stripe", load_fixture("stripe_checkout_unpaid")) is None
+
+
+class TestExactlyOnce:
+    @pytest.mark.asyncio
+    async def test_provider_retries_credit_once(self, store):
+        event = load_fixture("stripe_checkout_completed")
+        responses = [await ingest_webhook(store, "stripe", event) for _ in range(3)]
+        await ingest_webhook(store, "yookassa", load_fixture("yookassa_payment_succeeded"))
+
+        counts = await WebhookEventProcessor(store).process_batch()
+
+        assert [r["status"] for r in responses] == ["queued", "duplicate", "duplicate"]
+        assert counts == {"applied": 2}
+        assert store.users[313131]["credits_remaining"] == 25
+        assert store.users[424242]["credits_remaining"] == 20
+        assert len(store.payments) == 2
+        assert [action[1] for action in store.actions] == ["stripe_payment_completed", "yookassa_payment_completed"]
+
+    @pytest.mark.asyncio
+    async def test_second_event_for_same_session_is_duplicate(self, store):
+        await ingest_webhook(store, "stripe", load_fixture("stripe_checkout_completed"))
+        await ingest_webhook(store, "stripe", load_fixture("stripe_async_payment_succeeded"))
+        await ingest_webhook(store, "stripe", load_fixture("stripe_checkout_unpaid"))
+
+        counts = await WebhookEventProcessor(store).process_batch()
+
+        assert counts == {"applied": 1, "duplicate": 1, "ignored": 1}
+        assert store.users[313131]["credits_remaining"] == 25
+        assert len(store.payments) == 1
+
+    @pytest.mark.asyncio
+    async def test_worker_crash_is_recovered_after_lease(self, store):
+        await ingest_webhook(store, "stripe", load_fixture("stripe_checkout_completed"))
+        # A worker claimed the batch and died before applying it
+        await store.claim(10, lease_seconds=0)
+
+        processor = WebhookEventProcessor(store, lease_seconds=0)
+        assert await processor.process_batch() == {"applied": 1}
+        assert await processor.process_batch() == {}
+        assert store.users[313131]["credits_remaining"] == 25
+
+
+class TestRetriesAndReplay:
+    @pytest.mark.asyncio
+    async def test_transient_failure_is_retried_with_backoff(self, store):
+        await ingest_webhook(store, "stripe", load_fixture("stripe_checkout_completed"))
+        store.apply_failures = 1
+        processor = WebhookEventProcessor(store, retry_base_seconds=0)
+
+        assert await processor.process_batch() == {"retry": 1}
+        assert store.events[1]["last_error"] == "apply failed: database timeout"
+        assert await processor.process_batch() == {"applied": 1}
+        assert store.users[313131]["credits_remaining"] == 25
+
+        store.events[1]["status"] = "pending"
+        backoff = WebhookEventProcessor(store, retry_base_seconds=60)
+        store.apply_failures = 1
+        await backoff.process_batch()
+        # Not due yet
+        assert await backoff.process_batch() == {}
+
+    @pytest.mark.asyncio
+    async def test_failed_events_are_replayed(self, store):
+        del store.users[424242]
+        await ingest_webhook(store, "yookassa", load_fixture("yookassa_payment_succeeded"))
+        processor = WebhookEventProcessor(store, max_attempts=2, retry_base_seconds=0)
+
+        assert await processor.process_batch() == {"retry": 1}
+        assert await processor.process_batch() == {"failed": 1}
+        assert store.events[1]["last_error"] == "user_not_found"
+
+        # The user shows up (e.g. after /start) and support replays the failed events
+        store.users[424242] = {"id": "uuid-yookassa-user", "credits_remaining": 0}
+        failed = await store.list_events(status="failed")
+        assert await store.replay([event["id"] for event in failed]) == 1
+        assert await processor.process_batch() == {"applied": 1}
+        # Replaying an applied event is a no-op
+        assert await store.replay([1]) == 0
+        assert store.users[424242]["credits_remaining"] == 20
+
+    @pytest.mark.asyncio
+    async def test_paid_event_without_metadata_fails_without_retry(self, store):
+        event = load_fixture("stripe_checkout_completed")
+        event["data"]["object"]["metadata"] = {}
+        await ingest_webhook(store, "stripe", event)
+
+        assert await WebhookEventProcessor(store).process_batch() == {"failed": 1}
+        assert "Missing user_id/credits" in store.events[1]["last_error"]
+
+
+class TestStripeEndpoint:
+    @pytest.mark.asyncio
+    async def test_queued_mode_persists_and_acks(self, store, monkeypatch):
+        secret = "whsec_test"
+        monkeypatch.setenv("STRIPE_WEBHOOK_SECRET", secret)
+        monkeypatch.setenv("PAYMENT_WEBHOOK_QUEUE_ENABLED", "true")
+        monkeypatch.setattr(stripe_webhooks, "get_webhook_event_store", lambda: store)
+        payload = (FIXTURES / "stripe_checkout_completed.json").read_bytes()
+        timestamp = int(datetime.now(timezone.utc).timestamp())
+        digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+        signature = f"t={timestamp},v1={digest}"
+
+        handler = stripe_webhooks.StripeWebhookHandler()
+        first = await handler.handle_webhook(payload, signature)
+        second = await handler.handle_webhook(payload, signature)
+
+        assert first == ({"status": "queued", "event_id": "evt_1QCheckoutCompleted01"}, 200)
+        assert second[0]["status"] == "duplicate"
+        # Nothing is credited inside the request
+        assert store.users[313131]["credits_remaining"] == 5
+        assert len(store.events) == 1
@@ -0,0 +1,239 @@
+"""
+Unit tests for services/api/bot/utils/photo_stream.py: hashing while streaming,
+the R2 multipart tee, the spool memory budget and the ML request body.
+
+R2 is an in-memory boto3 stand-in here; the run against the S3-compatible HTTP
+stand-in at 200 concurrent uploads is tests/performance/test_photo_stream_memory.py.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from services.api.bot.utils import photo_stream, r2
+from services.api.bot.utils.photo_stream import (
+    PhotoSpool,
+    PhotoStreamError,
+    PhotoTooLargeError,
+    SpoolBudget,
+    stream_telegram_photo,
+    upload_streamed_photo,
+)
+
+JPEG = b"\xff\xd8\xff"
+
+
+class FakeS3:
+    """The boto3 S3 calls the pipeline makes, over dicts; tracks concurrent part uploads."""
+
+    def __init__(self, fail_part=None, part_delay=0.0):
+        self.objects = {}
+        self.metadata = {}
+        self.uploads = {}
+        self.aborted = []
+        self.calls = []
+        self.fail_part = fail_part
+        self.part_delay = part_delay
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, ContentLength, ContentType, Metadata):
+        self.calls.append("put")
+        self.objects[Key] = Body.read()
+        assert len(self.objects[Key]) == ContentLength
+        self.metadata[Key] = Metadata
+        return {"ETag": '"put"'}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType, Metadata):
+        self.calls.append("create")
+        self.uploads["up-1"] = {}
+        self.metadata[Key] = Metadata
+        return {"UploadId": "up-1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.part_delay)
+            if PartNumber == self.fail_part:
+                raise ConnectionError("R2 unavailable")
+            self.calls.append("part")
+            self.uploads[UploadId][PartNumber] = Body
+            return {"ETag": f'"part-{PartNumber}"'}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append("complete")
+        parts = self.uploads.pop(UploadId)
+        assert [part["PartNumber"] for part in MultipartUpload["Parts"]] == sorted(parts)
+        self.objects[Key] = b"".join(parts[number] for number in sorted(parts))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append(UploadId)
+        self.uploads.pop(UploadId, None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://r2.example/{Params['Key']}"
+
+
+def fake_bot(data, chunk_size=64 * 1024):
+    async def stream_content(url, timeout, chunk_size, raise_for_status):
+        for offset in range(0, len(data), chunk_size):
+            yield data[offset:offset + chunk_size]
+
+    api = SimpleNamespace(is_local=False, file_url=lambda token, path: f"https://api.telegram.org/file/bot{token}/{path}")
+    return SimpleNamespace(token="token", session=SimpleNamespace(api=api, stream_content=stream_content))
+
+
+def photo_bytes(size):
+    return JPEG + os.urandom(size - len(JPEG))
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    client = FakeS3()
+    monkeypatch.setattr(r2, "R2_ENABLED", True)
+    monkeypatch.setattr(r2, "R2_BUCKET_NAME", "photos")
+    monkeypatch.setattr(r2, "get_r2_client", lambda: client)
+    monkeypatch.setattr(photo_stream, "spool_budget", SpoolBudget(4 * 1024 * 1024))
+    return client
+
+
+class TestStreaming:
+    @pytest.mark.asyncio
+    async def test_hashes_while_streaming(self, s3):
+        data = photo_bytes(300_000)
+
+        photo = await stream_telegram_photo(fake_bot(data), "photos/1.jpg", expected_size=len(data))
+
+        assert photo.sha256 == hashlib.sha256(data).hexdigest()
+        assert photo.md5 == hashlib.md5(data).hexdigest()
+        assert photo.size == len(data) and photo.spool.getvalue() == data
+        # Nothing goes to R2 without upload=True
+        assert s3.calls == []
+        photo.close()
+
+    @pytest.mark.asyncio
+    async def test_small_photo_is_one_put_with_file_hash(self, s3):
+        data = photo_bytes(200_000)
+
+        photo = await stream_telegram_photo(fake_bot(data), "photos/1.jpg", user_id="user-1", upload=True)
+
+        assert s3.calls == ["put"]
+        assert s3.objects[photo.r2_key] == data
+        assert s3.metadata[photo.r2_key]["file_hash"] == photo.md5
+        assert photo.url == f"https://r2.example/{photo.r2_key}"
+        assert photo.r2_key.startswith("user-1/")
+        photo.close()
+
+    @pytest.mark.asyncio
+    async def test_large_photo_is_teed_to_a_multipart_upload(self, s3):
+        s3.part_delay = 0.01
+        data = photo_bytes(1_000_000)
+
+        photo = await stream_telegram_photo(
+            fake_bot(data), "photos/1.jpg", user_id="user-1", upload=True, part_size=128 * 1024
+        )
+
+        assert s3.calls[0] == "create" and s3.calls[-1] == "complete"
+        assert s3.calls.count("part") == -(-len(data) // (128 * 1024))
+        assert s3.objects[photo.r2_key] == data
+        # One part in flight per photo: the download waits for R2, buffers stay bounded
+        assert s3.max_in_flight == 1
+        photo.close()
+
+    @pytest.mark.asyncio
+    async def test_r2_failure_keeps_the_download(self, s3):
+        s3.fail_part = 2
+        data = photo_bytes(600_000)
+
+        photo = await stream_telegram_photo(
+            fake_bot(data), "photos/1.jpg", user_id="user-1", upload=True, part_size=128 * 1024
+        )
+
+        assert photo.url is None
+        assert s3.aborted == ["up-1"] and not s3.uploads
+        assert photo.sha256 == hashlib.sha256(data).hexdigest()
+        photo.close()
+
+
+class TestValidation:
+    @pytest.mark.asyncio
+    async def test_too_large_aborts_the_upload(self, s3):
+        data = photo_bytes(700_000)
+
+        with pytest.raises(PhotoTooLargeError):
+            await stream_telegram_photo(
+                fake_bot(data), "photos/1.jpg", user_id="user-1", upload=True,
+                max_bytes=500_000, part_size=128 * 1024,
+            )
+
+        assert s3.aborted == ["up-1"]
+        assert photo_stream.spool_budget.in_use == 0
+
+    @pytest.mark.asyncio
+    async def test_not_an_image(self, s3):
+        with pytest.raises(PhotoStreamError):
+            await stream_telegram_photo(fake_bot(b"%PDF-1.7" + b"x" * 1000), "docs/1.pdf")
+
+
+class TestSpool:
+    def test_budget_spills_to_disk_and_is_released(self):
+        budget = SpoolBudget(1024 * 1024)
+        first = PhotoSpool(expected_size=800_000, budget=budget)
+        second = PhotoSpool(expected_size=800_000, budget=budget)
+        third = PhotoSpool(expected_size=800_000, budget=budget)
+
+        assert (first.memory_share, second.memory_share, third.memory_share) == (800_000, 248_576, 0)
+        for spool in (first, second, third):
+            spool.write(b"x" * 500_000)
+        assert [spool.on_disk for spool in (first, second, third)] == [False, True, True]
+
+        for spool in (first, second, third):
+            spool.close()
+        assert budget.in_use == 0
+
+    @pytest.mark.asyncio
+    async def test_ml_body_is_read_from_the_spool_on_every_send(self, s3):
+        data = photo_bytes(250_000)
+        photo = await stream_telegram_photo(fake_bot(data), "photos/1.jpg")
+        received = []
+
+        def handler(request):
+            received.append(request.read())
+            return httpx.Response(200, json={})
+
+        files = {"photo": ("photo.jpg", photo.body(), "image/jpeg")}
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            # e.g. the streaming endpoint and then the blocking fallback
+            await client.post("http://ml/api/v1/analyze/stream", files=files)
+            await client.post("http://ml/api/v1/analyze", files=files)
+
+        assert len(received) == 2 and all(data in body for body in received)
+        # Reading the body never moved the spool to disk
+        assert not photo.spool.on_disk
+        photo.close()
+
+    @pytest.mark.asyncio
+    async def test_upload_after_download(self, s3):
+        data = photo_bytes(100_000)
+        photo = await stream_telegram_photo(fake_bot(data), "photos/1.jpg")
+
+        url = await upload_streamed_photo(photo, "user-1", "nutrition_analysis")
+
+        assert url and s3.objects[photo.r2_key] == data
+        # Already uploaded: no second PUT
+        assert await upload_streamed_photo(photo, "user-1") == url and s3.calls == ["put"]
+        photo.close()
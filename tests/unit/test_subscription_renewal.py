@@ -0,0 +1,364 @@
+"""
+Unit tests for services/pay/subscription_renewal.py: keyset paging, bounded
+concurrency, per-gateway rate limits, batched outcome writes, and resuming a
+crashed run or settling unknown charge outcomes without charging or crediting
+twice.
+
+The store and gateways are the offline stand-ins from tests/performance/stubs.py;
+the 100k-subscriber throughput run is tests/performance/test_subscription_renewal_benchmark.py.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.test_utils import setup_test_imports
+
+setup_test_imports()
+
+from services.pay import webhook_queue
+from services.pay.subscription_renewal import (
+    DueSubscription,
+    RenewalRateLimiter,
+    StripeRenewalGateway,
+    SubscriptionRenewalEngine,
+)
+from tests.performance.stubs import FakeRenewalGateway, InMemoryRenewalStore
+from tests.performance.synthetic import synthetic_subscriptions
+
+NOW = datetime(2026, 3, 1, 3, 0, tzinfo=timezone.utc)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_engine(store, stripe=None, yookassa=None, **kwargs):
+    gateways = {"stripe": stripe or FakeRenewalGateway(), "yookassa": yookassa or FakeRenewalGateway()}
+    # No rate limiting unless a test asks for it
+    kwargs.setdefault("rate_limits", {"stripe": 0, "yookassa": 0})
+    return SubscriptionRenewalEngine(store, gateways, **kwargs), gateways
+
+
+def due_ids(rows):
+    return {row["id"] for row in rows if row["next_renewal_at"] <= NOW}
+
+
+class TestRun:
+    @pytest.mark.asyncio
+    async def test_renews_every_due_subscription_once(self):
+        rows = synthetic_subscriptions(2000, now=NOW)
+        store = InMemoryRenewalStore(rows)
+        engine, gateways = make_engine(store, page_size=128, concurrency=16)
+
+        report = await engine.run("run-1", NOW)
+
+        due = due_ids(rows)
+        assert report["counts"] == {"succeeded": len(due), "declined": 0, "error": 0}
+        assert report["pages"] == -(-len(due) // 128)
+        assert gateways["stripe"].calls + gateways["yookassa"].calls == len(due)
+        renewed = {row["subscription_id"] for row in store.renewals}
+        assert renewed == due
+        # Next period is a month out, so nothing is due any more
+        assert await store.due_page(NOW, None, 10) == []
+        # Users with two subscriptions get both credits
+        assert sum(store.credits.values()) == 100 * len(due)
+        assert store.records == report["pages"]
+        assert store.runs["run-1"]["status"] == "completed"
+
+    @pytest.mark.asyncio
+    async def test_overdue_subscriptions_are_charged_once_per_run(self):
+        rows = synthetic_subscriptions(200, now=NOW, due_share=1.0)
+        for row in rows:
+            # Two to three periods behind
+            row["current_period_end"] = row["next_renewal_at"] = NOW - timedelta(days=60 + row["id"] % 30)
+            row["failed_attempts"] = 0
+        store = InMemoryRenewalStore(rows)
+        gateway = FakeRenewalGateway(latency_sec=0.001)
+        engine, _ = make_engine(store, stripe=gateway, yookassa=gateway, page_size=16, concurrency=8)
+
+        report = await engine.run("run-1", NOW)
+
+        assert report["counts"] == {"succeeded": 200, "declined": 0, "error": 0}
+        assert gateway.calls == 200 and len(store.payments) == 200
+        for row in rows:
+            renewed = store.subscriptions[row["id"]]
+            # The first period end after the run, in whole periods from the old one
+            assert renewed["next_renewal_at"] > NOW
+            assert renewed["next_renewal_at"] - timedelta(days=30) <= max(NOW, datetime.now(timezone.utc))
+            assert (renewed["current_period_end"] - row["current_period_end"]).days % 30 == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        store = InMemoryRenewalStore(synthetic_subscriptions(300, now=NOW))
+        gateway = FakeRenewalGateway(latency_sec=0.001)
+        engine, _ = make_engine(store, stripe=gateway, yookassa=gateway, page_size=100, concurrency=8)
+
+        await engine.run("run-1", NOW)
+
+        assert gateway.max_in_flight == 8
+
+    @pytest.mark.asyncio
+    async def test_declines_and_errors(self):
+        rows = synthetic_subscriptions(200, now=NOW)
+        due = sorted(due_ids(rows))
+        declined, failing = set(due[:10]), set(due[10:15])
+        gateway = FakeRenewalGateway(decline_ids=declined, error_ids=failing)
+        store = InMemoryRenewalStore(rows)
+        engine, _ = make_engine(store, stripe=gateway, yookassa=gateway, page_size=50)
+
+        report = await engine.run("run-1", NOW)
+
+        assert report["counts"] == {"succeeded": len(due) - 15, "declined": 10, "error": 5}
+        for subscription_id in declined:
+            row = store.subscriptions[subscription_id]
+            assert row["failed_attempts"] >= 1 and row["next_renewal_at"] > NOW
+        # Gateway errors leave the subscription due for the next run
+        assert {s.id for s in await store.due_page(NOW, None, 100)} == failing
+
+    @pytest.mark.asyncio
+    async def test_completed_run_is_not_repeated(self):
+        store = InMemoryRenewalStore(synthetic_subscriptions(100, now=NOW))
+        engine, gateways = make_engine(store)
+        first = await engine.run("run-1", NOW)
+        calls = gateways["stripe"].calls + gateways["yookassa"].calls
+
+        again = await engine.run("run-1", NOW)
+
+        assert again["counts"] == first["counts"] and again["charged"] == 0
+        assert gateways["stripe"].calls + gateways["yookassa"].calls == calls
+
+
+class TestResume:
+    @pytest.mark.asyncio
+    async def test_crashed_run_resumes_without_double_charges(self):
+        rows = synthetic_subscriptions(1000, now=NOW)
+        due = due_ids(rows)
+        store = InMemoryRenewalStore(rows, fail_record_at=4)
+        gateway = FakeRenewalGateway()
+        engine, _ = make_engine(store, stripe=gateway, yookassa=gateway, page_size=100)
+
+        with pytest.raises(ConnectionError):
+            await engine.run("run-1", NOW)
+        checkpoint = store.runs["run-1"]["checkpoint"]
+        written = {row["subscription_id"] for row in store.renewals}
+        assert checkpoint is not None and len(written) == 300
+
+        # Same run id: continues after the last committed page with the stored cutoff
+        report = await engine.run("run-1", NOW + timedelta(days=10))
+
+        assert report["counts"]["succeeded"] == len(due)
+        assert {row["subscription_id"] for row in store.renewals} == due
+        # Pages charged before the crash were charged again with the same keys: one payment each
+        assert len(gateway.charges) == len(due)
+        assert len(store.payments) == len(due)
+        assert sum(store.credits.values()) == 100 * len(due)
+
+
+    @pytest.mark.asyncio
+    async def test_resume_after_keys_expired_looks_charges_up(self):
+        rows = synthetic_subscriptions(1000, now=NOW)
+        due = due_ids(rows)
+        store = InMemoryRenewalStore(rows, fail_record_at=3)
+        gateway = FakeRenewalGateway()
+        engine, _ = make_engine(store, stripe=gateway, yookassa=gateway, page_size=100)
+        with pytest.raises(ConnectionError):
+            await engine.run("run-1", NOW)
+
+        # Resumed days later: replaying the same keys would charge the unwritten pages again
+        gateway.expire_keys()
+        report = await engine.run("run-1", NOW)
+
+        assert report["counts"]["succeeded"] == len(due)
+        assert len(gateway.payments) == len(due)
+        assert len(store.payments) == len(due)
+        # Only the pages that may have been charged unwritten are looked up
+        assert gateway.lookups == 200
+
+
+class TestUnknownOutcomes:
+    @pytest.mark.asyncio
+    async def test_pending_charge_is_looked_up_not_charged_again(self):
+        rows = synthetic_subscriptions(100, now=NOW)
+        due = sorted(due_ids(rows))
+        pending = set(due[:5])
+        gateway = FakeRenewalGateway(pending_ids=pending)
+        store = InMemoryRenewalStore(rows)
+        engine, _ = make_engine(store, stripe=gateway, yookassa=gateway)
+
+        first = await engine.run("run-1", NOW)
+        assert first["counts"]["error"] == 5
+        for subscription_id in pending:
+            row = store.subscriptions[subscription_id]
+            assert row["charge_pending"] and row["pending_transaction_id"]
+            gateway.settle(row["pending_transaction_id"])
+        gateway.expire_keys()
+
+        # The next day's run, after the gateway forgot the keys
+        second = await engine.run("run-2", NOW)
+
+        assert second["counts"] == {"succeeded": 5, "declined": 0, "error": 0}
+        assert gateway.lookups == 5
+        assert len(gateway.payments) == len(due)
+        assert len(store.payments) == len(due)
+        assert not any(store.subscriptions[i]["charge_pending"] for i in pending)
+
+    @pytest.mark.asyncio
+    async def test_late_success_is_recorded_once_from_the_webhook(self):
+        rows = synthetic_subscriptions(20, now=NOW)
+        subscription_id = min(due_ids(rows))
+        gateway = FakeRenewalGateway(pending_ids={subscription_id})
+        store = InMemoryRenewalStore(rows)
+        engine, _ = make_engine(store, stripe=gateway, yookassa=gateway)
+        await engine.run("run-1", NOW)
+        subscription = DueSubscription.from_row(store.subscriptions[subscription_id])
+        event = {
+            "event": "payment.succeeded",
+            "object": {
+                "id": subscription.pending_transaction_id,
+                "status": "succeeded",
+                "amount": {"value": "349.00", "currency": "RUB"},
+                "metadata": subscription.metadata,
+            },
+        }
+        outcome = webhook_queue.extract_renewal("yookassa", event)
+
+        assert (await store.record_payment(outcome))["renewed"] == 1
+        assert (await store.record_payment(outcome))["renewed"] == 0
+        assert store.subscriptions[subscription_id]["next_renewal_at"] > NOW
+        # Renewed by the webhook: the next run does not charge it
+        calls = gateway.calls
+        await engine.run("run-2", NOW)
+        assert gateway.calls == calls and gateway.lookups == 0
+        assert len(store.payments) == len(due_ids(rows))
+
+
+class FakeIntents:
+    """The StripeGateway calls the renewal gateway makes"""
+
+    def __init__(self, status):
+        self.status = status
+        self.queries = []
+
+    async def create_payment_intent(self, params, idempotency_key):
+        return {"id": "pi_1", "status": self.status, "metadata": params["metadata"]}
+
+    async def retrieve_payment_intent(self, intent_id):
+        return {"id": intent_id, "status": self.status}
+
+    async def search_payment_intents(self, query):
+        self.queries.append(query)
+        return [{"id": "pi_0", "status": "requires_payment_method"}, {"id": "pi_1", "status": self.status}]
+
+
+class TestStripeRenewalGateway:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("status, outcome", [
+        ("succeeded", "succeeded"),
+        ("requires_payment_method", "declined"),
+        ("canceled", "declined"),
+        # Not final: looked up by the next run instead of retried with a new key
+        ("processing", "error"),
+        ("requires_action", "error"),
+    ])
+    async def test_intent_statuses(self, status, outcome):
+        subscription = DueSubscription.from_row(synthetic_subscriptions(1, now=NOW, due_share=1.0)[0])
+        gateway = StripeRenewalGateway(FakeIntents(status))
+
+        result = await gateway.charge(subscription)
+
+        assert (result.status, result.transaction_id) == (outcome, "pi_1")
+
+    @pytest.mark.asyncio
+    async def test_find_searches_by_period_and_attempt(self):
+        subscription = DueSubscription.from_row(synthetic_subscriptions(1, now=NOW, due_share=1.0)[0])
+        intents = FakeIntents("succeeded")
+
+        result = await StripeRenewalGateway(intents).find(subscription)
+
+        assert (result.status, result.transaction_id) == ("succeeded", "pi_1")
+        assert f"metadata['period_start']:'{subscription.current_period_end.isoformat()}'" in intents.queries[0]
+        subscription.pending_transaction_id = "pi_9"
+        assert (await StripeRenewalGateway(intents).find(subscription)).transaction_id == "pi_9"
+
+
+class TestRateLimiter:
+    @pytest.mark.asyncio
+    async def test_token_bucket(self):
+        clock = Clock()
+        limiter = RenewalRateLimiter(rate=10, burst=5, clock=clock, sleep=clock.sleep)
+
+        for _ in range(25):
+            await limiter.acquire()
+
+        # A burst of 5, then one token every 100ms
+        assert clock.now == pytest.approx(2.0)
+
+    @pytest.mark.asyncio
+    async def test_engine_limits_each_gateway(self):
+        rows = synthetic_subscriptions(400, now=NOW)
+        store = InMemoryRenewalStore(rows)
+        engine, gateways = make_engine(store, rate_limits={"stripe": 50, "yookassa": 20})
+        clocks = {}
+        for name, limiter in engine.limiters.items():
+            clocks[name] = Clock()
+            limiter.clock, limiter.sleep = clocks[name], clocks[name].sleep
+            limiter._updated, limiter._tokens = 0.0, limiter.burst
+
+        await engine.run("run-1", NOW)
+
+        for name, rate in (("stripe", 50), ("yookassa", 20)):
+            calls = gateways[name].calls
+            # Burst of ``rate`` calls, then ``rate`` per (fake) second
+            assert calls > rate
+            assert clocks[name].now == pytest.approx((calls - rate) / rate, abs=1e-6)
+
+
+class TestWebhooks:
+    def test_renewal_payments_are_not_credited_by_the_webhook(self):
+        event = {
+            "event": "payment.succeeded",
+            "object": {
+                "id": "pay_1",
+                "status": "succeeded",
+                "amount": {"value": "349.00", "currency": "RUB"},
+                "metadata": {"subscription_id": "7", "plan_id": "pro", "renewal": "true"},
+            },
+        }
+
+        assert webhook_queue.extract_credit("yookassa", event) is None
+
+    @pytest.mark.asyncio
+    async def test_queued_renewal_event_is_recorded_once(self):
+        rows = synthetic_subscriptions(1, now=NOW, due_share=1.0)
+        renewals = InMemoryRenewalStore(rows)
+        subscription = DueSubscription.from_row(rows[0])
+
+        class EventStore:
+            async def record_renewal(self, row_id, outcome):
+                return await renewals.record_payment(outcome)
+
+        payload = {
+            "id": "evt_1",
+            "type": "payment_intent.succeeded",
+            "data": {"object": {
+                "id": "pi_1", "status": "succeeded", "amount": 999, "currency": "usd",
+                "metadata": subscription.metadata,
+            }},
+        }
+        processor = webhook_queue.WebhookEventProcessor(EventStore())
+        event = {"id": 1, "provider": "stripe", "event_id": "evt_1", "payload": payload, "attempts": 1}
+
+        assert await processor.process_event(event) == "applied"
+        assert await processor.process_event(event) == "duplicate"
+        assert renewals.credits == {rows[0]["user_id"]: rows[0]["credits"]}
+        assert renewals.renewals[0]["amount"] == "9.99"